@@ -0,0 +1,158 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Per-notification cost of the sched_switch notifications, from the
+# provider sending them to the analysis callbacks reading their fields.
+#
+#     python3 -m benchmarks.notification [subscriber count]
+
+import sys
+import timeit
+from lttnganalyses.linuxautomaton import notification
+
+
+_ITERATIONS = 200000
+_SWITCH_ARGS = (1000, 0, 42, 43, 'bash', 'sshd', object(), None)
+
+
+class _Sink():
+    def __init__(self):
+        self.last_ts = None
+
+
+# Dispatch as done before notification payloads: one kwargs dict built
+# per sched_switch, unpacked into every subscriber.
+def _bench_kwargs_list(nr_subscribers):
+    cbs = {}
+
+    def cb(period_data, **kwargs):
+        period_data.last_ts = kwargs['timestamp']
+        period_data.last_cpu = kwargs['cpu_id']
+
+    for name in ['sched_switch_per_cpu', 'sched_switch_per_tid']:
+        cbs[name] = [(_Sink(), cb) for i in range(nr_subscribers)]
+
+    def send_notification_cb(name, **kwargs):
+        if name in cbs:
+            for cb_tuple in cbs[name]:
+                cb_tuple[1](cb_tuple[0], **kwargs)
+
+    def sched_switch(timestamp, cpu_id, prev_tid, next_tid, prev_comm,
+                     next_comm, wakee_proc, waker_proc):
+        cb_data = {
+            'timestamp': timestamp,
+            'cpu_id': cpu_id,
+            'prev_tid': prev_tid,
+            'next_tid': next_tid,
+            'next_comm': next_comm,
+            'wakee_proc': wakee_proc,
+            'waker_proc': waker_proc,
+            'prev_comm': prev_comm,
+        }
+        send_notification_cb('sched_switch_per_cpu', **cb_data)
+        send_notification_cb('sched_switch_per_tid', **cb_data)
+
+    return lambda: sched_switch(*_SWITCH_ARGS)
+
+
+def _subscribe(bus, nr_subscribers, cb):
+    for i in range(nr_subscribers):
+        bus.subscribe(_Sink(), {
+            'sched_switch_per_cpu': cb,
+            'sched_switch_per_tid': cb,
+        })
+
+
+# Legacy analyses going through notification.kwargs_cb()
+def _bench_kwargs_shim(nr_subscribers):
+    bus = notification.NotificationBus()
+    payload = notification.SchedSwitchPayload()
+
+    def cb(period_data, **kwargs):
+        period_data.last_ts = kwargs['timestamp']
+        period_data.last_cpu = kwargs['cpu_id']
+
+    _subscribe(bus, nr_subscribers, notification.kwargs_cb(cb))
+
+    def sched_switch(timestamp, cpu_id, prev_tid, next_tid, prev_comm,
+                     next_comm, wakee_proc, waker_proc):
+        payload.timestamp = timestamp
+        payload.cpu_id = cpu_id
+        payload.prev_tid = prev_tid
+        payload.next_tid = next_tid
+        payload.prev_comm = prev_comm
+        payload.next_comm = next_comm
+        payload.wakee_proc = wakee_proc
+        payload.waker_proc = waker_proc
+        bus.send('sched_switch_per_cpu', payload)
+        bus.send('sched_switch_per_tid', payload)
+
+    return lambda: sched_switch(*_SWITCH_ARGS)
+
+
+def _bench_payload(nr_subscribers):
+    bus = notification.NotificationBus()
+    payload = notification.SchedSwitchPayload()
+
+    def cb(period_data, payload):
+        period_data.last_ts = payload.timestamp
+        period_data.last_cpu = payload.cpu_id
+
+    _subscribe(bus, nr_subscribers, cb)
+
+    def sched_switch(timestamp, cpu_id, prev_tid, next_tid, prev_comm,
+                     next_comm, wakee_proc, waker_proc):
+        payload.timestamp = timestamp
+        payload.cpu_id = cpu_id
+        payload.prev_tid = prev_tid
+        payload.next_tid = next_tid
+        payload.prev_comm = prev_comm
+        payload.next_comm = next_comm
+        payload.wakee_proc = wakee_proc
+        payload.waker_proc = waker_proc
+        bus.send('sched_switch_per_cpu', payload)
+        bus.send('sched_switch_per_tid', payload)
+
+    return lambda: sched_switch(*_SWITCH_ARGS)
+
+
+def _run(title, fn):
+    # two notifications per sched_switch
+    nr_notifications = _ITERATIONS * 2
+    best = min(timeit.repeat(fn, number=_ITERATIONS, repeat=3))
+    print('{:<30} {:>10.1f} ns/notification'.format(
+        title, best / nr_notifications * 1e9))
+
+
+def run(nr_subscribers=1):
+    print('{} subscriber(s) per notification'.format(nr_subscribers))
+    _run('kwargs dict (previous)', _bench_kwargs_list(nr_subscribers))
+    _run('payload, kwargs_cb() shim', _bench_kwargs_shim(nr_subscribers))
+    _run('payload', _bench_payload(nr_subscribers))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run()
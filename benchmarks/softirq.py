@@ -0,0 +1,130 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Per-event cost of the softirq raise/entry/exit path of the IRQ state
+# provider, NET_RX softirqs on a single CPU.
+#
+#     python3 -m benchmarks.softirq
+
+import timeit
+from lttnganalyses.linuxautomaton import sv
+from lttnganalyses.linuxautomaton.irq import IrqStateProvider
+from lttnganalyses.linuxautomaton.state import State
+
+
+_ITERATIONS = 100000
+_NET_RX = 3
+
+
+class _Event(dict):
+    def __init__(self, name, timestamp, **fields):
+        super().__init__(fields, cpu_id=0)
+        self.name = name
+        self.timestamp = timestamp
+
+
+def _get_events():
+    return [_Event(name, i, vec=_NET_RX)
+            for i, name in enumerate(['softirq_raise', 'softirq_entry',
+                                      'softirq_exit'])]
+
+
+# Queues as done before: one list per vec in a dict, the head deleted
+# on exit and a new SoftIRQ object per raise.
+def _bench_list():
+    state = State()
+    payload = object()
+    current_softirqs = {}
+
+    def raise_(event):
+        cpu = state.get_cpu(event['cpu_id'])
+        vec = event['vec']
+
+        if vec not in current_softirqs:
+            current_softirqs[vec] = []
+
+        if current_softirqs[vec] and \
+           current_softirqs[vec][0].begin_ts is None:
+            return
+
+        irq = sv.SoftIRQ(vec, cpu.cpu_id, raise_ts=event.timestamp)
+        current_softirqs[vec].append(irq)
+
+    def entry(event):
+        state.get_cpu(event['cpu_id'])
+        vec = event['vec']
+
+        if vec not in current_softirqs:
+            current_softirqs[vec] = []
+
+        if current_softirqs[vec]:
+            current_softirqs[vec][0].begin_ts = event.timestamp
+
+    def exit_(event):
+        state.get_cpu(event['cpu_id'])
+        softirqs = current_softirqs.get(event['vec'])
+        if not softirqs:
+            return
+
+        softirqs[0].end_ts = event.timestamp
+        state.send_notification('softirq_exit', payload)
+        del softirqs[0]
+
+    cbs = [raise_, entry, exit_]
+    events = _get_events()
+
+    def run():
+        for cb, event in zip(cbs, events):
+            cb(event)
+
+    return run
+
+
+def _bench_provider():
+    provider = IrqStateProvider(State())
+    cbs = [provider._process_softirq_raise,
+           provider._process_softirq_entry,
+           provider._process_softirq_exit]
+    events = _get_events()
+
+    def run():
+        for cb, event in zip(cbs, events):
+            cb(event)
+
+    return run
+
+
+def _run(title, fn):
+    nr_events = _ITERATIONS * 3
+    best = min(timeit.repeat(fn, number=_ITERATIONS, repeat=3))
+    print('{:<30} {:>10.1f} ns/event'.format(
+        title, best / nr_events * 1e9))
+
+
+def run():
+    _run('list queues (previous)', _bench_list())
+    _run('deque queues, recycled', _bench_provider())
+
+
+if __name__ == '__main__':
+    run()
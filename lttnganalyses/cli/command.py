@@ -32,11 +32,11 @@ import traceback
 from babeltrace import TraceCollection
 from . import mi, progressbar, period_parsing
 from .. import __version__
-from ..core import analysis, period as core_period
+from ..core import analysis, stats, period as core_period
 from ..common import (
     format_utils, parse_utils, trace_utils, version_utils
 )
-from ..linuxautomaton import automaton
+from ..linuxautomaton import automaton, checkpoint, sht
 
 
 class Command:
@@ -59,6 +59,10 @@ class Command:
         self._handles = None
         self._traces = None
         self._period_ticks = 0
+        self._checkpoint_store = None
+        self._next_checkpoint_ts = None
+        self._state_history_path = None
+        self._history_builder = None
         self._mi_mode = mi_mode
         self._debug_mode = os.environ.get(self._DEBUG_ENV_VAR)
         self._run_step('create automaton', self._create_automaton)
@@ -219,8 +223,7 @@ class Command:
         self._read_tracer_version()
         if not self._args.skip_validation:
             self._check_lost_events()
-        if not self._check_period_args():
-            self._gen_error('Invalid period parameters')
+        self._check_period_args()
 
     def _close_trace(self):
         for handle in self._handles.values():
@@ -348,26 +351,131 @@ class Command:
         self._pre_analysis()
         self._pb_setup()
 
+        if self._debug_mode:
+            self.state.intern_pool.enable_accounting()
+
+        if self._state_history_path is not None:
+            self._setup_state_history()
+
         if self._args.intersect_mode:
             if not self._traces.has_intersection:
                 self._gen_error('Trace has no intersection. '
                                 'Use --no-intersection to override')
 
+        if self._analysis_conf.checkpoint_interval is not None and \
+                self._ts_begin is not None:
+            self._next_checkpoint_ts = self._ts_begin + \
+                self._analysis_conf.checkpoint_interval
+
         first_event = True
-        for event in self._traces.events:
+        for event in self._get_events():
             if first_event is True:
                 self._analysis.begin_analysis(event)
                 first_event = False
             self._pb_update(event)
+            if self._next_checkpoint_ts is not None and \
+                    event.timestamp >= self._next_checkpoint_ts:
+                self._save_checkpoint(event.timestamp)
             self._analysis.process_event(event)
             if self._analysis.ended:
                 break
             self._automaton.process_event(event)
 
         self._pb_finish()
+        self._automaton.end()
+
+        if self._history_builder is not None:
+            self._save_state_history()
+
+        if self._debug_mode:
+            self._print_intern_stats()
+
         self._analysis.end_analysis()
         self._post_analysis()
 
+    def _setup_state_history(self):
+        path = self._state_history_path
+
+        if self._analysis_conf.begin_ts is not None or \
+                self._analysis_conf.end_ts is not None:
+            self._warn('Not building the state history {}: it requires '
+                       'reading the whole trace'.format(path))
+            return
+
+        # The history is built once per trace
+        if os.path.exists(path):
+            try:
+                with sht.StateHistory(path) as history:
+                    if history.matches_trace(self._ts_begin, self._ts_end):
+                        return
+            except (sht.HistoryError, OSError):
+                pass
+
+        self._history_builder = sht.HistoryBuilder()
+        self._automaton.enable_history(self._history_builder)
+
+    def _save_state_history(self):
+        path = self._state_history_path
+
+        try:
+            self._history_builder.save(path, self._analysis.last_event_ts,
+                                       self._ts_begin, self._ts_end)
+        except OSError as e:
+            self._warn('Cannot save state history {}: {}'.format(path, e))
+            return
+
+        if self._debug_mode:
+            self._print('Saved state history {}'.format(path))
+
+    def _print_intern_stats(self):
+        pool = self.state.intern_pool
+        self._print('Interned strings: {} unique ({} bytes), {} lookups, '
+                    '{} hits, {} bytes saved'.format(
+                        pool.size, pool.pool_bytes, pool.lookups,
+                        pool.hits, pool.saved_bytes))
+
+    def _get_events(self):
+        begin_ts = self._analysis_conf.begin_ts
+
+        if self._checkpoint_store is None or begin_ts is None:
+            return self._traces.events
+
+        path = self._checkpoint_store.find_nearest(begin_ts, self._ts_begin,
+                                                   self._ts_end)
+        if path is None:
+            return self._traces.events
+
+        try:
+            ckpt = checkpoint.Checkpoint.load(path)
+            self._automaton.restore_checkpoint(ckpt)
+        except (checkpoint.CheckpointError, OSError) as e:
+            self._warn('Cannot restore checkpoint {}: {}'.format(path, e))
+            return self._traces.events
+
+        if self._debug_mode:
+            self._print('Restored state checkpoint {}'.format(path))
+
+        # The checkpoint holds the state right before the first event
+        # at its timestamp, so resume reading from there.
+        if self._next_checkpoint_ts is not None:
+            self._next_checkpoint_ts = ckpt.timestamp + \
+                self._analysis_conf.checkpoint_interval
+
+        return self._traces.events_timestamps(ckpt.timestamp, self._ts_end)
+
+    def _save_checkpoint(self, timestamp):
+        # Taken before the event at timestamp is processed
+        ckpt = self._automaton.create_checkpoint(timestamp, self._ts_begin,
+                                                 self._ts_end)
+        path = self._checkpoint_store.save(ckpt)
+
+        if self._debug_mode:
+            self._print('Saved state checkpoint {}'.format(path))
+
+        interval = self._analysis_conf.checkpoint_interval
+        while self._next_checkpoint_ts <= timestamp:
+            self._next_checkpoint_ts += interval
+
     def _print_date(self, begin_ns, end_ns):
         time_range_str = format_utils.format_time_range(
             begin_ns, end_ns, print_date=True, gmt=self._args.gmt
@@ -376,6 +484,61 @@ class Command:
 
         self._print(date)
 
+    # Percentile columns of the statistics tables: (MI column name
+    # prefix, quantile, title)
+    _PERCENTILES = [
+        ('p50', .5, 'p50'),
+        ('p90', .9, 'p90'),
+        ('p99', .99, 'p99'),
+        ('p99_9', .999, 'p99.9'),
+    ]
+
+    # Returns the MI column infos of the percentiles of `quantity` (e.g.
+    # 'duration' for the p50_duration, ... columns)
+    @staticmethod
+    def _get_percentile_column_infos(quantity, title):
+        return [
+            ('{}_{}'.format(prefix, quantity),
+             '{} ({})'.format(title, percentile_title), mi.Duration)
+            for prefix, _, percentile_title in Command._PERCENTILES
+        ]
+
+    # Returns the percentile columns of `quantity`, computed from
+    # `histogram` (a stats.LogLinearHistogram), to append to a result
+    # table row
+    def _get_percentile_row_values(self, histogram, quantity):
+        quantiles = [quantile for _, quantile, _ in self._PERCENTILES]
+        values = {}
+
+        for (prefix, _, _), value in zip(self._PERCENTILES,
+                                         histogram.get_quantiles(quantiles)):
+            if value is None:
+                value = mi.Unknown()
+            else:
+                value = mi.Duration(value)
+
+            values['{}_{}'.format(prefix, quantity)] = value
+
+        return values
+
+    @property
+    def _percentile_titles(self):
+        return [title for _, _, title in self._PERCENTILES]
+
+    # Returns the text of the percentile columns of `quantity` in a
+    # result table row, in µs
+    def _get_percentile_strs(self, row, quantity):
+        strs = []
+
+        for prefix, _, _ in self._PERCENTILES:
+            value = getattr(row, '{}_{}'.format(prefix, quantity))
+            if type(value) is mi.Unknown:
+                strs.append('?')
+            else:
+                strs.append('%0.03f' % value.to_us())
+
+        return strs
+
     def _format_timestamp(self, timestamp):
         return format_utils.format_timestamp(
             timestamp, print_date=self._args.multi_day, gmt=self._args.gmt
@@ -392,6 +555,26 @@ class Command:
 
     def _find_uniform_freq_values(self, durations, ratio=1000,
                                   category='default'):
+        if len(durations) == 0:
+            return self._find_uniform_freq_range(None, None, ratio,
+                                                 category)
+
+        return self._find_uniform_freq_range(min(durations), max(durations),
+                                             ratio, category)
+
+    # Same as _find_uniform_freq_values() for durations recorded in
+    # stats.LogLinearHistogram objects
+    def _find_uniform_freq_histogram_values(self, histograms, ratio=1000,
+                                            category='default'):
+        histogram = stats.LogLinearHistogram.new_from_histograms(histograms)
+
+        return self._find_uniform_freq_range(histogram.min, histogram.max,
+                                             ratio, category)
+
+    # `min_duration` and `max_duration` are None if there are no
+    # durations
+    def _find_uniform_freq_range(self, min_duration, max_duration,
+                                 ratio=1000, category='default'):
         if category not in self._analysis_conf.uniform_step.keys():
             self._analysis_conf.uniform_min[category] = None
             self._analysis_conf.uniform_max[category] = None
@@ -400,25 +583,25 @@ class Command:
         if self._args.min is not None:
             self._analysis_conf.uniform_min[category] = self._args.min
         else:
-            if len(durations) == 0:
+            if min_duration is None:
                 self._analysis_conf.uniform_min[category] = 0
             else:
                 if self._analysis_conf.uniform_min[category] is None or \
-                        min(durations) / ratio < \
+                        min_duration / ratio < \
                         self._analysis_conf.uniform_min[category]:
                     self._analysis_conf.uniform_min[category] = \
-                        min(durations) / ratio
+                        min_duration / ratio
         if self._args.max is not None:
             self._analysis_conf.uniform_max[category] = self._args.max
         else:
-            if len(durations) == 0:
+            if max_duration is None:
                 self._analysis_conf.uniform_max[category] = 0
             else:
                 if self._analysis_conf.uniform_max[category] is None or \
-                        max(durations) / ratio > \
+                        max_duration / ratio > \
                         self._analysis_conf.uniform_max[category]:
                     self._analysis_conf.uniform_max[category] = \
-                        max(durations) / ratio
+                        max_duration / ratio
 
         # ns to µs
         self._analysis_conf.uniform_step[category] = (
@@ -430,40 +613,21 @@ class Command:
             self._analysis_conf.uniform_max[category], \
             self._analysis_conf.uniform_step[category]
 
+    # Resolves the event field references of the period definitions
+    # against the event declarations of the trace, failing before the
+    # analysis reads any event if an expression can never match
     def _check_period_args(self):
-        # FIXME
-        return True
-
-        if len(self._analysis_conf.period_defs) > 0:
-            name = self._analysis_conf.period_begin_ev_name
-            if not trace_utils.check_event_exists(self._handles, name):
-                self._gen_error("Event %s not found in the trace" % name)
-                return False
-        if self._analysis_conf.period_end_ev_name is not None:
-            name = self._analysis_conf.period_end_ev_name
-            if not trace_utils.check_event_exists(self._handles, name):
-                self._gen_error("Event %s not found in the trace" % name)
-                return False
-
-        ev_name = self._analysis_conf.period_begin_ev_name
-        for field in self._analysis_conf.period_begin_key_fields:
-            if not ev_name:
-                break
-            if not trace_utils.check_field_exists(self._handles,
-                                                  ev_name, field):
-                self._gen_error("Field %s not found in event %s" %
-                                (field, ev_name))
-                return False
-        ev_name = self._analysis_conf.period_end_ev_name
-        for field in self._analysis_conf.period_end_key_fields:
-            if not ev_name:
-                break
-            if not trace_utils.check_field_exists(self._handles,
-                                                  ev_name, field):
-                self._gen_error("Field %s not found in event %s" %
-                                (field, ev_name))
-                return False
-        return True
+        registry = self._analysis_conf.period_def_registry
+
+        if registry.is_empty:
+            return
+
+        event_fields = trace_utils.get_event_fields(self._handles)
+
+        try:
+            registry.resolve_field_scopes(event_fields)
+        except core_period.InvalidPeriodDefinition as e:
+            self._gen_error('Invalid period definition: {}'.format(e))
 
     def _validate_transform_period_args(self, analysis_conf):
         args = self._args
@@ -649,6 +813,24 @@ Please consider using the --period option.''')
             self._cmdline_error('Cannot specify --period* and --refresh '
                                 'arguments at the same time')
 
+        if args.checkpoint_interval is not None:
+            if args.checkpoint_dir is None:
+                self._cmdline_error('--checkpoint-interval requires '
+                                    '--checkpoint-dir')
+            try:
+                self._analysis_conf.checkpoint_interval = \
+                    parse_utils.parse_duration(args.checkpoint_interval)
+            except ValueError as e:
+                self._cmdline_error(str(e))
+            if self._analysis_conf.checkpoint_interval <= 0:
+                self._cmdline_error('Invalid checkpoint interval')
+
+        if args.checkpoint_dir is not None:
+            self._checkpoint_store = checkpoint.CheckpointStore(
+                args.checkpoint_dir)
+
+        self._state_history_path = args.state_history
+
         if args.cpu:
             self._analysis_conf.cpu_list = args.cpu.split(',')
             self._analysis_conf.cpu_list = [int(cpu) for cpu in
@@ -685,6 +867,16 @@ Please consider using the --period option.''')
             self._analysis_conf.uniform_max = {}
             self._analysis_conf.uniform_step = {}
 
+        # Individual samples are only needed to log them: statistics
+        # and frequency distributions are computed from streaming
+        # aggregates and the top from bounded heaps.
+        self._analysis_conf.summary_only = not getattr(args, 'log', False)
+
+        if getattr(args, 'top', False):
+            self._analysis_conf.top_limit = args.limit
+
+        self._analysis_conf.counter_snapshots = args.counter_snapshots
+
         if self._mi_mode:
             # print MI version if required
             if args.mi_version:
@@ -713,6 +905,11 @@ Please consider using the --period option.''')
         ap.add_argument('-r', '--refresh', type=str,
                         help='Refresh period, with optional units suffix '
                         '(default units: s)')
+        ap.add_argument('--state-history', type=str, metavar='PATH',
+                        help='Record the state history of the trace '
+                        '(running tasks, syscalls, IRQs and FDs) to this '
+                        'file, unless it already holds the history of '
+                        'this trace')
         ap.add_argument('--gmt', action='store_true',
                         help='Manipulate timestamps based on GMT instead '
                              'of local time')
@@ -740,11 +937,24 @@ Please consider using the --period option.''')
         ap.add_argument('--period-key-value', type=str,
                         help='Optional, define a fixed key value to which a'
                         ' period must correspond to be considered.')
+        ap.add_argument('--counter-snapshots', action='store_true',
+                        help='Update the additive counters (page '
+                        'allocations, network bytes) once per event and '
+                        'take snapshots at the period boundaries, '
+                        'instead of updating each open period')
         ap.add_argument('--cpu', type=str,
                         help='Filter the results only for this list of '
                         'CPU IDs')
         ap.add_argument('--timerange', type=str, help='time range: '
                                                       '[begin,end]')
+        ap.add_argument('--checkpoint-dir', type=str,
+                        help='Directory of state checkpoints, the one '
+                        'nearest to --begin is restored before reading '
+                        'the trace')
+        ap.add_argument('--checkpoint-interval', type=str,
+                        help='Save a state checkpoint to --checkpoint-dir '
+                        'at this interval, with optional units suffix '
+                        '(default units: s)')
         ap.add_argument('--progress-use-size', action='store_true',
                         help='use trace size to approximate progress')
         ap.add_argument('--no-intersection', action='store_false',
@@ -905,7 +1115,9 @@ Please consider using the --period option.''')
         self._analysis.register_notification_cbs(notification_cbs)
 
     def _create_automaton(self):
-        self._automaton = automaton.Automaton()
+        # only run the state providers the analysis needs
+        self._automaton = automaton.Automaton(
+            self._ANALYSIS_CLASS.STATE_NOTIFICATIONS)
         self.state = self._automaton.state
 
     def _analysis_tick_cb(self, period, end_ns):
@@ -23,12 +23,13 @@
 # SOFTWARE.
 
 import collections
+import math
 import operator
-import statistics
 import sys
 from . import mi
 from . import termgraph
 from ..core import io
+from ..linuxautomaton import sv
 from ..common import format_utils
 from .command import Command
 
@@ -86,6 +87,8 @@ class IoAnalysisCommand(Command):
                 ('max_latency', 'Maximum call latency', mi.Duration),
                 ('stdev_latency', 'System call latency standard deviation',
                  mi.Duration),
+                *Command._get_percentile_column_infos(
+                    'latency', 'System call latency percentile'),
             ]
         ),
         (
@@ -98,6 +101,8 @@ class IoAnalysisCommand(Command):
                 ('max_latency', 'Maximum access latency', mi.Duration),
                 ('stdev_latency', 'System access latency standard deviation',
                  mi.Duration),
+                *Command._get_percentile_column_infos(
+                    'latency', 'System access latency percentile'),
             ]
         ),
         (
@@ -188,8 +193,17 @@ class IoAnalysisCommand(Command):
             ]
         ),
     ]
-    _LATENCY_STATS_FORMAT = '{:<14} {:>14} {:>14} {:>14} {:>14} {:>14}'
-    _SECTION_SEPARATOR_STRING = '-' * 89
+    # Syscall I/O operations of the top, latency statistics and
+    # frequency distribution tables, with their subtitles
+    _SYSCALL_OPERATIONS = [
+        (sv.IORequest.OP_OPEN, 'open'),
+        (sv.IORequest.OP_READ, 'read'),
+        (sv.IORequest.OP_WRITE, 'write'),
+        (sv.IORequest.OP_SYNC, 'sync'),
+    ]
+    _LATENCY_STATS_FORMAT = '{:<14} {:>14} {:>14} {:>14} {:>14} {:>14} ' \
+                            '{:>14} {:>14} {:>14} {:>14}'
+    _SECTION_SEPARATOR_STRING = '-' * 149
 
     def _analysis_tick(self, period_data, end_ns):
         if period_data is None:
@@ -758,90 +772,76 @@ class IoAnalysisCommand(Command):
         self._print_per_netif_io(usage_tables.per_netif_recv, 'Received')
         self._print_per_netif_io(usage_tables.per_netif_send, 'Sent')
 
-    def _fill_freq_result_table(self, duration_list, result_table):
-        if not duration_list:
+    def _get_freq_histograms(self, period_data):
+        histograms = [latency_stats.histogram for latency_stats in
+                      period_data.latency_stats.values()]
+        histograms += [disk.latency_stats.histogram for disk in
+                       period_data.disks.values()]
+
+        return histograms
+
+    def _fill_freq_result_table(self, period_data, histogram, result_table):
+        if histogram.count == 0:
             return
 
         # The number of bins for the histogram
         resolution = self._args.freq_resolution
 
-        min_duration = min(duration_list)
-        max_duration = max(duration_list)
-        # ns to µs
-        min_duration /= 1000
-        max_duration /= 1000
-
-        step = (max_duration - min_duration) / resolution
+        if self._args.freq_uniform:
+            min_duration, max_duration, step = \
+                self._find_uniform_freq_histogram_values(
+                    self._get_freq_histograms(period_data))
+        else:
+            # ns to µs
+            min_duration = histogram.min / 1000
+            max_duration = histogram.max / 1000
+            step = (max_duration - min_duration) / resolution
 
         if step == 0:
             return
 
-        buckets = []
-        values = []
+        counts = histogram.get_freq_counts(min_duration, max_duration,
+                                           resolution, 1000)
 
-        for i in range(resolution):
-            buckets.append(i * step)
-            values.append(0)
-
-        for duration in duration_list:
-            duration /= 1000
-            index = min(int((duration - min_duration) / step), resolution - 1)
-            values[index] += 1
-
-        for index, value in enumerate(values):
+        for index, count in enumerate(counts):
             result_table.append_row(
                 latency_lower=mi.Duration.from_us(index * step + min_duration),
                 latency_upper=mi.Duration.from_us((index + 1) * step +
                                                   min_duration),
-                count=mi.Number(value),
+                count=mi.Number(count),
             )
 
     def _get_disk_freq_result_tables(self, period_data, begin, end):
         result_tables = []
 
         for disk in period_data.disks.values():
-            rq_durations = [rq.duration for rq in disk.rq_list if
-                            self._filter_io_request(rq)]
             subtitle = 'disk: {}'.format(disk.diskname)
             result_table = \
                 self._mi_create_result_table(self._MI_TABLE_CLASS_FREQ,
                                              begin, end, subtitle)
-            self._fill_freq_result_table(rq_durations, result_table)
+            self._fill_freq_result_table(period_data,
+                                         disk.latency_stats.histogram,
+                                         result_table)
             result_tables.append(result_table)
 
         return result_tables
 
     def _get_syscall_freq_result_tables(self, period_data, begin, end):
-        open_table = \
-            self._mi_create_result_table(self._MI_TABLE_CLASS_FREQ,
-                                         begin, end, 'open')
-        read_table = \
-            self._mi_create_result_table(self._MI_TABLE_CLASS_FREQ,
-                                         begin, end, 'read')
-        write_table = \
-            self._mi_create_result_table(self._MI_TABLE_CLASS_FREQ,
-                                         begin, end, 'write')
-        sync_table = \
-            self._mi_create_result_table(self._MI_TABLE_CLASS_FREQ,
-                                         begin, end, 'sync')
-        self._fill_freq_result_table(
-            [io_rq.duration for io_rq in
-             self._analysis.open_io_requests(period_data)
-             if self._filter_io_request(io_rq)], open_table)
-        self._fill_freq_result_table(
-            [io_rq.duration for io_rq in
-             self._analysis.read_io_requests(period_data)
-             if self._filter_io_request(io_rq)], read_table)
-        self._fill_freq_result_table(
-            [io_rq.duration for io_rq in
-             self._analysis.write_io_requests(period_data)
-             if self._filter_io_request(io_rq)], write_table)
-        self._fill_freq_result_table(
-            [io_rq.duration for io_rq in
-             self._analysis.sync_io_requests(period_data)
-             if self._filter_io_request(io_rq)], sync_table)
-
-        return [open_table, read_table, write_table, sync_table]
+        result_tables = []
+
+        # The analysis records the latencies of each operation online,
+        # already filtered by _filter_io_request()
+        for io_operation, subtitle in self._SYSCALL_OPERATIONS:
+            result_table = \
+                self._mi_create_result_table(self._MI_TABLE_CLASS_FREQ,
+                                             begin, end, subtitle)
+            latency_stats = period_data.latency_stats[io_operation]
+            self._fill_freq_result_table(period_data,
+                                         latency_stats.histogram,
+                                         result_table)
+            result_tables.append(result_table)
+
+        return result_tables
 
     def _get_freq_result_tables(self, period_data, begin, end):
         syscall_tables = self._get_syscall_freq_result_tables(period_data,
@@ -905,56 +905,35 @@ class IoAnalysisCommand(Command):
             fd=fd,
         )
 
-    def _fill_log_result_table(self, period_data, rq_list, sort_key, is_top,
+    def _fill_log_result_table(self, period_data, rq_list, sort_key,
                                result_table):
-        if not rq_list:
-            return
-
-        count = 0
-
-        for io_rq in sorted(rq_list, key=operator.attrgetter(sort_key),
-                            reverse=is_top):
-            if is_top and count > self._args.limit:
-                break
-
+        for io_rq in sorted(rq_list, key=operator.attrgetter(sort_key)):
             self._append_log_row(period_data, io_rq, result_table)
-            count += 1
 
     def _fill_log_result_table_from_io_requests(self, period_data, io_requests,
-                                                sort_key, is_top,
-                                                result_table):
+                                                sort_key, result_table):
         io_requests = [io_rq for io_rq in io_requests if
                        self._filter_io_request(io_rq)]
-        self._fill_log_result_table(period_data, io_requests, sort_key, is_top,
+        self._fill_log_result_table(period_data, io_requests, sort_key,
                                     result_table)
 
     def _get_top_result_tables(self, period_data, begin, end):
-        open_table = \
-            self._mi_create_result_table(self._MI_TABLE_CLASS_TOP_SYSCALL,
-                                         begin, end, 'open')
-        read_table = \
-            self._mi_create_result_table(self._MI_TABLE_CLASS_TOP_SYSCALL,
-                                         begin, end, 'read')
-        write_table = \
-            self._mi_create_result_table(self._MI_TABLE_CLASS_TOP_SYSCALL,
-                                         begin, end, 'write')
-        sync_table = \
-            self._mi_create_result_table(self._MI_TABLE_CLASS_TOP_SYSCALL,
-                                         begin, end, 'sync')
-        self._fill_log_result_table_from_io_requests(
-            period_data, self._analysis.open_io_requests(period_data),
-            'duration', True, open_table)
-        self._fill_log_result_table_from_io_requests(
-            period_data, self._analysis.read_io_requests(period_data),
-            'duration', True, read_table)
-        self._fill_log_result_table_from_io_requests(
-            period_data, self._analysis.write_io_requests(period_data),
-            'duration', True, write_table)
-        self._fill_log_result_table_from_io_requests(
-            period_data, self._analysis.sync_io_requests(period_data),
-            'duration', True, sync_table)
+        top_tables = []
+
+        # The analysis keeps the top requests of each operation online,
+        # already filtered by _filter_io_request()
+        for io_operation, subtitle in self._SYSCALL_OPERATIONS:
+            result_table = \
+                self._mi_create_result_table(self._MI_TABLE_CLASS_TOP_SYSCALL,
+                                             begin, end, subtitle)
+
+            for io_rq in self._analysis.top_io_requests(period_data,
+                                                        io_operation):
+                self._append_log_row(period_data, io_rq, result_table)
+
+            top_tables.append(result_table)
 
-        return [open_table, read_table, write_table, sync_table]
+        return top_tables
 
     def _print_log_row(self, row):
         fmt = '{:<40} {:<16} {:>16} {:>11}  {:<24} {:<8} {:<14}'
@@ -1027,58 +1006,47 @@ class IoAnalysisCommand(Command):
                                                  begin, end)
         self._fill_log_result_table_from_io_requests(
             period_data, self._analysis.io_requests(period_data),
-            'begin_ts', False, log_table)
+            'begin_ts', log_table)
 
         return log_table
 
-    def _append_latency_stats_row(self, obj, rq_durations, result_table):
-        rq_count = len(rq_durations)
-        total_duration = sum(rq_durations)
-
-        if len(rq_durations) > 0:
-            min_duration = min(rq_durations)
-            max_duration = max(rq_durations)
+    def _append_latency_stats_row(self, obj, latency_stats, result_table):
+        if latency_stats.count > 0:
+            min_duration = latency_stats.min_duration
+            max_duration = latency_stats.max_duration
+            avg = latency_stats.durations.mean
         else:
             min_duration = 0
             max_duration = 0
+            avg = 0
 
-        if rq_count < 2:
+        stdev = latency_stats.durations.stdev
+        if math.isnan(stdev):
             stdev = mi.Unknown()
         else:
-            stdev = mi.Duration(statistics.stdev(rq_durations))
-
-        if rq_count > 0:
-            avg = total_duration / rq_count
-        else:
-            avg = 0
+            stdev = mi.Duration(stdev)
 
         result_table.append_row(
             obj=obj,
-            count=mi.Number(rq_count),
+            count=mi.Number(latency_stats.count),
             min_latency=mi.Duration(min_duration),
             avg_latency=mi.Duration(avg),
             max_latency=mi.Duration(max_duration),
             stdev_latency=stdev,
+            **self._get_percentile_row_values(latency_stats.histogram,
+                                              'latency')
         )
 
-    def _append_latency_stats_row_from_requests(self, obj, io_requests,
-                                                result_table):
-        rq_durations = [io_rq.duration for io_rq in io_requests if
-                        self._filter_io_request(io_rq)]
-        self._append_latency_stats_row(obj, rq_durations, result_table)
-
     def _get_syscall_latency_stats_result_table(self, period_data, begin, end):
         result_table = self._mi_create_result_table(
             self._MI_TABLE_CLASS_SYSCALL_LATENCY_STATS, begin, end)
-        append_fn = self._append_latency_stats_row_from_requests
-        append_fn(mi.String('Open'),
-                  self._analysis.open_io_requests(period_data), result_table)
-        append_fn(mi.String('Read'),
-                  self._analysis.read_io_requests(period_data), result_table)
-        append_fn(mi.String('Write'),
-                  self._analysis.write_io_requests(period_data), result_table)
-        append_fn(mi.String('Sync'),
-                  self._analysis.sync_io_requests(period_data), result_table)
+
+        # The analysis accounts the latencies of each operation online,
+        # already filtered by _filter_io_request()
+        for io_operation, subtitle in self._SYSCALL_OPERATIONS:
+            self._append_latency_stats_row(
+                mi.String(subtitle.capitalize()),
+                period_data.latency_stats[io_operation], result_table)
 
         return result_table
 
@@ -1091,10 +1059,8 @@ class IoAnalysisCommand(Command):
 
         for disk in period_data.disks.values():
             if disk.rq_count:
-                rq_durations = [rq.duration for rq in disk.rq_list if
-                                self._filter_io_request(rq)]
-                disk = mi.Disk(disk.diskname)
-                self._append_latency_stats_row(disk, rq_durations,
+                self._append_latency_stats_row(mi.Disk(disk.diskname),
+                                               disk.latency_stats,
                                                result_table)
 
         return result_table
@@ -1119,12 +1085,14 @@ class IoAnalysisCommand(Command):
 
         print(IoAnalysisCommand._LATENCY_STATS_FORMAT.format(
             str(row.obj), row.count.value, min_duration,
-            avg, max_duration, stdev))
+            avg, max_duration, stdev,
+            *self._get_percentile_strs(row, 'latency')))
 
     def _print_syscall_latency_stats(self, stats_table):
         print('\nSyscalls latency statistics (usec):')
         print(IoAnalysisCommand._LATENCY_STATS_FORMAT.format(
-            'Type', 'Count', 'Min', 'Average', 'Max', 'Stdev'))
+            'Type', 'Count', 'Min', 'Average', 'Max', 'Stdev',
+            *self._percentile_titles))
         print(IoAnalysisCommand._SECTION_SEPARATOR_STRING)
 
         for row in stats_table.rows:
@@ -1136,7 +1104,8 @@ class IoAnalysisCommand(Command):
 
         print('\nDisk latency statistics (usec):')
         print(IoAnalysisCommand._LATENCY_STATS_FORMAT.format(
-            'Name', 'Count', 'Min', 'Average', 'Max', 'Stdev'))
+            'Name', 'Count', 'Min', 'Average', 'Max', 'Stdev',
+            *self._percentile_titles))
         print(IoAnalysisCommand._SECTION_SEPARATOR_STRING)
 
         for row in stats_table.rows:
@@ -1147,6 +1116,13 @@ class IoAnalysisCommand(Command):
         self._print_syscall_latency_stats(syscall_latency_stats_table)
         self._print_disk_latency_stats(disk_latency_stats_table)
 
+    def _validate_transform_args(self):
+        self._analysis_conf.top_filter = self._filter_io_request
+
+    def _create_analysis(self):
+        super()._create_analysis()
+        self._analysis.rq_filter = self._filter_io_request
+
     def _add_arguments(self, ap):
         Command._add_min_max_args(ap)
         Command._add_log_args(
@@ -24,7 +24,6 @@
 
 import itertools
 import math
-import statistics
 import sys
 from . import mi
 from . import termgraph
@@ -64,6 +63,8 @@ class IrqAnalysisCommand(Command):
                 ('max_duration', 'Maximum duration', mi.Duration),
                 ('stdev_duration', 'Interrupt duration standard deviation',
                  mi.Duration),
+                *Command._get_percentile_column_infos(
+                    'duration', 'Interrupt duration percentile'),
             ]
         ),
         (
@@ -76,6 +77,8 @@ class IrqAnalysisCommand(Command):
                 ('max_duration', 'Maximum duration', mi.Duration),
                 ('stdev_duration', 'Interrupt duration standard deviation',
                  mi.Duration),
+                *Command._get_percentile_column_infos(
+                    'duration', 'Interrupt duration percentile'),
                 ('raise_count', 'Interrupt raise count', mi.Number,
                  'interrupt raises'),
                 ('min_latency', 'Minimum raise latency', mi.Duration),
@@ -216,6 +219,7 @@ class IrqAnalysisCommand(Command):
             mi.Duration(irq_stats.total_duration / irq_stats.count),
             mi.Duration(irq_stats.max_duration),
             stdev,
+            self._get_percentile_row_values(irq_stats.histogram, 'duration'),
         )
 
     def _append_hard_stats_result_table_row(self, irq_nr, irq_stats,
@@ -229,6 +233,7 @@ class IrqAnalysisCommand(Command):
             avg_duration=common_row[3],
             max_duration=common_row[4],
             stdev_duration=common_row[5],
+            **common_row[6]
         )
 
     def _append_soft_stats_result_table_row(self, irq_nr, irq_stats,
@@ -265,6 +270,7 @@ class IrqAnalysisCommand(Command):
             avg_latency=avg_latency,
             max_latency=max_latency,
             stdev_latency=stdev_latency,
+            **common_row[6]
         )
 
     def _fill_freq_result_table(self, period_data, irq_stats, freq_table):
@@ -286,35 +292,21 @@ class IrqAnalysisCommand(Command):
         # histogram's step
         if self._args.freq_uniform:
             # TODO: perform only one time
-            durations = [irq.duration for irq in period_data.irq_list]
+            histograms = [
+                item.histogram for item in itertools.chain(
+                    period_data.hard_irq_stats.values(),
+                    period_data.softirq_stats.values())
+            ]
             min_duration, max_duration, step = \
-                self._find_uniform_freq_values(durations)
+                self._find_uniform_freq_histogram_values(histograms)
         else:
             step = (max_duration - min_duration) / resolution
 
         if step == 0:
             return
 
-        buckets = []
-        counts = []
-
-        for i in range(resolution):
-            buckets.append(i * step)
-            counts.append(0)
-
-        for irq in irq_stats.irq_list:
-            duration = irq.duration / 1000
-            index = int((duration - min_duration) / step)
-
-            if index >= resolution:
-                # special case for max value: put in last bucket (includes
-                # its upper bound)
-                if duration == max_duration:
-                    counts[index - 1] += 1
-
-                continue
-
-            counts[index] += 1
+        counts = irq_stats.histogram.get_freq_counts(
+            min_duration, max_duration, resolution, 1000)
 
         for index, count in enumerate(counts):
             lower_bound = index * step + min_duration
@@ -473,27 +465,10 @@ class IrqAnalysisCommand(Command):
             args.softirq_filter_list = args.softirq.split(',')
 
     def _compute_duration_stdev(self, irq_stats_item):
-        if irq_stats_item.count < 2:
-            return float('nan')
-
-        durations = []
-        for irq in irq_stats_item.irq_list:
-            durations.append(irq.end_ts - irq.begin_ts)
-
-        return statistics.stdev(durations)
+        return irq_stats_item.durations.stdev
 
     def _compute_raise_latency_stdev(self, irq_stats_item):
-        if irq_stats_item.raise_count < 2:
-            return float('nan')
-
-        raise_latencies = []
-        for irq in irq_stats_item.irq_list:
-            if irq.raise_ts is None:
-                continue
-
-            raise_latencies.append(irq.begin_ts - irq.raise_ts)
-
-        return statistics.stdev(raise_latencies)
+        return irq_stats_item.raise_latencies.stdev
 
     def _print_frequency_distribution(self, freq_table):
         title_fmt = 'Handler duration frequency distribution {}'
@@ -535,7 +510,8 @@ class IrqAnalysisCommand(Command):
         print(output_str)
 
     def _get_duration_stats_str(self, row):
-        format_str = '{:<3} {:<18} {:>5} {:>12} {:>12} {:>12} {:>12} {:<2}'
+        format_str = '{:<3} {:<18} {:>5} {:>12} {:>12} {:>12} {:>12} ' \
+                     '{:>12} {:>12} {:>12} {:>12} {:<2}'
         irq_do = row.irq
         count = row.count.value
         min_duration = row.min_duration.to_us()
@@ -554,6 +530,8 @@ class IrqAnalysisCommand(Command):
                                        '%0.03f' % avg_duration,
                                        '%0.03f' % max_duration,
                                        '%s' % duration_stdev_str,
+                                       *self._get_percentile_strs(
+                                           row, 'duration'),
                                        ' |')
         return output_str
 
@@ -580,22 +558,26 @@ class IrqAnalysisCommand(Command):
     def _print_stats_freq(self, hard_stats_table, soft_stats_table,
                           freq_tables):
         hard_header_format = '{:<52} {:<12}\n' \
-                             '{:<22} {:<14} {:<12} {:<12} {:<10} {:<12}\n'
+                             '{:<22} {:<14} {:<12} {:<12} {:<10} {:<5} ' \
+                             '{:>12} {:>12} {:>12} {:>12}\n'
         hard_header = hard_header_format.format(
             'Hard IRQ', 'Duration (us)',
-            '', 'count', 'min', 'avg', 'max', 'stdev'
+            '', 'count', 'min', 'avg', 'max', 'stdev',
+            *self._percentile_titles
         )
-        hard_header += ('-' * 82 + '|')
-        soft_header_format = '{:<52} {:<52} {:<12}\n' \
-                             '{:<22} {:<14} {:<12} {:<12} {:<10} {:<4} ' \
-                             '{:<3} {:<14} {:<12} {:<12} {:<10} {:<12}\n'
+        hard_header += ('-' * 134 + '|')
+        soft_header_format = '{:<52} {:<104} {:<12}\n' \
+                             '{:<22} {:<14} {:<12} {:<12} {:<10} {:<5} ' \
+                             '{:>12} {:>12} {:>12} {:>12} {:<3} ' \
+                             '{:<14} {:<12} {:<12} {:<10} {:<12}\n'
         soft_header = soft_header_format.format(
             'Soft IRQ', 'Duration (us)',
             'Raise latency (us)', '',
-            'count', 'min', 'avg', 'max', 'stdev', ' |',
+            'count', 'min', 'avg', 'max', 'stdev',
+            *self._percentile_titles, ' |',
             'count', 'min', 'avg', 'max', 'stdev'
         )
-        soft_header += '-' * 82 + '|' + '-' * 60
+        soft_header += '-' * 134 + '|' + '-' * 60
 
         if hard_stats_table.rows or soft_stats_table.rows:
             stats_rows = itertools.chain(hard_stats_table.rows,
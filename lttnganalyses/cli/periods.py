@@ -28,7 +28,7 @@ import ast
 import re
 from collections import OrderedDict
 from . import mi, termgraph
-from ..core import periods
+from ..core import periods, stats
 from .command import Command
 
 
@@ -42,14 +42,11 @@ class _StatsFreqTables():
         self.global_count_table = None
         self.global_pc_table = None
 
-        # Raw values for the frequency distributions
-        # *_values[period][child] = []
-        self.duration_values = {}
-        self.count_values = {}
-        self.pc_values = {}
-        self.global_duration_values = {}
-        self.global_count_values = {}
-        self.global_pc_values = {}
+        # Statistics for the frequency distributions, the global ones
+        # also account the parent periods without the child period
+        # *_stats[period][child] = periods.AggregatedStats
+        self.per_parent_stats = {}
+        self.global_stats = {}
 
         # Freq tables
         self.per_parent_freq_tables = []
@@ -60,138 +57,6 @@ class _StatsFreqTables():
         self.global_pc_freq_tables = []
 
 
-class _PeriodStats():
-    def __init__(self, count=0, min=None, max=0, stdev=0, total=0):
-        self.count = count
-        self.min = min
-        self.max = max
-        self.stdev = stdev
-        self.total = total
-        self.count_array = []
-        self.durations = []
-        self.min_count = None
-        self.max_count = 0
-        self.total_count = 0
-        # Percentage of the parent period time spent
-        self.min_pc = None
-        self.max_pc = 0
-        self.total_pc = 0
-        self.pc_array = []
-        # How many parent periods have us as a child, indexed by
-        # parent period name.
-        self.parent_count = {}
-
-    def add_count(self, count):
-        if self.min_count is None or count < self.min_count:
-            self.min_count = count
-        if self.max_count < count:
-            self.max_count = count
-        self.total_count += count
-        self.count_array.append(count)
-
-    def add_duration(self, duration):
-        if self.min is None or duration < self.min:
-            self.min = duration
-        if self.max < duration:
-            self.max = duration
-        self.total += duration
-        self.durations.append(duration)
-
-    def add_percentage(self, pc):
-        if self.min_pc is None or pc < self.min_pc:
-            self.min_pc = pc
-        if self.max_pc < pc:
-            self.max_pc = pc
-        self.total_pc += pc
-        self.pc_array.append(pc)
-
-
-class _TmpAggregation():
-    def __init__(self, parent=None):
-        # self._children[name] = [durations]
-        self._children = {}
-        self._parent = parent
-        self.capture_groups = None
-
-    @property
-    def children(self):
-        return self._children
-
-    def add_child(self, name, duration):
-        if name not in self._children.keys():
-            self._children[name] = []
-        self._children[name].append(duration)
-
-        parent = self._parent
-        while parent is not None:
-            parent.add_child(name, duration)
-            parent = parent._parent
-
-
-class _AggregatedPeriodStats():
-    def __init__(self, registry, name):
-        self._reg = registry
-        self._name = name
-        self._children = OrderedDict()
-        self._stats = _PeriodStats()
-        self.nr_periods = 0
-        self._init_children()
-
-    def _recurs_find_children(self, period):
-        for child in period.children:
-            self._children[child.name] = _PeriodStats()
-            self._recurs_find_children(child)
-
-    def _init_children(self):
-        period_def = self._reg.get_period_def(self._name)
-        if period_def is None:
-            return
-        self._recurs_find_children(period_def)
-
-    def finish_period(self, start_ts, end_ts, child_dict):
-        parent_duration = end_ts - start_ts
-        for child in child_dict.keys():
-            count = len(child_dict[child])
-            duration = 0
-            for period in child_dict[child]:
-                duration += period
-            c = self._children[child]
-            pc = (duration / parent_duration) * 100
-
-            c.add_count(count)
-            c.add_duration(duration)
-            c.add_percentage(pc)
-
-            if self._name not in c.parent_count.keys():
-                c.parent_count[self._name] = 0
-            c.parent_count[self._name] += 1
-        self.nr_periods += 1
-
-
-class _AggregatedItem():
-    def __init__(self, event, parent_event, group_by_captures, full_captures):
-        self._event = event
-        self._parent = parent_event
-        self._group_by_captures = group_by_captures
-        self._full_captures = full_captures
-
-    @property
-    def event(self):
-        return self._event
-
-    @property
-    def parent_event(self):
-        return self._parent
-
-    @property
-    def group_by_captures(self):
-        return self._group_by_captures
-
-    @property
-    def full_captures(self):
-        return self._full_captures
-
-
 class PeriodAnalysisCommand(Command):
     _DESC = """The periods command."""
     _ANALYSIS_CLASS = periods.PeriodAnalysis
@@ -245,6 +110,8 @@ class PeriodAnalysisCommand(Command):
                 ('max_duration', 'Maximum duration', mi.Duration),
                 ('stdev_duration', 'Period duration standard deviation',
                  mi.Duration),
+                *Command._get_percentile_column_infos(
+                    'duration', 'Period duration percentile'),
                 ('runtime', 'Total runtime', mi.Duration),
             ]
         ),
@@ -429,11 +296,11 @@ class PeriodAnalysisCommand(Command):
             else:
                 # time-based view
                 log_table = self._get_log_result_table(
-                    begin_ns, end_ns, self._analysis.all_period_list)
+                    begin_ns, end_ns,
+                    self._analysis.period_store.period_events())
 
         if self._args.top:
-            top_table = self._get_top_result_table(
-                begin_ns, end_ns, self._analysis.all_period_list)
+            top_table = self._get_top_result_table(begin_ns, end_ns)
 
         # Common tables for stats and freq
         if self._args.stats or self._args.freq:
@@ -445,11 +312,10 @@ class PeriodAnalysisCommand(Command):
                     begin_ns, end_ns, per_period_stats,
                     '', per_period_stats)
 
-            if self._args.freq_uniform:
-                for group in per_parent_period_group_by_stats.keys():
-                    freq_min, freq_max, freq_step = \
-                        self._find_filtered_uniform_freq_values(
-                            per_period_group_by_stats[group])
+            if self._args.freq_uniform and per_period_group_by_stats:
+                freq_min, freq_max, freq_step = \
+                    self._find_grouped_uniform_freq_values(
+                        per_period_group_by_stats)
 
             for group in per_parent_period_group_by_stats.keys():
                 per_period_stats_group_by_tables[group], \
@@ -667,52 +533,6 @@ class PeriodAnalysisCommand(Command):
             if aggregated_log_tables:
                 self._print_aggregated_log(aggregated_log_tables)
 
-    def _get_filtered_min_max_count_avg_total_values(self, durations):
-        min = None
-        max = None
-        count = 0
-        avg = 0
-        total = 0
-        filter_list = []
-        for d in durations:
-            if not self._filter_duration(d):
-                continue
-            if min is None or min > d:
-                min = d
-            if max is None or max < d:
-                max = d
-            count += 1
-            total += d
-            filter_list.append(d)
-        if count > 0:
-            avg = total / count
-        else:
-            avg = 0
-        return min, max, count, avg, total, filter_list
-
-    def _get_filtered_min_max_count_avg_total_flist(self, period_list):
-        min = None
-        max = None
-        count = 0
-        avg = 0
-        total = 0
-        filter_list = []
-        for period_event in period_list:
-            if not self._filter_event_duration(period_event):
-                continue
-            if min is None or min > period_event.duration:
-                min = period_event.duration
-            if max is None or max < period_event.duration:
-                max = period_event.duration
-            count += 1
-            total += period_event.duration
-            filter_list.append(period_event)
-        if count > 0:
-            avg = total / count
-        else:
-            avg = 0
-        return min, max, count, avg, total, filter_list
-
     def _get_agg_filtered_min_max_count_avg_total_flist(self, ag_list):
         min = None
         max = None
@@ -737,240 +557,26 @@ class PeriodAnalysisCommand(Command):
             avg = 0
         return min, max, count, avg, total, filter_list
 
-    def _find_aggregated_subperiods(self, root, event, aggregated_list,
-                                    group_by_captures,
-                                    full_captures):
-        if len(self._analysis_conf._select) == 0 or \
-                event.name in self._analysis_conf._select:
-            aggregated_list.append(_AggregatedItem(event, root,
-                                                   group_by_captures,
-                                                   full_captures))
-        for capture in event.filtered_captures(
-                self._analysis_conf._group_by):
-            group_by_captures.append(capture)
-        for capture in event.full_captures():
-            full_captures.append(capture)
-        for child in event.children:
-            self._find_aggregated_subperiods(root, child, aggregated_list,
-                                             group_by_captures,
-                                             full_captures)
-
-    def _add_parent_per_group_active_periods(self, event,
-                                             per_group_active_periods,
-                                             group_key):
-        p = None
-        if event.parent is not None and \
-                event.parent not in per_group_active_periods[group_key].keys():
-            p = self._add_parent_per_group_active_periods(
-                event.parent, per_group_active_periods, group_key)
-        per_group_active_periods[group_key][event] = _TmpAggregation(p)
-        return per_group_active_periods[group_key][event]
-
-    def _account_parents_in_group(self, event, full_captures,
-                                  per_parent_period_group_by_stats,
-                                  per_group_active_periods,
-                                  per_period_group_by_stats):
-        for g in full_captures:
-            group_key = ''
-            if len(g) < len(self._analysis_conf._group_by.keys()):
-                continue
-            for group in sorted(g, key=lambda x: x[0]):
-                if len(group_key) == 0:
-                    group_key = '%s = %s' % (group[0], group[1])
-                else:
-                    group_key = '%s, %s = %s' % (group_key, group[0],
-                                                 group[1])
-
-            if len(group_key) == 0:
-                continue
-
-            if group_key not in per_group_active_periods.keys():
-                per_group_active_periods[group_key] = OrderedDict()
-
-            # Statistics for this event alone in this group
-            if group_key not in per_period_group_by_stats.keys():
-                per_period_group_by_stats[group_key] = OrderedDict()
-            if event.name not in per_period_group_by_stats[group_key].keys():
-                per_period_group_by_stats[group_key][event.name] = \
-                    _PeriodStats()
-            per_period_group_by_stats[group_key][event.name].add_duration(
-                event.duration)
-
-            if group_key not in per_parent_period_group_by_stats.keys():
-                per_parent_period_group_by_stats[group_key] = OrderedDict()
-            if event.name not in \
-                    per_parent_period_group_by_stats[group_key].keys():
-                per_parent_period_group_by_stats[group_key][event.name] = \
-                    _AggregatedPeriodStats(
-                        self._analysis_conf.period_def_registry,
-                        event.name)
-            # Account all parent periods of this event in all of its groups
-            _parent = event.parent
-            _child = event
-            while _parent is not None:
-                if _parent not in per_group_active_periods[group_key].keys():
-                    self._add_parent_per_group_active_periods(
-                        _parent, per_group_active_periods, group_key)
-                if _parent.name not in \
-                        per_parent_period_group_by_stats[group_key].keys():
-                    per_parent_period_group_by_stats[group_key][_parent.name] \
-                        = _AggregatedPeriodStats(
-                        self._analysis_conf.period_def_registry,
-                        _parent.name)
-                per_group_active_periods[group_key][_parent].add_child(
-                    _child.name, _child.duration)
-                _parent = _parent.parent
-
-            if event in per_group_active_periods[group_key].keys():
-                per_parent_period_group_by_stats[group_key][event.name]. \
-                    finish_period(
-                        event.start_ts, event.end_ts,
-                        per_group_active_periods[group_key][event].children)
-
-    def _hierarchical_sub(self, tmp_hierarchical_list, event, per_period_stats,
-                          per_parent_period_group_by_stats, active_periods,
-                          ancestors_captures, per_group_active_periods,
-                          per_period_group_by_stats):
-        tmp_hierarchical_list.append(event)
-
-        event_captures = event.filtered_captures(self._analysis_conf._group_by)
-#        print(parent_captures, event_captures)
-
-        # Our local level capture to return to our parent combined with the
-        # captures of our children.
-        local_captures = []
-        global_captures = []
-
-        # Recursively iterate over all the children of this period
-        for child in event.children:
-            if not self._filter_event_duration(child):
-                continue
-            if child.name not in per_period_stats.keys():
-                per_period_stats[child.name] = _AggregatedPeriodStats(
-                    self._analysis_conf.period_def_registry,
-                    child.name)
-            active_periods[event].add_child(child.name, child.duration)
-            active_periods[child] = _TmpAggregation(active_periods[event])
-            child_captures = self._hierarchical_sub(
-                tmp_hierarchical_list, child, per_period_stats,
-                per_parent_period_group_by_stats, active_periods,
-                ancestors_captures + event_captures,
-                per_group_active_periods, per_period_group_by_stats)
-            del(active_periods[child])
-            for c in child_captures:
-                local_captures.append(event_captures + c)
-                global_captures.append(event_captures.copy() + c)
-        if len(local_captures) == 0:
-            local_captures = [event_captures]
-            global_captures = [event_captures.copy()]
-        full_captures = []
-        for c in global_captures:
-            tmp_c = c.copy()
-            for d in ancestors_captures:
-                tmp_c.append(d)
-            # dedup
-            if tmp_c not in full_captures:
-                full_captures.append(tmp_c)
-        active_periods[event].capture_groups = full_captures
-
-        self._account_parents_in_group(event, full_captures,
-                                       per_parent_period_group_by_stats,
-                                       per_group_active_periods,
-                                       per_period_group_by_stats)
-
-        per_period_stats[event.name].finish_period(
-            event.start_ts, event.end_ts,
-            active_periods[event].children)
-
-        return local_captures
-
+    # The aggregates are updated by the analysis as periods end, this
+    # only returns them
     def _get_aggregated_lists(self):
-        # Dict with parent period as key. Each entry contains a dict
-        # of all child period that each contain a list of _AggregatedItem.
-        # parent_aggregated_dict[parent_period][child_period] = []
-        parent_aggregated_dict = {}
-        # List of PeriodEvent ordered in hierarchy (parents are followed
-        # by their children)
-        hierarchical_list = []
-        # dict of _AggregatedPeriodStats
-        # OrderedDict because we want the same order as the period_tree
-        per_period_stats = OrderedDict()
-        per_parent_period_group_by_stats = OrderedDict()
-        # Just the stats for the period per group (not relative to
-        # its parents)
-        per_period_group_by_stats = OrderedDict()
-        # active_periods[period_event] = _TmpAggregation()
-        active_periods = {}
-        per_group_active_periods = {}
-        for period_event in self._analysis.all_period_list:
-            if not self._filter_event_duration(period_event):
-                continue
-            if self._analysis_conf._order_by == "hierarchy" or \
-                    self._args.stats or self._args.freq:
-                # Only top-level events to start the recursive iteration
-                # and extract per_parent stats/freq and hierarchical list
-                # of periods
-                if period_event.parent is None:
-                    active_periods[period_event] = _TmpAggregation()
-                    if period_event.name not in per_period_stats.keys():
-                        per_period_stats[period_event.name] = \
-                            _AggregatedPeriodStats(
-                                self._analysis_conf.period_def_registry,
-                                period_event.name)
-
-                    tmp_hierarchical_list = []
-                    self._hierarchical_sub(
-                        tmp_hierarchical_list, period_event, per_period_stats,
-                        per_parent_period_group_by_stats, active_periods, [],
-                        per_group_active_periods, per_period_group_by_stats)
-                    del(active_periods[period_event])
-                    for item in tmp_hierarchical_list:
-                        hierarchical_list.append(item)
-
-            if period_event.name != self._analysis_conf._aggregate_by:
-                continue
-            if period_event not in parent_aggregated_dict.keys():
-                parent_aggregated_dict[period_event] = {}
-            # Associate the periods with their full capture list (each period
-            # sees its own capture and the capture of all its children)
-            tmp_list = []
-            for child in period_event.children:
-                if not self._filter_event_duration(child):
-                    continue
-                self._find_aggregated_subperiods(
-                    period_event,
-                    child, tmp_list,
-                    period_event.filtered_captures(
-                        self._analysis_conf._group_by),
-                    period_event.full_captures())
-            for item in tmp_list:
-                if item.event.name not in \
-                        parent_aggregated_dict[period_event].keys():
-                    parent_aggregated_dict[period_event][item.event.name] = []
-                parent_aggregated_dict[period_event][item.event.name]. \
-                    append(item)
-        ordered_parent = collections.OrderedDict(
-            sorted(parent_aggregated_dict.items(),
-                   key=lambda t: t[0].start_ts))
-
-        return ordered_parent, hierarchical_list, per_period_stats, \
-            per_parent_period_group_by_stats, per_period_group_by_stats
+        aggregator = self._analysis.aggregator
+
+        return aggregator.parent_aggregated_dict, \
+            aggregator.hierarchical_list, aggregator.per_period_stats, \
+            aggregator.per_parent_period_group_by_stats, \
+            aggregator.per_period_group_by_stats
 
     def _get_aggregated_groups(self, per_parent_aggregated_dict):
         # Group and flatten event list by captured keys, aggregate by parent
-        # groups[group_key][parent][child] = [_AggregatedItem, ...]
+        # groups[group_key][parent][child] = [AggregatedItem, ...]
         groups = {}
+        aggregator = self._analysis.aggregator
         for parent in per_parent_aggregated_dict.keys():
             for child in per_parent_aggregated_dict[parent].keys():
                 for ag_event in per_parent_aggregated_dict[parent][child]:
-                    group_key = ""
-                    for group in sorted(ag_event.group_by_captures,
-                                        key=lambda x: x[0]):
-                        if len(group_key) == 0:
-                            group_key = "%s = %s" % (group[0], group[1])
-                        else:
-                            group_key = "%s, %s = %s" % (group_key, group[0],
-                                                         group[1])
+                    group_key = aggregator.get_group_key(
+                        ag_event.group_by_captures)
 
                     if group_key not in groups.keys():
                         groups[group_key] = {}
@@ -981,32 +587,6 @@ class PeriodAnalysisCommand(Command):
                     groups[group_key][parent][child].append(ag_event)
         return groups
 
-    def _get_total_period_lists_stats(self):
-        if self._args.min_duration is None and \
-                self._args.max_duration is None:
-            total_list = self._analysis.all_period_list
-            stdev = self._compute_period_duration_stdev(total_list)
-            total_stats = _PeriodStats(
-                count=self._analysis.all_count,
-                min=self._analysis.all_min_duration,
-                max=self._analysis.all_max_duration,
-                stdev=stdev,
-                total=self._analysis.all_total_duration
-            )
-        else:
-            min, max, count, avg, total, total_list = \
-                self._get_filtered_min_max_count_avg_total_flist(
-                    self._analysis.all_period_list)
-            total_stats = _PeriodStats(
-                count=count,
-                min=min,
-                max=max,
-                stdev=self._compute_period_duration_stdev(total_list),
-                total=total,
-            )
-
-        return [total_list], total_stats
-
     def _get_one_hierarchical_log_table(self, begin_ns, end_ns,
                                         aggregated_list, sub, top):
         if top:
@@ -1100,21 +680,22 @@ class PeriodAnalysisCommand(Command):
             )
         return result_table
 
-    def _get_top_result_table(self, begin_ns, end_ns, event_list):
+    def _get_top_result_table(self, begin_ns, end_ns):
         result_table = self._mi_create_result_table(
             self._MI_TABLE_CLASS_TOP, begin_ns, end_ns)
 
-        top_events = sorted(event_list,
-                            key=operator.attrgetter('duration'),
-                            reverse=True)
-        count = 0
+        # The analysis keeps the top period events of each period name,
+        # already filtered by duration
+        top_events = []
+        for top_periods in self._analysis.top_periods.values():
+            top_events += [period_event for period_event in top_periods.items
+                           if not self._args.select or
+                           period_event.name in self._args.select]
 
-        for period_event in top_events:
-            if not self._filter_event_duration(period_event):
-                continue
-            if self._args.select and period_event.name not in \
-                    self._args.select:
-                continue
+        top_events.sort(key=periods.PeriodAnalysis.top_period_key,
+                        reverse=True)
+
+        for period_event in top_events[:self._args.limit]:
             result_table.append_row(
                 begin_ts=mi.Timestamp(period_event.start_ts),
                 end_ts=mi.Timestamp(period_event.end_ts),
@@ -1123,9 +704,6 @@ class PeriodAnalysisCommand(Command):
                 begin_captures=mi.String(period_event.begin_captures),
                 end_captures=mi.String(period_event.end_captures),
             )
-            count += 1
-            if count == self._args.limit:
-                break
         return result_table
 
     def _get_ordered_period_stats_list(self, parent_name, period_stats_list,
@@ -1170,12 +748,8 @@ class PeriodAnalysisCommand(Command):
             if self._analysis_conf._aggregate_by is not None and \
                     period not in self._analysis_conf._aggregate_by:
                 continue
-            ret.duration_values[period] = {}
-            ret.count_values[period] = {}
-            ret.pc_values[period] = {}
-            ret.global_duration_values[period] = {}
-            ret.global_count_values[period] = {}
-            ret.global_pc_values[period] = {}
+            ret.per_parent_stats[period] = {}
+            ret.global_stats[period] = {}
             for child in per_period_stats[period]._children.keys():
                 if self._args.select is not None and \
                         child not in self._args.select:
@@ -1184,70 +758,27 @@ class PeriodAnalysisCommand(Command):
                 if period not in c.parent_count.keys():
                     continue
                 nogroup_c = not_grouped_per_period_stats[period]
-                if per_period_stats[period].nr_periods == 0:
-                    global_duration_avg = 0
-                    global_count_avg = 0
-                    duration_avg = 0
-                    count_avg = 0
-                    pc_avg = 0
-                else:
-                    global_duration_avg = c.total / \
-                        nogroup_c.nr_periods
-                    global_count_avg = c.total_count / \
-                        nogroup_c.nr_periods
-                    duration_avg = c.total / c.parent_count[period]
-                    count_avg = c.total_count / c.parent_count[period]
-                    pc_avg = c.total_pc / c.parent_count[period]
-                    global_pc_avg = c.total_pc / \
-                        nogroup_c.nr_periods
-
-                if len(c.durations) > 2:
-                    duration_stdev = mi.Duration(statistics.stdev(c.durations))
-                    count_stdev = mi.Number(statistics.stdev(c.count_array))
-                    pc_stdev = mi.Number(statistics.stdev(c.pc_array))
+                # The parent periods in which the child is not active
+                # count as zero values globally
+                global_c = c.new_with_zeros(nogroup_c.nr_periods -
+                                            c.parent_count[period])
+                ret.per_parent_stats[period][child] = c
+                ret.global_stats[period][child] = global_c
+
+                if c.durations.count > 2:
+                    duration_stdev = mi.Duration(c.durations.stdev)
+                    count_stdev = mi.Number(c.counts.stdev)
+                    pc_stdev = mi.Number(c.pcs.stdev)
                 else:
                     duration_stdev = mi.Unknown()
                     count_stdev = mi.Unknown()
                     pc_stdev = mi.Unknown()
 
-                # Make temporary copies in case we need to reuse the
-                # original table afterwards.
-                global_durations = c.durations.copy()
-                global_count_array = c.count_array.copy()
-                global_pc_array = c.pc_array.copy()
-                # Save the raw values if we need them for the frequency
-                # distributions
-                ret.duration_values[period][child] = c.durations.copy()
-                ret.count_values[period][child] = c.count_array.copy()
-                ret.pc_values[period][child] = c.pc_array.copy()
-                ret.global_duration_values[period][child] = c.durations.copy()
-                ret.global_count_values[period][child] = c.count_array.copy()
-                ret.global_pc_values[period][child] = c.pc_array.copy()
-                if c.parent_count[period] < \
-                        nogroup_c.nr_periods:
-                    global_min = 0
-                    global_min_count = 0
-                    global_min_pc = 0
-                    for i in range(nogroup_c.nr_periods -
-                                   c.parent_count[period]):
-                        global_durations.append(0)
-                        global_count_array.append(0)
-                        global_pc_array.append(0)
-                        ret.global_duration_values[period][child].append(0)
-                        ret.global_count_values[period][child].append(0)
-                        ret.global_pc_values[period][child].append(0)
-                else:
-                    global_min = c.min
-                    global_min_count = c.min_count
-                    global_min_pc = c.min_pc
-
-                if nogroup_c.nr_periods > 2:
+                if global_c.durations.count > 2:
                     global_duration_stdev = mi.Duration(
-                        statistics.stdev(global_durations))
-                    global_count_stdev = mi.Number(
-                        statistics.stdev(global_count_array))
-                    global_pc_stdev = mi.Number(
-                        statistics.stdev(global_pc_array))
+                        global_c.durations.stdev)
+                    global_count_stdev = mi.Number(global_c.counts.stdev)
+                    global_pc_stdev = mi.Number(global_c.pcs.stdev)
                 else:
                     global_duration_stdev = mi.Unknown()
                     global_count_stdev = mi.Unknown()
@@ -1256,68 +787,67 @@ class PeriodAnalysisCommand(Command):
                 duration_table.append_row(
                     name=mi.String(self._get_full_period_path(child)),
                     parent=mi.String(self._get_full_period_path(period)),
-                    min_duration=mi.Duration(c.min),
-                    avg_duration=mi.Duration(duration_avg),
-                    max_duration=mi.Duration(c.max),
+                    min_duration=mi.Duration(c.durations.min),
+                    avg_duration=mi.Duration(c.durations.mean),
+                    max_duration=mi.Duration(c.durations.max),
                     stdev_duration=duration_stdev,
                 )
 
                 count_table.append_row(
                     name=mi.String(self._get_full_period_path(child)),
                     parent=mi.String(self._get_full_period_path(period)),
-                    min=mi.Number(c.min_count),
-                    avg=mi.Number(count_avg),
-                    max=mi.Number(c.max_count),
+                    min=mi.Number(c.counts.min),
+                    avg=mi.Number(c.counts.mean),
+                    max=mi.Number(c.counts.max),
                     stdev=count_stdev,
                 )
 
                 pc_table.append_row(
                     name=mi.String(self._get_full_period_path(child)),
                     parent=mi.String(self._get_full_period_path(period)),
-                    min=mi.Number(c.min_pc),
-                    avg=mi.Number(pc_avg),
-                    max=mi.Number(c.max_pc),
+                    min=mi.Number(c.pcs.min),
+                    avg=mi.Number(c.pcs.mean),
+                    max=mi.Number(c.pcs.max),
                     stdev=pc_stdev,
                 )
 
                 global_duration_table.append_row(
                     name=mi.String(self._get_full_period_path(child)),
                     parent=mi.String(self._get_full_period_path(period)),
-                    min_duration=mi.Duration(global_min),
-                    avg_duration=mi.Duration(global_duration_avg),
-                    max_duration=mi.Duration(c.max),
+                    min_duration=mi.Duration(global_c.durations.min),
+                    avg_duration=mi.Duration(global_c.durations.mean),
+                    max_duration=mi.Duration(global_c.durations.max),
                     stdev_duration=global_duration_stdev,
                 )
 
                 global_count_table.append_row(
                     name=mi.String(self._get_full_period_path(child)),
                     parent=mi.String(self._get_full_period_path(period)),
-                    min=mi.Number(global_min_count),
-                    avg=mi.Number(global_count_avg),
-                    max=mi.Number(c.max_count),
+                    min=mi.Number(global_c.counts.min),
+                    avg=mi.Number(global_c.counts.mean),
+                    max=mi.Number(global_c.counts.max),
                     stdev=global_count_stdev,
                 )
 
                 global_pc_table.append_row(
                     name=mi.String(self._get_full_period_path(child)),
                     parent=mi.String(self._get_full_period_path(period)),
-                    min=mi.Number(global_min_pc),
-                    avg=mi.Number(global_pc_avg),
-                    max=mi.Number(c.max_pc),
+                    min=mi.Number(global_c.pcs.min),
+                    avg=mi.Number(global_c.pcs.mean),
+                    max=mi.Number(global_c.pcs.max),
                     stdev=global_pc_stdev,
                 )
         return ret
 
-    def _find_filtered_uniform_freq_values(self, per_period_group_stats):
-        for period in per_period_group_stats.keys():
-            table = per_period_group_stats[period]
-            min, max, count, avg, total, total_list = \
-                self._get_filtered_min_max_count_avg_total_values(
-                    table.durations)
-            min, max, step = self._find_uniform_freq_values(total_list, 1000,
-                                                            'duration')
-        # We only care about the last values
-        return min, max, step
+    def _find_grouped_uniform_freq_values(self, per_period_group_by_stats):
+        histograms = [
+            period_stats.duration_histogram
+            for per_period_group_stats in per_period_group_by_stats.values()
+            for period_stats in per_period_group_stats.values()
+        ]
+
+        return self._find_uniform_freq_histogram_values(histograms, 1000,
+                                                        'duration')
 
     def _get_grouped_by_period_stats_freq(self, begin_ns, end_ns,
                                           per_period_group_stats,
@@ -1333,31 +863,32 @@ class PeriodAnalysisCommand(Command):
             if self._args.select is not None and \
                     period not in self._args.select:
                 continue
+            # The aggregated periods are within the duration bounds
             table = per_period_group_stats[period]
-            min, max, count, avg, total, total_list = \
-                self._get_filtered_min_max_count_avg_total_values(
-                    table.durations)
-            stdev = self._compute_period_duration_stdev_values(total_list)
+            stdev = table.durations.stdev
             if math.isnan(stdev):
                 stdev = mi.Unknown()
             else:
                 stdev = mi.Duration(stdev)
-            count = len(total_list)
 
             stats_table.append_row(
                 name=mi.String(self._get_full_period_path(period)),
-                count=mi.Number(count),
-                min_duration=mi.Duration(min),
-                avg_duration=mi.Duration(avg),
-                max_duration=mi.Duration(max),
+                count=mi.Number(table.durations.count),
+                min_duration=mi.Duration(table.durations.min),
+                avg_duration=mi.Duration(table.durations.mean),
+                max_duration=mi.Duration(table.durations.max),
                 stdev_duration=stdev,
-                runtime=mi.Duration(total),
+                runtime=mi.Duration(table.durations.total),
+                **self._get_percentile_row_values(table.duration_histogram,
+                                                  'duration')
             )
 
             subtitle = '{}Duration of period: {}'.format(group_prefix, period)
-            tmp_table = self._get_one_freq_result_table(
+            tmp_table = self._mi_create_result_table(
                 self._MI_TABLE_CLASS_FREQ_DURATION, begin_ns, end_ns,
-                freq_min, freq_max, freq_step, total_list, subtitle, 1000)
+                subtitle)
+            self._fill_freq_result_table(table.duration_histogram, freq_min,
+                                         freq_max, freq_step, tmp_table)
             freq_tables.append(tmp_table)
             freq_tables_by_period_name[period] = tmp_table
         return stats_table, freq_tables, freq_tables_by_period_name
@@ -1373,35 +904,17 @@ class PeriodAnalysisCommand(Command):
             self._get_ordered_period_stats_list(parent, period_stats_list,
                                                 period_tree[parent])
 
+        # The period statistics only account the periods within the
+        # duration bounds
         for period_stats in period_stats_list:
-            if not period_stats.period_list:
+            if period_stats.count == 0:
                 continue
 
             if self._args.select is not None and \
                     period_stats.name not in self._args.select:
                 continue
 
-            if self._args.min_duration is None and \
-                    self._args.max_duration is None:
-                stdev = self._compute_period_duration_stdev(
-                    period_stats.period_list)
-                min = period_stats.min_duration
-                max = period_stats.max_duration
-                count = period_stats.count
-                total = period_stats.total_duration
-                if count > 0:
-                    avg = period_stats.total_duration / \
-                        period_stats.count
-                else:
-                    avg = 0
-            else:
-                min, max, count, avg, total, period_list = \
-                    self._get_filtered_min_max_count_avg_total_flist(
-                        period_stats.period_list)
-                if count == 0:
-                    continue
-                stdev = self._compute_period_duration_stdev(period_list)
-
+            stdev = period_stats.durations.stdev
             if math.isnan(stdev):
                 stdev = mi.Unknown()
             else:
@@ -1409,12 +922,14 @@ class PeriodAnalysisCommand(Command):
 
             stats_table.append_row(
                 name=mi.String(self._get_full_period_path(period_stats.name)),
-                count=mi.Number(count),
-                min_duration=mi.Duration(min),
-                avg_duration=mi.Duration(avg),
-                max_duration=mi.Duration(max),
+                count=mi.Number(period_stats.count),
+                min_duration=mi.Duration(period_stats.min_duration),
+                avg_duration=mi.Duration(period_stats.durations.mean),
+                max_duration=mi.Duration(period_stats.max_duration),
                 stdev_duration=stdev,
-                runtime=mi.Duration(total),
+                runtime=mi.Duration(period_stats.total_duration),
+                **self._get_percentile_row_values(period_stats.histogram,
+                                                  'duration')
             )
 
         return stats_table
@@ -1485,8 +1000,10 @@ class PeriodAnalysisCommand(Command):
 
         return result_tables
 
-    def _fill_freq_result_table(self, period_list, stats, min_duration,
-                                max_duration, step, freq_table):
+    # `ratio` converts the values of `histogram` to the unit of the
+    # table (1000 for ns to µs)
+    def _fill_freq_result_table(self, histogram, min_duration,
+                                max_duration, step, freq_table, ratio=1000):
         # The number of bins for the histogram
         resolution = self._args.freq_resolution
 
@@ -1494,120 +1011,30 @@ class PeriodAnalysisCommand(Command):
             if self._args.min is not None:
                 min_duration = self._args.min
             else:
-                min_duration = stats.min
+                min_duration = histogram.min
 
             if self._args.max is not None:
                 max_duration = self._args.max
             else:
-                max_duration = stats.max
+                max_duration = histogram.max
 
-            # ns to µs
             if min_duration is None:
                 min_duration = 0
             else:
-                min_duration /= 1000
+                min_duration /= ratio
 
             if max_duration is None:
                 max_duration = 0
             else:
-                max_duration /= 1000
+                max_duration /= ratio
 
             step = (max_duration - min_duration) / resolution
 
         if step == 0:
             return
 
-        buckets = []
-        counts = []
-
-        for i in range(resolution):
-            buckets.append(i * step)
-            counts.append(0)
-
-        for period_event in period_list:
-            if not self._filter_event_duration(period_event):
-                continue
-            duration = period_event.duration / 1000
-            index = int((duration - min_duration) / step)
-
-            if index >= resolution:
-                # special case for max value: put in last bucket (includes
-                # its upper bound)
-                if duration == max_duration:
-                    counts[index - 1] += 1
-
-                continue
-
-            counts[index] += 1
-
-        for index, count in enumerate(counts):
-            lower_bound = index * step + min_duration
-            upper_bound = (index + 1) * step + min_duration
-            freq_table.append_row(
-                lower=mi.Duration.from_us(lower_bound),
-                upper=mi.Duration.from_us(upper_bound),
-                count=mi.Number(count),
-            )
-
-    def _fill_freq_result_table_values(self, values, min_duration,
-                                       max_duration, step, freq_table, ratio):
-        # Differ from _fill_freq_result_table because we work directly with
-        # a list of values instead of periods.
-
-        # The number of bins for the histogram
-        resolution = self._args.freq_resolution
-
-        if not self._args.freq_uniform:
-            if self._args.min is not None:
-                min_duration = self._args.min
-            else:
-                min_duration = min(values) / ratio
-
-            if self._args.max is not None:
-                max_duration = self._args.max
-            else:
-                max_duration = max(values) / ratio
-
-            # ns to µs
-            if min_duration is None:
-                min_duration = 0
-
-            if max_duration is None:
-                max_duration = 0
-
-            step = (max_duration - min_duration) / resolution
-
-        if step == 0:
-            return
-
-        buckets = []
-        counts = []
-
-        for i in range(resolution):
-            buckets.append(i * step)
-            counts.append(0)
-
-        for v in values:
-            if not self._filter_duration(v):
-                continue
-            duration = v / ratio
-            index = int((duration - min_duration) / step)
-
-            if index < 0:
-                raise ValueError('Invalid range, duration=%s, min=%s, max=%s,'
-                                 ' step=%s, resolution=%s' % (
-                                     duration, min_duration, max_duration,
-                                     step, resolution))
-
-            if index >= resolution:
-                # special case for max value: put in last bucket (includes
-                # its upper bound)
-                if duration == max_duration:
-                    counts[index - 1] += 1
-
-                continue
-
-            counts[index] += 1
+        counts = histogram.get_freq_counts(min_duration, max_duration,
+                                           resolution, ratio)
 
         for index, count in enumerate(counts):
             lower_bound = index * step + min_duration
@@ -1620,33 +1047,25 @@ class PeriodAnalysisCommand(Command):
 
     def _get_total_freq_result_tables(self, begin_ns, end_ns):
         freq_tables = []
-        period_lists, period_stats = self._get_total_period_lists_stats()
+        histogram = stats.LogLinearHistogram.new_from_histograms(
+            period_stats.histogram for period_stats in
+            self._analysis.all_period_stats.values())
         min_duration = None
         max_duration = None
         step = None
         subtitle = 'All periods'
 
         if self._args.freq_uniform:
-            durations = []
-
-            for period_list in period_lists:
-                for period_event in period_list:
-                    if not self._filter_event_duration(period_event):
-                        continue
-                    durations.append(period_event.duration)
-
             min_duration, max_duration, step = \
-                self._find_uniform_freq_values(durations)
+                self._find_uniform_freq_histogram_values([histogram])
 
-        for period_list in period_lists:
-            freq_table = \
-                self._mi_create_result_table(
-                    self._MI_TABLE_CLASS_FREQ_DURATION, begin_ns, end_ns,
-                    subtitle)
-            self._fill_freq_result_table(period_list, period_stats,
-                                         min_duration, max_duration, step,
-                                         freq_table)
-            freq_tables.append(freq_table)
+        freq_table = \
+            self._mi_create_result_table(
+                self._MI_TABLE_CLASS_FREQ_DURATION, begin_ns, end_ns,
+                subtitle)
+        self._fill_freq_result_table(histogram, min_duration, max_duration,
+                                     step, freq_table)
+        freq_tables.append(freq_table)
 
         return freq_tables
 
@@ -1690,53 +1109,19 @@ class PeriodAnalysisCommand(Command):
                 per_period_tables[period].append_row_tuple(tuple(row_tuple))
         return per_period_tables
 
-    def _get_period_lists_stats(self):
-        period_lists = {}
-        period_stats = {}
-
-        for period in self._analysis.all_period_stats.keys():
-            period_list = self._analysis.all_period_stats[period].period_list
+    # Returns the uniform frequency distribution values of the
+    # histograms `get_histogram(aggregated_stats)` across all the
+    # parent/child combinations of `table`
+    def _find_table_min_max_step(self, table, get_histogram, ratio,
+                                 category):
+        histograms = [
+            get_histogram(aggregated_stats)
+            for children in table.values()
+            for aggregated_stats in children.values()
+        ]
 
-            if not period_list:
-                continue
-            if self._args.min_duration is None and \
-                    self._args.max_duration is None:
-                stdev = self._compute_period_duration_stdev(period_list)
-                count = len(period_list)
-                min = self._analysis.all_period_stats[period].min_duration
-                max = self._analysis.all_period_stats[period].max_duration
-                total = \
-                    self._analysis.all_period_stats[period].total_duration
-            else:
-                min, max, count, avg, total, period_list = \
-                    self._get_filtered_min_max_count_avg_total_flist(
-                        period_list)
-                stdev = self._compute_period_duration_stdev(period_list)
-
-            period_stats[period] = _PeriodStats(
-                count=count, min=min, max=max, stdev=stdev, total=total)
-            period_lists[period] = period_list
-
-        return period_lists, period_stats
-
-    def _find_table_min_max_step(self, table, ratio, category):
-        _min = None
-        max = 0
-        # Find the uniform freq values across all parent/child combinations
-        for period in table.keys():
-            for child in table[period].keys():
-                tmp_min, tmp_max, tmp_step = \
-                    self._find_uniform_freq_values(
-                        table[period][child], ratio, category)
-                if _min is None or tmp_min < _min:
-                    _min = tmp_min
-                if tmp_max > max:
-                    max = tmp_max
-        if _min is None:
-            steps = 0
-        else:
-            steps = (max - _min) / self._args.freq_resolution
-        return _min, max, steps
+        return self._find_uniform_freq_histogram_values(histograms, ratio,
+                                                        category)
 
     def _find_uniform_values(self, tables):
         if not self._args.freq_uniform:
@@ -1744,24 +1129,34 @@ class PeriodAnalysisCommand(Command):
                 None, None, None, None, None, None, \
                 None, None, None, None, None, None
 
+        pc_ratio = periods.AggregatedStats.PC_RATIO
         duration_min, duration_max, duration_step = \
-            self._find_table_min_max_step(tables.duration_values, 1000,
-                                          'duration')
+            self._find_table_min_max_step(
+                tables.per_parent_stats,
+                operator.attrgetter('duration_histogram'), 1000, 'duration')
         global_duration_min, global_duration_max, global_duration_step = \
-            self._find_table_min_max_step(tables.global_duration_values, 1000,
-                                          'global_duration')
+            self._find_table_min_max_step(
+                tables.global_stats,
+                operator.attrgetter('duration_histogram'), 1000,
+                'global_duration')
 
         count_min, count_max, count_step = \
-            self._find_table_min_max_step(tables.count_values, 1, 'count')
+            self._find_table_min_max_step(
+                tables.per_parent_stats,
+                operator.attrgetter('count_histogram'), 1, 'count')
         global_count_min, global_count_max, global_count_step = \
-            self._find_table_min_max_step(tables.global_count_values, 1,
-                                          'global_count')
+            self._find_table_min_max_step(
+                tables.global_stats,
+                operator.attrgetter('count_histogram'), 1, 'global_count')
 
         pc_min, pc_max, pc_step = \
-            self._find_table_min_max_step(tables.pc_values, 1, 'pc')
+            self._find_table_min_max_step(
+                tables.per_parent_stats,
+                operator.attrgetter('pc_histogram'), pc_ratio, 'pc')
         global_pc_min, global_pc_max, global_pc_step = \
-            self._find_table_min_max_step(tables.global_pc_values, 1,
-                                          'global_pc')
+            self._find_table_min_max_step(
+                tables.global_stats,
+                operator.attrgetter('pc_histogram'), pc_ratio, 'global_pc')
 
         return duration_min, duration_max, duration_step, \
             global_duration_min, global_duration_max, \
@@ -1774,12 +1169,12 @@ class PeriodAnalysisCommand(Command):
             global_pc_step
 
     def _get_one_freq_result_table(self, mi_class, begin_ns, end_ns,
-                                   min, max, step, values,
+                                   min, max, step, histogram,
                                    subtitle, ratio=1):
         freq_table = \
             self._mi_create_result_table(mi_class, begin_ns, end_ns, subtitle)
-        self._fill_freq_result_table_values(values, min, max, step,
-                                            freq_table, ratio)
+        self._fill_freq_result_table(histogram, min, max, step,
+                                     freq_table, ratio)
         return freq_table
 
     def _get_per_parent_freq_result_table(self, begin_ns, end_ns,
@@ -1794,15 +1189,19 @@ class PeriodAnalysisCommand(Command):
             global_pc_min, global_pc_max, \
             global_pc_step = self._find_uniform_values(tables)
 
+        pc_ratio = periods.AggregatedStats.PC_RATIO
+
         # sorted to get the same output order between runs
-        for period in sorted(tables.duration_values.keys()):
+        for period in sorted(tables.per_parent_stats.keys()):
             if self._analysis_conf._aggregate_by is not None and \
                     period not in self._analysis_conf._aggregate_by:
                 continue
-            for child in tables.duration_values[period].keys():
+            for child in tables.per_parent_stats[period].keys():
                 if self._args.select is not None and \
                         child not in self._args.select:
                     continue
+                c = tables.per_parent_stats[period][child]
+                global_c = tables.global_stats[period][child]
                 subtitle = "%sDuration of %s per %s" % (
                     group_prefix,
                     self._get_full_period_path(child),
@@ -1812,7 +1211,7 @@ class PeriodAnalysisCommand(Command):
                     self._get_one_freq_result_table(
                         self._MI_TABLE_CLASS_FREQ_DURATION,
                         begin_ns, end_ns, duration_min, duration_max,
-                        duration_step, tables.duration_values[period][child],
+                        duration_step, c.duration_histogram,
                         subtitle, ratio=1000))
 
                 subtitle = "%sNumber of %s per %s" % (
@@ -1823,8 +1222,7 @@ class PeriodAnalysisCommand(Command):
                     self._get_one_freq_result_table(
                         self._MI_TABLE_CLASS_FREQ_COUNT,
                         begin_ns, end_ns, count_min, count_max, count_step,
-                        tables.count_values[period][child],
-                        subtitle))
+                        c.count_histogram, subtitle))
 
                 subtitle = "%sUsage ratio of %s per %s" % (
                     group_prefix,
@@ -1834,8 +1232,7 @@ class PeriodAnalysisCommand(Command):
                     self._get_one_freq_result_table(
                         self._MI_TABLE_CLASS_FREQ_PC,
                         begin_ns, end_ns, pc_min, pc_max, pc_step,
-                        tables.pc_values[period][child],
-                        subtitle))
+                        c.pc_histogram, subtitle, ratio=pc_ratio))
 
                 subtitle = "%sGlobal duration of %s per %s" % (
                     group_prefix,
@@ -1847,8 +1244,7 @@ class PeriodAnalysisCommand(Command):
                         self._MI_TABLE_CLASS_FREQ_DURATION,
                         begin_ns, end_ns, global_duration_min,
                         global_duration_max, global_duration_step,
-                        tables.global_duration_values[period][child],
-                        subtitle, ratio=1000))
+                        global_c.duration_histogram, subtitle, ratio=1000))
 
                 subtitle = "%sGlobal number of %s per %s" % (
                     group_prefix,
@@ -1859,8 +1255,7 @@ class PeriodAnalysisCommand(Command):
                         self._MI_TABLE_CLASS_FREQ_COUNT,
                         begin_ns, end_ns, global_count_min, global_count_max,
                         global_count_step,
-                        tables.global_count_values[period][child],
-                        subtitle))
+                        global_c.count_histogram, subtitle))
 
                 subtitle = "%sGlobal usage ratio of %s per %s" % (
                     group_prefix,
@@ -1871,66 +1266,40 @@ class PeriodAnalysisCommand(Command):
                         self._MI_TABLE_CLASS_FREQ_PC,
                         begin_ns, end_ns, global_pc_min, global_pc_max,
                         global_pc_step,
-                        tables.global_pc_values[period][child],
-                        subtitle))
+                        global_c.pc_histogram, subtitle, ratio=pc_ratio))
 
     def _get_per_period_freq_result_tables(self, begin_ns, end_ns):
         freq_tables = []
-        period_lists, period_stats = self._get_period_lists_stats()
+        all_period_stats = self._analysis.all_period_stats
         min_duration = None
         max_duration = None
         step = None
 
         if self._args.freq_uniform:
-            durations = []
-
-            for period_list in period_lists.values():
-                for period_event in period_list:
-                    if not self._filter_event_duration(period_event):
-                        continue
-                    durations.append(period_event.duration)
-
             min_duration, max_duration, step = \
-                self._find_uniform_freq_values(durations)
+                self._find_uniform_freq_histogram_values(
+                    [period_stats.histogram for period_stats in
+                     all_period_stats.values()])
 
-        for period in sorted(period_stats.keys()):
+        for period in sorted(all_period_stats.keys()):
+            period_stats = all_period_stats[period]
+            if period_stats.count == 0:
+                continue
             if self._args.select is not None and \
                     period not in self._args.select:
                 continue
-            period_list = period_lists[period]
-            stats = period_stats[period]
             subtitle = 'Duration of period: {}'.format(period)
             freq_table = \
                 self._mi_create_result_table(
                     self._MI_TABLE_CLASS_FREQ_DURATION, begin_ns, end_ns,
                     subtitle)
-            self._fill_freq_result_table(period_list, stats,
+            self._fill_freq_result_table(period_stats.histogram,
                                          min_duration, max_duration, step,
                                          freq_table)
             freq_tables.append(freq_table)
 
         return freq_tables
 
-    def _compute_period_duration_stdev_values(self, durations):
-        period_durations = []
-        for d in durations:
-            if not self._filter_duration(d):
-                continue
-            period_durations.append(d)
-        if len(period_durations) < 2:
-            return float('nan')
-        return statistics.stdev(period_durations)
-
-    def _compute_period_duration_stdev(self, period_events):
-        period_durations = []
-        for period_event in period_events:
-            if not self._filter_event_duration(period_event):
-                continue
-            period_durations.append(period_event.duration)
-        if len(period_durations) < 2:
-            return float('nan')
-        return statistics.stdev(period_durations)
-
     def _compute_period_agg_duration_stdev(self, period_agg_events):
         period_durations = []
         for period_event in period_agg_events:
@@ -2096,9 +1465,11 @@ class PeriodAnalysisCommand(Command):
                 self._print_period_tree(period_tree[parent], level + 1)
 
     def _print_per_period_stats(self, stats_table, period_tree):
-        row_format = '{:<25} {:>8}  {:>12}  {:>12}  {:>12}  {:>12} {:>12}'
+        row_format = '{:<25} {:>8}  {:>12}  {:>12}  {:>12}  {:>12} ' \
+                     '{:>12} {:>12} {:>12} {:>12} {:>12}'
         header = row_format.format(
-            'Period', 'Count', 'Min', 'Avg', 'Max', 'Stdev', 'Runtime'
+            'Period', 'Count', 'Min', 'Avg', 'Max', 'Stdev',
+            *self._percentile_titles, 'Runtime'
         )
 
         print("Period tree:")
@@ -2121,6 +1492,7 @@ class PeriodAnalysisCommand(Command):
                     '%0.03f' % row.avg_duration.to_us(),
                     '%0.03f' % row.max_duration.to_us(),
                     '%s' % stdev_str,
+                    *self._get_percentile_strs(row, 'duration'),
                     '%0.03f' % row.runtime.to_us(),
                 )
 
@@ -2283,6 +1655,7 @@ class PeriodAnalysisCommand(Command):
 
     def _validate_transform_args(self):
         args = self._args
+        self._analysis_conf.top_filter = self._filter_event_duration
         self._analysis_conf._group_by = {}
         self._analysis_conf._aggregate_by = None
         self._analysis_conf._select = []
@@ -2315,6 +1688,25 @@ class PeriodAnalysisCommand(Command):
             self._analysis_conf._aggregate_by = self._cleanup_period_name(
                 args.aggregate_by)
 
+    def _create_analysis(self):
+        super()._create_analysis()
+        args = self._args
+        conf = self._analysis_conf
+
+        # The analysis updates the aggregates the requested outputs
+        # need as periods end. Individual period events are only kept
+        # for the logs.
+        self._analysis.period_filter = self._filter_event_duration
+        self._analysis.aggregator = periods.PeriodAggregator(
+            conf.period_def_registry, self._filter_event_duration,
+            conf._group_by, conf._select, conf._aggregate_by,
+            hierarchy=conf._order_by == 'hierarchy' or args.stats or
+            args.freq,
+            by_parent=args.log and bool(args.select) and
+            conf._order_by != 'hierarchy',
+            keep_hierarchical_list=args.log and
+            conf._order_by == 'hierarchy')
+
     def _add_arguments(self, ap):
         Command._add_min_max_args(ap)
         Command._add_freq_args(
@@ -23,24 +23,12 @@
 
 import sys
 import math
-import operator
-import statistics
-import collections
 from . import mi, termgraph
 from ..core import sched
 from .command import Command
 from ..common import format_utils
 
 
-_SchedStats = collections.namedtuple('_SchedStats', [
-    'count',
-    'min',
-    'max',
-    'stdev',
-    'total',
-])
-
-
 class SchedAnalysisCommand(Command):
     _DESC = """The sched command."""
     _ANALYSIS_CLASS = sched.SchedAnalysis
@@ -90,6 +78,8 @@ class SchedAnalysisCommand(Command):
                 ('max_latency', 'Maximum latency', mi.Duration),
                 ('stdev_latency', 'Scheduling latency standard deviation',
                  mi.Duration),
+                *Command._get_percentile_column_infos(
+                    'latency', 'Scheduling latency percentile'),
             ]
         ),
         (
@@ -102,6 +92,8 @@ class SchedAnalysisCommand(Command):
                 ('max_latency', 'Maximum latency', mi.Duration),
                 ('stdev_latency', 'Scheduling latency standard deviation',
                  mi.Duration),
+                *Command._get_percentile_column_infos(
+                    'latency', 'Scheduling latency percentile'),
                 ('prio_list', 'Chronological priorities', mi.String),
             ]
         ),
@@ -115,6 +107,8 @@ class SchedAnalysisCommand(Command):
                 ('max_latency', 'Maximum latency', mi.Duration),
                 ('stdev_latency', 'Scheduling latency standard deviation',
                  mi.Duration),
+                *Command._get_percentile_column_infos(
+                    'latency', 'Scheduling latency percentile'),
             ]
         ),
         (
@@ -235,86 +229,6 @@ class SchedAnalysisCommand(Command):
             if top_table:
                 self._print_sched_events(top_table)
 
-    def _get_total_sched_lists_stats(self, period_data):
-        total_list = period_data.sched_list
-        stdev = self._compute_sched_latency_stdev(total_list)
-        total_stats = _SchedStats(
-            count=self._analysis.count(period_data),
-            min=period_data.min_latency,
-            max=period_data.max_latency,
-            stdev=stdev,
-            total=period_data.total_latency
-        )
-
-        return [total_list], total_stats
-
-    def _get_tid_sched_lists_stats(self, period_data):
-        tid_sched_lists = {}
-        tid_stats = {}
-
-        for sched_event in period_data.sched_list:
-            tid = sched_event.wakee_proc.tid
-            if tid not in tid_sched_lists:
-                tid_sched_lists[tid] = []
-
-            tid_sched_lists[tid].append(sched_event)
-
-        for tid in tid_sched_lists:
-            sched_list = tid_sched_lists[tid]
-
-            if not sched_list:
-                continue
-
-            stdev = self._compute_sched_latency_stdev(sched_list)
-            latencies = [sched.latency for sched in sched_list]
-            count = len(latencies)
-            min_latency = min(latencies)
-            max_latency = max(latencies)
-            total_latency = sum(latencies)
-
-            tid_stats[tid] = _SchedStats(
-                count=count,
-                min=min_latency,
-                max=max_latency,
-                stdev=stdev,
-                total=total_latency,
-            )
-
-        return tid_sched_lists, tid_stats
-
-    def _get_prio_sched_lists_stats(self, period_data):
-        prio_sched_lists = {}
-        prio_stats = {}
-
-        for sched_event in period_data.sched_list:
-            if sched_event.prio not in prio_sched_lists:
-                prio_sched_lists[sched_event.prio] = []
-
-            prio_sched_lists[sched_event.prio].append(sched_event)
-
-        for prio in prio_sched_lists:
-            sched_list = prio_sched_lists[prio]
-
-            if not sched_list:
-                continue
-
-            stdev = self._compute_sched_latency_stdev(sched_list)
-            latencies = [sched.latency for sched in sched_list]
-            count = len(latencies)
-            min_latency = min(latencies)
-            max_latency = max(latencies)
-            total_latency = sum(latencies)
-
-            prio_stats[prio] = _SchedStats(
-                count=count,
-                min=min_latency,
-                max=max_latency,
-                stdev=stdev,
-                total=total_latency,
-            )
-
-        return prio_sched_lists, prio_stats
-
     def _get_log_result_table(self, period_data, begin_ns, end_ns):
         result_table = self._mi_create_result_table(self._MI_TABLE_CLASS_LOG,
                                                     begin_ns, end_ns)
@@ -347,12 +261,7 @@ class SchedAnalysisCommand(Command):
         result_table = self._mi_create_result_table(
             self._MI_TABLE_CLASS_TOP, begin_ns, end_ns)
 
-        top_events = sorted(period_data.sched_list,
-                            key=operator.attrgetter('latency'),
-                            reverse=True)
-        top_events = top_events[:self._args.limit]
-
-        for sched_event in top_events:
+        for sched_event in period_data.top_events.items:
             wakee_proc = mi.Process(sched_event.wakee_proc.comm,
                                     sched_event.wakee_proc.pid,
                                     sched_event.wakee_proc.tid)
@@ -381,34 +290,30 @@ class SchedAnalysisCommand(Command):
             self._mi_create_result_table(self._MI_TABLE_CLASS_TOTAL_STATS,
                                          begin_ns, end_ns)
 
-        stdev = self._compute_sched_latency_stdev(period_data.sched_list)
+        latencies = period_data.latencies
+        stdev = latencies.stdev
         if math.isnan(stdev):
             stdev = mi.Unknown()
         else:
             stdev = mi.Duration(stdev)
 
-        count = self._analysis.count(period_data)
-        if count == 0:
+        if latencies.count == 0:
             avg = mi.Duration(0)
-        else:
-            avg = mi.Duration(period_data.total_latency / count)
-
-        if period_data.min_latency is None:
             min = mi.Duration(0)
-        else:
-            min = mi.Duration(period_data.min_latency)
-
-        if period_data.max_latency is None:
             max = mi.Duration(0)
         else:
-            max = mi.Duration(period_data.max_latency)
+            avg = mi.Duration(latencies.mean)
+            min = mi.Duration(latencies.min)
+            max = mi.Duration(latencies.max)
 
         stats_table.append_row(
-            count=mi.Number(self._analysis.count(period_data)),
+            count=mi.Number(latencies.count),
             min_latency=min,
             avg_latency=avg,
             max_latency=max,
             stdev_latency=stdev,
+            **self._get_percentile_row_values(period_data.latency_histogram,
+                                              'latency')
         )
 
         return stats_table
@@ -422,10 +327,10 @@ class SchedAnalysisCommand(Command):
                                 key=lambda proc: proc.comm.lower())
 
         for tid_stats in tid_stats_list:
-            if not tid_stats.sched_list:
+            if tid_stats.count == 0:
                 continue
 
-            stdev = self._compute_sched_latency_stdev(tid_stats.sched_list)
+            stdev = tid_stats.latencies.stdev
             if math.isnan(stdev):
                 stdev = mi.Unknown()
             else:
@@ -442,6 +347,8 @@ class SchedAnalysisCommand(Command):
                 max_latency=mi.Duration(tid_stats.max_latency),
                 stdev_latency=stdev,
                 prio_list=mi.String(prio_list),
+                **self._get_percentile_row_values(tid_stats.histogram,
+                                                  'latency')
             )
 
         return stats_table
@@ -451,29 +358,24 @@ class SchedAnalysisCommand(Command):
             self._mi_create_result_table(self._MI_TABLE_CLASS_PER_PRIO_STATS,
                                          begin_ns, end_ns)
 
-        _, prio_stats = self._get_prio_sched_lists_stats(period_data)
-
-        for prio in sorted(prio_stats):
-            stats = prio_stats[prio]
-            stdev = stats.stdev
+        for prio in sorted(period_data.prio_latencies):
+            latencies = period_data.prio_latencies[prio]
+            stdev = latencies.stdev
 
             if math.isnan(stdev):
                 stdev = mi.Unknown()
             else:
                 stdev = mi.Duration(stdev)
 
-            count = stats.count
-            min_latency = stats.min
-            max_latency = stats.max
-            total_latency = stats.total
-
             stats_table.append_row(
                 prio=mi.Number(prio),
-                count=mi.Number(count),
-                min_latency=mi.Duration(min_latency),
-                avg_latency=mi.Duration(total_latency / count),
-                max_latency=mi.Duration(max_latency),
+                count=mi.Number(latencies.count),
+                min_latency=mi.Duration(latencies.min),
+                avg_latency=mi.Duration(latencies.mean),
+                max_latency=mi.Duration(latencies.max),
                 stdev_latency=stdev,
+                **self._get_percentile_row_values(
+                    period_data.prio_histograms[prio], 'latency')
             )
 
         return stats_table
@@ -552,7 +454,7 @@ class SchedAnalysisCommand(Command):
 
         return result_table
 
-    def _fill_freq_result_table(self, sched_list, stats, min_duration,
+    def _fill_freq_result_table(self, histogram, min_duration,
                                 max_duration, step, freq_table):
         # The number of bins for the histogram
         resolution = self._args.freq_resolution
@@ -561,12 +463,12 @@ class SchedAnalysisCommand(Command):
             if self._args.min is not None:
                 min_duration = self._args.min
             else:
-                min_duration = stats.min
+                min_duration = histogram.min
 
             if self._args.max is not None:
                 max_duration = self._args.max
             else:
-                max_duration = stats.max
+                max_duration = histogram.max
 
             # ns to µs
             if min_duration is None:
@@ -584,26 +486,8 @@ class SchedAnalysisCommand(Command):
         if step == 0:
             return
 
-        buckets = []
-        counts = []
-
-        for i in range(resolution):
-            buckets.append(i * step)
-            counts.append(0)
-
-        for sched_event in sched_list:
-            duration = sched_event.latency / 1000
-            index = int((duration - min_duration) / step)
-
-            if index >= resolution:
-                # special case for max value: put in last bucket (includes
-                # its upper bound)
-                if duration == max_duration:
-                    counts[index - 1] += 1
-
-                continue
-
-            counts[index] += 1
+        counts = histogram.get_freq_counts(min_duration, max_duration,
+                                           resolution, 1000)
 
         for index, count in enumerate(counts):
             lower_bound = index * step + min_duration
@@ -614,100 +498,48 @@ class SchedAnalysisCommand(Command):
                 count=mi.Number(count),
             )
 
-    def _get_total_freq_result_tables(self, period_data, begin_ns, end_ns):
-        freq_tables = []
-        sched_lists, sched_stats = self._get_total_sched_lists_stats(
-            period_data)
-        min_duration = None
-        max_duration = None
-        step = None
-
-        if self._args.freq_uniform:
-            latencies = []
-
-            for sched_list in sched_lists:
-                latencies += [sched.latency for sched in sched_list]
-
-            min_duration, max_duration, step = \
-                self._find_uniform_freq_values(latencies)
-
-        for sched_list in sched_lists:
-            freq_table = \
-                self._mi_create_result_table(self._MI_TABLE_CLASS_FREQ,
-                                             begin_ns, end_ns)
-            self._fill_freq_result_table(sched_list, sched_stats, min_duration,
-                                         max_duration, step, freq_table)
-            freq_tables.append(freq_table)
-
-        return freq_tables
-
-    def _get_per_tid_freq_result_tables(self, period_data, begin_ns, end_ns):
+    # Fills one frequency table per (subtitle, histogram) pair
+    def _get_freq_result_tables(self, histograms, begin_ns, end_ns):
         freq_tables = []
-        tid_sched_lists, tid_stats = self._get_tid_sched_lists_stats(
-            period_data)
         min_duration = None
         max_duration = None
         step = None
 
         if self._args.freq_uniform:
-            latencies = []
-
-            for sched_list in tid_sched_lists.values():
-                latencies += [sched.latency for sched in sched_list]
-
             min_duration, max_duration, step = \
-                self._find_uniform_freq_values(latencies)
+                self._find_uniform_freq_histogram_values(
+                    [histogram for _, histogram in histograms])
 
-        for tid in sorted(tid_sched_lists):
-            sched_list = tid_sched_lists[tid]
-            stats = tid_stats[tid]
-            subtitle = 'TID: {}'.format(tid)
+        for subtitle, histogram in histograms:
             freq_table = \
                 self._mi_create_result_table(self._MI_TABLE_CLASS_FREQ,
                                              begin_ns, end_ns, subtitle)
-            self._fill_freq_result_table(sched_list, stats, min_duration,
+            self._fill_freq_result_table(histogram, min_duration,
                                          max_duration, step, freq_table)
             freq_tables.append(freq_table)
 
         return freq_tables
 
-    def _get_per_prio_freq_result_tables(self, period_data, begin_ns, end_ns):
-        freq_tables = []
-        prio_sched_lists, prio_stats = self._get_prio_sched_lists_stats(
-            period_data)
-        min_duration = None
-        max_duration = None
-        step = None
-
-        if self._args.freq_uniform:
-            latencies = []
-
-            for sched_list in prio_sched_lists.values():
-                latencies += [sched.latency for sched in sched_list]
+    def _get_total_freq_result_tables(self, period_data, begin_ns, end_ns):
+        return self._get_freq_result_tables(
+            [(None, period_data.latency_histogram)], begin_ns, end_ns)
 
-            min_duration, max_duration, step = \
-                self._find_uniform_freq_values(latencies)
+    def _get_per_tid_freq_result_tables(self, period_data, begin_ns, end_ns):
+        histograms = [
+            ('TID: {}'.format(tid), period_data.tids[tid].histogram)
+            for tid in sorted(period_data.tids)
+            if period_data.tids[tid].count > 0
+        ]
 
-        for prio in sorted(prio_sched_lists):
-            sched_list = prio_sched_lists[prio]
-            stats = prio_stats[prio]
-            subtitle = 'Priority: {}'.format(prio)
-            freq_table = \
-                self._mi_create_result_table(self._MI_TABLE_CLASS_FREQ,
-                                             begin_ns, end_ns, subtitle)
-            self._fill_freq_result_table(sched_list, stats, min_duration,
-                                         max_duration, step, freq_table)
-            freq_tables.append(freq_table)
+        return self._get_freq_result_tables(histograms, begin_ns, end_ns)
 
-        return freq_tables
+    def _get_per_prio_freq_result_tables(self, period_data, begin_ns, end_ns):
+        histograms = [
+            ('Priority: {}'.format(prio), period_data.prio_histograms[prio])
+            for prio in sorted(period_data.prio_histograms)
+        ]
 
-    def _compute_sched_latency_stdev(self, sched_events):
-        sched_latencies = []
-        for sched_event in sched_events:
-            sched_latencies.append(sched_event.latency)
-        if len(sched_latencies) < 2:
-            return float('nan')
-        return statistics.stdev(sched_latencies)
+        return self._get_freq_result_tables(histograms, begin_ns, end_ns)
 
     def _print_sched_events(self, result_table):
         fmt = '[{:<18}, {:<18}] {:>15} {:>10}  {:>3}   {:<25}  {:<25}'
@@ -737,9 +569,10 @@ class SchedAnalysisCommand(Command):
                              target_cpu, wakee_str, waker_str))
 
     def _print_total_stats(self, stats_table):
-        row_format = '{:<12} {:<12} {:<12} {:<12} {:<12}'
+        row_format = '{:<12} {:<12} {:<12} {:<12} {:<12} {:<12} {:<12} ' \
+                     '{:<12} {:<12}'
         header = row_format.format(
-            'Count', 'Min', 'Avg', 'Max', 'Stdev'
+            'Count', 'Min', 'Avg', 'Max', 'Stdev', *self._percentile_titles
         )
 
         if stats_table.rows:
@@ -758,14 +591,17 @@ class SchedAnalysisCommand(Command):
                     '%0.03f' % row.avg_latency.to_us(),
                     '%0.03f' % row.max_latency.to_us(),
                     '%s' % stdev_str,
+                    *self._get_percentile_strs(row, 'latency'),
                 )
 
                 print(row_str)
 
     def _print_per_tid_stats(self, stats_table):
-        row_format = '{:<25} {:>8}  {:>12}  {:>12}  {:>12}  {:>12}   {}'
+        row_format = '{:<25} {:>8}  {:>12}  {:>12}  {:>12}  {:>12}  ' \
+                     '{:>12}  {:>12}  {:>12}  {:>12}   {}'
         header = row_format.format(
-            'Process', 'Count', 'Min', 'Avg', 'Max', 'Stdev', 'Priorities'
+            'Process', 'Count', 'Min', 'Avg', 'Max', 'Stdev',
+            *self._percentile_titles, 'Priorities'
         )
 
         if stats_table.rows:
@@ -788,15 +624,18 @@ class SchedAnalysisCommand(Command):
                     '%0.03f' % row.avg_latency.to_us(),
                     '%0.03f' % row.max_latency.to_us(),
                     '%s' % stdev_str,
+                    *self._get_percentile_strs(row, 'latency'),
                     '%s' % row.prio_list.value,
                 )
 
                 print(row_str)
 
     def _print_per_prio_stats(self, stats_table):
-        row_format = '{:>4} {:>8}  {:>12}  {:>12}  {:>12}  {:>12}'
+        row_format = '{:>4} {:>8}  {:>12}  {:>12}  {:>12}  {:>12}  ' \
+                     '{:>12}  {:>12}  {:>12}  {:>12}'
         header = row_format.format(
-            'Prio', 'Count', 'Min', 'Avg', 'Max', 'Stdev'
+            'Prio', 'Count', 'Min', 'Avg', 'Max', 'Stdev',
+            *self._percentile_titles
         )
 
         if stats_table.rows:
@@ -816,6 +655,7 @@ class SchedAnalysisCommand(Command):
                     '%0.03f' % row.avg_latency.to_us(),
                     '%0.03f' % row.max_latency.to_us(),
                     '%s' % stdev_str,
+                    *self._get_percentile_strs(row, 'latency'),
                 )
 
                 print(row_str)
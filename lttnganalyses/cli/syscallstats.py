@@ -22,9 +22,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import errno
 import operator
-import statistics
 from . import mi
 from ..core import syscalls
 from .command import Command
@@ -50,6 +48,8 @@ class SyscallsAnalysis(Command):
                 ('max_duration', 'Maximum call duration', mi.Duration),
                 ('stdev_duration', 'Call duration standard deviation',
                  mi.Duration),
+                *Command._get_percentile_column_infos(
+                    'duration', 'Call duration percentile'),
                 ('return_values', 'Return values count', mi.String),
             ]
         ),
@@ -140,27 +140,8 @@ class SyscallsAnalysis(Command):
             for syscall in sorted(proc_stats.syscalls.values(),
                                   key=operator.attrgetter('count'),
                                   reverse=True):
-                durations = []
-                return_count = {}
-
-                for syscall_event in syscall.syscalls_list:
-                    durations.append(syscall_event.duration)
-
-                    if syscall_event.ret >= 0:
-                        return_key = 'success'
-                    else:
-                        try:
-                            return_key = errno.errorcode[-syscall_event.ret]
-                        except KeyError:
-                            return_key = str(syscall_event.ret)
-
-                    if return_key not in return_count:
-                        return_count[return_key] = 1
-
-                    return_count[return_key] += 1
-
-                if len(durations) > 2:
-                    stdev = mi.Duration(statistics.stdev(durations))
+                if syscall.count > 2:
+                    stdev = mi.Duration(syscall.durations.stdev)
                 else:
                     stdev = mi.Unknown()
 
@@ -172,7 +153,9 @@ class SyscallsAnalysis(Command):
                                              syscall.count),
                     max_duration=mi.Duration(syscall.max_duration),
                     stdev_duration=stdev,
-                    return_values=mi.String(str(return_count)),
+                    return_values=mi.String(str(syscall.return_count)),
+                    **self._get_percentile_row_values(syscall.histogram,
+                                                      'duration')
                 )
 
             per_tid_tables.append(result_table)
@@ -185,7 +168,8 @@ class SyscallsAnalysis(Command):
         return total_table, per_tid_tables
 
     def _print_results(self, total_table, per_tid_tables):
-        line_format = '{:<38} {:>14} {:>14} {:>14} {:>12} {:>10}  {:<14}'
+        line_format = '{:<38} {:>14} {:>14} {:>14} {:>12} {:>10} ' \
+                      '{:>12} {:>12} {:>12} {:>12}  {:<14}'
 
         print('Per-TID syscalls statistics (usec)')
         total_calls = 0
@@ -193,7 +177,8 @@ class SyscallsAnalysis(Command):
         for total_row, table in zip(total_table.rows, per_tid_tables):
             print(line_format.format(table.subtitle,
                                      'Count', 'Min', 'Average', 'Max',
-                                     'Stdev', 'Return values'))
+                                     'Stdev', *self._percentile_titles,
+                                     'Return values'))
             for row in table.rows:
                 syscall_name = row.syscall.name
                 syscall_count = row.count.value
@@ -210,11 +195,12 @@ class SyscallsAnalysis(Command):
                 print(line_format.format(
                     ' - ' + syscall_name, syscall_count, min_duration,
                     avg_duration, max_duration, stdev,
+                    *self._get_percentile_strs(row, 'duration'),
                     row.return_values.value))
 
             print(line_format.format('Total:', proc_total_calls,
-                                     '', '', '', '', ''))
-            print('-' * 113)
+                                     '', '', '', '', '', '', '', '', ''))
+            print('-' * 165)
             total_calls += proc_total_calls
 
         print('\nTotal syscalls: %d' % (total_calls))
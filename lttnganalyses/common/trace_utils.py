@@ -185,6 +185,33 @@ def check_field_exists(handles, ev_name, field_name):
     return False
 
 
+def get_event_fields(handles):
+    """Get the fields of all the events declared in the metadata.
+
+    Args:
+        handles (TraceHandle): an array of babeltrace TraceHandle instance.
+
+    Returns:
+        A dict mapping each event name to the list of its distinct
+        declarations in the traces of `handles`. A declaration is a
+        list of (field name, CTF scope) tuples, in the order in which
+        babeltrace searches the scopes for a field read without a
+        scope.
+    """
+    event_fields = {}
+    for handle in handles.values():
+        for event in handle.events:
+            fields = []
+            for field in event.fields:
+                field_tuple = (field.name, field.scope)
+                if field_tuple not in fields:
+                    fields.append(field_tuple)
+            declarations = event_fields.setdefault(event.name, [])
+            if fields not in declarations:
+                declarations.append(fields)
+    return event_fields
+
+
 def check_event_exists(handles, name):
     """Validate that an event exists in the metadata.
 
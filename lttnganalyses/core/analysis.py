@@ -21,6 +21,7 @@
 # SOFTWARE.
 
 from . import period as core_period
+from ..linuxautomaton import notification
 import enum
 
 
@@ -34,6 +35,20 @@ class AnalysisConfig:
         self.proc_list = None
         self.tid_list = None
         self.cpu_list = None
+        self.checkpoint_interval = None
+        # When True, analyses only keep streaming aggregates (count,
+        # min, max, mean, stdev) instead of every individual sample
+        self.summary_only = False
+        # Number of samples kept by the online top-K heaps of the
+        # analyses, None when no top is requested
+        self.top_limit = None
+        # Predicate a sample must satisfy to enter the top-K heaps,
+        # None to accept all of them
+        self.top_filter = None
+        # When True, the callbacks of the counter notifications of the
+        # analyses (see Analysis._COUNTER_NOTIFICATIONS) run once on a
+        # shared accumulator instead of once per open period
+        self.counter_snapshots = False
         self.period_def_registry = core_period.PeriodDefinitionRegistry()
 
 
@@ -53,10 +68,66 @@ class AnalysisCallbackType(enum.Enum):
 
 
 class Analysis:
+    # State notification callbacks receive a payload object from the
+    # notification module: fn(period_data, payload). Analyses written
+    # for the previous interface, fn(period_data, **kwargs), leave
+    # this to False and get their callbacks wrapped.
+    _PAYLOAD_NOTIFICATIONS = False
+
+    # Names of the state notifications the analysis consumes: only the
+    # state providers sending them are run. None runs all of them.
+    STATE_NOTIFICATIONS = None
+
+    # Names of the state notifications whose callbacks only add to
+    # counters of the period data object. With conf.counter_snapshots,
+    # those callbacks run on a single accumulator (a period data object
+    # not associated to any period), and each period gets the
+    # difference between the accumulator's counters when it ends and
+    # when it began.
+    #
+    # The snapshots are lazy: the callbacks call _save_counter() before
+    # updating a counter, which logs its old value the first time it
+    # changes after the beginning of the latest period. When a period
+    # ends, only the counters logged since it began changed during it
+    # (see _take_counter_snapshot() and _apply_counter_snapshot()).
+    _COUNTER_NOTIFICATIONS = frozenset()
+
     def __init__(self, state, conf, state_cbs):
         self._state = state
         self._conf = conf
+
+        if self.STATE_NOTIFICATIONS is not None:
+            for name in state_cbs:
+                if name not in self.STATE_NOTIFICATIONS:
+                    raise ValueError(
+                        'Undeclared state notification "{}"'.format(name))
+
+        if not self._PAYLOAD_NOTIFICATIONS:
+            state_cbs = {name: notification.kwargs_cb(fn)
+                         for name, fn in state_cbs.items()}
+
+        self._counter_cbs = {}
+
+        if conf.counter_snapshots:
+            self._counter_cbs = {name: fn for name, fn in state_cbs.items()
+                                 if name in self._COUNTER_NOTIFICATIONS}
+            state_cbs = {name: fn for name, fn in state_cbs.items()
+                         if name not in self._counter_cbs}
+
         self._state_cbs = state_cbs
+        # Shared accumulator of the counter notifications, created with
+        # the first period
+        self._counters = None
+        # Incremented when a period begins
+        self._counter_epoch = 0
+        # Epoch of the latest logged snapshot of each counter, by key
+        self._counter_epochs = {}
+        # (counter key, snapshot) log, starting at index
+        # _counter_log_base, and start index of each period data object
+        # in that log
+        self._counter_log = []
+        self._counter_log_base = 0
+        self._counter_log_starts = {}
         self._period_key = None
         self._first_event_ts = None
         self._last_event_ts = None
@@ -144,6 +215,60 @@ class Analysis:
                        begin_captures, end_captures):
         pass
 
+    # Returns a snapshot of the counter `key` of the accumulator
+    # `counters`, which might not exist yet. This must be implemented
+    # by a specific analysis declaring counter notifications.
+    def _take_counter_snapshot(self, counters, key):
+        raise NotImplementedError()
+
+    # Adds to `period_data` the difference between the counter `key` of
+    # the accumulator `counters` and its snapshot `snapshot`. This must
+    # be implemented by a specific analysis declaring counter
+    # notifications.
+    def _apply_counter_snapshot(self, period_data, counters, key, snapshot):
+        raise NotImplementedError()
+
+    # Called by the callbacks of the counter notifications before they
+    # update the counter `key` of `period_data`
+    def _save_counter(self, period_data, key):
+        if period_data is not self._counters or \
+                not self._counter_log_starts:
+            return
+
+        if self._counter_epochs.get(key) == self._counter_epoch:
+            # already logged since the latest period began
+            return
+
+        self._counter_epochs[key] = self._counter_epoch
+        self._counter_log.append(
+            (key, self._take_counter_snapshot(period_data, key)))
+
+    def _apply_counter_log(self, period_data):
+        start = self._counter_log_starts.pop(period_data) - \
+            self._counter_log_base
+        applied_keys = set()
+
+        # the first snapshot of a counter logged since the period began
+        # is its value when the period began
+        for key, snapshot in self._counter_log[start:]:
+            if key in applied_keys:
+                continue
+
+            applied_keys.add(key)
+            self._apply_counter_snapshot(period_data, self._counters, key,
+                                         snapshot)
+
+        # drop the part of the log no open period needs
+        if not self._counter_log_starts:
+            self._counter_log_base += len(self._counter_log)
+            self._counter_log = []
+            return
+
+        oldest_start = min(self._counter_log_starts.values())
+        if oldest_start > self._counter_log_base:
+            del self._counter_log[:oldest_start - self._counter_log_base]
+            self._counter_log_base = oldest_start
+
     # This is called back by the period engine when a new period is
     # created. `period` is the created period, and `evt` is the event
     # that triggered the beginning of this period (the original event,
@@ -159,6 +284,16 @@ class Analysis:
         # register state notification callbacks with this period data object
         self._state.register_notification_cbs(period_data, self._state_cbs)
 
+        if self._counter_cbs:
+            if self._counters is None:
+                self._counters = self._create_period_data()
+                self._state.register_notification_cbs(self._counters,
+                                                      self._counter_cbs)
+
+            self._counter_epoch += 1
+            self._counter_log_starts[period_data] = \
+                self._counter_log_base + len(self._counter_log)
+
         # call specific analysis's beginning of period callback
         self._begin_period_cb(period_data)
 
@@ -173,6 +308,9 @@ class Analysis:
         # get the period data object associated with this period object
         period_data = self._get_period_data(period)
 
+        if self._counter_cbs:
+            self._apply_counter_log(period_data)
+
         # call specific analysis's end of period callback
         self._end_period_cb(period_data, period.completed,
                             period.begin_captures, period.end_captures)
@@ -33,6 +33,12 @@ class _PeriodData(PeriodData):
 
 
 class Cputop(Analysis):
+    STATE_NOTIFICATIONS = frozenset([
+        'sched_migrate_task', 'sched_switch_per_cpu',
+        'sched_switch_per_tid', 'prio_changed'])
+
+    _PAYLOAD_NOTIFICATIONS = True
+
     def __init__(self, state, conf):
         notification_cbs = {
             'sched_migrate_task': self._process_sched_migrate_task,
@@ -84,10 +90,10 @@ class Cputop(Analysis):
 
             proc.compute_stats(duration)
 
-    def _process_sched_switch_per_cpu(self, period_data, **kwargs):
-        timestamp = kwargs['timestamp']
-        cpu_id = kwargs['cpu_id']
-        wakee_proc = kwargs['wakee_proc']
+    def _process_sched_switch_per_cpu(self, period_data, payload):
+        timestamp = payload.timestamp
+        cpu_id = payload.cpu_id
+        wakee_proc = payload.wakee_proc
 
         if not self._filter_cpu(cpu_id):
             return
@@ -106,14 +112,14 @@ class Cputop(Analysis):
         else:
             cpu.current_task_start_ts = timestamp
 
-    def _process_sched_switch_per_tid(self, period_data, **kwargs):
-        cpu_id = kwargs['cpu_id']
-        wakee_proc = kwargs['wakee_proc']
-        timestamp = kwargs['timestamp']
-        prev_tid = kwargs['prev_tid']
-        next_tid = kwargs['next_tid']
-        next_comm = kwargs['next_comm']
-        prev_comm = kwargs['prev_comm']
+    def _process_sched_switch_per_tid(self, period_data, payload):
+        cpu_id = payload.cpu_id
+        wakee_proc = payload.wakee_proc
+        timestamp = payload.timestamp
+        prev_tid = payload.prev_tid
+        next_tid = payload.next_tid
+        next_comm = payload.next_comm
+        prev_comm = payload.prev_comm
 
         if not self._filter_cpu(cpu_id):
             return
@@ -144,9 +150,9 @@ class Cputop(Analysis):
         next_proc = period_data.tids[next_tid]
         next_proc.last_sched_ts = timestamp
 
-    def _process_sched_migrate_task(self, period_data, **kwargs):
-        cpu_id = kwargs['cpu_id']
-        proc = kwargs['proc']
+    def _process_sched_migrate_task(self, period_data, payload):
+        cpu_id = payload.cpu_id
+        proc = payload.proc
         tid = proc.tid
 
         if not self._filter_process(proc):
@@ -159,10 +165,10 @@ class Cputop(Analysis):
 
         period_data.tids[tid].migrate_count += 1
 
-    def _process_prio_changed(self, period_data, **kwargs):
-        timestamp = kwargs['timestamp']
-        prio = kwargs['prio']
-        tid = kwargs['tid']
+    def _process_prio_changed(self, period_data, payload):
+        timestamp = payload.timestamp
+        prio = payload.prio
+        tid = payload.tid
 
         if tid not in period_data.tids:
             return
@@ -37,23 +37,42 @@ _CTF_SCOPES = (
 # This class has an interface which is compatible with the
 # babeltrace.reader.Event class. This is the result of a deep copy
 # performed by LTTng analyses.
+#
+# If `fields` is set, only the fields it contains are copied: it's an
+# iterable of (field name, CTF scope) pairs, where a None scope means
+# the field is copied from any scope it's found in.
 class Event(collections.Mapping):
-    def __init__(self, bt_ev):
-        self._copy_bt_event(bt_ev)
+    def __init__(self, bt_ev, fields=None):
+        self._copy_bt_event(bt_ev, fields)
 
-    def _copy_bt_event(self, bt_ev):
+    def _copy_bt_event(self, bt_ev, fields):
         self._name = bt_ev.name
         self._cycles = bt_ev.cycles
         self._timestamp = bt_ev.timestamp
-        self._fields = {}
+        self._fields = {scope: {} for scope in _CTF_SCOPES}
 
-        for scope in _CTF_SCOPES:
-            self._fields[scope] = {}
+        if fields is not None:
+            self._copy_bt_event_fields(bt_ev, fields)
+            return
 
+        for scope in _CTF_SCOPES:
             for field_name in bt_ev.field_list_with_scope(scope):
                 field_value = bt_ev.field_with_scope(field_name, scope)
                 self._fields[scope][field_name] = field_value
 
+    def _copy_bt_event_fields(self, bt_ev, fields):
+        for field_name, field_scope in fields:
+            scopes = _CTF_SCOPES
+
+            if field_scope is not None:
+                scopes = (field_scope,)
+
+            for scope in scopes:
+                field_value = bt_ev.field_with_scope(field_name, scope)
+
+                if field_value is not None:
+                    self._fields[scope][field_name] = field_value
+
     @property
     def name(self):
         return self._name
@@ -20,19 +20,45 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import operator
 from . import stats
 from .analysis import Analysis, PeriodData
 from ..linuxautomaton import sv
 
 
 class _PeriodData(PeriodData):
-    def __init__(self):
+    # Operations of the syscall I/O requests kept in top-K heaps and
+    # latency statistics
+    TOP_OPERATIONS = [sv.IORequest.OP_OPEN, sv.IORequest.OP_READ,
+                      sv.IORequest.OP_WRITE, sv.IORequest.OP_SYNC]
+
+    def __init__(self, top_limit=None):
         self.disks = {}
         self.ifaces = {}
         self.tids = {}
+        # Latencies of the syscall I/O requests, indexed by operation
+        self.latency_stats = {}
+        for operation in self.TOP_OPERATIONS:
+            self.latency_stats[operation] = LatencyStats()
+        # Syscall I/O requests with the highest durations, indexed by
+        # operation, empty when no top is requested
+        self.top_requests = {}
+        if top_limit is not None:
+            for operation in self.TOP_OPERATIONS:
+                self.top_requests[operation] = stats.TopK(
+                    top_limit, operator.attrgetter('duration'))
 
 
 class IoAnalysis(Analysis):
+    STATE_NOTIFICATIONS = frozenset([
+        'net_dev_xmit', 'netif_receive_skb', 'block_rq_complete',
+        'io_rq_exit', 'create_fd', 'fd_table_inherited', 'close_fd',
+        'update_fd', 'statedump_bulk', 'lttng_statedump_block_device'])
+
+    _PAYLOAD_NOTIFICATIONS = True
+
+    _COUNTER_NOTIFICATIONS = frozenset(['net_dev_xmit', 'netif_receive_skb'])
+
     def __init__(self, state, conf):
         notification_cbs = {
             'net_dev_xmit': self._process_net_dev_xmit,
@@ -40,9 +66,10 @@ class IoAnalysis(Analysis):
             'block_rq_complete': self._process_block_rq_complete,
             'io_rq_exit': self._process_io_rq_exit,
             'create_fd': self._process_create_fd,
+            'fd_table_inherited': self._process_fd_table_inherited,
             'close_fd': self._process_close_fd,
             'update_fd': self._process_update_fd,
-            'create_parent_proc': self._process_create_parent_proc,
+            'statedump_bulk': self._process_statedump_bulk,
             'lttng_statedump_block_device': self._process_statedump_block
         }
 
@@ -50,12 +77,51 @@ class IoAnalysis(Analysis):
         if conf.cpu_list is not None:
             print('Warning: cpu filter not enabled on I/O analysis')
 
+        # fn(io_rq) returning whether to account an I/O request in the
+        # latency statistics, None to account all of them
+        self._rq_filter = None
+
     def process_event(self, ev):
         super().process_event(ev)
         self._process_event_cb(ev)
 
     def _create_period_data(self):
-        return _PeriodData()
+        return _PeriodData(self._conf.top_limit)
+
+    @property
+    def rq_filter(self):
+        return self._rq_filter
+
+    @rq_filter.setter
+    def rq_filter(self, rq_filter):
+        self._rq_filter = rq_filter
+
+    def _filter_rq(self, io_rq):
+        return self._rq_filter is None or self._rq_filter(io_rq)
+
+    def _take_counter_snapshot(self, counters, name):
+        iface = counters.ifaces.get(name)
+        if iface is None:
+            return 0, 0, 0, 0
+
+        return (iface.recv_bytes, iface.recv_packets, iface.sent_bytes,
+                iface.sent_packets)
+
+    def _apply_counter_snapshot(self, period_data, counters, name, snapshot):
+        iface = counters.ifaces[name]
+        recv_bytes, recv_packets, sent_bytes, sent_packets = snapshot
+        recv_packets = iface.recv_packets - recv_packets
+        sent_packets = iface.sent_packets - sent_packets
+
+        if recv_packets == 0 and sent_packets == 0:
+            return
+
+        period_iface = IfaceStats(name)
+        period_iface.recv_bytes = iface.recv_bytes - recv_bytes
+        period_iface.recv_packets = recv_packets
+        period_iface.sent_bytes = iface.sent_bytes - sent_bytes
+        period_iface.sent_packets = sent_packets
+        period_data.ifaces[name] = period_iface
 
     @property
     def disk_io_requests(self, period_data):
@@ -101,6 +167,9 @@ class IoAnalysis(Analysis):
                                                         io_rq.operation):
                     yield io_rq
 
+    def top_io_requests(self, period_data, io_operation):
+        return period_data.top_requests[io_operation].items
+
     def get_files_stats(self, period_data):
         files_stats = {}
 
@@ -135,47 +204,53 @@ class IoAnalysis(Analysis):
             for fd in toremove:
                 del proc.fds[fd]
 
-    def _process_net_dev_xmit(self, period_data, **kwargs):
-        name = kwargs['iface_name']
-        sent_bytes = kwargs['sent_bytes']
+    def _process_net_dev_xmit(self, period_data, payload):
+        name = payload.iface_name
+        sent_bytes = payload.sent_bytes
 
+        self._save_counter(period_data, name)
         if name not in period_data.ifaces:
             period_data.ifaces[name] = IfaceStats(name)
 
         period_data.ifaces[name].sent_packets += 1
         period_data.ifaces[name].sent_bytes += sent_bytes
 
-    def _process_netif_receive_skb(self, period_data, **kwargs):
-        name = kwargs['iface_name']
-        recv_bytes = kwargs['recv_bytes']
+    def _process_netif_receive_skb(self, period_data, payload):
+        name = payload.iface_name
+        recv_bytes = payload.recv_bytes
 
+        self._save_counter(period_data, name)
         if name not in period_data.ifaces:
             period_data.ifaces[name] = IfaceStats(name)
 
         period_data.ifaces[name].recv_packets += 1
         period_data.ifaces[name].recv_bytes += recv_bytes
 
-    def _process_block_rq_complete(self, period_data, **kwargs):
-        req = kwargs['req']
-        proc = kwargs['proc']
-        disk = kwargs['disk']
+    def _process_block_rq_complete(self, period_data, payload):
+        req = payload.req
+        proc = payload.proc
+        disk = payload.disk
 
         if disk.dev not in period_data.disks:
             period_data.disks[disk.dev] = DiskStats.new_from_disk(disk)
 
-        period_data.disks[disk.dev].update_stats(req)
+        keep_rq = not self._conf.summary_only
+        disk_stats = period_data.disks[disk.dev]
+        disk_stats.update_stats(req, keep_rq)
+        if self._filter_rq(req):
+            disk_stats.latency_stats.update_stats(req)
 
         if proc is not None:
             if proc.tid not in period_data.tids:
                 period_data.tids[proc.tid] = ProcessIOStats.new_from_process(
                     proc)
 
-            period_data.tids[proc.tid].update_block_stats(req)
+            period_data.tids[proc.tid].update_block_stats(req, keep_rq)
 
-    def _process_io_rq_exit(self, period_data, **kwargs):
-        proc = kwargs['proc']
-        parent_proc = kwargs['parent_proc']
-        io_rq = kwargs['io_rq']
+    def _process_io_rq_exit(self, period_data, payload):
+        proc = payload.proc
+        parent_proc = payload.parent_proc
+        io_rq = payload.io_rq
 
         if proc.tid not in period_data.tids:
             period_data.tids[proc.tid] = ProcessIOStats.new_from_process(proc)
@@ -202,8 +277,11 @@ class IoAnalysis(Analysis):
                 fd_types['fd_in'] = parent_stats.get_fd(io_rq.fd_in).fd_type
                 fd_types['fd_out'] = parent_stats.get_fd(io_rq.fd_out).fd_type
 
-        proc_stats.update_io_stats(io_rq, fd_types)
-        parent_stats.update_fd_stats(io_rq)
+        keep_rq = not self._conf.summary_only
+        proc_stats.update_io_stats(io_rq, fd_types, keep_rq)
+        parent_stats.update_fd_stats(io_rq, keep_rq)
+        self._update_top_requests(period_data, io_rq)
+        self._update_latency_stats(period_data, io_rq)
 
         # Check if the proc stats comm corresponds to the actual
         # process comm. It might be that it was missing so far.
@@ -212,10 +290,48 @@ class IoAnalysis(Analysis):
         if parent_stats.comm != parent_proc.comm:
             parent_stats.comm = parent_proc.comm
 
-    def _process_create_parent_proc(self, period_data, **kwargs):
-        proc = kwargs['proc']
-        parent_proc = kwargs['parent_proc']
+    def _update_top_requests(self, period_data, io_rq):
+        if not period_data.top_requests:
+            return
 
+        top_filter = self._conf.top_filter
+        if top_filter is not None and not top_filter(io_rq):
+            return
+
+        for operation, top_requests in period_data.top_requests.items():
+            if sv.IORequest.is_equivalent_operation(operation,
+                                                    io_rq.operation):
+                top_requests.add(io_rq)
+
+    def _update_latency_stats(self, period_data, io_rq):
+        if not self._filter_rq(io_rq):
+            return
+
+        for operation, latency_stats in period_data.latency_stats.items():
+            if sv.IORequest.is_equivalent_operation(operation,
+                                                    io_rq.operation):
+                latency_stats.update_stats(io_rq)
+
+    def _process_statedump_bulk(self, period_data, payload):
+        timestamp = payload.timestamp
+
+        for proc, parent_proc in payload.parent_procs:
+            self._create_parent_proc(period_data, proc, parent_proc)
+
+        for parent_proc, fds in payload.new_fds:
+            tid = parent_proc.tid
+            if tid not in period_data.tids:
+                period_data.tids[tid] = ProcessIOStats.new_from_process(
+                    parent_proc)
+
+            # the FDStats objects are only created for the FDs which
+            # get used
+            period_data.tids[tid].inherit_fds(fds, timestamp)
+
+        for parent_proc, fd in payload.updated_fds:
+            self._update_fd(period_data, parent_proc, fd, timestamp)
+
+    def _create_parent_proc(self, period_data, proc, parent_proc):
         if proc.tid not in period_data.tids:
             period_data.tids[proc.tid] = ProcessIOStats.new_from_process(proc)
 
@@ -229,35 +345,42 @@ class IoAnalysis(Analysis):
         proc_stats.pid = parent_stats.tid
         IoAnalysis._assign_fds_to_parent(proc_stats, parent_stats)
 
-    def _process_statedump_block(self, period_data, **kwargs):
-        dev = kwargs['dev']
-        diskname = kwargs['diskname']
+    def _process_statedump_block(self, period_data, payload):
+        dev = payload.dev
+        diskname = payload.diskname
         if dev not in period_data.disks:
             period_data.disks[dev] = DiskStats(dev, diskname)
         else:
             period_data.disks[dev].diskname = diskname
 
-    def _process_create_fd(self, period_data, **kwargs):
-        timestamp = kwargs['timestamp']
-        parent_proc = kwargs['parent_proc']
+    def _process_create_fd(self, period_data, payload):
+        timestamp = payload.timestamp
+        parent_proc = payload.parent_proc
         tid = parent_proc.tid
-        fd = kwargs['fd']
+        fd = payload.fd
 
         if tid not in period_data.tids:
             period_data.tids[tid] = ProcessIOStats.new_from_process(
                 parent_proc)
 
         parent_stats = period_data.tids[tid]
-        if fd not in parent_stats.fds:
-            parent_stats.fds[fd] = []
-        parent_stats.fds[fd].append(FDStats.new_from_fd(parent_proc.fds[fd],
-                                                        timestamp))
-
-    def _process_close_fd(self, period_data, **kwargs):
-        timestamp = kwargs['timestamp']
-        parent_proc = kwargs['parent_proc']
+        parent_stats.get_fd_list(fd).append(
+            FDStats.new_from_fd(parent_proc.fds[fd], timestamp))
+
+    def _process_fd_table_inherited(self, period_data, payload):
+        proc = payload.proc
+        tid = proc.tid
+
+        if tid not in period_data.tids:
+            period_data.tids[tid] = ProcessIOStats.new_from_process(proc)
+
+        period_data.tids[tid].inherit_fds(proc.fds, payload.timestamp)
+
+    def _process_close_fd(self, period_data, payload):
+        timestamp = payload.timestamp
+        parent_proc = payload.parent_proc
         tid = parent_proc.tid
-        fd = kwargs['fd']
+        fd = payload.fd
 
         if tid not in period_data.tids:
             return
@@ -267,22 +390,26 @@ class IoAnalysis(Analysis):
             return
         last_fd.close_ts = timestamp
 
-    def _process_update_fd(self, period_data, **kwargs):
-        timestamp = kwargs['timestamp']
-        parent_proc = kwargs['parent_proc']
+    def _process_update_fd(self, period_data, payload):
+        self._update_fd(period_data, payload.parent_proc, payload.fd,
+                        payload.timestamp)
+
+    def _update_fd(self, period_data, parent_proc, fd, timestamp):
         tid = parent_proc.tid
-        fd = kwargs['fd']
 
         if fd not in parent_proc.fds:
             return
 
-        if fd not in period_data.tids[tid].fds:
-            period_data.tids[tid].fds[fd] = []
-            period_data.tids[tid].fds[fd].append(
+        if tid not in period_data.tids:
+            period_data.tids[tid] = ProcessIOStats.new_from_process(
+                parent_proc)
+
+        fd_list = period_data.tids[tid].get_fd_list(fd)
+        if not fd_list:
+            fd_list.append(
                 FDStats.new_from_fd(parent_proc.fds[fd], timestamp))
 
         new_filename = parent_proc.fds[fd].filename
-        fd_list = period_data.tids[tid].fds[fd]
         fd_list[-1].filename = new_filename
 
 
@@ -299,33 +426,39 @@ class DiskStats():
 
         self.min_rq_duration = None
         self.max_rq_duration = None
+        self.rq_count = 0
         self.total_rq_sectors = 0
         self.total_rq_duration = 0
+        # Latencies of the requests accepted by the request filter of
+        # the analysis
+        self.latency_stats = LatencyStats()
+        # Individual requests, only kept when requested
         self.rq_list = []
 
     @classmethod
     def new_from_disk(cls, disk):
         return cls(disk.dev, disk.diskname)
 
-    @property
-    def rq_count(self):
-        return len(self.rq_list)
-
-    def update_stats(self, req):
+    def update_stats(self, req, keep_rq=False):
         if self.min_rq_duration is None or req.duration < self.min_rq_duration:
             self.min_rq_duration = req.duration
         if self.max_rq_duration is None or req.duration > self.max_rq_duration:
             self.max_rq_duration = req.duration
 
+        self.rq_count += 1
         self.total_rq_sectors += req.nr_sector
         self.total_rq_duration += req.duration
-        self.rq_list.append(req)
+
+        if keep_rq:
+            self.rq_list.append(req)
 
     def reset(self):
         self.min_rq_duration = None
         self.max_rq_duration = None
+        self.rq_count = 0
         self.total_rq_sectors = 0
         self.total_rq_duration = 0
+        self.latency_stats.reset()
         self.rq_list = []
 
     @staticmethod
@@ -337,6 +470,36 @@ class DiskStats():
         return '(%d,%d)' % (major, minor)
 
 
+class LatencyStats():
+    def __init__(self):
+        self.durations = stats.Summary()
+        self.histogram = stats.LogLinearHistogram()
+
+    @property
+    def count(self):
+        return self.durations.count
+
+    @property
+    def min_duration(self):
+        return self.durations.min
+
+    @property
+    def max_duration(self):
+        return self.durations.max
+
+    @property
+    def total_duration(self):
+        return self.durations.total
+
+    def update_stats(self, req):
+        self.durations.update(req.duration)
+        self.histogram.record(req.duration)
+
+    def reset(self):
+        self.durations.reset()
+        self.histogram.reset()
+
+
 class IfaceStats():
     def __init__(self, name):
         self.name = name
@@ -359,14 +522,59 @@ class ProcessIOStats(stats.Process):
         self.net_io = stats.IO()
         self.unk_io = stats.IO()
         self.block_io = stats.IO()
-        # FDStats objects, indexed by fd (fileno)
-        self.fds = {}
+        # Lists of FDStats objects, indexed by fd (fileno)
+        self._fds = {}
+        # FDs inherited on fork or listed by the statedump, their
+        # FDStats objects are only created when the fd is first used,
+        # see inherit_fds()
+        self._inherited_fds = None
+        self._inherited_ts = None
+        # Individual requests, only kept when requested
         self.rq_list = []
 
     @classmethod
     def new_from_process(cls, proc):
         return cls(proc.pid, proc.tid, proc.comm)
 
+    @property
+    def fds(self):
+        self._resolve_inherited_fds()
+
+        return self._fds
+
+    def inherit_fds(self, fd_table, timestamp):
+        self._resolve_inherited_fds()
+        # copy-on-write snapshot of the table at fork time
+        self._inherited_fds = fd_table.copy()
+        self._inherited_ts = timestamp
+
+    def _resolve_inherited_fd(self, fd):
+        inherited_fds = self._inherited_fds
+
+        if inherited_fds is None or fd not in inherited_fds:
+            return
+
+        fd_stats = FDStats.new_from_fd(inherited_fds[fd], self._inherited_ts)
+        del inherited_fds[fd]
+        self._fds.setdefault(fd, []).append(fd_stats)
+
+    def _resolve_inherited_fds(self):
+        if self._inherited_fds is None:
+            return
+
+        for fd, fd_obj in self._inherited_fds.items():
+            self._fds.setdefault(fd, []).append(
+                FDStats.new_from_fd(fd_obj, self._inherited_ts))
+
+        self._inherited_fds = None
+
+    # Chronological list of the FDStats objects of fd, created if
+    # needed
+    def get_fd_list(self, fd):
+        self._resolve_inherited_fd(fd)
+
+        return self._fds.setdefault(fd, [])
+
     # Total read/write does not account for block layer I/O
     @property
     def total_read(self):
@@ -376,31 +584,33 @@ class ProcessIOStats(stats.Process):
     def total_write(self):
         return self.disk_io.write + self.net_io.write + self.unk_io.write
 
-    def update_fd_stats(self, req):
+    def update_fd_stats(self, req, keep_rq=False):
         if req.errno is not None:
             return
 
         if req.fd is None or self.get_fd(req.fd) is None:
             return
 
-        self.get_fd(req.fd).update_stats(req)
+        self.get_fd(req.fd).update_stats(req, keep_rq)
         if isinstance(req, sv.ReadWriteIORequest):
             if req.fd_in is not None:
-                self.get_fd(req.fd_in).update_stats(req)
+                self.get_fd(req.fd_in).update_stats(req, keep_rq)
 
             if req.fd_out is not None:
-                self.get_fd(req.fd_out).update_stats(req)
+                self.get_fd(req.fd_out).update_stats(req, keep_rq)
 
-    def update_block_stats(self, req):
-        self.rq_list.append(req)
+    def update_block_stats(self, req, keep_rq=False):
+        if keep_rq:
+            self.rq_list.append(req)
 
         if req.operation is sv.IORequest.OP_READ:
             self.block_io.read += req.size
         elif req.operation is sv.IORequest.OP_WRITE:
             self.block_io.write += req.size
 
-    def update_io_stats(self, req, fd_types):
-        self.rq_list.append(req)
+    def update_io_stats(self, req, fd_types, keep_rq=False):
+        if keep_rq:
+            self.rq_list.append(req)
 
         if req.size is None or req.errno is not None:
             return
@@ -430,7 +640,7 @@ class ProcessIOStats(stats.Process):
             self.unk_io.write += size
 
     def _get_current_fd(self, fd):
-        fd_stats = self.fds[fd][-1]
+        fd_stats = self._fds[fd][-1]
         if fd_stats.close_ts is not None:
             return None
 
@@ -479,13 +689,15 @@ class ProcessIOStats(stats.Process):
                         fd_list[midpoint + 1:], timestamp)
 
     def get_fd(self, fd, timestamp=None):
-        if fd not in self.fds or not self.fds[fd]:
+        self._resolve_inherited_fd(fd)
+
+        if not self._fds.get(fd):
             return None
 
         if timestamp is None:
             fd_stats = self._get_current_fd(fd)
         else:
-            fd_stats = ProcessIOStats._get_fd_by_timestamp(self.fds[fd],
+            fd_stats = ProcessIOStats._get_fd_by_timestamp(self._fds[fd],
                                                            timestamp)
 
         return fd_stats
@@ -513,7 +725,7 @@ class FDStats():
         self.open_ts = open_ts
         self.close_ts = None
         self.io = stats.IO()
-        # IO Requests that acted upon the FD
+        # IO Requests that acted upon the FD, only kept when requested
         self.rq_list = []
 
     @classmethod
@@ -521,7 +733,7 @@ class FDStats():
         return cls(fd.fd, fd.filename, fd.fd_type, fd.cloexec, fd.family,
                    open_ts)
 
-    def update_stats(self, req):
+    def update_stats(self, req, keep_rq=False):
         if req.operation is sv.IORequest.OP_READ:
             self.io.read += req.returned_size
         elif req.operation is sv.IORequest.OP_WRITE:
@@ -532,7 +744,8 @@ class FDStats():
             elif self.fd == req.fd_out:
                 self.io.write += req.returned_size
 
-        self.rq_list.append(req)
+        if keep_rq:
+            self.rq_list.append(req)
 
     def reset(self):
         self.io.reset()
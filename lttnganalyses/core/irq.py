@@ -20,6 +20,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from . import stats
 from .analysis import Analysis, PeriodData
 
 
@@ -28,11 +29,16 @@ class _PeriodData(PeriodData):
         # Indexed by irq 'id' (irq or vec)
         self.hard_irq_stats = {}
         self.softirq_stats = {}
-        # Log of individual interrupts
+        # Log of individual interrupts, empty in summary-only mode
         self.irq_list = []
 
 
 class IrqAnalysis(Analysis):
+    STATE_NOTIFICATIONS = frozenset([
+        'irq_handler_entry', 'irq_handler_exit', 'softirq_exit'])
+
+    _PAYLOAD_NOTIFICATIONS = True
+
     def __init__(self, state, conf):
         notification_cbs = {
             'irq_handler_entry': self._process_irq_handler_entry,
@@ -44,16 +50,16 @@ class IrqAnalysis(Analysis):
     def _create_period_data(self):
         return _PeriodData()
 
-    def _process_irq_handler_entry(self, period_data, **kwargs):
-        id = kwargs['id']
-        name = kwargs['irq_name']
+    def _process_irq_handler_entry(self, period_data, payload):
+        id = payload.id
+        name = payload.irq_name
         if id not in period_data.hard_irq_stats:
             period_data.hard_irq_stats[id] = HardIrqStats(name)
         elif name not in period_data.hard_irq_stats[id].names:
             period_data.hard_irq_stats[id].names.append(name)
 
-    def _process_irq_handler_exit(self, period_data, **kwargs):
-        irq = kwargs['hard_irq']
+    def _process_irq_handler_exit(self, period_data, payload):
+        irq = payload.hard_irq
 
         if not self._filter_cpu(irq.cpu_id):
             return
@@ -65,14 +71,17 @@ class IrqAnalysis(Analysis):
            irq.duration > self._conf.max_duration:
             return
 
-        period_data.irq_list.append(irq)
         if irq.id not in period_data.hard_irq_stats:
             period_data.hard_irq_stats[irq.id] = HardIrqStats()
 
-        period_data.hard_irq_stats[irq.id].update_stats(irq)
+        keep_irq = not self._conf.summary_only
+        if keep_irq:
+            period_data.irq_list.append(irq)
+
+        period_data.hard_irq_stats[irq.id].update_stats(irq, keep_irq)
 
-    def _process_softirq_exit(self, period_data, **kwargs):
-        irq = kwargs['softirq']
+    def _process_softirq_exit(self, period_data, payload):
+        irq = payload.softirq
 
         if not self._filter_cpu(irq.cpu_id):
             return
@@ -84,20 +93,25 @@ class IrqAnalysis(Analysis):
            irq.duration > self._conf.max_duration:
             return
 
-        period_data.irq_list.append(irq)
         if irq.id not in period_data.softirq_stats:
             name = SoftIrqStats.names[irq.id]
             period_data.softirq_stats[irq.id] = SoftIrqStats(name)
 
-        period_data.softirq_stats[irq.id].update_stats(irq)
+        keep_irq = not self._conf.summary_only
+        if keep_irq:
+            # the state provider reuses the SoftIRQ object
+            irq = irq.copy()
+            period_data.irq_list.append(irq)
+
+        period_data.softirq_stats[irq.id].update_stats(irq, keep_irq)
 
 
 class IrqStats():
     def __init__(self, name):
         self._name = name
-        self.min_duration = None
-        self.max_duration = None
-        self.total_duration = 0
+        self.durations = stats.Summary()
+        self.histogram = stats.LogLinearHistogram()
+        # Individual interrupts, only kept when requested
         self.irq_list = []
 
     @property
@@ -106,22 +120,30 @@ class IrqStats():
 
     @property
     def count(self):
-        return len(self.irq_list)
+        return self.durations.count
+
+    @property
+    def min_duration(self):
+        return self.durations.min
 
-    def update_stats(self, irq):
-        if self.min_duration is None or irq.duration < self.min_duration:
-            self.min_duration = irq.duration
+    @property
+    def max_duration(self):
+        return self.durations.max
 
-        if self.max_duration is None or irq.duration > self.max_duration:
-            self.max_duration = irq.duration
+    @property
+    def total_duration(self):
+        return self.durations.total
 
-        self.total_duration += irq.duration
-        self.irq_list.append(irq)
+    def update_stats(self, irq, keep_irq=False):
+        self.durations.update(irq.duration)
+        self.histogram.record(irq.duration)
+
+        if keep_irq:
+            self.irq_list.append(irq)
 
     def reset(self):
-        self.min_duration = None
-        self.max_duration = None
-        self.total_duration = 0
+        self.durations.reset()
+        self.histogram.reset()
         self.irq_list = []
 
 
@@ -152,32 +174,32 @@ class SoftIrqStats(IrqStats):
 
     def __init__(self, name):
         super().__init__(name)
-        self.min_raise_latency = None
-        self.max_raise_latency = None
-        self.total_raise_latency = 0
-        self.raise_count = 0
+        self.raise_latencies = stats.Summary()
 
-    def update_stats(self, irq):
-        super().update_stats(irq)
+    @property
+    def raise_count(self):
+        return self.raise_latencies.count
 
-        if irq.raise_ts is None:
-            return
+    @property
+    def min_raise_latency(self):
+        return self.raise_latencies.min
 
-        raise_latency = irq.begin_ts - irq.raise_ts
-        if self.min_raise_latency is None or \
-           raise_latency < self.min_raise_latency:
-            self.min_raise_latency = raise_latency
+    @property
+    def max_raise_latency(self):
+        return self.raise_latencies.max
 
-        if self.max_raise_latency is None or \
-           raise_latency > self.max_raise_latency:
-            self.max_raise_latency = raise_latency
+    @property
+    def total_raise_latency(self):
+        return self.raise_latencies.total
+
+    def update_stats(self, irq, keep_irq=False):
+        super().update_stats(irq, keep_irq)
+
+        if irq.raise_ts is None:
+            return
 
-        self.total_raise_latency += raise_latency
-        self.raise_count += 1
+        self.raise_latencies.update(irq.begin_ts - irq.raise_ts)
 
     def reset(self):
         super().reset()
-        self.min_raise_latency = None
-        self.max_raise_latency = None
-        self.total_raise_latency = 0
-        self.raise_count = 0
+        self.raise_latencies.reset()
@@ -30,6 +30,12 @@ class _PeriodData(PeriodData):
 
 
 class Memtop(Analysis):
+    STATE_NOTIFICATIONS = frozenset(['tid_page_alloc', 'tid_page_free'])
+
+    _PAYLOAD_NOTIFICATIONS = True
+
+    _COUNTER_NOTIFICATIONS = STATE_NOTIFICATIONS
+
     def __init__(self, state, conf):
         notification_cbs = {
             'tid_page_alloc': self._process_tid_page_alloc,
@@ -40,9 +46,30 @@ class Memtop(Analysis):
     def _create_period_data(self):
         return _PeriodData()
 
-    def _process_tid_page_alloc(self, period_data, **kwargs):
-        cpu_id = kwargs['cpu_id']
-        proc = kwargs['proc']
+    def _take_counter_snapshot(self, counters, tid):
+        proc_stats = counters.tids.get(tid)
+        if proc_stats is None:
+            return 0, 0
+
+        return proc_stats.allocated_pages, proc_stats.freed_pages
+
+    def _apply_counter_snapshot(self, period_data, counters, tid, snapshot):
+        proc_stats = counters.tids[tid]
+        allocated_pages, freed_pages = snapshot
+        allocated_pages = proc_stats.allocated_pages - allocated_pages
+        freed_pages = proc_stats.freed_pages - freed_pages
+
+        if allocated_pages == 0 and freed_pages == 0:
+            return
+
+        period_data.tids[tid] = ProcessMemStats(
+            proc_stats.pid, proc_stats.tid, proc_stats.comm)
+        period_data.tids[tid].allocated_pages = allocated_pages
+        period_data.tids[tid].freed_pages = freed_pages
+
+    def _process_tid_page_alloc(self, period_data, payload):
+        cpu_id = payload.cpu_id
+        proc = payload.proc
 
         if not self._filter_process(proc):
             return
@@ -50,14 +77,15 @@ class Memtop(Analysis):
             return
 
         tid = proc.tid
+        self._save_counter(period_data, tid)
         if tid not in period_data.tids:
             period_data.tids[tid] = ProcessMemStats.new_from_process(proc)
 
         period_data.tids[tid].allocated_pages += 1
 
-    def _process_tid_page_free(self, period_data, **kwargs):
-        cpu_id = kwargs['cpu_id']
-        proc = kwargs['proc']
+    def _process_tid_page_free(self, period_data, payload):
+        cpu_id = payload.cpu_id
+        proc = payload.proc
 
         if not self._filter_process(proc):
             return
@@ -65,6 +93,7 @@ class Memtop(Analysis):
             return
 
         tid = proc.tid
+        self._save_counter(period_data, tid)
         if tid not in period_data.tids:
             period_data.tids[tid] = ProcessMemStats.new_from_process(proc)
 
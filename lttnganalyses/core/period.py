@@ -21,8 +21,8 @@
 # SOFTWARE.
 
 from . import event as core_event
-from functools import partial
 import babeltrace as bt
+import operator
 import enum
 
 
@@ -37,6 +37,10 @@ class PeriodDefinitionRegistry:
         self._named_period_defs = {}
         # name to hierarchy
         self._full_period_path = {}
+        # all the period definitions, named or not
+        self._period_defs = []
+        # event name to the (begin, end) candidate period definitions
+        self._candidate_period_defs = {}
 
     def period_full_path(self, name):
         return self._full_period_path[name]
@@ -83,6 +87,7 @@ class PeriodDefinitionRegistry:
         if parent_name is not None:
             parent = self.get_period_def(parent_name)
 
+        # validates and compiles the new period definition
         period_def = PeriodDefinition(parent, period_name, begin_expr,
                                       end_expr, begin_captures_exprs,
                                       end_captures_exprs)
@@ -90,8 +95,9 @@ class PeriodDefinitionRegistry:
         if parent is not None:
             parent.children.add(period_def)
 
-        # validate new period definition
-        PeriodDefinitionValidator(period_def)
+            # the parent's begin event copies also need the fields the
+            # new definition reads with `$parent.$begin`
+            parent.add_begin_evt_fields(period_def.parent_begin_evt_fields)
 
         if period_def.parent is None:
             self._root_period_defs.add(period_def)
@@ -99,11 +105,47 @@ class PeriodDefinitionRegistry:
         if period_def.name is not None:
             self._named_period_defs[period_def.name] = period_def
 
+        self._period_defs.append(period_def)
+        self._candidate_period_defs.clear()
         self.add_full_period_path(period_name, parent_name)
 
     def get_period_def(self, name):
         return self._named_period_defs.get(name)
 
+    # Checks all the period definitions against `event_fields`, the
+    # fields of the trace's events, and resolves the dynamic scopes of
+    # their event field references (see
+    # PeriodDefinition.resolve_field_scopes()).
+    def resolve_field_scopes(self, event_fields):
+        # parents are added, thus resolved, before their children
+        for period_def in self._period_defs:
+            period_def.resolve_field_scopes(event_fields)
+
+        for period_def in self._period_defs:
+            if period_def.parent is not None:
+                period_def.parent.add_begin_evt_fields(
+                    period_def.parent_begin_evt_fields)
+
+    # Returns the period definitions which can begin (parents first)
+    # and which can end (children first) on an event named `name`,
+    # according to the event name constraints of their expressions.
+    # Each event name is resolved once.
+    def get_candidate_period_defs(self, name):
+        candidates = self._candidate_period_defs.get(name)
+
+        if candidates is None:
+            begin_defs = [period_def for period_def in self._period_defs
+                          if period_def.can_begin_with(name)]
+            end_defs = [period_def for period_def in self._period_defs
+                        if period_def.can_end_with(name)]
+            begin_defs.sort(key=lambda period_def: period_def.depth)
+            end_defs.sort(key=lambda period_def: period_def.depth,
+                          reverse=True)
+            candidates = (tuple(begin_defs), tuple(end_defs))
+            self._candidate_period_defs[name] = candidates
+
+        return candidates
+
     @property
     def root_period_defs(self):
         for period_def in self._root_period_defs:
@@ -130,11 +172,157 @@ class PeriodDefinition:
         self._end_expr = end_expr
         self._begin_captures_exprs = begin_captures_exprs
         self._end_captures_exprs = end_captures_exprs
+        PeriodDefinitionValidator(self)
+
+        self._depth = 0
+        if parent is not None:
+            self._depth = parent.depth + 1
+
+        # names of the trace events which can begin this period, set
+        # by resolve_field_scopes()
+        self._begin_event_names = None
+        self._compile({})
+
+    # `field_scopes` maps EventFieldName expressions read with the
+    # automatic dynamic scope to the CTF scope to read them from
+    def _compile(self, field_scopes):
+        begin_expr = self._begin_expr
+        end_expr = self._end_expr
+
+        # compiled once: matching an event is then a single call
+        compiler = _ExpressionCompiler(field_scopes)
+        self._begin_matches = compiler.compile_predicate(begin_expr)
+        self._end_matches = compiler.compile_predicate(end_expr)
+        self._begin_captures_fns = compiler.compile_captures(
+            self._begin_captures_exprs)
+        self._end_captures_fns = compiler.compile_captures(
+            self._end_captures_exprs)
+
+        # when beginning, the begin scope is the current event
+        self._begin_name_filter = compiler.compile_name_filter(
+            begin_expr, (EventScope, BeginScope))
+        self._end_name_filter = compiler.compile_name_filter(
+            end_expr, (EventScope,))
+
+        # equalities of the end expression between the current event
+        # and the begin event, used to index the open periods
+        self._end_key_fns, self._end_residual_matches = \
+            compiler.compile_end_key(end_expr)
+
+        # fields of the begin event read by this definition's end
+        # expression and captures (in the begin expression and
+        # captures, `$begin` is the current event), and by the
+        # definitions of child periods (see add_begin_evt_fields())
+        end_exprs = [end_expr] + list(self._end_captures_exprs.values())
+        self._begin_evt_fields = _get_begin_evt_fields(
+            end_exprs, BeginScope, field_scopes)
+
+        # fields of the parent's begin event read by this definition
+        all_exprs = [begin_expr] + end_exprs + \
+            list(self._begin_captures_exprs.values())
+        self._parent_begin_evt_fields = _get_begin_evt_fields(
+            all_exprs, ParentScope, field_scopes)
+
+    def _get_desc(self):
+        if self._name is None:
+            return 'unnamed period'
+
+        return 'period "{}"'.format(self._name)
+
+    # Checks the event field references of this definition against
+    # `event_fields`, a dict mapping the name of each event of the
+    # traces to its declarations, each one a list of (field name, CTF
+    # scope) pairs (see common.trace_utils.get_event_fields()), and
+    # compiles the definition again so that a field read with the
+    # automatic dynamic scope is read directly from the scope it's
+    # found in, if it's the same in all the declarations of the events
+    # which can be read.
+    #
+    # Raises InvalidPeriodDefinition if no event of the trace can
+    # begin or end the period, or if a field is not found in any of
+    # the events it can be read from. The parent definition must be
+    # resolved first.
+    def resolve_field_scopes(self, event_fields):
+        begin_event_names = [name for name in event_fields
+                             if self.can_begin_with(name)]
+        end_event_names = [name for name in event_fields
+                           if self.can_end_with(name)]
+
+        if not begin_event_names:
+            raise InvalidPeriodDefinition(
+                'No event of the trace can begin {}'.format(
+                    self._get_desc()))
+
+        if not end_event_names:
+            raise InvalidPeriodDefinition(
+                'No event of the trace can end {}'.format(self._get_desc()))
+
+        # (event names, action, period description) of each scope
+        begin_ctx = (begin_event_names, 'begin', self._get_desc())
+        parent_ctx = None
+
+        if self._parent is not None:
+            parent_ctx = (self._parent._begin_event_names, 'begin',
+                          self._parent._get_desc())
+
+        # in the begin expression and captures, `$begin` is the current
+        # event
+        begin_exprs = [self._begin_expr] + \
+            list(self._begin_captures_exprs.values())
+        end_exprs = [self._end_expr] + \
+            list(self._end_captures_exprs.values())
+        exprs_scope_ctxs = [
+            (begin_exprs, {
+                EventScope: begin_ctx,
+                BeginScope: begin_ctx,
+                ParentScope: parent_ctx,
+            }),
+            (end_exprs, {
+                EventScope: (end_event_names, 'end', self._get_desc()),
+                BeginScope: begin_ctx,
+                ParentScope: parent_ctx,
+            }),
+        ]
+        field_scopes = {}
+
+        for exprs, scope_ctxs in exprs_scope_ctxs:
+            for scope_expr, field_expr, dyn_scope in \
+                    _get_event_field_refs(exprs):
+                event_names, action, desc = scope_ctxs[type(scope_expr)]
+                scopes = _get_field_scopes(event_fields, event_names,
+                                           field_expr.name, dyn_scope)
+
+                if not scopes:
+                    fmt = 'Cannot find field {} in the events which can ' \
+                          '{} {}'
+                    raise InvalidPeriodDefinition(fmt.format(
+                        scope_expr, action, desc))
+
+                if dyn_scope != DynScope.AUTO:
+                    continue
+
+                scope = None
+
+                if len(scopes) == 1:
+                    scope = scopes.pop()
+
+                # the same expression could be read in two contexts
+                if field_scopes.get(field_expr, scope) != scope:
+                    scope = None
+
+                field_scopes[field_expr] = scope
+
+        self._begin_event_names = begin_event_names
+        self._compile(field_scopes)
 
     @property
     def name(self):
         return self._name
 
+    @property
+    def depth(self):
+        return self._depth
+
     @property
     def parent(self):
         return self._parent
@@ -159,6 +347,109 @@ class PeriodDefinition:
     def children(self):
         return self._children
 
+    # Set of (field name, CTF scope) pairs to copy from the event
+    # beginning a period (see core.event.Event)
+    @property
+    def begin_evt_fields(self):
+        return self._begin_evt_fields
+
+    @property
+    def parent_begin_evt_fields(self):
+        return self._parent_begin_evt_fields
+
+    def add_begin_evt_fields(self, fields):
+        self._begin_evt_fields |= fields
+
+    # Whether the begin expression can match an event named `name`
+    def can_begin_with(self, name):
+        return self._begin_name_filter is None or \
+            self._begin_name_filter(name)
+
+    # Whether the end expression can match an event named `name`
+    def can_end_with(self, name):
+        return self._end_name_filter is None or self._end_name_filter(name)
+
+    # The following methods evaluate the compiled expressions of this
+    # definition. `evt` is the current event, `begin_evt` the begin
+    # event of the period (`evt` itself when matching the beginning)
+    # and `parent_begin_evt` the begin event of the parent period, if
+    # any.
+    def begin_matches(self, evt, parent_begin_evt):
+        return self._begin_matches(evt, evt, parent_begin_evt)
+
+    def end_matches(self, evt, begin_evt, parent_begin_evt):
+        return self._end_matches(evt, begin_evt, parent_begin_evt)
+
+    def get_begin_captures(self, evt, parent_begin_evt):
+        return {name: get_value(evt, evt, parent_begin_evt)
+                for name, get_value in self._begin_captures_fns}
+
+    def get_end_captures(self, evt, begin_evt, parent_begin_evt):
+        return {name: get_value(evt, begin_evt, parent_begin_evt)
+                for name, get_value in self._end_captures_fns}
+
+    # Returns the key of a period beginning with `begin_evt`, None if
+    # it cannot be indexed: only an event with the same key (see
+    # get_event_key()) can then match its end expression.
+    #
+    # A key element is the (type, value) pair of a begin value, so
+    # that key equality has the same meaning as the `==` operator.
+    # Floats are not indexed since the operator casts a float to an
+    # int when compared to an int.
+    def get_period_key(self, begin_evt):
+        if not self._end_key_fns:
+            return
+
+        key = []
+
+        for _, get_begin_value in self._end_key_fns:
+            value = get_begin_value(begin_evt)
+
+            if value is None or type(value) is float:
+                return
+
+            key.append((type(value), value))
+
+        key = tuple(key)
+
+        try:
+            hash(key)
+        except TypeError:
+            return
+
+        return key
+
+    # Returns the key of the current event `evt`, None if no indexed
+    # period can end with it, or ANY_KEY if the index cannot be used.
+    def get_event_key(self, evt):
+        key = []
+
+        for get_evt_value, _ in self._end_key_fns:
+            value = get_evt_value(evt)
+
+            if value is None:
+                return
+
+            if type(value) is float:
+                return ANY_KEY
+
+            key.append((type(value), value))
+
+        return tuple(key)
+
+    # Same as end_matches() for a period found with the key of `evt`:
+    # only the rest of the end expression is evaluated
+    def end_residual_matches(self, evt, begin_evt, parent_begin_evt):
+        if self._end_residual_matches is None:
+            return True
+
+        return self._end_residual_matches(evt, begin_evt, parent_begin_evt)
+
+
+# Event key returned by PeriodDefinition.get_event_key() when all the
+# open periods must be evaluated
+ANY_KEY = object()
+
 
 class _Expression:
     pass
@@ -389,25 +680,6 @@ class PeriodDefinitionValidator:
             self._validate_expr_cbs[type(expr)](expr)
 
 
-class _MatchContext:
-    def __init__(self, evt, begin_evt, parent_begin_evt):
-        self._evt = evt
-        self._begin_evt = begin_evt
-        self._parent_begin_evt = parent_begin_evt
-
-    @property
-    def evt(self):
-        return self._evt
-
-    @property
-    def begin_evt(self):
-        return self._begin_evt
-
-    @property
-    def parent_begin_evt(self):
-        return self._parent_begin_evt
-
-
 _DYN_SCOPE_TO_BT_CTF_SCOPE = {
     DynScope.TPH: bt.CTFScope.TRACE_PACKET_HEADER,
     DynScope.SPC: bt.CTFScope.STREAM_PACKET_CONTEXT,
@@ -418,133 +690,439 @@ _DYN_SCOPE_TO_BT_CTF_SCOPE = {
 }
 
 
-def _resolve_event_expr(event, expr):
-    # event not found
-    if event is None:
-        return
+# Compiles expressions into closures, once per period definition.
+#
+# A compiled predicate is fn(evt, begin_evt, parent_begin_evt) and
+# returns whether the expression matches. A compiled value has the
+# same signature and returns the resolved value (Python's
+# number/string), or None if it's not found. The tree is only walked
+# here, so that evaluating an expression allocates nothing.
+class _ExpressionCompiler:
+    _COMP_FNS = {
+        Eq: operator.eq,
+        Lt: operator.lt,
+        LtEq: operator.le,
+        Gt: operator.gt,
+        GtEq: operator.ge,
+    }
+
+    # `field_scopes` maps EventFieldName expressions read with the
+    # automatic dynamic scope to the CTF scope to read them from (None
+    # to search all the scopes)
+    def __init__(self, field_scopes=None):
+        if field_scopes is None:
+            field_scopes = {}
+
+        self._field_scopes = field_scopes
+        self._compile_predicate_cbs = {
+            LogicalAnd: self._compile_and_expr,
+            LogicalOr: self._compile_or_expr,
+            LogicalNot: self._compile_not_expr,
+            GlobEq: self._compile_glob_eq_expr,
+            Eq: self._compile_comp_expr,
+            Lt: self._compile_comp_expr,
+            LtEq: self._compile_comp_expr,
+            Gt: self._compile_comp_expr,
+            GtEq: self._compile_comp_expr,
+        }
+        self._compile_value_cbs = {
+            ParentScope: self._compile_parent_scope,
+            BeginScope: self._compile_begin_scope,
+            EventScope: self._compile_event_scope,
+            Number: self._compile_literal,
+            String: self._compile_literal,
+        }
 
-    # event name
-    if type(expr.child) is EventName:
-        return event.name
+    def compile_predicate(self, expr):
+        return self._compile_predicate_cbs[type(expr)](expr)
 
-    # default, automatic dynamic scope
-    dyn_scope = DynScope.AUTO
+    def compile_value(self, expr):
+        return self._compile_value_cbs[type(expr)](expr)
 
-    if type(expr.child) is DynamicScope:
-        # select specific dynamic scope
-        expr = expr.child
-        dyn_scope = expr.dyn_scope
+    # Returns a list of (name, compiled value) pairs
+    def compile_captures(self, captures_exprs):
+        return [(name, self.compile_value(capture_expr))
+                for name, capture_expr in captures_exprs.items()]
 
-    if type(expr.child) is EventFieldName:
-        expr = expr.child
+    # Compiles the constraints a predicate puts on the name of the
+    # events it can match, from its `==` and `=*` comparisons of the
+    # event name with a string, into fn(name). Returns None if any
+    # name can match. `scope_types` are the scopes referring to the
+    # current event.
+    def compile_name_filter(self, expr, scope_types):
+        expr_type = type(expr)
 
-        if dyn_scope == DynScope.AUTO:
-            # automatic dynamic scope
-            if expr.name in event:
-                return event[expr.name]
+        if expr_type is LogicalAnd:
+            lh_filter = self.compile_name_filter(expr.lh_expr, scope_types)
+            rh_filter = self.compile_name_filter(expr.rh_expr, scope_types)
 
-            # event field not found
-            return
+            if lh_filter is None:
+                return rh_filter
 
-        # specific dynamic scope
-        bt_ctf_scope = _DYN_SCOPE_TO_BT_CTF_SCOPE[dyn_scope]
+            if rh_filter is None:
+                return lh_filter
+
+            return lambda name: lh_filter(name) and rh_filter(name)
+
+        if expr_type is LogicalOr:
+            lh_filter = self.compile_name_filter(expr.lh_expr, scope_types)
+            rh_filter = self.compile_name_filter(expr.rh_expr, scope_types)
+
+            if lh_filter is None or rh_filter is None:
+                return
+
+            return lambda name: lh_filter(name) or rh_filter(name)
+
+        if expr_type is GlobEq:
+            if self._is_event_name_expr(expr.lh_expr, scope_types):
+                regex_match = expr.regex.match
+
+                return lambda name: bool(regex_match(name))
+
+        if expr_type is Eq:
+            for name_expr, value_expr in [(expr.lh_expr, expr.rh_expr),
+                                          (expr.rh_expr, expr.lh_expr)]:
+                if self._is_event_name_expr(name_expr, scope_types) and \
+                        type(value_expr) is String:
+                    value = value_expr.value
+
+                    return lambda name: name == value
+
+        # not constraining the name (a negation may match any name)
+
+    # Splits the top-level conjunction of an end expression into the
+    # `==` comparisons between a value of the current event and a
+    # value of the begin event, compiled into a list of
+    # (fn(evt), fn(begin_evt)) pairs, and the remaining conjuncts,
+    # compiled into a predicate (None if there's none).
+    def compile_end_key(self, expr):
+        key_fns = []
+        residual_exprs = []
+
+        for conjunct in self._get_conjuncts(expr):
+            if type(conjunct) is Eq:
+                lh_expr = conjunct.lh_expr
+                rh_expr = conjunct.rh_expr
+
+                if type(lh_expr) is BeginScope:
+                    lh_expr, rh_expr = rh_expr, lh_expr
+
+                if type(lh_expr) is EventScope and \
+                        type(rh_expr) is BeginScope:
+                    key_fns.append((self._compile_event_value(lh_expr),
+                                    self._compile_event_value(rh_expr.child)))
+                    continue
+
+            residual_exprs.append(conjunct)
+
+        residual_matches = None
+
+        if residual_exprs:
+            residual_matches = self.compile_predicate(
+                create_conjunction_from_exprs(residual_exprs))
+
+        return key_fns, residual_matches
+
+    def _get_conjuncts(self, expr):
+        if type(expr) is LogicalAnd:
+            return (self._get_conjuncts(expr.lh_expr) +
+                    self._get_conjuncts(expr.rh_expr))
+
+        return [expr]
+
+    @staticmethod
+    def _is_event_name_expr(expr, scope_types):
+        if type(expr) not in scope_types:
+            return False
+
+        if type(expr) is BeginScope:
+            expr = expr.child
+
+        return type(expr.child) is EventName
+
+    def _compile_and_expr(self, expr):
+        lh_matches = self.compile_predicate(expr.lh_expr)
+        rh_matches = self.compile_predicate(expr.rh_expr)
+
+        def matches(evt, begin_evt, parent_begin_evt):
+            return (lh_matches(evt, begin_evt, parent_begin_evt) and
+                    rh_matches(evt, begin_evt, parent_begin_evt))
+
+        return matches
+
+    def _compile_or_expr(self, expr):
+        lh_matches = self.compile_predicate(expr.lh_expr)
+        rh_matches = self.compile_predicate(expr.rh_expr)
+
+        def matches(evt, begin_evt, parent_begin_evt):
+            return (lh_matches(evt, begin_evt, parent_begin_evt) or
+                    rh_matches(evt, begin_evt, parent_begin_evt))
+
+        return matches
+
+    def _compile_not_expr(self, expr):
+        expr_matches = self.compile_predicate(expr.expr)
+
+        def matches(evt, begin_evt, parent_begin_evt):
+            return not expr_matches(evt, begin_evt, parent_begin_evt)
+
+        return matches
+
+    def _compile_glob_eq_expr(self, expr):
+        regex_match = expr.regex.match
+
+        def compfn(lh, rh):
+            return bool(regex_match(lh))
+
+        return self._compile_comp(compfn, expr)
+
+    def _compile_comp_expr(self, expr):
+        return self._compile_comp(self._COMP_FNS[type(expr)], expr)
+
+    def _compile_comp(self, compfn, expr):
+        get_lh_value = self.compile_value(expr.lh_expr)
+
+        if type(expr.rh_expr) in (Number, String):
+            # comparing to a literal value: only the LHS varies
+            return self._compile_literal_comp(compfn, get_lh_value,
+                                              expr.rh_expr.value)
+
+        get_rh_value = self.compile_value(expr.rh_expr)
+
+        def matches(evt, begin_evt, parent_begin_evt):
+            lh_value = get_lh_value(evt, begin_evt, parent_begin_evt)
+            rh_value = get_rh_value(evt, begin_evt, parent_begin_evt)
+
+            # make sure both sides are found
+            if lh_value is None or rh_value is None:
+                return False
+
+            # cast RHS to int if LHS is an int
+            if type(lh_value) is int and type(rh_value) is float:
+                rh_value = int(rh_value)
+
+            # compare types first
+            if type(lh_value) is not type(rh_value):
+                return False
+
+            return compfn(lh_value, rh_value)
+
+        return matches
+
+    @staticmethod
+    def _compile_literal_comp(compfn, get_lh_value, rh_value):
+        rh_type = type(rh_value)
+        rh_is_float = rh_type is float
 
-        return event.field_with_scope(expr.name, bt_ctf_scope)
+        def matches(evt, begin_evt, parent_begin_evt):
+            lh_value = get_lh_value(evt, begin_evt, parent_begin_evt)
+            lh_type = type(lh_value)
 
-    assert(False)
+            # cast RHS to int if LHS is an int
+            if lh_type is int and rh_is_float:
+                return compfn(lh_value, int(rh_value))
 
+            # compare types first (also rejects a field not found)
+            if lh_type is not rh_type:
+                return False
 
-# This exquisite function takes an expression and resolves it to
-# an actual value (Python's number/string) considering the current
-# matching context.
-def _resolve_expr(expr, match_context):
-    if type(expr) is ParentScope:
+            return compfn(lh_value, rh_value)
+
+        return matches
+
+    def _compile_parent_scope(self, expr):
         begin_scope = expr.child
-        event_scope = begin_scope.child
+        get_event_value = self._compile_event_value(begin_scope.child)
+
+        def get_value(evt, begin_evt, parent_begin_evt):
+            return get_event_value(parent_begin_evt)
 
-        return _resolve_event_expr(match_context.parent_begin_evt, event_scope)
+        return get_value
 
-    if type(expr) is BeginScope:
+    def _compile_begin_scope(self, expr):
         # event in the begin context
-        event_scope = expr.child
+        get_event_value = self._compile_event_value(expr.child)
 
-        return _resolve_event_expr(match_context.begin_evt, event_scope)
+        def get_value(evt, begin_evt, parent_begin_evt):
+            return get_event_value(begin_evt)
 
-    if type(expr) is EventScope:
+        return get_value
+
+    def _compile_event_scope(self, expr):
         # current event
-        return _resolve_event_expr(match_context.evt, expr)
-
-    if type(expr) is Number:
-        return expr.value
-
-    if type(expr) is String:
-        return expr.value
-
-    assert(False)
-
-
-class _Matcher:
-    def __init__(self, expr, match_context):
-        self._match_context = match_context
-        self._expr_matchers = {
-            LogicalAnd: self._and_expr_matches,
-            LogicalOr: self._or_expr_matches,
-            LogicalNot: self._not_expr_matches,
-            GlobEq: self._glob_eq_expr_matches,
-            Eq: partial(self._comp_expr_matches, lambda lh, rh: lh == rh),
-            Lt: partial(self._comp_expr_matches, lambda lh, rh: lh < rh),
-            LtEq: partial(self._comp_expr_matches, lambda lh, rh: lh <= rh),
-            Gt: partial(self._comp_expr_matches, lambda lh, rh: lh > rh),
-            GtEq: partial(self._comp_expr_matches, lambda lh, rh: lh >= rh),
-        }
-        self._matches = self._expr_matches(expr)
+        get_event_value = self._compile_event_value(expr)
 
-    def _and_expr_matches(self, expr):
-        return (self._expr_matches(expr.lh_expr) and
-                self._expr_matches(expr.rh_expr))
+        def get_value(evt, begin_evt, parent_begin_evt):
+            return get_event_value(evt)
 
-    def _or_expr_matches(self, expr):
-        return (self._expr_matches(expr.lh_expr) or
-                self._expr_matches(expr.rh_expr))
+        return get_value
 
-    def _not_expr_matches(self, expr):
-        return not self._expr_matches(expr.expr)
+    @staticmethod
+    def _compile_literal(expr):
+        value = expr.value
 
-    def _glob_eq_expr_matches(self, expr):
-        def compfn(lh, rh):
-            return bool(expr.regex.match(lh))
+        def get_value(evt, begin_evt, parent_begin_evt):
+            return value
 
-        return self._comp_expr_matches(compfn, expr)
+        return get_value
 
-    def _comp_expr_matches(self, compfn, expr):
-        lh_value = _resolve_expr(expr.lh_expr, self._match_context)
-        rh_value = _resolve_expr(expr.rh_expr, self._match_context)
+    # Compiles an event scope into fn(event), returning None if the
+    # event (or the field) is not found
+    def _compile_event_value(self, expr):
+        # event name
+        if type(expr.child) is EventName:
+            def get_name(event):
+                if event is None:
+                    return
 
-        # make sure both sides are found
-        if lh_value is None or rh_value is None:
-            return False
+                return event.name
 
-        # cast RHS to int if LHS is an int
-        if type(lh_value) is int and type(rh_value) is float:
-            rh_value = int(rh_value)
+            return get_name
 
-        # compare types first
-        if type(lh_value) is not type(rh_value):
-            return False
+        # default, automatic dynamic scope
+        dyn_scope = DynScope.AUTO
 
-        # compare field to a literal value
-        return compfn(lh_value, rh_value)
+        if type(expr.child) is DynamicScope:
+            # select specific dynamic scope
+            expr = expr.child
+            dyn_scope = expr.dyn_scope
 
-    def _expr_matches(self, expr):
-        return self._expr_matchers[type(expr)](expr)
+        assert(type(expr.child) is EventFieldName)
+        name = expr.child.name
 
-    @property
-    def matches(self):
-        return self._matches
+        if dyn_scope == DynScope.AUTO:
+            # resolved from the trace's event declarations, if possible
+            bt_ctf_scope = self._field_scopes.get(expr.child)
+
+            if bt_ctf_scope is None:
+                # automatic dynamic scope
+                def get_field(event):
+                    if event is None or name not in event:
+                        return
+
+                    return event[name]
 
+                return get_field
+        else:
+            # specific dynamic scope
+            bt_ctf_scope = _DYN_SCOPE_TO_BT_CTF_SCOPE[dyn_scope]
 
-def _expr_matches(expr, match_context):
-    return _Matcher(expr, match_context).matches
+        def get_scoped_field(event):
+            if event is None:
+                return
+
+            return event.field_with_scope(name, bt_ctf_scope)
+
+        return get_scoped_field
+
+
+# Returns the set of (field name, CTF scope) pairs of the fields read
+# through a scope of type `scope_type` (BeginScope or ParentScope) in
+# the expressions `exprs`. The CTF scope is None for an unresolved
+# automatic dynamic scope (see `field_scopes` in
+# PeriodDefinition._compile()). In a ParentScope, a BeginScope refers
+# to the begin event of the parent period, not to the one of the
+# current period.
+def _get_begin_evt_fields(exprs, scope_type, field_scopes):
+    fields = set()
+    exprs = list(exprs)
+
+    while exprs:
+        expr = exprs.pop()
+
+        if type(expr) is scope_type:
+            evt_expr = expr.child
+
+            if scope_type is ParentScope:
+                evt_expr = evt_expr.child
+
+            field = _get_event_field(evt_expr, field_scopes)
+
+            if field is not None:
+                fields.add(field)
+        elif isinstance(expr, _BinaryExpression):
+            exprs += [expr.lh_expr, expr.rh_expr]
+        elif isinstance(expr, _UnaryExpression):
+            exprs.append(expr.expr)
+
+    return fields
+
+
+# Returns the (field name, CTF scope) pair of the field read by the
+# event scope `expr`, or None if it reads the event name
+def _get_event_field(expr, field_scopes):
+    expr = expr.child
+
+    if type(expr) is EventName:
+        return
+
+    if type(expr) is DynamicScope:
+        if expr.dyn_scope != DynScope.AUTO:
+            return (expr.child.name,
+                    _DYN_SCOPE_TO_BT_CTF_SCOPE[expr.dyn_scope])
+
+        expr = expr.child
+
+    return (expr.name, field_scopes.get(expr))
+
+
+# Yields the (scope expression, EventFieldName expression, dynamic
+# scope) triples of the event fields read by the expressions `exprs`,
+# from left to right. The scope expression is an EventScope, a
+# BeginScope or a ParentScope.
+def _get_event_field_refs(exprs):
+    exprs = list(reversed(exprs))
+
+    while exprs:
+        expr = exprs.pop()
+
+        if type(expr) in (EventScope, BeginScope, ParentScope):
+            evt_expr = expr
+
+            while type(evt_expr) is not EventScope:
+                evt_expr = evt_expr.child
+
+            field_expr = evt_expr.child
+            dyn_scope = DynScope.AUTO
+
+            if type(field_expr) is DynamicScope:
+                dyn_scope = field_expr.dyn_scope
+                field_expr = field_expr.child
+
+            if type(field_expr) is EventFieldName:
+                yield expr, field_expr, dyn_scope
+        elif isinstance(expr, _BinaryExpression):
+            exprs += [expr.rh_expr, expr.lh_expr]
+        elif isinstance(expr, _UnaryExpression):
+            exprs.append(expr.expr)
+
+
+# Returns the set of CTF scopes in which the declarations of the
+# events named `event_names` have the field named `field_name` (see
+# PeriodDefinition.resolve_field_scopes() for `event_fields`). With
+# the automatic dynamic scope `dyn_scope`, this is the first scope of
+# each declaration which has the field: the declarations of an event
+# in different traces can have it in different scopes. The set is
+# empty if no declaration has the field.
+def _get_field_scopes(event_fields, event_names, field_name, dyn_scope):
+    bt_ctf_scope = None
+
+    if dyn_scope != DynScope.AUTO:
+        bt_ctf_scope = _DYN_SCOPE_TO_BT_CTF_SCOPE[dyn_scope]
+
+    scopes = set()
+
+    for event_name in event_names:
+        for fields in event_fields[event_name]:
+            for name, scope in fields:
+                if name != field_name:
+                    continue
+
+                if bt_ctf_scope is None or scope == bt_ctf_scope:
+                    scopes.add(scope)
+                    break
+
+    return scopes
 
 
 def create_conjunction_from_exprs(exprs):
@@ -579,7 +1157,13 @@ class PeriodEngineCallbackType(enum.Enum):
 
 class Period:
     def __init__(self, definition, parent, begin_evt, begin_captures):
-        begin_evt_copy = core_event.Event(begin_evt)
+        # only the fields the period definitions read are copied
+        begin_evt_fields = None
+
+        if definition is not None:
+            begin_evt_fields = definition.begin_evt_fields
+
+        begin_evt_copy = core_event.Event(begin_evt, begin_evt_fields)
         self._begin_evt = begin_evt_copy
         self._end_evt = None
         self._completed = False
@@ -588,6 +1172,10 @@ class Period:
         self._children = set()
         self._begin_captures = begin_captures
         self._end_captures = {}
+        self._key = None
+
+        if definition is not None:
+            self._key = definition.get_period_key(begin_evt_copy)
 
     @property
     def begin_evt(self):
@@ -629,12 +1217,110 @@ class Period:
     def end_captures(self):
         return self._end_captures
 
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def parent_begin_evt(self):
+        if self._parent is None:
+            return
+
+        return self._parent.begin_evt
+
+
+# Open periods of a period definition, indexed by their key (see
+# PeriodDefinition.get_period_key())
+class _OpenPeriods:
+    def __init__(self, definition):
+        self._definition = definition
+        self._indexed_periods = {}
+        self._unindexed_periods = set()
+
+    def __iter__(self):
+        for periods in self._indexed_periods.values():
+            yield from periods
+
+        yield from self._unindexed_periods
+
+    def __bool__(self):
+        return bool(self._indexed_periods or self._unindexed_periods)
+
+    def add(self, period):
+        if period.key is None:
+            self._unindexed_periods.add(period)
+            return
+
+        periods = self._indexed_periods.get(period.key)
+
+        if periods is None:
+            periods = set()
+            self._indexed_periods[period.key] = periods
+
+        periods.add(period)
+
+    def remove(self, period):
+        if period.key is None:
+            self._unindexed_periods.remove(period)
+            return
+
+        periods = self._indexed_periods[period.key]
+        periods.remove(period)
+
+        if not periods:
+            del self._indexed_periods[period.key]
+
+    # Returns the open periods ending with `evt`. The returned list is
+    # only allocated when a period ends.
+    def get_ended_periods(self, evt):
+        definition = self._definition
+        ended_periods = None
+
+        if self._indexed_periods:
+            key = definition.get_event_key(evt)
+
+            if key is ANY_KEY:
+                for periods in self._indexed_periods.values():
+                    ended_periods = self._add_ended_periods(
+                        ended_periods, periods, definition.end_matches, evt)
+            elif key is not None:
+                try:
+                    periods = self._indexed_periods.get(key, ())
+                except TypeError:
+                    # unhashable: no indexed key has the same type
+                    periods = ()
+
+                # the key matched: only evaluate the rest of the end
+                # expression
+                ended_periods = self._add_ended_periods(
+                    ended_periods, periods, definition.end_residual_matches,
+                    evt)
+
+        ended_periods = self._add_ended_periods(
+            ended_periods, self._unindexed_periods, definition.end_matches,
+            evt)
+
+        return ended_periods or ()
+
+    @staticmethod
+    def _add_ended_periods(ended_periods, periods, matches, evt):
+        for period in periods:
+            if matches(evt, period.begin_evt, period.parent_begin_evt):
+                if ended_periods is None:
+                    ended_periods = []
+
+                ended_periods.append(period)
+
+        return ended_periods
+
 
 class PeriodEngine:
     def __init__(self, registry, cbs):
         self._registry = registry
         self._cbs = cbs
         self._root_periods = set()
+        # period definition to its _OpenPeriods
+        self._open_periods = {}
 
     def _cb_period_end(self, period):
         self._cbs[PeriodEngineCallbackType.PERIOD_END](period)
@@ -645,116 +1331,120 @@ class PeriodEngine:
     def _create_period(self, definition, parent, begin_evt, begin_captures):
         return Period(definition, parent, begin_evt, begin_captures)
 
-    def _get_captures(self, captures_exprs, match_context):
-        captures = {}
-
-        for name, capture_expr in captures_exprs.items():
-            captures[name] = _resolve_expr(capture_expr, match_context)
-
-        return captures
-
-    def _process_event_add_periods(self, parent_period,
-                                   child_periods, child_period_defs, evt):
-        periods_to_add = set()
+    # `begin_defs` are the period definitions which can begin on `evt`,
+    # parents first, so that a child period can begin with its parent
+    def _process_event_begin(self, evt, begin_defs):
+        for period_def in begin_defs:
+            if period_def.parent is None:
+                self._begin_periods(period_def, None, evt)
+                continue
 
-        for child_period_def in child_period_defs:
-            match_context = self._create_begin_match_context(parent_period,
-                                                             evt)
+            parent_periods = self._open_periods.get(period_def.parent)
 
-            if _expr_matches(child_period_def.begin_expr, match_context):
-                # match! add period
-                captures = self._get_captures(
-                    child_period_def.begin_captures_exprs,
-                    match_context)
-                period = self._create_period(child_period_def,
-                                             parent_period, evt, captures)
-                periods_to_add.add(period)
+            if not parent_periods:
+                continue
 
-        # safe to add child periods now, outside the iteration
-        for period_to_add in periods_to_add:
-            self._cb_period_begin(period_to_add)
-            child_periods.add(period_to_add)
+            for parent_period in parent_periods:
+                self._begin_periods(period_def, parent_period, evt)
 
-        for child_period in child_periods:
-            self._process_event_add_periods(child_period,
-                                            child_period.children,
-                                            child_period.definition.children,
-                                            evt)
-
-    def _process_event_begin(self, evt):
-        defs = self._registry.root_period_defs
-        self._process_event_add_periods(None, self._root_periods, defs, evt)
-
-    def _create_begin_match_context(self, parent_period, evt):
+    def _begin_periods(self, period_def, parent_period, evt):
         parent_begin_evt = None
+        child_periods = self._root_periods
 
         if parent_period is not None:
             parent_begin_evt = parent_period.begin_evt
+            child_periods = parent_period.children
 
-        return _MatchContext(evt, evt, parent_begin_evt)
+        if period_def.begin_matches(evt, parent_begin_evt):
+            # match! add period
+            captures = period_def.get_begin_captures(evt, parent_begin_evt)
+            period = self._create_period(period_def, parent_period, evt,
+                                         captures)
+            self._cb_period_begin(period)
+            child_periods.add(period)
+            self._add_open_period(period)
 
-    def _create_end_match_context(self, period, evt):
-        parent_begin_evt = None
+    def _add_open_period(self, period):
+        open_periods = self._open_periods.get(period.definition)
 
-        if period.parent is not None:
-            parent_begin_evt = period.parent.begin_evt
+        if open_periods is None:
+            open_periods = _OpenPeriods(period.definition)
+            self._open_periods[period.definition] = open_periods
 
-        return _MatchContext(evt, period.begin_evt, parent_begin_evt)
+        open_periods.add(period)
 
-    def _process_event_remove_period(self, child_periods, evt):
-        for child_period in child_periods:
-            self._process_event_remove_period(child_period.children, evt)
+    def _remove_open_period(self, period):
+        self._open_periods[period.definition].remove(period)
 
-        child_periods_to_remove = set()
+        if period.parent is None:
+            self._root_periods.remove(period)
+        else:
+            period.parent.children.remove(period)
 
-        for child_period in child_periods:
-            match_context = self._create_end_match_context(child_period, evt)
+    # `end_defs` are the period definitions which can end on `evt`,
+    # children first, so that child periods end before their parent
+    def _process_event_end(self, evt, end_defs):
+        for period_def in end_defs:
+            open_periods = self._open_periods.get(period_def)
 
-            if _expr_matches(child_period.definition.end_expr, match_context):
+            if not open_periods:
+                continue
+
+            for period in open_periods.get_ended_periods(evt):
                 # set period's end captures
-                end_captures_exprs = \
-                    child_period.definition.end_captures_exprs
-                captures = self._get_captures(end_captures_exprs,
-                                              match_context)
-                child_period._end_captures = captures
+                period._end_captures = period_def.get_end_captures(
+                    evt, period.begin_evt, period.parent_begin_evt)
 
-                # mark as to be removed
-                child_periods_to_remove.add(child_period)
+                # set period's ending event and completed property
+                period.end_evt = evt
+                period.completed = True
 
-        # safe to remove child periods now, outside the iteration
-        for child_period_to_remove in child_periods_to_remove:
-            # set period's ending event and completed property
-            child_period_to_remove.end_evt = evt
-            child_period_to_remove.completed = True
+                # also remove its own remaining child periods
+                self._remove_periods(period.children, evt)
 
-            # also remove its own remaining child periods
-            self._remove_periods(child_period_to_remove.children, evt)
+                # call end of period user callback (this period matched)
+                self._cb_period_end(period)
 
-            # call end of period user callback (this period matched)
-            self._cb_period_end(child_period_to_remove)
+                # remove period from the open periods
+                self._remove_open_period(period)
 
-            # remove period from set
-            child_periods.remove(child_period_to_remove)
+    def process_event(self, evt):
+        begin_defs, end_defs = \
+            self._registry.get_candidate_period_defs(evt.name)
 
-    def _process_event_end(self, evt):
-        self._process_event_remove_period(self._root_periods, evt)
+        # events no period can begin or end with skip the engine
+        if end_defs and self._root_periods:
+            self._process_event_end(evt, end_defs)
 
-    def process_event(self, evt):
-        self._process_event_end(evt)
-        self._process_event_begin(evt)
+        if begin_defs:
+            self._process_event_begin(evt, begin_defs)
 
+    # Ends the periods of `child_periods` and all their descendants,
+    # which did not match their end expression: descendants end before
+    # their ancestors.
     def _remove_periods(self, child_periods, evt):
-        for child_period in child_periods:
-            self._remove_periods(child_period.children, evt)
+        if not child_periods:
+            return
+
+        # depth-first, ancestors before descendants
+        periods = []
+        stack = list(child_periods)
+
+        while stack:
+            period = stack.pop()
+            periods.append(period)
+            stack += period.children
+
+        for period in reversed(periods):
+            period.children.clear()
 
-        # safe to remove child periods now, outside the iteration
-        for child_period in child_periods:
             # set period's ending event and completed property
-            child_period.end_evt = evt
-            child_period.completed = False
+            period.end_evt = evt
+            period.completed = False
 
             # call end of period user callback
-            self._cb_period_end(child_period)
+            self._cb_period_end(period)
+            self._open_periods[period.definition].remove(period)
 
         child_periods.clear()
 
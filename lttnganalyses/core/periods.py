@@ -20,6 +20,9 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from collections import OrderedDict
+import array
+from . import stats
 from .analysis import Analysis, PeriodData
 
 
@@ -33,34 +36,78 @@ class _PeriodData(PeriodData):
 
 
 class PeriodAnalysis(Analysis):
+    STATE_NOTIFICATIONS = frozenset()
+
     def __init__(self, state, conf):
         super().__init__(state, conf, {})
         # This is a special case where we keep a global state instead of a
         # per-period state, since we are accumulating statistics about
         # all the periods.
         self._all_period_stats = {}
-        self._all_period_list = []
+        # Completed period events, only kept when individual samples
+        # are needed
+        self._period_store = None
+        if not conf.summary_only:
+            self._period_store = PeriodStore()
+        # Number of periods which began so far
+        self._period_count = 0
+        self._all_count = 0
         self._all_total_duration = 0
         self._all_min_duration = None
         self._all_max_duration = None
+        # Top-K heaps of the longest completed period events, indexed
+        # by period name, empty when no top is requested
+        self._top_periods = {}
         # Internal map between currently active periods and their
         # corresponding PeriodEvent object.
         self._current_periods = {}
+        # PeriodAggregator updated as periods end, if any
+        self._aggregator = None
+        # fn(period_event) returning whether to account a completed
+        # period event in the per-period statistics, None to account
+        # all of them
+        self._period_filter = None
 
     def _create_period_data(self):
         return _PeriodData()
 
     @property
     def all_count(self):
-        return len(self._all_period_list)
+        return self._all_count
 
     @property
     def all_period_stats(self):
         return self._all_period_stats
 
     @property
-    def all_period_list(self):
-        return self._all_period_list
+    def period_store(self):
+        return self._period_store
+
+    @property
+    def aggregator(self):
+        return self._aggregator
+
+    @aggregator.setter
+    def aggregator(self, aggregator):
+        self._aggregator = aggregator
+
+    @property
+    def period_filter(self):
+        return self._period_filter
+
+    @period_filter.setter
+    def period_filter(self, period_filter):
+        self._period_filter = period_filter
+
+    @property
+    def top_periods(self):
+        return self._top_periods
+
+    # Orders the period events by decreasing duration, then in the
+    # order they began
+    @staticmethod
+    def top_period_key(period_event):
+        return period_event.duration, -period_event.start_ts
 
     @property
     def all_min_duration(self):
@@ -108,9 +155,13 @@ class PeriodAnalysis(Analysis):
             parent = None
 
         period_data._period_event = PeriodEvent(
-            period.begin_evt.timestamp, definition.name, parent)
+            period.begin_evt.timestamp, definition.name, parent,
+            self._period_count)
+        self._period_count += 1
+
+        if self._aggregator is not None:
+            self._aggregator.begin_period_event(period_data._period_event)
 
-        self._all_period_list.append(period_data._period_event)
         self._current_periods[period] = period_data._period_event
 
     def _end_period_cb(self, period_data, completed,
@@ -123,7 +174,11 @@ class PeriodAnalysis(Analysis):
         if completed is False:
             # We should eventually warn the user here or keep
             # the event as uncomplete or in a separate table.
-            self._all_period_list.remove(period_data._period_event)
+            if self._aggregator is not None:
+                self._aggregator.end_period_event(period_data._period_event,
+                                                  False)
+
+            del self._current_periods[period]
             return
 
         if period.definition.name is None:
@@ -133,9 +188,20 @@ class PeriodAnalysis(Analysis):
 
         period_data._period_event.finish(
             self.last_event_ts, begin_captures, end_captures)
-        self._all_period_stats[name].update_stats(
-            period_data._period_event)
+        if self._period_filter is None or \
+                self._period_filter(period_data._period_event):
+            self._all_period_stats[name].update_stats(
+                period_data._period_event)
         self.update_global_stats(period_data._period_event)
+        self._update_top_periods(name, period_data._period_event)
+        self._all_count += 1
+
+        if self._period_store is not None:
+            self._period_store.append(period_data._period_event)
+
+        if self._aggregator is not None:
+            self._aggregator.end_period_event(period_data._period_event,
+                                              True)
 
         if period.parent is not None:
             parent = self._current_periods[period.parent]
@@ -143,14 +209,26 @@ class PeriodAnalysis(Analysis):
 
         del self._current_periods[period]
 
+    def _update_top_periods(self, name, period_event):
+        if self._conf.top_limit is None:
+            return
+
+        top_filter = self._conf.top_filter
+        if top_filter is not None and not top_filter(period_event):
+            return
+
+        if name not in self._top_periods:
+            self._top_periods[name] = stats.TopK(self._conf.top_limit,
+                                                 self.top_period_key)
+
+        self._top_periods[name].add(period_event)
+
 
 class PeriodStats():
     def __init__(self, name):
         self.name = name
-        self.period_list = []
-        self.min_duration = None
-        self.max_duration = None
-        self.total_duration = 0
+        self.durations = stats.Summary()
+        self.histogram = stats.LogLinearHistogram()
 
     @classmethod
     def new_from_period(cls, period):
@@ -160,32 +238,134 @@ class PeriodStats():
 
     @property
     def count(self):
-        return len(self.period_list)
+        return self.durations.count
+
+    @property
+    def min_duration(self):
+        return self.durations.min
+
+    @property
+    def max_duration(self):
+        return self.durations.max
+
+    @property
+    def total_duration(self):
+        return self.durations.total
 
     def update_stats(self, period_event):
-        if self.min_duration is None or period_event.duration < \
-                self.min_duration:
-            self.min_duration = period_event.duration
+        self.durations.update(period_event.duration)
+        self.histogram.record(period_event.duration)
+
+
+# Compact storage of completed period events: one array (or list) per
+# attribute instead of one PeriodEvent object per period. The
+# timestamps are stored in signed 64-bit arrays, the period names as
+# indexes in a name table, and each set of captures as an interned
+# tuple of capture names and a tuple of values.
+class PeriodStore():
+    def __init__(self):
+        # order in which the periods began
+        self._indexes = array.array('q')
+        self._start_ts = array.array('q')
+        self._end_ts = array.array('q')
+        self._name_ids = array.array('l')
+        self._names = []
+        self._name_id_map = {}
+        self._begin_capture_names = []
+        self._begin_capture_values = []
+        self._end_capture_names = []
+        self._end_capture_values = []
+        self._interned_capture_names = {}
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def _get_name_id(self, name):
+        name_id = self._name_id_map.get(name)
+
+        if name_id is None:
+            name_id = len(self._names)
+            self._names.append(name)
+            self._name_id_map[name] = name_id
+
+        return name_id
+
+    def _append_captures(self, captures, capture_names, capture_values):
+        if captures is None:
+            capture_names.append(None)
+            capture_values.append(None)
+            return
 
-        if self.max_duration is None or period_event.duration > \
-                self.max_duration:
-            self.max_duration = period_event.duration
-        self.total_duration += period_event.duration
-        self.period_list.append(period_event)
+        names = tuple(captures.keys())
+        names = self._interned_capture_names.setdefault(names, names)
+        capture_names.append(names)
+        capture_values.append(tuple(captures.values()))
+
+    @staticmethod
+    def _get_captures(capture_names, capture_values, row):
+        names = capture_names[row]
+
+        if names is None:
+            return
+
+        return dict(zip(names, capture_values[row]))
+
+    # Stores a completed period event
+    def append(self, period_event):
+        self._indexes.append(period_event.index)
+        self._start_ts.append(period_event.start_ts)
+        self._end_ts.append(period_event.end_ts)
+        self._name_ids.append(self._get_name_id(period_event._name))
+        self._append_captures(period_event._begin_captures,
+                              self._begin_capture_names,
+                              self._begin_capture_values)
+        self._append_captures(period_event._end_captures,
+                              self._end_capture_names,
+                              self._end_capture_values)
+
+    # Returns a new PeriodEvent (without parent nor children) from the
+    # row `row`
+    def get_period_event(self, row):
+        period_event = PeriodEvent(self._start_ts[row],
+                                   self._names[self._name_ids[row]], None,
+                                   self._indexes[row])
+        period_event.finish(
+            self._end_ts[row],
+            self._get_captures(self._begin_capture_names,
+                               self._begin_capture_values, row),
+            self._get_captures(self._end_capture_names,
+                               self._end_capture_values, row))
+
+        return period_event
+
+    # Yields the stored period events in the order they began, one
+    # at a time
+    def period_events(self):
+        for row in sorted(range(len(self)), key=self._indexes.__getitem__):
+            yield self.get_period_event(row)
 
 
 class PeriodEvent():
-    def __init__(self, start_ts, name, parent):
+    def __init__(self, start_ts, name, parent, index=None):
         self._start_ts = start_ts
         self._name = name
         self._parent = parent
+        # order in which the period began
+        self._index = index
         self._end_ts = None
         self._begin_captures = None
         self._end_captures = None
+        # (qualified capture name, value) pairs to group by, set by the
+        # aggregator when the period ends
+        self._group_by_captures = ()
         # Only during the aggregation phase, store the list
         # of children we want to output.
         self._children = []
 
+    @property
+    def index(self):
+        return self._index
+
     @property
     def start_ts(self):
         return self._start_ts
@@ -212,23 +392,27 @@ class PeriodEvent():
     def end_captures(self):
         return str(self._end_captures)
 
-    def filtered_captures(self, period_group_by):
-        # List of tuple (field, value) for all the captured fields
-        # present in the _period_group_by dict.
+    @property
+    def group_by_captures(self):
+        return self._group_by_captures
+
+    @group_by_captures.setter
+    def group_by_captures(self, group_by_captures):
+        self._group_by_captures = group_by_captures
+
+    # Returns a tuple of (qualified capture name, value) pairs for the
+    # captures in `projection`, a sequence of (capture name, qualified
+    # capture name) pairs sorted by capture name. The begin captures
+    # come first.
+    def project_captures(self, projection):
         _captures = []
-        if self._name not in period_group_by.keys():
-            return _captures
-        if self._begin_captures is not None:
-            for c in sorted(self._begin_captures.keys()):
-                if c in period_group_by[self._name]:
-                    _captures.append(('%s.%s' % (self._name, c),
-                                     self._begin_captures[c]))
-        if self._end_captures is not None:
-            for c in sorted(self._end_captures.keys()):
-                if c in period_group_by[self._name]:
-                    _captures.append(('%s.%s' % (self._name, c),
-                                     self._end_captures[c]))
-        return _captures
+        for captures in (self._begin_captures, self._end_captures):
+            if captures is None:
+                continue
+            for c, qualified_name in projection:
+                if c in captures:
+                    _captures.append((qualified_name, captures[c]))
+        return tuple(_captures)
 
     def full_captures(self):
         _captures = []
@@ -257,3 +441,452 @@ class PeriodEvent():
 
     def add_child(self, child_period_event):
         self._children.append(child_period_event)
+
+
+# Statistics of the values accounted for a period: its duration, and
+# for a child period, its number of occurrences and the percentage of
+# the parent period time it spent, per parent period. Each kind of value
+# is kept in a stats.Summary and a stats.LogLinearHistogram for the
+# frequency distributions.
+class AggregatedStats():
+    # The percentages are recorded in the histogram as integers, in
+    # 1/PC_RATIO of a percent
+    PC_RATIO = 1000
+
+    def __init__(self):
+        self.durations = stats.Summary()
+        self.duration_histogram = stats.LogLinearHistogram()
+        self.counts = stats.Summary()
+        self.count_histogram = stats.LogLinearHistogram()
+        # Percentage of the parent period time spent
+        self.pcs = stats.Summary()
+        self.pc_histogram = stats.LogLinearHistogram()
+        # How many parent periods have us as a child, indexed by
+        # parent period name.
+        self.parent_count = {}
+
+    # Returns new statistics with the values of these ones and
+    # `zero_count` more zero values of each kind, as for the parent
+    # periods in which the child period is not active
+    def new_with_zeros(self, zero_count):
+        aggregated_stats = AggregatedStats()
+        aggregated_stats.parent_count = self.parent_count.copy()
+
+        for summary, other in [
+                (aggregated_stats.durations, self.durations),
+                (aggregated_stats.counts, self.counts),
+                (aggregated_stats.pcs, self.pcs)]:
+            summary.merge(other)
+            summary.update(0, zero_count)
+
+        for histogram, other in [
+                (aggregated_stats.duration_histogram,
+                 self.duration_histogram),
+                (aggregated_stats.count_histogram, self.count_histogram),
+                (aggregated_stats.pc_histogram, self.pc_histogram)]:
+            histogram.merge(other)
+            histogram.record(0, zero_count)
+
+        return aggregated_stats
+
+    def add_count(self, count):
+        self.counts.update(count)
+        self.count_histogram.record(count)
+
+    def add_duration(self, duration):
+        self.durations.update(duration)
+        self.duration_histogram.record(duration)
+
+    def add_percentage(self, pc):
+        self.pcs.update(pc)
+        self.pc_histogram.record(round(pc * self.PC_RATIO))
+
+
+class _TmpAggregation():
+    def __init__(self, parent=None):
+        # self._children[name] = [durations]
+        self._children = {}
+        self._parent = parent
+        self.capture_groups = None
+
+    @property
+    def children(self):
+        return self._children
+
+    def add_child(self, name, duration):
+        if name not in self._children.keys():
+            self._children[name] = []
+        self._children[name].append(duration)
+
+        parent = self._parent
+        while parent is not None:
+            parent.add_child(name, duration)
+            parent = parent._parent
+
+
+class AggregatedPeriodStats():
+    def __init__(self, registry, name):
+        self._reg = registry
+        self._name = name
+        self._children = OrderedDict()
+        self._stats = AggregatedStats()
+        self.nr_periods = 0
+        self._init_children()
+
+    def _recurs_find_children(self, period):
+        for child in period.children:
+            self._children[child.name] = AggregatedStats()
+            self._recurs_find_children(child)
+
+    def _init_children(self):
+        period_def = self._reg.get_period_def(self._name)
+        if period_def is None:
+            return
+        self._recurs_find_children(period_def)
+
+    def finish_period(self, start_ts, end_ts, child_dict):
+        parent_duration = end_ts - start_ts
+        for child in child_dict.keys():
+            count = len(child_dict[child])
+            duration = 0
+            for period in child_dict[child]:
+                duration += period
+            c = self._children[child]
+            pc = (duration / parent_duration) * 100
+
+            c.add_count(count)
+            c.add_duration(duration)
+            c.add_percentage(pc)
+
+            if self._name not in c.parent_count.keys():
+                c.parent_count[self._name] = 0
+            c.parent_count[self._name] += 1
+        self.nr_periods += 1
+
+
+class AggregatedItem():
+    def __init__(self, event, parent_event, group_by_captures, full_captures):
+        self._event = event
+        self._parent = parent_event
+        self._group_by_captures = group_by_captures
+        self._full_captures = full_captures
+
+    @property
+    def event(self):
+        return self._event
+
+    @property
+    def parent_event(self):
+        return self._parent
+
+    @property
+    def group_by_captures(self):
+        return self._group_by_captures
+
+    @property
+    def full_captures(self):
+        return self._full_captures
+
+
+# Removes the duplicate tuples of captures of `captures_list`, keeping
+# their order
+def _dedup_captures(captures_list):
+    try:
+        return list(dict.fromkeys(captures_list))
+    except TypeError:
+        # unhashable capture value
+        deduped = []
+        for captures in captures_list:
+            if captures not in deduped:
+                deduped.append(captures)
+        return deduped
+
+
+# Per-period name, per-parent and per-group aggregates of the period
+# events, updated as they end.
+#
+# A root period event and its descendants are aggregated when all the
+# root period events which began before it have ended, so that the
+# aggregates are built in the same order as a pass over all the period
+# events in the order they began. `period_filter` is
+# fn(period_event) returning whether to account a period event.
+class PeriodAggregator:
+    def __init__(self, registry, period_filter, group_by, select,
+                 aggregate_by, hierarchy=True, by_parent=False,
+                 keep_hierarchical_list=False):
+        self._reg = registry
+        self._period_filter = period_filter
+        self._group_by = group_by
+        # Period name to the (capture name, qualified capture name)
+        # pairs to group by, sorted by capture name
+        self._group_by_projections = {}
+        for name, captures in group_by.items():
+            self._group_by_projections[name] = tuple(
+                (c, '%s.%s' % (name, c)) for c in sorted(set(captures)))
+        # Tuple of group by captures to group key
+        self._group_keys = {}
+        self._select = select
+        self._aggregate_by = aggregate_by
+        self._hierarchy = hierarchy
+        self._by_parent = by_parent
+        self._keep_hierarchical_list = keep_hierarchical_list
+        # List of PeriodEvent ordered in hierarchy (parents are followed
+        # by their children)
+        self._hierarchical_list = []
+        # dict of AggregatedPeriodStats
+        # OrderedDict because we want the same order as the period_tree
+        self._per_period_stats = OrderedDict()
+        self._per_parent_period_group_by_stats = OrderedDict()
+        # Just the stats for the period per group (not relative to
+        # its parents)
+        self._per_period_group_by_stats = OrderedDict()
+        # Dict with parent period as key. Each entry contains a dict
+        # of all child period that each contain a list of
+        # AggregatedItem, None until the parent period ends.
+        # parent_aggregated_dict[parent_period][child_period] = []
+        self._parent_aggregated_dict = {}
+        # Root period events, in the order they began, mapped to
+        # whether they completed (None while they are active)
+        self._root_period_events = {}
+
+    @property
+    def hierarchical_list(self):
+        return self._hierarchical_list
+
+    @property
+    def per_period_stats(self):
+        return self._per_period_stats
+
+    @property
+    def per_parent_period_group_by_stats(self):
+        return self._per_parent_period_group_by_stats
+
+    @property
+    def per_period_group_by_stats(self):
+        return self._per_period_group_by_stats
+
+    @property
+    def parent_aggregated_dict(self):
+        return OrderedDict(
+            sorted(self._parent_aggregated_dict.items(),
+                   key=lambda t: t[0].start_ts))
+
+    def begin_period_event(self, period_event):
+        if self._hierarchy and period_event.parent is None:
+            self._root_period_events[period_event] = None
+
+        if self._by_parent and period_event.name == self._aggregate_by:
+            # reserve the place of the parent period, in the order
+            # the periods began
+            self._parent_aggregated_dict[period_event] = None
+
+    # The children of `period_event` have all ended at this point
+    def end_period_event(self, period_event, completed):
+        if completed:
+            projection = self._group_by_projections.get(period_event.name)
+            if projection is not None:
+                period_event.group_by_captures = \
+                    period_event.project_captures(projection)
+
+        if period_event in self._parent_aggregated_dict:
+            if completed and self._period_filter(period_event):
+                self._parent_aggregated_dict[period_event] = \
+                    self._get_aggregated_children(period_event)
+            else:
+                del self._parent_aggregated_dict[period_event]
+
+        if period_event in self._root_period_events:
+            self._root_period_events[period_event] = completed
+
+            # aggregate the ended root period events which began
+            # before all the active ones
+            while self._root_period_events:
+                root = next(iter(self._root_period_events))
+                root_completed = self._root_period_events[root]
+
+                if root_completed is None:
+                    break
+
+                del self._root_period_events[root]
+
+                if root_completed and self._period_filter(root):
+                    self._add_root_period_event(root)
+
+    # Returns the group key ("name = value, ...") of the group by
+    # captures `group_by_captures`, formatted once per distinct tuple
+    def get_group_key(self, group_by_captures):
+        try:
+            return self._group_keys[group_by_captures]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable capture value
+            return self._format_group_key(group_by_captures)
+
+        group_key = self._format_group_key(group_by_captures)
+        self._group_keys[group_by_captures] = group_key
+
+        return group_key
+
+    @staticmethod
+    def _format_group_key(group_by_captures):
+        return ', '.join(
+            '%s = %s' % (name, value) for name, value in
+            sorted(group_by_captures, key=lambda x: x[0]))
+
+    def _add_root_period_event(self, period_event):
+        # active_periods[period_event] = _TmpAggregation()
+        active_periods = {period_event: _TmpAggregation()}
+        per_group_active_periods = {}
+
+        if period_event.name not in self._per_period_stats.keys():
+            self._per_period_stats[period_event.name] = \
+                AggregatedPeriodStats(self._reg, period_event.name)
+
+        tmp_hierarchical_list = []
+        self._hierarchical_sub(
+            tmp_hierarchical_list, period_event, active_periods, (),
+            per_group_active_periods)
+
+        if self._keep_hierarchical_list:
+            self._hierarchical_list += tmp_hierarchical_list
+
+    def _get_aggregated_children(self, period_event):
+        children = {}
+
+        # Associate the periods with their full capture list (each period
+        # sees its own capture and the capture of all its children)
+        for child in period_event.children:
+            if not self._period_filter(child):
+                continue
+            events = []
+            group_by_captures = list(period_event.group_by_captures)
+            full_captures = period_event.full_captures()
+            self._find_aggregated_subperiods(child, events,
+                                             group_by_captures,
+                                             full_captures)
+            group_by_captures = tuple(group_by_captures)
+            for event in events:
+                if event.name not in children.keys():
+                    children[event.name] = []
+                children[event.name].append(
+                    AggregatedItem(event, period_event, group_by_captures,
+                                   full_captures))
+
+        return children
+
+    def _find_aggregated_subperiods(self, event, events, group_by_captures,
+                                    full_captures):
+        if len(self._select) == 0 or event.name in self._select:
+            events.append(event)
+        group_by_captures += event.group_by_captures
+        full_captures += event.full_captures()
+        for child in event.children:
+            self._find_aggregated_subperiods(child, events,
+                                             group_by_captures,
+                                             full_captures)
+
+    def _add_parent_per_group_active_periods(self, event,
+                                             per_group_active_periods,
+                                             group_key):
+        p = None
+        if event.parent is not None and \
+                event.parent not in per_group_active_periods[group_key].keys():
+            p = self._add_parent_per_group_active_periods(
+                event.parent, per_group_active_periods, group_key)
+        per_group_active_periods[group_key][event] = _TmpAggregation(p)
+        return per_group_active_periods[group_key][event]
+
+    def _account_parents_in_group(self, event, full_captures,
+                                  per_group_active_periods):
+        per_parent_period_group_by_stats = \
+            self._per_parent_period_group_by_stats
+        per_period_group_by_stats = self._per_period_group_by_stats
+
+        for g in full_captures:
+            if len(g) < len(self._group_by.keys()):
+                continue
+            group_key = self.get_group_key(g)
+
+            if len(group_key) == 0:
+                continue
+
+            if group_key not in per_group_active_periods.keys():
+                per_group_active_periods[group_key] = OrderedDict()
+
+            # Statistics for this event alone in this group
+            if group_key not in per_period_group_by_stats.keys():
+                per_period_group_by_stats[group_key] = OrderedDict()
+            if event.name not in per_period_group_by_stats[group_key].keys():
+                per_period_group_by_stats[group_key][event.name] = \
+                    AggregatedStats()
+            per_period_group_by_stats[group_key][event.name].add_duration(
+                event.duration)
+
+            if group_key not in per_parent_period_group_by_stats.keys():
+                per_parent_period_group_by_stats[group_key] = OrderedDict()
+            if event.name not in \
+                    per_parent_period_group_by_stats[group_key].keys():
+                per_parent_period_group_by_stats[group_key][event.name] = \
+                    AggregatedPeriodStats(self._reg, event.name)
+            # Account all parent periods of this event in all of its groups
+            _parent = event.parent
+            _child = event
+            while _parent is not None:
+                if _parent not in per_group_active_periods[group_key].keys():
+                    self._add_parent_per_group_active_periods(
+                        _parent, per_group_active_periods, group_key)
+                if _parent.name not in \
+                        per_parent_period_group_by_stats[group_key].keys():
+                    per_parent_period_group_by_stats[group_key][_parent.name] \
+                        = AggregatedPeriodStats(self._reg, _parent.name)
+                per_group_active_periods[group_key][_parent].add_child(
+                    _child.name, _child.duration)
+                _parent = _parent.parent
+
+            if event in per_group_active_periods[group_key].keys():
+                per_parent_period_group_by_stats[group_key][event.name]. \
+                    finish_period(
+                        event.start_ts, event.end_ts,
+                        per_group_active_periods[group_key][event].children)
+
+    def _hierarchical_sub(self, tmp_hierarchical_list, event, active_periods,
+                          ancestors_captures, per_group_active_periods):
+        tmp_hierarchical_list.append(event)
+
+        event_captures = event.group_by_captures
+
+        # Our local level capture to return to our parent combined with the
+        # captures of our children.
+        local_captures = []
+
+        # Recursively iterate over all the children of this period
+        for child in event.children:
+            if not self._period_filter(child):
+                continue
+            if child.name not in self._per_period_stats.keys():
+                self._per_period_stats[child.name] = AggregatedPeriodStats(
+                    self._reg, child.name)
+            active_periods[event].add_child(child.name, child.duration)
+            active_periods[child] = _TmpAggregation(active_periods[event])
+            child_captures = self._hierarchical_sub(
+                tmp_hierarchical_list, child, active_periods,
+                ancestors_captures + event_captures,
+                per_group_active_periods)
+            del(active_periods[child])
+            for c in child_captures:
+                local_captures.append(event_captures + c)
+        if len(local_captures) == 0:
+            local_captures = [event_captures]
+        full_captures = _dedup_captures(
+            [c + ancestors_captures for c in local_captures])
+        active_periods[event].capture_groups = full_captures
+
+        self._account_parents_in_group(event, full_captures,
+                                       per_group_active_periods)
+
+        self._per_period_stats[event.name].finish_period(
+            event.start_ts, event.end_ts,
+            active_periods[event].children)
+
+        return local_captures
@@ -21,21 +21,36 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import operator
 from . import stats
 from .analysis import Analysis, PeriodData
 
 
 class _PeriodData(PeriodData):
-    def __init__(self):
-        # Log of individual wake scheduling events
+    def __init__(self, top_limit=None):
+        # Log of individual wake scheduling events, empty in
+        # summary-only mode
         self.sched_list = []
-        self.min_latency = None
-        self.max_latency = None
-        self.total_latency = 0
+        # Wake scheduling events with the highest latencies, None when
+        # no top is requested
+        self.top_events = None
+        if top_limit is not None:
+            self.top_events = stats.TopK(top_limit,
+                                         operator.attrgetter('latency'))
+        self.latencies = stats.Summary()
+        self.latency_histogram = stats.LogLinearHistogram()
+        # Summaries and histograms of the latencies, indexed by wakee
+        # priority
+        self.prio_latencies = {}
+        self.prio_histograms = {}
         self.tids = {}
 
 
 class SchedAnalysis(Analysis):
+    STATE_NOTIFICATIONS = frozenset(['sched_switch_per_tid', 'prio_changed'])
+
+    _PAYLOAD_NOTIFICATIONS = True
+
     def __init__(self, state, conf):
         notification_cbs = {
             'sched_switch_per_tid': self._process_sched_switch,
@@ -44,17 +59,17 @@ class SchedAnalysis(Analysis):
         super().__init__(state, conf, notification_cbs)
 
     def count(self, period_data):
-        return len(period_data.sched_list)
+        return period_data.latencies.count
 
     def _create_period_data(self):
-        return _PeriodData()
-
-    def _process_sched_switch(self, period_data, **kwargs):
-        cpu_id = kwargs['cpu_id']
-        switch_ts = kwargs['timestamp']
-        wakee_proc = kwargs['wakee_proc']
-        waker_proc = kwargs['waker_proc']
-        next_tid = kwargs['next_tid']
+        return _PeriodData(self._conf.top_limit)
+
+    def _process_sched_switch(self, period_data, payload):
+        cpu_id = payload.cpu_id
+        switch_ts = payload.timestamp
+        wakee_proc = payload.wakee_proc
+        waker_proc = payload.waker_proc
+        next_tid = payload.next_tid
         wakeup_ts = wakee_proc.last_wakeup
 #        print(period_data)
 
@@ -87,60 +102,76 @@ class SchedAnalysis(Analysis):
 
         sched_event = SchedEvent(
             wakeup_ts, switch_ts, wakee_proc, waker_proc, cpu_id)
-        period_data.tids[next_tid].update_stats(sched_event)
-        self._update_stats(period_data, sched_event)
+        keep_event = not self._conf.summary_only
+        period_data.tids[next_tid].update_stats(sched_event, keep_event)
+        self._update_stats(period_data, sched_event, keep_event)
 
-    def _process_prio_changed(self, period_data, **kwargs):
-        timestamp = kwargs['timestamp']
-        prio = kwargs['prio']
-        tid = kwargs['tid']
+    def _process_prio_changed(self, period_data, payload):
+        timestamp = payload.timestamp
+        prio = payload.prio
+        tid = payload.tid
 
         if tid not in period_data.tids:
             return
 
         period_data.tids[tid].update_prio(timestamp, prio)
 
-    def _update_stats(self, period_data, sched_event):
-        if period_data.min_latency is None or \
-                sched_event.latency < period_data.min_latency:
-            period_data.min_latency = sched_event.latency
+    def _update_stats(self, period_data, sched_event, keep_event):
+        latency = sched_event.latency
+        prio = sched_event.prio
+        period_data.latencies.update(latency)
+        period_data.latency_histogram.record(latency)
+
+        if prio not in period_data.prio_latencies:
+            period_data.prio_latencies[prio] = stats.Summary()
+            period_data.prio_histograms[prio] = stats.LogLinearHistogram()
 
-        if period_data.max_latency is None or \
-                sched_event.latency > period_data.max_latency:
-            period_data.max_latency = sched_event.latency
+        period_data.prio_latencies[prio].update(latency)
+        period_data.prio_histograms[prio].record(latency)
 
-        period_data.total_latency += sched_event.latency
-        period_data.sched_list.append(sched_event)
+        if keep_event:
+            period_data.sched_list.append(sched_event)
+
+        if period_data.top_events is not None:
+            period_data.top_events.add(sched_event)
 
 
 class ProcessSchedStats(stats.Process):
     def __init__(self, pid, tid, comm):
         super().__init__(pid, tid, comm)
 
-        self.min_latency = None
-        self.max_latency = None
-        self.total_latency = 0
+        self.latencies = stats.Summary()
+        self.histogram = stats.LogLinearHistogram()
+        # Individual wake scheduling events, only kept when requested
         self.sched_list = []
 
     @property
     def count(self):
-        return len(self.sched_list)
+        return self.latencies.count
 
-    def update_stats(self, sched_event):
-        if self.min_latency is None or sched_event.latency < self.min_latency:
-            self.min_latency = sched_event.latency
+    @property
+    def min_latency(self):
+        return self.latencies.min
+
+    @property
+    def max_latency(self):
+        return self.latencies.max
+
+    @property
+    def total_latency(self):
+        return self.latencies.total
 
-        if self.max_latency is None or sched_event.latency > self.max_latency:
-            self.max_latency = sched_event.latency
+    def update_stats(self, sched_event, keep_event=False):
+        self.latencies.update(sched_event.latency)
+        self.histogram.record(sched_event.latency)
 
-        self.total_latency += sched_event.latency
-        self.sched_list.append(sched_event)
+        if keep_event:
+            self.sched_list.append(sched_event)
 
     def reset(self):
         super().reset()
-        self.min_latency = None
-        self.max_latency = None
-        self.total_latency = 0
+        self.latencies.reset()
+        self.histogram.reset()
         self.sched_list = []
 
 
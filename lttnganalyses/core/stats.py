@@ -20,6 +20,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import heapq
+import math
 from collections import namedtuple
 
 
@@ -65,3 +67,248 @@ class IO(Stats):
         self.read += other.read
         self.write += other.write
         return self
+
+
+# Streaming count, minimum, maximum, total and standard deviation of a
+# series of values, computed without keeping the values (Welford's
+# algorithm, and Chan et al.'s to account several values at once).
+class Summary(Stats):
+    def __init__(self):
+        self.reset()
+
+    @classmethod
+    def new_from_summaries(cls, summaries):
+        summary = cls()
+        for other in summaries:
+            summary.merge(other)
+
+        return summary
+
+    @property
+    def mean(self):
+        if self.count == 0:
+            return None
+
+        return self.total / self.count
+
+    # Sample standard deviation, like statistics.stdev(), NaN with less
+    # than two values
+    @property
+    def stdev(self):
+        if self.count < 2:
+            return float('nan')
+
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    # Accounts `count` values equal to `value`
+    def update(self, value, count=1):
+        if count <= 0:
+            return
+
+        prev_count = self.count
+        self.count += count
+
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        self.total += value * count
+        delta = value - self._mean
+        self._mean += delta * count / self.count
+        self._m2 += delta * delta * prev_count * count / self.count
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+
+        prev_count = self.count
+        self.count += other.count
+
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+
+        self.total += other.total
+        delta = other._mean - self._mean
+        self._mean += delta * other.count / self.count
+        self._m2 += other._m2 + \
+            delta * delta * prev_count * other.count / self.count
+
+    def reset(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.total = 0
+        self._mean = 0
+        self._m2 = 0
+
+
+# Log-linear histogram of non-negative integer values (HDR-style):
+# values below 2^SUB_BUCKET_BITS get their own bucket, and each
+# following power of two range is split into 2^(SUB_BUCKET_BITS - 1)
+# buckets, bounding the relative bucket width. Each bucket also keeps
+# the total of its values, so that a bucket of equal values maps back
+# to exactly that value.
+#
+# Histograms recorded separately can be merged, and frequency
+# distributions of any range and resolution are derived from the
+# buckets only.
+class LogLinearHistogram(Stats):
+    SUB_BUCKET_BITS = 8
+
+    def __init__(self):
+        self.reset()
+
+    @classmethod
+    def new_from_histograms(cls, histograms):
+        histogram = cls()
+        for other in histograms:
+            histogram.merge(other)
+
+        return histogram
+
+    @classmethod
+    def _get_index(cls, value):
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+
+        return (shift << cls.SUB_BUCKET_BITS) + (value >> shift)
+
+    # Records `count` values equal to `value`
+    def record(self, value, count=1):
+        if count <= 0:
+            return
+
+        if value < 0:
+            value = 0
+
+        index = self._get_index(value)
+        bucket_count = self._counts.get(index)
+        if bucket_count is None:
+            self._counts[index] = count
+            self._totals[index] = value * count
+        else:
+            self._counts[index] = bucket_count + count
+            self._totals[index] += value * count
+
+        self.count += count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in other._counts.items():
+            self._counts[index] = self._counts.get(index, 0) + count
+            self._totals[index] = self._totals.get(index, 0) + \
+                other._totals[index]
+
+        self.count += other.count
+        if other.min is not None and (self.min is None or
+                                      other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or
+                                      other.max > self.max):
+            self.max = other.max
+
+    # Returns the counts of `resolution` equal bins covering
+    # [lower, upper], the upper bound being part of the last bin.
+    # Bucket values are divided by `ratio` before binning (e.g. 1000
+    # for ns values and µs bounds). Values outside the range are left
+    # out.
+    def get_freq_counts(self, lower, upper, resolution, ratio=1):
+        counts = [0] * resolution
+        step = (upper - lower) / resolution
+
+        if step <= 0:
+            return counts
+
+        for index, count in self._counts.items():
+            value = self._totals[index] / count / ratio
+
+            if value < lower or value > upper:
+                continue
+
+            counts[min(int((value - lower) / step), resolution - 1)] += count
+
+        return counts
+
+    # Returns the values at the quantiles `quantiles` (each between 0
+    # and 1, nearest-rank method), None if the histogram is empty. The
+    # relative error is bounded by the bucket width.
+    def get_quantiles(self, quantiles):
+        if self.count == 0:
+            return [None] * len(quantiles)
+
+        ranks = [max(1, math.ceil(quantile * self.count))
+                 for quantile in quantiles]
+        values = [None] * len(quantiles)
+        order = sorted(range(len(ranks)), key=lambda i: ranks[i])
+        cumulative_count = 0
+        next_rank = 0
+
+        for index in sorted(self._counts):
+            count = self._counts[index]
+            cumulative_count += count
+
+            while next_rank < len(order) and \
+                    ranks[order[next_rank]] <= cumulative_count:
+                value = self._totals[index] / count
+                value = min(max(value, self.min), self.max)
+                values[order[next_rank]] = value
+                next_rank += 1
+
+            if next_rank == len(order):
+                break
+
+        return values
+
+    def get_quantile(self, quantile):
+        return self.get_quantiles([quantile])[0]
+
+    def reset(self):
+        # Indexed by bucket index
+        self._counts = {}
+        self._totals = {}
+        self.count = 0
+        self.min = None
+        self.max = None
+
+
+# The `limit` items with the largest `key(item)`, kept in a bounded
+# min-heap: adding an item is O(log limit). Items with equal keys are
+# ordered by insertion, like a stable sort of all the items.
+class TopK(Stats):
+    def __init__(self, limit, key):
+        self.limit = limit
+        self._key = key
+        self.reset()
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def items(self):
+        entries = sorted(self._heap, reverse=True)
+        return [item for _, _, item in entries]
+
+    def add(self, item):
+        if self.limit <= 0:
+            return
+
+        # The negated insertion index evicts the latest of equal keys
+        # first and keeps the items from being compared.
+        entry = (self._key(item), -self._index, item)
+        self._index += 1
+
+        if len(self._heap) < self.limit:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def reset(self):
+        self._heap = []
+        self._index = 0
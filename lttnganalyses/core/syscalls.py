@@ -20,6 +20,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import errno
 from . import stats
 from .analysis import Analysis, PeriodData
 
@@ -31,6 +32,10 @@ class _PeriodData(PeriodData):
 
 
 class SyscallsAnalysis(Analysis):
+    STATE_NOTIFICATIONS = frozenset(['syscall_exit'])
+
+    _PAYLOAD_NOTIFICATIONS = True
+
     def __init__(self, state, conf):
         notification_cbs = {
             'syscall_exit': self._process_syscall_exit
@@ -40,9 +45,9 @@ class SyscallsAnalysis(Analysis):
     def _create_period_data(self):
         return _PeriodData()
 
-    def _process_syscall_exit(self, period_data, **kwargs):
-        cpu_id = kwargs['cpu_id']
-        proc = kwargs['proc']
+    def _process_syscall_exit(self, period_data, payload):
+        cpu_id = payload.cpu_id
+        proc = payload.proc
         tid = proc.tid
         current_syscall = proc.current_syscall
         name = current_syscall.name
@@ -59,7 +64,8 @@ class SyscallsAnalysis(Analysis):
         if name not in proc_stats.syscalls:
             proc_stats.syscalls[name] = SyscallStats(name)
 
-        proc_stats.syscalls[name].update_stats(current_syscall)
+        proc_stats.syscalls[name].update_stats(
+            current_syscall, not self._conf.summary_only)
         proc_stats.total_syscalls += 1
         period_data.total_syscalls += 1
 
@@ -79,22 +85,43 @@ class ProcessSyscallStats(stats.Process):
 class SyscallStats():
     def __init__(self, name):
         self.name = name
-        self.min_duration = None
-        self.max_duration = None
-        self.total_duration = 0
+        self.durations = stats.Summary()
+        self.histogram = stats.LogLinearHistogram()
+        # Number of calls per return value: 'success' or the errno name
+        self.return_count = {}
+        # Individual calls, only kept when requested
         self.syscalls_list = []
 
     @property
     def count(self):
-        return len(self.syscalls_list)
+        return self.durations.count
 
-    def update_stats(self, syscall):
-        duration = syscall.duration
+    @property
+    def min_duration(self):
+        return self.durations.min
 
-        if self.min_duration is None or self.min_duration > duration:
-            self.min_duration = duration
-        if self.max_duration is None or self.max_duration < duration:
-            self.max_duration = duration
+    @property
+    def max_duration(self):
+        return self.durations.max
 
-        self.total_duration += duration
-        self.syscalls_list.append(syscall)
+    @property
+    def total_duration(self):
+        return self.durations.total
+
+    def update_stats(self, syscall, keep_syscall=False):
+        self.durations.update(syscall.duration)
+        self.histogram.record(syscall.duration)
+
+        if syscall.ret >= 0:
+            return_key = 'success'
+        else:
+            try:
+                return_key = errno.errorcode[-syscall.ret]
+            except KeyError:
+                return_key = str(syscall.ret)
+
+        self.return_count[return_key] = \
+            self.return_count.get(return_key, 0) + 1
+
+        if keep_syscall:
+            self.syscalls_list.append(syscall)
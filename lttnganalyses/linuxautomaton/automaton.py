@@ -29,57 +29,91 @@ from .io import IoStateProvider
 from .statedump import StatedumpStateProvider
 from .block import BlockStateProvider
 from .net import NetStateProvider
-from .sv import MemoryManagement
+from .history import HistoryStateProvider
+from .checkpoint import Checkpoint, CheckpointError
+from .sp import get_needed_provider_classes
+from .state import State
 
 
-class State:
-    def __init__(self):
-        self.cpus = {}
-        self.tids = {}
-        self.disks = {}
-        self.mm = MemoryManagement()
-        self._notification_cbs = {}
-        # State changes can be handled differently depending on
-        # version of tracer used, so keep track of it.
-        self._tracer_version = None
+class Automaton:
+    # Providers process each event in this order
+    _PROVIDER_CLASSES = [
+        StatedumpStateProvider,
+        SchedStateProvider,
+        MemStateProvider,
+        IrqStateProvider,
+        SyscallsStateProvider,
+        IoStateProvider,
+        BlockStateProvider,
+        NetStateProvider
+    ]
 
-    def register_notification_cbs(self, period_data, cbs):
-        for name in cbs:
-            if name not in self._notification_cbs:
-                self._notification_cbs[name] = []
-            # Store the callback in the form of (period_data, function)
-            self._notification_cbs[name].append((period_data, cbs[name]))
+    # Only the providers needed to send the notifications named in
+    # `notifications` (and their dependencies) are created. None means
+    # all the providers.
+    def __init__(self, notifications=None):
+        self._state = State()
+        self._notifications = notifications
+        self._state_providers = []
+        self._create_providers()
 
-    def send_notification_cb(self, name, **kwargs):
-        if name in self._notification_cbs:
-            for cb_tuple in self._notification_cbs[name]:
-                cb_tuple[1](cb_tuple[0], **kwargs)
+    def _create_providers(self, required=()):
+        existing = {type(sp): sp for sp in self._state_providers}
+        provider_classes = get_needed_provider_classes(
+            self._PROVIDER_CLASSES, self._notifications, required)
+        self._state_providers = [existing.get(cls) or cls(self._state)
+                                 for cls in provider_classes]
 
-    def clear_period_notification_cbs(self, period_data):
-        for name in self._notification_cbs:
-            for cb in self._notification_cbs[name]:
-                if cb[0] == period_data:
-                    self._notification_cbs[name].remove(cb)
+        # the IO state provider processes the exit of the I/O syscalls
+        # after the syscalls state provider, and clears them itself
+        io_sp_running = IoStateProvider in provider_classes
+        for sp in self._state_providers:
+            if type(sp) is SyscallsStateProvider:
+                sp.clear_io_syscalls = not io_sp_running
 
+    # Records the state changes into `builder` (a sht.HistoryBuilder).
+    # This must be called before processing the first event.
+    def enable_history(self, builder):
+        self._create_providers(HistoryStateProvider.DEPENDENCIES)
+        self._state_providers.append(
+            HistoryStateProvider(self._state, builder))
 
-class Automaton:
-    def __init__(self):
-        self._state = State()
-        self._state_providers = [
-            SchedStateProvider(self._state),
-            MemStateProvider(self._state),
-            IrqStateProvider(self._state),
-            SyscallsStateProvider(self._state),
-            IoStateProvider(self._state),
-            StatedumpStateProvider(self._state),
-            BlockStateProvider(self._state),
-            NetStateProvider(self._state)
-        ]
+    @property
+    def provider_names(self):
+        return [type(sp).__name__ for sp in self._state_providers]
 
     def process_event(self, ev):
         for sp in self._state_providers:
             sp.process_event(ev)
 
+    def end(self):
+        for sp in self._state_providers:
+            sp.end()
+
+    def create_checkpoint(self, timestamp, trace_begin=None, trace_end=None):
+        checkpoint = Checkpoint.new_from_state(self._state, timestamp,
+                                               trace_begin, trace_end)
+        checkpoint.provider_names = self.provider_names
+        for sp in self._state_providers:
+            data = sp.get_checkpoint_data()
+            if data is not None:
+                checkpoint.providers[type(sp).__name__] = data
+
+        return checkpoint
+
+    def restore_checkpoint(self, checkpoint):
+        if not checkpoint.has_providers(self.provider_names):
+            raise CheckpointError(
+                'Checkpoint built by other state providers ({})'.format(
+                    ', '.join(checkpoint.provider_names)))
+
+        checkpoint.apply_to_state(self._state)
+        self._state.reindex_cpus()
+        for sp in self._state_providers:
+            name = type(sp).__name__
+            if name in checkpoint.providers:
+                sp.restore_checkpoint_data(checkpoint.providers[name])
+
     @property
     def state(self):
         return self._state
@@ -21,10 +21,16 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from . import sp, sv
+from . import notification, sp, sv
+from .sched import SchedStateProvider
+from .statedump import StatedumpStateProvider
 
 
 class BlockStateProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset(['block_rq_complete'])
+    # the processes and disk names
+    DEPENDENCIES = [SchedStateProvider, StatedumpStateProvider]
+
     def __init__(self, state):
         cbs = {
             'block_rq_complete': self._process_block_rq_complete,
@@ -35,6 +41,13 @@ class BlockStateProvider(sp.StateProvider):
 
         super().__init__(state, cbs)
         self._remap_requests = []
+        self._rq_complete_payload = notification.BlockRqCompletePayload()
+
+    def get_checkpoint_data(self):
+        return self._remap_requests
+
+    def restore_checkpoint_data(self, data):
+        self._remap_requests = data
 
     def _process_block_bio_remap(self, event):
         dev = event['dev']
@@ -114,7 +127,10 @@ class BlockStateProvider(sp.StateProvider):
             proc = self._state.tids[req.tid]
         else:
             proc = None
-        self._state.send_notification_cb('block_rq_complete', req=req,
-                                         proc=proc, cpu_id=event['cpu_id'],
-                                         disk=disk)
+        payload = self._rq_complete_payload
+        payload.req = req
+        payload.proc = proc
+        payload.cpu_id = event['cpu_id']
+        payload.disk = disk
+        self._state.send_notification('block_rq_complete', payload)
         del disk.pending_requests[sector]
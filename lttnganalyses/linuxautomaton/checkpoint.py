@@ -0,0 +1,207 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import pickle
+import struct
+import zlib
+
+
+class CheckpointError(Exception):
+    pass
+
+
+class Checkpoint():
+    # On-disk layout: magic, header (format version, checkpoint
+    # timestamp, trace begin and end timestamps), then the
+    # zlib-compressed pickle of the state. The header is kept
+    # uncompressed so that a store can pick the right checkpoint
+    # without decoding every payload.
+    MAGIC = b'LTTNGACK'
+    VERSION = 3
+    FILE_SUFFIX = '.ckpt'
+    _HEADER = struct.Struct('<IQqq')
+    # Only the trace-derived state is saved, the notification
+    # callbacks belong to the analyses of the current run.
+    _STATE_ATTRS = ['cpus', 'tids', 'disks', 'mm', 'tracer_version']
+
+    def __init__(self, timestamp, trace_begin=None, trace_end=None):
+        self.timestamp = timestamp
+        self.trace_begin = trace_begin
+        self.trace_end = trace_end
+        self.state = {}
+        # provider-private state, indexed by provider class name
+        self.providers = {}
+        # class names of the providers which built the state, a
+        # checkpoint only restores the state of these providers
+        self.provider_names = []
+
+    @classmethod
+    def new_from_state(cls, state, timestamp, trace_begin=None,
+                       trace_end=None):
+        checkpoint = cls(timestamp, trace_begin, trace_end)
+        for attr in cls._STATE_ATTRS:
+            checkpoint.state[attr] = getattr(state, attr, None)
+
+        return checkpoint
+
+    def apply_to_state(self, state):
+        for attr in self._STATE_ATTRS:
+            if attr in self.state:
+                setattr(state, attr, self.state[attr])
+
+    def has_providers(self, provider_names):
+        return set(provider_names) <= set(self.provider_names)
+
+    def matches_trace(self, trace_begin, trace_end):
+        return self.trace_begin == trace_begin and \
+            self.trace_end == trace_end
+
+    @staticmethod
+    def _encode_ts(ts):
+        # -1 stands for an unknown trace bound
+        if ts is None:
+            return -1
+        return ts
+
+    @staticmethod
+    def _decode_ts(ts):
+        if ts == -1:
+            return None
+        return ts
+
+    def to_bytes(self):
+        payload = pickle.dumps((self.state, self.providers,
+                                self.provider_names),
+                               protocol=pickle.HIGHEST_PROTOCOL)
+        header = self._HEADER.pack(self.VERSION, self.timestamp,
+                                   self._encode_ts(self.trace_begin),
+                                   self._encode_ts(self.trace_end))
+
+        return self.MAGIC + header + zlib.compress(payload)
+
+    @classmethod
+    def _parse_header(cls, data):
+        size = len(cls.MAGIC) + cls._HEADER.size
+
+        if len(data) < size or not data.startswith(cls.MAGIC):
+            raise CheckpointError('Not a state checkpoint')
+
+        version, timestamp, trace_begin, trace_end = \
+            cls._HEADER.unpack_from(data, len(cls.MAGIC))
+
+        if version != cls.VERSION:
+            raise CheckpointError(
+                'Unsupported checkpoint version {} (expected {})'.format(
+                    version, cls.VERSION))
+
+        checkpoint = cls(timestamp, cls._decode_ts(trace_begin),
+                         cls._decode_ts(trace_end))
+
+        return checkpoint, size
+
+    @classmethod
+    def new_from_bytes(cls, data):
+        checkpoint, size = cls._parse_header(data)
+
+        try:
+            checkpoint.state, checkpoint.providers, \
+                checkpoint.provider_names = pickle.loads(
+                    zlib.decompress(data[size:]))
+        except (zlib.error, pickle.UnpicklingError, EOFError) as e:
+            raise CheckpointError('Corrupted checkpoint: {}'.format(e))
+
+        return checkpoint
+
+    @classmethod
+    def new_from_header(cls, path):
+        # Only read the header: the returned checkpoint has no state
+        with open(path, 'rb') as f:
+            data = f.read(len(cls.MAGIC) + cls._HEADER.size)
+
+        return cls._parse_header(data)[0]
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.new_from_bytes(f.read())
+
+    def save(self, path):
+        # Write to a temporary file first, an interrupted run must not
+        # leave a truncated checkpoint behind.
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+
+
+class CheckpointStore():
+    def __init__(self, path):
+        self._path = path
+
+    @property
+    def path(self):
+        return self._path
+
+    def _get_checkpoint_path(self, timestamp):
+        # zero-padded so that the files sort chronologically
+        return os.path.join(self._path, '{:020d}{}'.format(
+            timestamp, Checkpoint.FILE_SUFFIX))
+
+    def save(self, checkpoint):
+        os.makedirs(self._path, exist_ok=True)
+        path = self._get_checkpoint_path(checkpoint.timestamp)
+        checkpoint.save(path)
+
+        return path
+
+    def _list_headers(self):
+        if not os.path.isdir(self._path):
+            return
+
+        for filename in sorted(os.listdir(self._path)):
+            if not filename.endswith(Checkpoint.FILE_SUFFIX):
+                continue
+
+            path = os.path.join(self._path, filename)
+
+            try:
+                yield path, Checkpoint.new_from_header(path)
+            except (CheckpointError, OSError):
+                continue
+
+    def find_nearest(self, timestamp, trace_begin=None, trace_end=None):
+        # Return the path of the latest checkpoint taken at or before
+        # timestamp for the given trace, or None.
+        nearest_path = None
+        nearest_ts = None
+
+        for path, header in self._list_headers():
+            if not header.matches_trace(trace_begin, trace_end):
+                continue
+            if header.timestamp > timestamp:
+                continue
+            if nearest_ts is None or header.timestamp > nearest_ts:
+                nearest_path = path
+                nearest_ts = header.timestamp
+
+        return nearest_path
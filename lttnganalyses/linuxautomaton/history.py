@@ -0,0 +1,130 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from . import sp
+from .io import IoStateProvider
+from .irq import IrqStateProvider
+from .sched import SchedStateProvider
+from .statedump import StatedumpStateProvider
+from .syscalls import SyscallsStateProvider
+
+
+class HistoryStateProvider(sp.StateProvider):
+    # Records the changes the other providers make to the state into a
+    # sht.HistoryBuilder, so it must process each event after them.
+    DEPENDENCIES = [
+        SchedStateProvider,
+        IrqStateProvider,
+        SyscallsStateProvider,
+        IoStateProvider,
+        StatedumpStateProvider
+    ]
+
+    def __init__(self, state, builder):
+        cbs = {
+            'sched_switch': self._process_sched_switch,
+            'syscall_entry': self._process_syscall_entry,
+            'syscall_exit': self._process_syscall_exit,
+            'irq_handler_entry': self._process_irq_handler_entry,
+            'irq_handler_exit': self._process_irq_handler_exit,
+            'softirq_entry': self._process_softirq_entry,
+            'softirq_exit': self._process_softirq_exit,
+        }
+
+        super().__init__(state, cbs)
+        self._builder = builder
+        # FD changes come from several providers
+        self._state.register_notification_cbs(self, {
+            'create_fd': self._process_create_fd,
+            'update_fd': self._process_create_fd,
+            'close_fd': self._process_close_fd,
+            'fd_table_inherited': self._process_fd_table_inherited,
+            'statedump_bulk': self._process_statedump_bulk,
+        })
+
+    def _process_sched_switch(self, event):
+        self._builder.modify(('cpus', event['cpu_id'], 'current_tid'),
+                             event['next_tid'], event.timestamp)
+
+    def _process_syscall_entry(self, event):
+        proc = self._state.get_current_proc(event['cpu_id'])
+        if proc is None or proc.current_syscall is None:
+            return
+
+        self._builder.modify(('tids', proc.tid, 'syscall'),
+                             proc.current_syscall.name, event.timestamp)
+
+    def _process_syscall_exit(self, event):
+        proc = self._state.get_current_proc(event['cpu_id'])
+        if proc is None:
+            return
+
+        self._builder.modify(('tids', proc.tid, 'syscall'), None,
+                             event.timestamp)
+
+    def _process_irq_handler_entry(self, event):
+        self._builder.modify(('cpus', event['cpu_id'], 'irq'), event['irq'],
+                             event.timestamp)
+
+    def _process_irq_handler_exit(self, event):
+        self._builder.modify(('cpus', event['cpu_id'], 'irq'), None,
+                             event.timestamp)
+
+    def _process_softirq_entry(self, event):
+        self._builder.modify(('cpus', event['cpu_id'], 'softirq'),
+                             event['vec'], event.timestamp)
+
+    def _process_softirq_exit(self, event):
+        self._builder.modify(('cpus', event['cpu_id'], 'softirq'), None,
+                             event.timestamp)
+
+    # FDs are owned by the process (the parent of the threads)
+    def _set_fd(self, proc, fd, timestamp):
+        filename = proc.fds[fd].filename
+        if filename is None:
+            filename = ''
+
+        self._builder.modify(('tids', proc.tid, 'fds', fd), filename,
+                             timestamp)
+
+    def _process_create_fd(self, period_data, payload):
+        parent_proc = payload.parent_proc
+        if payload.fd in parent_proc.fds:
+            self._set_fd(parent_proc, payload.fd, payload.timestamp)
+
+    def _process_close_fd(self, period_data, payload):
+        self._builder.modify(('tids', payload.parent_proc.tid, 'fds',
+                              payload.fd), None, payload.timestamp)
+
+    def _process_fd_table_inherited(self, period_data, payload):
+        proc = payload.proc
+        for fd in proc.fds:
+            self._set_fd(proc, fd, payload.timestamp)
+
+    def _process_statedump_bulk(self, period_data, payload):
+        for proc, fds in payload.new_fds:
+            for fd in fds:
+                self._set_fd(proc, fd, payload.timestamp)
+
+        for proc, fd in payload.updated_fds:
+            self._set_fd(proc, fd, payload.timestamp)
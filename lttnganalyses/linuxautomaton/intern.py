@@ -0,0 +1,64 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import sys
+
+
+class InternPool():
+    # Pool of the strings repeated across the state and analysis
+    # objects (process names, filenames), so that all the objects
+    # holding an equal string share a single copy of it.
+    def __init__(self):
+        self._strings = {}
+        self._accounting = False
+        self.lookups = 0
+        self.hits = 0
+        self.saved_bytes = 0
+
+    @property
+    def size(self):
+        return len(self._strings)
+
+    @property
+    def pool_bytes(self):
+        return sum(sys.getsizeof(s) for s in self._strings)
+
+    def enable_accounting(self):
+        self._accounting = True
+
+    def intern(self, string):
+        if string is None:
+            return None
+
+        if not self._accounting:
+            return self._strings.setdefault(string, string)
+
+        self.lookups += 1
+        interned = self._strings.setdefault(string, string)
+
+        if interned is not string:
+            # this copy can now be freed
+            self.hits += 1
+            self.saved_bytes += sys.getsizeof(string)
+
+        return interned
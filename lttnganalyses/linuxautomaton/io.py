@@ -24,11 +24,23 @@
 import os
 import socket
 from babeltrace import CTFScope
-from . import sp, sv
-from ..common import format_utils, trace_utils
+from . import notification, sp, sv
+from .sched import SchedStateProvider
+from .statedump import StatedumpStateProvider
+from .syscalls import SyscallsStateProvider
+from ..common import format_utils
 
 
 class IoStateProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset([
+        'create_fd', 'close_fd', 'update_fd', 'io_rq_exit'])
+    # the current syscall of each process and the FDs of the statedump
+    DEPENDENCIES = [
+        SchedStateProvider,
+        SyscallsStateProvider,
+        StatedumpStateProvider
+    ]
+
     def __init__(self, state):
         cbs = {
             'syscall_entry': self._process_syscall_entry,
@@ -40,52 +52,57 @@ class IoStateProvider(sp.StateProvider):
         }
 
         super().__init__(state, cbs)
+        self._io_rq_exit_payload = notification.IoRqExitPayload()
+        # splice and sendfile64 (SyscallClass.read_write) are not
+        # tracked on entry yet
+        self._class_handlers = {
+            sv.SyscallClass.open: self._track_open,
+            sv.SyscallClass.close: self._track_close,
+            sv.SyscallClass.read: self._track_read_write,
+            sv.SyscallClass.write: self._track_read_write,
+            sv.SyscallClass.sync: self._track_sync,
+        }
+        # Indexed by entry event name, (SyscallInfo, handler) tuples
+        self._entry_handlers = {}
+
+    def _get_entry_handler(self, event):
+        entry_handler = self._entry_handlers.get(event.name)
+
+        if entry_handler is None:
+            info = sv.SyscallTable.get_info(event)
+            handler = self._class_handlers.get(info.syscall_class)
+            entry_handler = (info, handler)
+            self._entry_handlers[event.name] = entry_handler
+
+        return entry_handler
 
     def _process_syscall_entry(self, event):
-        # Only handle IO Syscalls
-        name = trace_utils.get_syscall_name(event)
-        if name not in sv.SyscallConsts.IO_SYSCALLS:
-            return
+        info, handler = self._get_entry_handler(event)
 
-        cpu_id = event['cpu_id']
-        if cpu_id not in self._state.cpus:
+        # Only handle IO Syscalls
+        if not info.is_io:
             return
 
-        cpu = self._state.cpus[cpu_id]
-        if cpu.current_tid is None:
+        proc = self._state.get_current_proc(event['cpu_id'])
+        if proc is None:
             return
 
-        proc = self._state.tids[cpu.current_tid]
-
         # check if we can fix the pid from a context
         self._fix_context_pid(event, proc)
 
-        if name in sv.SyscallConsts.OPEN_SYSCALLS:
-            self._track_open(event, name, proc)
-        elif name in sv.SyscallConsts.CLOSE_SYSCALLS:
-            self._track_close(event, name, proc)
-        elif name in sv.SyscallConsts.READ_SYSCALLS or \
-                name in sv.SyscallConsts.WRITE_SYSCALLS:
-            self._track_read_write(event, name, proc)
-        elif name in sv.SyscallConsts.SYNC_SYSCALLS:
-            self._track_sync(event, name, proc)
+        if handler is not None:
+            handler(event, info, proc)
 
     def _process_syscall_exit(self, event):
-        cpu_id = event['cpu_id']
-        if cpu_id not in self._state.cpus:
+        proc = self._state.get_current_proc(event['cpu_id'])
+        if proc is None:
             return
 
-        cpu = self._state.cpus[cpu_id]
-        if cpu.current_tid is None:
-            return
-
-        proc = self._state.tids[cpu.current_tid]
         current_syscall = proc.current_syscall
         if current_syscall is None:
             return
 
-        name = current_syscall.name
-        if name not in sv.SyscallConsts.IO_SYSCALLS:
+        if not sv.SyscallTable.is_io_syscall(current_syscall.name):
             return
 
         self._track_io_rq_exit(event, proc)
@@ -93,36 +110,29 @@ class IoStateProvider(sp.StateProvider):
         proc.current_syscall = None
 
     def _process_connect(self, event):
-        cpu_id = event['cpu_id']
-        if cpu_id not in self._state.cpus:
+        proc = self._state.get_current_proc(event['cpu_id'])
+        if proc is None:
             return
 
-        cpu = self._state.cpus[cpu_id]
-        if cpu.current_tid is None:
-            return
-
-        proc = self._state.tids[cpu.current_tid]
         parent_proc = self._get_parent_proc(proc)
 
         # FIXME: handle on syscall_exit_connect only when succesful
         if 'family' in event and event['family'] == socket.AF_INET:
             fd = event['fd']
             if fd in parent_proc.fds:
-                parent_proc.fds[fd].filename = format_utils.format_ipv4(
-                    event['v4addr'], event['dport']
-                )
-            self._state.send_notification_cb('update_fd',
-                                             fd=fd,
-                                             parent_proc=proc,
-                                             timestamp=event.timestamp,
-                                             cpu_id=event['cpu_id'])
+                filename = format_utils.format_ipv4(event['v4addr'],
+                                                    event['dport'])
+                parent_proc.fds.get_mutable(fd).filename = \
+                    self._state.intern_pool.intern(filename)
+            self._send_fd_notification('update_fd', fd, proc,
+                                       event.timestamp, event['cpu_id'])
 
     def _process_writeback_pages_written(self, event):
         for cpu in self._state.cpus.values():
-            if cpu.current_tid is None:
+            if cpu.current_proc is None:
                 continue
 
-            current_syscall = self._state.tids[cpu.current_tid].current_syscall
+            current_syscall = cpu.current_proc.current_syscall
             if current_syscall is None:
                 continue
 
@@ -130,15 +140,11 @@ class IoStateProvider(sp.StateProvider):
                 current_syscall.io_rq.pages_written += event['pages']
 
     def _process_mm_vmscan_wakeup_kswapd(self, event):
-        cpu_id = event['cpu_id']
-        if cpu_id not in self._state.cpus:
+        proc = self._state.get_current_proc(event['cpu_id'])
+        if proc is None:
             return
 
-        cpu = self._state.cpus[cpu_id]
-        if cpu.current_tid is None:
-            return
-
-        current_syscall = self._state.tids[cpu.current_tid].current_syscall
+        current_syscall = proc.current_syscall
         if current_syscall is None:
             return
 
@@ -147,11 +153,10 @@ class IoStateProvider(sp.StateProvider):
 
     def _process_mm_page_free(self, event):
         for cpu in self._state.cpus.values():
-            if cpu.current_tid is None:
+            proc = cpu.current_proc
+            if proc is None:
                 continue
 
-            proc = self._state.tids[cpu.current_tid]
-
             # if the current process is kswapd0, we need to
             # attribute the page freed to the process that
             # woke it up.
@@ -165,7 +170,8 @@ class IoStateProvider(sp.StateProvider):
             if current_syscall.io_rq and current_syscall.io_rq.woke_kswapd:
                 current_syscall.io_rq.pages_freed += 1
 
-    def _track_open(self, event, name, proc):
+    def _track_open(self, event, info, proc):
+        name = info.name
         current_syscall = proc.current_syscall
         if name in sv.SyscallConsts.DISK_OPEN_SYSCALLS:
             current_syscall.io_rq = sv.OpenIORequest.new_from_disk_open(
@@ -178,6 +184,12 @@ class IoStateProvider(sp.StateProvider):
                 event, proc.tid)
         elif name in sv.SyscallConsts.DUP_OPEN_SYSCALLS:
             self._track_dup(event, name, proc)
+            return
+        else:
+            return
+
+        io_rq = current_syscall.io_rq
+        io_rq.filename = self._state.intern_pool.intern(io_rq.filename)
 
     def _track_dup(self, event, name, proc):
         current_syscall = proc.current_syscall
@@ -213,11 +225,12 @@ class IoStateProvider(sp.StateProvider):
             cloexec = event['flags'] & os.O_CLOEXEC == os.O_CLOEXEC
             current_syscall.io_rq.cloexec = cloexec
 
-    def _track_close(self, event, name, proc):
+    def _track_close(self, event, info, proc):
         proc.current_syscall.io_rq = sv.CloseIORequest(
             event.timestamp, proc.tid, event['fd'])
 
-    def _track_read_write(self, event, name, proc):
+    def _track_read_write(self, event, info, proc):
+        name = info.name
         current_syscall = proc.current_syscall
 
         if name == 'splice':
@@ -229,21 +242,11 @@ class IoStateProvider(sp.StateProvider):
                 event, proc.tid)
             return
 
-        if name in ['writev', 'pwritev', 'readv', 'preadv']:
-            size_key = 'vlen'
-        elif name == 'recvfrom':
-            size_key = 'size'
-        elif name == 'sendto':
-            size_key = 'len'
-        elif name in ['recvmsg', 'sendmsg']:
-            size_key = None
-        else:
-            size_key = 'count'
-
         current_syscall.io_rq = sv.ReadWriteIORequest.new_from_fd_event(
-            event, proc.tid, size_key)
+            event, proc.tid, info.size_key)
 
-    def _track_sync(self, event, name, proc):
+    def _track_sync(self, event, info, proc):
+        name = info.name
         current_syscall = proc.current_syscall
 
         if name == 'sync':
@@ -272,11 +275,12 @@ class IoStateProvider(sp.StateProvider):
             self._create_fd(proc, io_rq, cpu_id)
 
         parent_proc = self._get_parent_proc(proc)
-        self._state.send_notification_cb('io_rq_exit',
-                                         io_rq=io_rq,
-                                         proc=proc,
-                                         parent_proc=parent_proc,
-                                         cpu_id=cpu_id)
+        payload = self._io_rq_exit_payload
+        payload.io_rq = io_rq
+        payload.proc = proc
+        payload.parent_proc = parent_proc
+        payload.cpu_id = cpu_id
+        self._state.send_notification('io_rq_exit', payload)
 
         if isinstance(io_rq, sv.CloseIORequest) and ret == 0:
             self._close_fd(proc, io_rq.fd, io_rq.end_ts, cpu_id)
@@ -286,40 +290,30 @@ class IoStateProvider(sp.StateProvider):
 
         if io_rq.fd is not None and io_rq.fd not in parent_proc.fds:
             if isinstance(io_rq, sv.OpenIORequest):
-                parent_proc.fds[io_rq.fd] = sv.FD.new_from_open_rq(io_rq)
+                parent_proc.fds.set_new(io_rq.fd,
+                                        sv.FD.new_from_open_rq(io_rq))
             else:
-                parent_proc.fds[io_rq.fd] = sv.FD(io_rq.fd)
+                parent_proc.fds.set_new(io_rq.fd, sv.FD(io_rq.fd))
 
-            self._state.send_notification_cb('create_fd',
-                                             fd=io_rq.fd,
-                                             parent_proc=parent_proc,
-                                             timestamp=io_rq.end_ts,
-                                             cpu_id=cpu_id)
+            self._send_fd_notification('create_fd', io_rq.fd, parent_proc,
+                                       io_rq.end_ts, cpu_id)
         elif isinstance(io_rq, sv.ReadWriteIORequest):
             if io_rq.fd_in is not None and io_rq.fd_in not in parent_proc.fds:
-                parent_proc.fds[io_rq.fd_in] = sv.FD(io_rq.fd_in)
-                self._state.send_notification_cb('create_fd',
-                                                 fd=io_rq.fd_in,
-                                                 parent_proc=parent_proc,
-                                                 timestamp=io_rq.end_ts,
-                                                 cpu_id=cpu_id)
+                parent_proc.fds.set_new(io_rq.fd_in, sv.FD(io_rq.fd_in))
+                self._send_fd_notification('create_fd', io_rq.fd_in,
+                                           parent_proc, io_rq.end_ts, cpu_id)
 
             if io_rq.fd_out is not None and \
                io_rq.fd_out not in parent_proc.fds:
-                parent_proc.fds[io_rq.fd_out] = sv.FD(io_rq.fd_out)
-                self._state.send_notification_cb('create_fd',
-                                                 fd=io_rq.fd_out,
-                                                 parent_proc=parent_proc,
-                                                 timestamp=io_rq.end_ts,
-                                                 cpu_id=cpu_id)
+                parent_proc.fds.set_new(io_rq.fd_out,
+                                        sv.FD(io_rq.fd_out))
+                self._send_fd_notification('create_fd', io_rq.fd_out,
+                                           parent_proc, io_rq.end_ts, cpu_id)
 
     def _close_fd(self, proc, fd, timestamp, cpu_id):
         parent_proc = self._get_parent_proc(proc)
-        self._state.send_notification_cb('close_fd',
-                                         fd=fd,
-                                         parent_proc=parent_proc,
-                                         timestamp=timestamp,
-                                         cpu_id=cpu_id)
+        self._send_fd_notification('close_fd', fd, parent_proc, timestamp,
+                                   cpu_id)
         del parent_proc.fds[fd]
 
     def _get_parent_proc(self, proc):
@@ -348,4 +342,4 @@ class IoStateProvider(sp.StateProvider):
                     proc.pid = event['pid']
                     parent_proc = sv.Process(proc.pid, proc.pid, proc.comm,
                                              proc.prio)
-                    self._state.tids[parent_proc.pid] = parent_proc
+                    self._state.add_proc(parent_proc)
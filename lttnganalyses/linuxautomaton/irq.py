@@ -21,10 +21,13 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from . import sp, sv
+from . import notification, sp, sv
 
 
 class IrqStateProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset([
+        'irq_handler_entry', 'irq_handler_exit', 'softirq_exit'])
+
     def __init__(self, state):
         cbs = {
             'irq_handler_entry': self._process_irq_handler_entry,
@@ -35,25 +38,26 @@ class IrqStateProvider(sp.StateProvider):
         }
 
         super().__init__(state, cbs)
-
-    def _get_cpu(self, cpu_id):
-        if cpu_id not in self._state.cpus:
-            self._state.cpus[cpu_id] = sv.CPU(cpu_id)
-
-        return self._state.cpus[cpu_id]
+        self._irq_handler_entry_payload = \
+            notification.IrqHandlerEntryPayload()
+        self._irq_handler_exit_payload = notification.IrqHandlerExitPayload()
+        self._softirq_exit_payload = notification.SoftIrqExitPayload()
+        # exited SoftIRQ objects, ready to be reused
+        self._free_softirqs = []
 
     # Hard IRQs
     def _process_irq_handler_entry(self, event):
-        cpu = self._get_cpu(event['cpu_id'])
+        cpu = self._state.get_cpu(event['cpu_id'])
         irq = sv.HardIRQ.new_from_irq_handler_entry(event)
         cpu.current_hard_irq = irq
 
-        self._state.send_notification_cb('irq_handler_entry',
-                                         id=irq.id,
-                                         irq_name=event['name'])
+        payload = self._irq_handler_entry_payload
+        payload.id = irq.id
+        payload.irq_name = event['name']
+        self._state.send_notification('irq_handler_entry', payload)
 
     def _process_irq_handler_exit(self, event):
-        cpu = self._get_cpu(event['cpu_id'])
+        cpu = self._state.get_cpu(event['cpu_id'])
         if cpu.current_hard_irq is None or \
            cpu.current_hard_irq.id != event['irq']:
             cpu.current_hard_irq = None
@@ -62,57 +66,63 @@ class IrqStateProvider(sp.StateProvider):
         cpu.current_hard_irq.end_ts = event.timestamp
         cpu.current_hard_irq.ret = event['ret']
 
-        self._state.send_notification_cb('irq_handler_exit',
-                                         hard_irq=cpu.current_hard_irq)
+        payload = self._irq_handler_exit_payload
+        payload.hard_irq = cpu.current_hard_irq
+        self._state.send_notification('irq_handler_exit', payload)
         cpu.current_hard_irq = None
 
     # SoftIRQs
+    #
+    # The SoftIRQ object sent with softirq_exit is reused for a later
+    # raise or entry: subscribers keeping it must copy it.
+    def _new_softirq(self, vec, cpu_id, raise_ts=None, begin_ts=None):
+        if not self._free_softirqs:
+            return sv.SoftIRQ(vec, cpu_id, raise_ts, begin_ts)
+
+        irq = self._free_softirqs.pop()
+        irq.reset(vec, cpu_id, raise_ts, begin_ts)
+        return irq
+
     def _process_softirq_raise(self, event):
-        cpu = self._get_cpu(event['cpu_id'])
+        cpu_id = event['cpu_id']
         vec = event['vec']
-
-        if vec not in cpu.current_softirqs:
-            cpu.current_softirqs[vec] = []
+        queue = self._state.get_cpu(cpu_id).get_softirq_queue(vec)
 
         # Don't append a SoftIRQ object if one has already been raised,
         # because they are level-triggered. The only exception to this
         # is if the first SoftIRQ object already had a begin_ts which
         # means this raise was triggered after its entry, and will be
         # handled in the following softirq_entry
-        if cpu.current_softirqs[vec] and \
-           cpu.current_softirqs[vec][0].begin_ts is None:
+        if queue and queue[0].begin_ts is None:
             return
 
-        irq = sv.SoftIRQ.new_from_softirq_raise(event)
-        cpu.current_softirqs[vec].append(irq)
+        queue.append(self._new_softirq(vec, cpu_id,
+                                       raise_ts=event.timestamp))
 
     def _process_softirq_entry(self, event):
-        cpu = self._get_cpu(event['cpu_id'])
+        cpu_id = event['cpu_id']
         vec = event['vec']
+        queue = self._state.get_cpu(cpu_id).get_softirq_queue(vec)
 
-        if vec not in cpu.current_softirqs:
-            cpu.current_softirqs[vec] = []
-
-        if cpu.current_softirqs[vec]:
-            cpu.current_softirqs[vec][0].begin_ts = event.timestamp
+        if queue:
+            queue[0].begin_ts = event.timestamp
         else:
             # SoftIRQ entry without a corresponding raise
-            irq = sv.SoftIRQ.new_from_softirq_entry(event)
-            cpu.current_softirqs[vec].append(irq)
+            queue.append(self._new_softirq(vec, cpu_id,
+                                           begin_ts=event.timestamp))
 
     def _process_softirq_exit(self, event):
-        cpu = self._get_cpu(event['cpu_id'])
-        vec = event['vec']
-        # List of enqueued softirqs for the current cpu/vec
-        # combination. None if vec is not found in the dictionary.
-        current_softirqs = cpu.current_softirqs.get(vec)
+        queue = self._state.get_cpu(event['cpu_id']).get_softirq_queue(
+            event['vec'])
 
-        # Ignore the exit if either vec was not in the cpu's dict or
-        # if its irq list was empty (i.e. no matching raise).
-        if not current_softirqs:
+        # Ignore the exit if no softirq was enqueued for this cpu/vec
+        # combination (i.e. no matching raise).
+        if not queue:
             return
 
-        current_softirqs[0].end_ts = event.timestamp
-        self._state.send_notification_cb('softirq_exit',
-                                         softirq=current_softirqs[0])
-        del current_softirqs[0]
+        irq = queue.popleft()
+        irq.end_ts = event.timestamp
+        payload = self._softirq_exit_payload
+        payload.softirq = irq
+        self._state.send_notification('softirq_exit', payload)
+        self._free_softirqs.append(irq)
@@ -21,10 +21,15 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from . import sp
+from . import notification, sp
+from .sched import SchedStateProvider
 
 
 class MemStateProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset(['tid_page_alloc', 'tid_page_free'])
+    # the current process of each CPU
+    DEPENDENCIES = [SchedStateProvider]
+
     def __init__(self, state):
         cbs = {
             'mm_page_alloc': self._process_mm_page_alloc,
@@ -34,17 +39,8 @@ class MemStateProvider(sp.StateProvider):
         }
 
         super().__init__(state, cbs)
-
-    def _get_current_proc(self, event):
-        cpu_id = event['cpu_id']
-        if cpu_id not in self._state.cpus:
-            return None
-
-        cpu = self._state.cpus[cpu_id]
-        if cpu.current_tid is None:
-            return None
-
-        return self._state.tids[cpu.current_tid]
+        # shared by tid_page_alloc and tid_page_free
+        self._page_payload = notification.ProcCpuPayload()
 
     def _process_mm_page_alloc(self, event):
         self._state.mm.page_count += 1
@@ -58,13 +54,14 @@ class MemStateProvider(sp.StateProvider):
             if process.current_syscall.io_rq:
                 process.current_syscall.io_rq.pages_allocated += 1
 
-        current_process = self._get_current_proc(event)
+        current_process = self._state.get_current_proc(event['cpu_id'])
         if current_process is None:
             return
 
-        self._state.send_notification_cb('tid_page_alloc',
-                                         proc=current_process,
-                                         cpu_id=event['cpu_id'])
+        payload = self._page_payload
+        payload.proc = current_process
+        payload.cpu_id = event['cpu_id']
+        self._state.send_notification('tid_page_alloc', payload)
 
     def _process_mm_page_free(self, event):
         if self._state.mm.page_count == 0:
@@ -72,10 +69,11 @@ class MemStateProvider(sp.StateProvider):
 
         self._state.mm.page_count -= 1
 
-        current_process = self._get_current_proc(event)
+        current_process = self._state.get_current_proc(event['cpu_id'])
         if current_process is None:
             return
 
-        self._state.send_notification_cb('tid_page_free',
-                                         proc=current_process,
-                                         cpu_id=event['cpu_id'])
+        payload = self._page_payload
+        payload.proc = current_process
+        payload.cpu_id = event['cpu_id']
+        self._state.send_notification('tid_page_free', payload)
@@ -21,10 +21,17 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from . import sp, sv
+from . import notification, sp, sv
+from .io import IoStateProvider
+from .sched import SchedStateProvider
+from .syscalls import SyscallsStateProvider
 
 
 class NetStateProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset(['net_dev_xmit', 'netif_receive_skb'])
+    # the FD of the current I/O request of each process
+    DEPENDENCIES = [SchedStateProvider, SyscallsStateProvider, IoStateProvider]
+
     def __init__(self, state):
         cbs = {
             'net_dev_xmit': self._process_net_dev_xmit,
@@ -32,22 +39,21 @@ class NetStateProvider(sp.StateProvider):
         }
 
         super().__init__(state, cbs)
+        self._net_dev_xmit_payload = notification.NetDevXmitPayload()
+        self._netif_receive_skb_payload = \
+            notification.NetifReceiveSkbPayload()
 
     def _process_net_dev_xmit(self, event):
-        self._state.send_notification_cb('net_dev_xmit',
-                                         iface_name=event['name'],
-                                         sent_bytes=event['len'],
-                                         cpu_id=event['cpu_id'])
-
-        cpu_id = event['cpu_id']
-        if cpu_id not in self._state.cpus:
-            return
+        payload = self._net_dev_xmit_payload
+        payload.iface_name = event['name']
+        payload.sent_bytes = event['len']
+        payload.cpu_id = event['cpu_id']
+        self._state.send_notification('net_dev_xmit', payload)
 
-        cpu = self._state.cpus[cpu_id]
-        if cpu.current_tid is None:
+        proc = self._state.get_current_proc(event['cpu_id'])
+        if proc is None:
             return
 
-        proc = self._state.tids[cpu.current_tid]
         current_syscall = proc.current_syscall
         if current_syscall is None:
             return
@@ -60,10 +66,11 @@ class NetStateProvider(sp.StateProvider):
             # setting FD Type if FD hasn't yet been created
             fd = current_syscall.io_rq.fd
             if fd in proc.fds and proc.fds[fd].fd_type == sv.FDType.unknown:
-                proc.fds[fd].fd_type = sv.FDType.maybe_net
+                proc.fds.get_mutable(fd).fd_type = sv.FDType.maybe_net
 
     def _process_netif_receive_skb(self, event):
-        self._state.send_notification_cb('netif_receive_skb',
-                                         iface_name=event['name'],
-                                         recv_bytes=event['len'],
-                                         cpu_id=event['cpu_id'])
+        payload = self._netif_receive_skb_payload
+        payload.iface_name = event['name']
+        payload.recv_bytes = event['len']
+        payload.cpu_id = event['cpu_id']
+        self._state.send_notification('netif_receive_skb', payload)
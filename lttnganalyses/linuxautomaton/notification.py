@@ -0,0 +1,288 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Notification payloads
+#
+# Each notification type has a fixed payload type. State providers
+# keep one payload object per notification they send and update it in
+# place before each send, so subscribers must copy what they need and
+# never keep a reference to the payload itself.
+class Payload():
+    __slots__ = []
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Wraps the keyword arguments of the legacy
+# State.send_notification_cb() interface.
+class KwargsPayload(Payload):
+    __slots__ = ['_kwargs']
+
+    def __init__(self, kwargs):
+        self._kwargs = kwargs
+
+    def __getattr__(self, name):
+        try:
+            return self._kwargs[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def as_dict(self):
+        return self._kwargs
+
+
+# sched_switch_per_cpu, sched_switch_per_tid
+class SchedSwitchPayload(Payload):
+    __slots__ = ['timestamp', 'cpu_id', 'prev_tid', 'next_tid', 'prev_comm',
+                 'next_comm', 'wakee_proc', 'waker_proc']
+
+    def __init__(self):
+        self.timestamp = None
+        self.cpu_id = None
+        self.prev_tid = None
+        self.next_tid = None
+        self.prev_comm = None
+        self.next_comm = None
+        self.wakee_proc = None
+        self.waker_proc = None
+
+
+# prio_changed
+class PrioChangedPayload(Payload):
+    __slots__ = ['timestamp', 'tid', 'prio']
+
+    def __init__(self):
+        self.timestamp = None
+        self.tid = None
+        self.prio = None
+
+
+# sched_migrate_task, tid_page_alloc, tid_page_free
+class ProcCpuPayload(Payload):
+    __slots__ = ['proc', 'cpu_id']
+
+    def __init__(self):
+        self.proc = None
+        self.cpu_id = None
+
+
+# create_fd, close_fd, update_fd
+class FdPayload(Payload):
+    __slots__ = ['fd', 'parent_proc', 'timestamp', 'cpu_id']
+
+    def __init__(self):
+        self.fd = None
+        self.parent_proc = None
+        self.timestamp = None
+        self.cpu_id = None
+
+
+# fd_table_inherited
+class FdTableInheritedPayload(Payload):
+    __slots__ = ['proc', 'parent_proc', 'timestamp', 'cpu_id']
+
+    def __init__(self):
+        self.proc = None
+        self.parent_proc = None
+        self.timestamp = None
+        self.cpu_id = None
+
+
+# io_rq_exit
+class IoRqExitPayload(Payload):
+    __slots__ = ['io_rq', 'proc', 'parent_proc', 'cpu_id']
+
+    def __init__(self):
+        self.io_rq = None
+        self.proc = None
+        self.parent_proc = None
+        self.cpu_id = None
+
+
+# irq_handler_entry
+class IrqHandlerEntryPayload(Payload):
+    __slots__ = ['id', 'irq_name']
+
+    def __init__(self):
+        self.id = None
+        self.irq_name = None
+
+
+# irq_handler_exit
+class IrqHandlerExitPayload(Payload):
+    __slots__ = ['hard_irq']
+
+    def __init__(self):
+        self.hard_irq = None
+
+
+# softirq_exit: the SoftIRQ object is reused by later softirqs
+class SoftIrqExitPayload(Payload):
+    __slots__ = ['softirq']
+
+    def __init__(self):
+        self.softirq = None
+
+
+# syscall_exit
+class SyscallExitPayload(Payload):
+    __slots__ = ['proc', 'event', 'cpu_id']
+
+    def __init__(self):
+        self.proc = None
+        self.event = None
+        self.cpu_id = None
+
+
+# block_rq_complete
+class BlockRqCompletePayload(Payload):
+    __slots__ = ['req', 'proc', 'cpu_id', 'disk']
+
+    def __init__(self):
+        self.req = None
+        self.proc = None
+        self.cpu_id = None
+        self.disk = None
+
+
+# lttng_statedump_block_device
+class BlockDevicePayload(Payload):
+    __slots__ = ['dev', 'diskname']
+
+    def __init__(self):
+        self.dev = None
+        self.diskname = None
+
+
+# statedump_bulk: parent_procs is a list of (thread, process) pairs,
+# new_fds a list of (process, sv.FDTable of the FDs added by the
+# statedump) pairs and updated_fds a list of (process, fd) pairs
+class StatedumpBulkPayload(Payload):
+    __slots__ = ['parent_procs', 'new_fds', 'updated_fds', 'timestamp',
+                 'cpu_id']
+
+    def __init__(self):
+        self.parent_procs = None
+        self.new_fds = None
+        self.updated_fds = None
+        self.timestamp = None
+        self.cpu_id = None
+
+
+# net_dev_xmit
+class NetDevXmitPayload(Payload):
+    __slots__ = ['iface_name', 'sent_bytes', 'cpu_id']
+
+    def __init__(self):
+        self.iface_name = None
+        self.sent_bytes = None
+        self.cpu_id = None
+
+
+# netif_receive_skb
+class NetifReceiveSkbPayload(Payload):
+    __slots__ = ['iface_name', 'recv_bytes', 'cpu_id']
+
+    def __init__(self):
+        self.iface_name = None
+        self.recv_bytes = None
+        self.cpu_id = None
+
+
+# Adapts a legacy callback, fn(period_data, **kwargs), to the payload
+# interface, fn(period_data, payload).
+def kwargs_cb(fn):
+    def cb(period_data, payload):
+        fn(period_data, **payload.as_dict())
+
+    return cb
+
+
+class Subscription():
+    __slots__ = ['_key', '_subscriber_dicts']
+
+    def __init__(self, key, subscriber_dicts):
+        self._key = key
+        # the per-notification subscriber dicts this subscription
+        # was added to
+        self._subscriber_dicts = subscriber_dicts
+
+    @property
+    def key(self):
+        return self._key
+
+
+class NotificationBus():
+    def __init__(self):
+        # Indexed by notification name, each value is a dict mapping a
+        # subscription key to a (period_data, function) tuple. Dicts
+        # keep the subscription order for dispatching while allowing
+        # O(1) removal.
+        self._subscribers = {}
+        self._next_key = 0
+
+    def subscribe(self, period_data, cbs):
+        key = self._next_key
+        self._next_key += 1
+        subscriber_dicts = []
+
+        for name, fn in cbs.items():
+            subscribers = self._subscribers.get(name)
+            if subscribers is None:
+                subscribers = {}
+                self._subscribers[name] = subscribers
+
+            subscribers[key] = (period_data, fn)
+            subscriber_dicts.append(subscribers)
+
+        return Subscription(key, subscriber_dicts)
+
+    def unsubscribe(self, subscription):
+        key = subscription.key
+
+        for subscribers in subscription._subscriber_dicts:
+            subscribers.pop(key, None)
+
+        subscription._subscriber_dicts = []
+
+    def has_subscribers(self, name):
+        return bool(self._subscribers.get(name))
+
+    def subscriber_count(self, name):
+        subscribers = self._subscribers.get(name)
+        if subscribers is None:
+            return 0
+
+        return len(subscribers)
+
+    # Callbacks must not subscribe or unsubscribe while being
+    # dispatched: periods only begin and end from the period engine,
+    # never from a notification.
+    def send(self, name, payload):
+        subscribers = self._subscribers.get(name)
+        if not subscribers:
+            return
+
+        for period_data, fn in subscribers.values():
+            fn(period_data, payload)
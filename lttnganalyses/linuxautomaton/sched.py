@@ -21,11 +21,19 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from . import sp, sv
+from . import notification, sp, sv
+from .statedump import StatedumpStateProvider
 from ..common import version_utils
 
 
 class SchedStateProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset([
+        'sched_switch_per_cpu', 'sched_switch_per_tid',
+        'prio_changed', 'sched_migrate_task', 'fd_table_inherited',
+        'close_fd'])
+    # processes known before they are first scheduled
+    DEPENDENCIES = [StatedumpStateProvider]
+
     # The priority offset for sched_wak* events was fixed in
     # lttng-modules 2.7.1 upwards
     PRIO_OFFSET_FIX_VERSION = version_utils.Version(2, 7, 1)
@@ -43,35 +51,21 @@ class SchedStateProvider(sp.StateProvider):
         }
 
         super().__init__(state, cbs)
-
-    def _sched_switch_per_cpu(self, cpu_id, next_tid):
-        if cpu_id not in self._state.cpus:
-            self._state.cpus[cpu_id] = sv.CPU(cpu_id)
-
-        cpu = self._state.cpus[cpu_id]
-        # exclude swapper process
-        if next_tid == 0:
-            cpu.current_tid = None
-        else:
-            cpu.current_tid = next_tid
-
-    def _create_proc(self, tid):
-        if tid not in self._state.tids:
-            if tid == 0:
-                # special case for the swapper
-                self._state.tids[tid] = sv.Process(tid=tid, pid=0)
-            else:
-                self._state.tids[tid] = sv.Process(tid=tid)
+        self._sched_switch_payload = notification.SchedSwitchPayload()
+        self._prio_changed_payload = notification.PrioChangedPayload()
+        self._migrate_task_payload = notification.ProcCpuPayload()
+        self._fd_table_inherited_payload = \
+            notification.FdTableInheritedPayload()
 
     def _sched_switch_per_tid(self, next_tid, next_comm, prev_tid):
         # Instantiate processes if new
-        self._create_proc(prev_tid)
-        self._create_proc(next_tid)
-
-        next_proc = self._state.tids[next_tid]
+        self._state.get_or_create_proc(prev_tid)
+        next_proc = self._state.get_or_create_proc(next_tid)
         next_proc.comm = next_comm
         next_proc.prev_tid = prev_tid
 
+        return next_proc
+
     def _check_prio_changed(self, timestamp, tid, prio):
         # Ignore swapper
         if tid == 0:
@@ -81,42 +75,45 @@ class SchedStateProvider(sp.StateProvider):
 
         if proc.prio != prio:
             proc.prio = prio
-            self._state.send_notification_cb(
-                'prio_changed', timestamp=timestamp, tid=tid, prio=prio)
+            payload = self._prio_changed_payload
+            payload.timestamp = timestamp
+            payload.tid = tid
+            payload.prio = prio
+            self._state.send_notification('prio_changed', payload)
 
     def _process_sched_switch(self, event):
         timestamp = event.timestamp
         cpu_id = event['cpu_id']
         next_tid = event['next_tid']
-        next_comm = event['next_comm']
+        intern = self._state.intern_pool.intern
+        next_comm = intern(event['next_comm'])
         next_prio = event['next_prio']
         prev_tid = event['prev_tid']
         prev_prio = event['prev_prio']
-        prev_comm = event['prev_comm']
+        prev_comm = intern(event['prev_comm'])
 
-        self._sched_switch_per_cpu(cpu_id, next_tid)
-        self._sched_switch_per_tid(next_tid, next_comm, prev_tid)
+        wakee_proc = self._sched_switch_per_tid(next_tid, next_comm,
+                                                prev_tid)
+        self._state.switch_task(cpu_id, next_tid)
         self._check_prio_changed(timestamp, prev_tid, prev_prio)
         self._check_prio_changed(timestamp, next_tid, next_prio)
 
-        wakee_proc = self._state.tids[next_tid]
         waker_proc = None
         if wakee_proc.last_waker is not None:
             waker_proc = self._state.tids[wakee_proc.last_waker]
 
-        cb_data = {
-            'timestamp': timestamp,
-            'cpu_id': cpu_id,
-            'prev_tid': prev_tid,
-            'next_tid': next_tid,
-            'next_comm': next_comm,
-            'wakee_proc': wakee_proc,
-            'waker_proc': waker_proc,
-            'prev_comm': prev_comm,
-        }
+        payload = self._sched_switch_payload
+        payload.timestamp = timestamp
+        payload.cpu_id = cpu_id
+        payload.prev_tid = prev_tid
+        payload.next_tid = next_tid
+        payload.prev_comm = prev_comm
+        payload.next_comm = next_comm
+        payload.wakee_proc = wakee_proc
+        payload.waker_proc = waker_proc
 
-        self._state.send_notification_cb('sched_switch_per_cpu', **cb_data)
-        self._state.send_notification_cb('sched_switch_per_tid', **cb_data)
+        self._state.send_notification('sched_switch_per_cpu', payload)
+        self._state.send_notification('sched_switch_per_tid', payload)
 
         wakee_proc.last_wakeup = None
         wakee_proc.last_waker = None
@@ -125,16 +122,14 @@ class SchedStateProvider(sp.StateProvider):
         tid = event['tid']
         prio = event['prio']
 
-        if tid not in self._state.tids:
-            proc = sv.Process()
-            proc.tid = tid
-            proc.comm = event['comm']
-            self._state.tids[tid] = proc
-        else:
-            proc = self._state.tids[tid]
+        proc = self._state.migrate_task(
+            tid, event['dest_cpu'],
+            self._state.intern_pool.intern(event['comm']))
 
-        self._state.send_notification_cb(
-            'sched_migrate_task', proc=proc, cpu_id=event['cpu_id'])
+        payload = self._migrate_task_payload
+        payload.proc = proc
+        payload.cpu_id = event['cpu_id']
+        self._state.send_notification('sched_migrate_task', payload)
         self._check_prio_changed(event.timestamp, tid, prio)
 
     def _process_sched_wakeup(self, event):
@@ -146,44 +141,27 @@ class SchedStateProvider(sp.StateProvider):
         if self._state.tracer_version < self.PRIO_OFFSET_FIX_VERSION:
             prio -= 100
 
-        if target_cpu not in self._state.cpus:
-            self._state.cpus[target_cpu] = sv.CPU(target_cpu)
-
-        if current_cpu not in self._state.cpus:
-            self._state.cpus[current_cpu] = sv.CPU(current_cpu)
+        self._state.get_cpu(target_cpu)
 
-        # If the TID is already executing on a CPU, ignore this wakeup
-        for cpu_id in self._state.cpus:
-            cpu = self._state.cpus[cpu_id]
-            if cpu.current_tid == tid:
-                return
-
-        if tid not in self._state.tids:
-            proc = sv.Process()
-            proc.tid = tid
-            self._state.tids[tid] = proc
+        # Ignored if the TID is already executing on a CPU
+        proc = self._state.wakeup_task(tid, current_cpu, event.timestamp)
+        if proc is None:
+            return
 
         self._check_prio_changed(event.timestamp, tid, prio)
 
-        # A process can be woken up multiple times, only record
-        # the first one
-        if self._state.tids[tid].last_wakeup is None:
-            self._state.tids[tid].last_wakeup = event.timestamp
-            if self._state.cpus[current_cpu].current_tid is not None:
-                self._state.tids[tid].last_waker = \
-                    self._state.cpus[current_cpu].current_tid
-
     def _process_sched_process_fork(self, event):
         child_tid = event['child_tid']
         child_pid = event['child_pid']
-        child_comm = event['child_comm']
+        intern = self._state.intern_pool.intern
+        child_comm = intern(event['child_comm'])
         parent_pid = event['parent_pid']
         parent_tid = event['parent_pid']
-        parent_comm = event['parent_comm']
+        parent_comm = intern(event['parent_comm'])
 
         if parent_tid not in self._state.tids:
-            self._state.tids[parent_tid] = sv.Process(
-                parent_tid, parent_pid, parent_comm)
+            self._state.add_proc(sv.Process(parent_tid, parent_pid,
+                                            parent_comm))
         else:
             self._state.tids[parent_tid].pid = parent_pid
             self._state.tids[parent_tid].comm = parent_comm
@@ -191,40 +169,33 @@ class SchedStateProvider(sp.StateProvider):
         parent_proc = self._state.tids[parent_pid]
         child_proc = sv.Process(child_tid, child_pid, child_comm)
 
-        for fd in parent_proc.fds:
-            old_fd = parent_proc.fds[fd]
-            child_proc.fds[fd] = sv.FD.new_from_fd(old_fd)
-            # Note: the parent_proc key in the notification function
-            # refers to the parent of the FD, which in this case is
-            # the child_proc created by the fork
-            self._state.send_notification_cb(
-                'create_fd', fd=fd, parent_proc=child_proc,
-                timestamp=event.timestamp, cpu_id=event['cpu_id'])
+        # The child shares the parent's FDs until either of them
+        # modifies its table, and a single notification replaces the
+        # create_fd notifications of every inherited FD.
+        self._state.fork_task(parent_proc, child_proc)
 
-        self._state.tids[child_tid] = child_proc
+        if child_proc.fds:
+            payload = self._fd_table_inherited_payload
+            payload.proc = child_proc
+            payload.parent_proc = parent_proc
+            payload.timestamp = event.timestamp
+            payload.cpu_id = event['cpu_id']
+            self._state.send_notification('fd_table_inherited', payload)
 
     def _process_sched_process_exec(self, event):
-        tid = event['tid']
-
-        if tid not in self._state.tids:
-            proc = sv.Process()
-            proc.tid = tid
-            self._state.tids[tid] = proc
-        else:
-            proc = self._state.tids[tid]
+        proc = self._state.get_or_create_proc(event['tid'])
 
         # Use LTTng procname context if available
         if 'procname' in event:
-            proc.comm = event['procname']
+            proc.comm = self._state.intern_pool.intern(event['procname'])
 
         toremove = []
         for fd in proc.fds:
             if proc.fds[fd].cloexec:
                 toremove.append(fd)
         for fd in toremove:
-            self._state.send_notification_cb(
-                'close_fd', fd=fd, parent_proc=proc,
-                timestamp=event.timestamp, cpu_id=event['cpu_id'])
+            self._send_fd_notification('close_fd', fd, proc,
+                                       event.timestamp, event['cpu_id'])
             del proc.fds[fd]
 
     def _process_sched_pi_setprio(self, event):
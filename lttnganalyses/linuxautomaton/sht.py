@@ -0,0 +1,383 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+
+class HistoryError(Exception):
+    pass
+
+
+# State history file
+#
+# A state attribute is a path, for example ('cpus', 3, 'current_tid'),
+# and its history is the list of the [start, end) intervals during
+# which it had a value. The intervals of a single attribute never
+# overlap, so each attribute is stored as a run of intervals sorted by
+# start time: finding the value of an attribute at a given time is a
+# binary search in its run, directly in the memory-mapped file.
+#
+# On-disk layout:
+#
+#   * magic and header (format version, time range covered by the
+#     history, trace begin and end timestamps, attribute count,
+#     offset and size of the metadata);
+#   * attribute index: first interval and interval count of each
+#     attribute;
+#   * intervals: start, end, value kind and value;
+#   * metadata: zlib-compressed JSON of the attribute paths and of the
+#     string values, which intervals reference by index.
+MAGIC = b'LTTNGASH'
+VERSION = 1
+_HEADER = struct.Struct('<IqqqqIQQ')
+_INDEX_ENTRY = struct.Struct('<QQ')
+_INTERVAL = struct.Struct('<qqqq')
+_INTERVAL_FIELDS = 4
+_START = struct.Struct('<q')
+
+# value kinds
+_INT = 0
+_STRING = 1
+
+
+def _encode_ts(ts):
+    # -1 stands for an unknown timestamp
+    if ts is None:
+        return -1
+    return ts
+
+
+def _decode_ts(ts):
+    if ts == -1:
+        return None
+    return ts
+
+
+class HistoryBuilder():
+    # Records the state changes in memory, in one compact array per
+    # attribute, until save() writes the history file.
+    def __init__(self):
+        self._quarks = {}
+        self._attributes = []
+        self._intervals = []
+        # (start, value) of the current value of each attribute, or
+        # None if it has no value
+        self._ongoing = []
+        self._strings = {}
+        self._begin_ts = None
+        self._end_ts = None
+
+    @property
+    def begin_ts(self):
+        return self._begin_ts
+
+    @property
+    def end_ts(self):
+        return self._end_ts
+
+    def _get_quark(self, attribute):
+        quark = self._quarks.get(attribute)
+
+        if quark is None:
+            quark = len(self._attributes)
+            self._quarks[attribute] = quark
+            self._attributes.append(attribute)
+            self._intervals.append(array.array('q'))
+            self._ongoing.append(None)
+
+        return quark
+
+    def _add_interval(self, quark, start, end, value):
+        # zero-length intervals cannot be queried
+        if start == end:
+            return
+
+        if isinstance(value, str):
+            kind = _STRING
+            value = self._strings.setdefault(value, len(self._strings))
+        elif isinstance(value, int):
+            kind = _INT
+        else:
+            raise TypeError('Unsupported state value: {}'.format(value))
+
+        self._intervals[quark].extend((start, end, kind, value))
+
+    # Sets the value of an attribute from timestamp on. None means the
+    # attribute has no value anymore. A change older than the last
+    # change of the attribute is applied at the time of the latter.
+    def modify(self, attribute, value, timestamp):
+        quark = self._get_quark(attribute)
+        ongoing = self._ongoing[quark]
+        intervals = self._intervals[quark]
+
+        if ongoing is not None:
+            timestamp = max(timestamp, ongoing[0])
+        elif intervals:
+            # end of the last interval
+            timestamp = max(timestamp, intervals[-3])
+
+        if self._begin_ts is None:
+            self._begin_ts = timestamp
+
+        if self._end_ts is None or timestamp > self._end_ts:
+            self._end_ts = timestamp
+
+        if ongoing is not None:
+            start, prev_value = ongoing
+            if prev_value == value:
+                return
+
+            self._add_interval(quark, start, timestamp, prev_value)
+        elif value is None:
+            return
+
+        if value is None:
+            self._ongoing[quark] = None
+        else:
+            self._ongoing[quark] = (timestamp, value)
+
+    # Closes the ongoing intervals and writes the history file. The
+    # history covers up to end_ts (included), which defaults to the
+    # timestamp of the last change.
+    def save(self, path, end_ts=None, trace_begin=None, trace_end=None):
+        if end_ts is None:
+            end_ts = self._end_ts
+
+        if end_ts is None:
+            end = -1
+        else:
+            end = end_ts + 1
+
+        for quark, ongoing in enumerate(self._ongoing):
+            if ongoing is not None:
+                self._add_interval(quark, ongoing[0], end, ongoing[1])
+                self._ongoing[quark] = None
+
+        strings = [None] * len(self._strings)
+        for string, index in self._strings.items():
+            strings[index] = string
+
+        metadata = zlib.compress(json.dumps({
+            'attributes': self._attributes,
+            'strings': strings,
+        }).encode())
+
+        data_offset = len(MAGIC) + _HEADER.size + \
+            len(self._attributes) * _INDEX_ENTRY.size
+        record_count = 0
+        index = []
+
+        for intervals in self._intervals:
+            count = len(intervals) // _INTERVAL_FIELDS
+            index.append(_INDEX_ENTRY.pack(record_count, count))
+            record_count += count
+
+        meta_offset = data_offset + record_count * _INTERVAL.size
+        header = _HEADER.pack(VERSION, _encode_ts(self._begin_ts), end,
+                              _encode_ts(trace_begin), _encode_ts(trace_end),
+                              len(self._attributes), meta_offset,
+                              len(metadata))
+
+        # Write to a temporary file first, an interrupted run must not
+        # leave a truncated history behind.
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC + header)
+            f.write(b''.join(index))
+            for intervals in self._intervals:
+                if sys.byteorder != 'little':
+                    intervals = array.array('q', intervals)
+                    intervals.byteswap()
+                intervals.tofile(f)
+            f.write(metadata)
+        os.replace(tmp_path, path)
+
+
+class StateHistory():
+    # Read-only, memory-mapped state history file
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            self._parse()
+        except (ValueError, HistoryError, struct.error, zlib.error) as e:
+            self.close()
+            if isinstance(e, HistoryError):
+                raise
+            raise HistoryError('Corrupted state history: {}'.format(e))
+
+    def _parse(self):
+        size = len(MAGIC) + _HEADER.size
+        if len(self._map) < size or self._map[:len(MAGIC)] != MAGIC:
+            raise HistoryError('Not a state history')
+
+        version, begin, end, trace_begin, trace_end, attr_count, \
+            meta_offset, meta_size = _HEADER.unpack_from(self._map,
+                                                         len(MAGIC))
+        if version != VERSION:
+            raise HistoryError(
+                'Unsupported state history version {} (expected {})'.format(
+                    version, VERSION))
+
+        self._begin_ts = _decode_ts(begin)
+        self._end_ts = _decode_ts(end)
+        self._trace_begin = _decode_ts(trace_begin)
+        self._trace_end = _decode_ts(trace_end)
+        self._index_offset = size
+        self._intervals_offset = size + attr_count * _INDEX_ENTRY.size
+
+        metadata = json.loads(zlib.decompress(
+            self._map[meta_offset:meta_offset + meta_size]).decode())
+        self._strings = metadata['strings']
+        # JSON turns the attribute paths into lists
+        self._quarks = {tuple(attribute): quark for quark, attribute
+                        in enumerate(metadata['attributes'])}
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def begin_ts(self):
+        return self._begin_ts
+
+    # the history covers [begin_ts, end_ts)
+    @property
+    def end_ts(self):
+        return self._end_ts
+
+    def matches_trace(self, trace_begin, trace_end):
+        return self._trace_begin == trace_begin and \
+            self._trace_end == trace_end
+
+    def get_attributes(self, prefix=()):
+        prefix = tuple(prefix)
+        return [attribute for attribute in self._quarks
+                if attribute[:len(prefix)] == prefix]
+
+    def _get_run(self, attribute):
+        quark = self._quarks.get(tuple(attribute))
+        if quark is None:
+            return 0, 0
+
+        return _INDEX_ENTRY.unpack_from(
+            self._map, self._index_offset + quark * _INDEX_ENTRY.size)
+
+    def _get_interval(self, index):
+        start, end, kind, value = _INTERVAL.unpack_from(
+            self._map, self._intervals_offset + index * _INTERVAL.size)
+
+        if kind == _STRING:
+            value = self._strings[value]
+
+        return start, end, value
+
+    # Index of the last interval of the run starting at or before
+    # timestamp, or first - 1 if there is none.
+    def _find(self, first, count, timestamp):
+        lo = first
+        hi = first + count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = _START.unpack_from(
+                self._map, self._intervals_offset + mid * _INTERVAL.size)[0]
+            if start <= timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo - 1
+
+    # Value of attribute at timestamp, None if it had no value
+    def query(self, attribute, timestamp):
+        first, count = self._get_run(attribute)
+        index = self._find(first, count, timestamp)
+
+        if index < first:
+            return None
+
+        start, end, value = self._get_interval(index)
+        if timestamp >= end:
+            return None
+
+        return value
+
+    # Yields the (start, end, value) intervals of attribute
+    # intersecting [begin, end)
+    def query_range(self, attribute, begin, end):
+        first, count = self._get_run(attribute)
+        index = max(self._find(first, count, begin), first)
+
+        for index in range(index, first + count):
+            interval = self._get_interval(index)
+            if interval[0] >= end:
+                break
+            if interval[1] > begin:
+                yield interval
+
+    # Values of all the attributes at timestamp
+    def query_full(self, timestamp):
+        values = {}
+
+        for attribute in self._quarks:
+            value = self.query(attribute, timestamp)
+            if value is not None:
+                values[attribute] = value
+
+        return values
+
+    def get_cpu_tid(self, cpu_id, timestamp):
+        return self.query(('cpus', cpu_id, 'current_tid'), timestamp)
+
+    # Time spent on the CPUs by each TID (including the swapper, TID
+    # 0) within [begin, end), indexed by TID
+    def get_cpu_usage(self, begin, end):
+        usage = {}
+
+        for attribute in self.get_attributes(['cpus']):
+            if attribute[2:] != ('current_tid',):
+                continue
+
+            for start, stop, tid in self.query_range(attribute, begin, end):
+                duration = min(stop, end) - max(start, begin)
+                usage[tid] = usage.get(tid, 0) + duration
+
+        return usage
@@ -21,10 +21,21 @@
 # SOFTWARE.
 
 
+from . import notification
+
+
 class StateProvider:
+    # Names of the notifications this provider sends
+    NOTIFICATIONS = frozenset()
+    # Providers maintaining the parts of the state this provider
+    # relies on
+    DEPENDENCIES = []
+
     def __init__(self, state, cbs):
         self._state = state
         self._cbs = cbs
+        # create_fd, close_fd and update_fd are sent by several providers
+        self._fd_payload = notification.FdPayload()
 
     def process_event(self, ev):
         name = ev.name
@@ -39,3 +50,52 @@ class StateProvider:
                 (name.startswith('exit_syscall') or
                  name.startswith('syscall_exit_')):
             self._cbs['syscall_exit'](ev)
+
+    def _send_fd_notification(self, name, fd, parent_proc, timestamp,
+                              cpu_id):
+        payload = self._fd_payload
+        payload.fd = fd
+        payload.parent_proc = parent_proc
+        payload.timestamp = timestamp
+        payload.cpu_id = cpu_id
+        self._state.send_notification(name, payload)
+
+    # Called once the last event was processed
+    def end(self):
+        pass
+
+    # Providers keeping private state outside of the shared State
+    # object must override these so it is part of the checkpoints.
+    def get_checkpoint_data(self):
+        return None
+
+    def restore_checkpoint_data(self, data):
+        pass
+
+
+# Returns the subset of provider_classes (in the same order) needed to
+# send the given notifications, including their dependencies, as well
+# as the providers in `required`. All the providers are needed if
+# notifications is None.
+def get_needed_provider_classes(provider_classes, notifications=None,
+                                required=()):
+    if notifications is None:
+        return list(provider_classes)
+
+    todo = list(required)
+    for name in notifications:
+        senders = [cls for cls in provider_classes
+                   if name in cls.NOTIFICATIONS]
+        if not senders:
+            raise ValueError(
+                'No state provider sends the "{}" notification'.format(name))
+        todo += senders
+
+    needed = set()
+    while todo:
+        cls = todo.pop()
+        if cls not in needed:
+            needed.add(cls)
+            todo += cls.DEPENDENCIES
+
+    return [cls for cls in provider_classes if cls in needed]
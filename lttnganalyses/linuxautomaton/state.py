@@ -0,0 +1,194 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from .sv import CPU, MemoryManagement, Process
+from .notification import NotificationBus, KwargsPayload
+from .intern import InternPool
+
+
+class State:
+    # The state is split into CPU-local shards (`cpus`, sv.CPU objects
+    # holding the running task, the current IRQ and the pending
+    # softirqs of each CPU) and global tables (the tasks in `tids`,
+    # with their FD tables, the disks and the memory counters).
+    #
+    # An event only modifies the shard of its CPU and the task running
+    # there. Anything reaching another CPU or a task which is not
+    # running (context switches, wakeups, migrations, forks) goes
+    # through the cross-CPU operations below, so that these are the
+    # only points needing synchronization between shards.
+    def __init__(self):
+        self.cpus = {}
+        self.tids = {}
+        self.disks = {}
+        self.mm = MemoryManagement()
+        # process names and filenames repeat a lot across processes,
+        # FDs and I/O requests
+        self.intern_pool = InternPool()
+        # ID of the CPU each running task is running on, indexed by TID
+        self._running_tids = {}
+        self._notification_bus = NotificationBus()
+        # subscriptions of each period data object, so that they can
+        # all be dropped when the period ends
+        self._period_subscriptions = {}
+        # State changes can be handled differently depending on
+        # version of tracer used, so keep track of it.
+        self._tracer_version = None
+
+    # CPU shards
+
+    def get_cpu(self, cpu_id):
+        cpu = self.cpus.get(cpu_id)
+        if cpu is None:
+            cpu = CPU(cpu_id)
+            self.cpus[cpu_id] = cpu
+
+        return cpu
+
+    # Returns the process running on a CPU, None if unknown or if it
+    # is the swapper.
+    def get_current_proc(self, cpu_id):
+        cpu = self.cpus.get(cpu_id)
+        if cpu is None:
+            return None
+
+        return cpu.current_proc
+
+    # Global task table
+
+    def get_or_create_proc(self, tid):
+        proc = self.tids.get(tid)
+        if proc is None:
+            if tid == 0:
+                # special case for the swapper
+                proc = Process(tid=tid, pid=0)
+            else:
+                proc = Process(tid=tid)
+            self.tids[tid] = proc
+
+        return proc
+
+    # Adds proc to the task table, replacing any previous process with
+    # the same TID, including on the CPU it is running on.
+    def add_proc(self, proc):
+        self.tids[proc.tid] = proc
+        cpu_id = self._running_tids.get(proc.tid)
+        if cpu_id is not None:
+            self.cpus[cpu_id].current_proc = proc
+
+    # Cross-CPU operations
+
+    def get_running_cpu(self, tid):
+        return self._running_tids.get(tid)
+
+    # Makes next_tid the running task of a CPU. Returns the CPU.
+    def switch_task(self, cpu_id, next_tid):
+        cpu = self.get_cpu(cpu_id)
+        prev_tid = cpu.current_tid
+
+        if prev_tid is not None and \
+                self._running_tids.get(prev_tid) == cpu_id:
+            del self._running_tids[prev_tid]
+
+        # exclude swapper process
+        if next_tid == 0:
+            cpu.current_tid = None
+            cpu.current_proc = None
+        else:
+            cpu.current_tid = next_tid
+            cpu.current_proc = self.get_or_create_proc(next_tid)
+            self._running_tids[next_tid] = cpu_id
+
+        return cpu
+
+    # Records the wakeup of a task by the task running on a CPU.
+    # Returns the woken up process, or None if the task is already
+    # running on a CPU.
+    def wakeup_task(self, tid, waker_cpu_id, timestamp):
+        waker_cpu = self.get_cpu(waker_cpu_id)
+
+        if tid in self._running_tids:
+            return None
+
+        proc = self.get_or_create_proc(tid)
+
+        # A process can be woken up multiple times, only record
+        # the first one
+        if proc.last_wakeup is None:
+            proc.last_wakeup = timestamp
+            if waker_cpu.current_tid is not None:
+                proc.last_waker = waker_cpu.current_tid
+
+        return proc
+
+    # Returns the migrated process, created with `comm` if unknown.
+    def migrate_task(self, tid, dest_cpu_id, comm=None):
+        self.get_cpu(dest_cpu_id)
+        proc = self.tids.get(tid)
+        if proc is None:
+            proc = Process(tid=tid, comm=comm)
+            self.tids[tid] = proc
+
+        return proc
+
+    # Adds the child process of a fork, which starts with a copy of
+    # the FD table of parent_proc.
+    def fork_task(self, parent_proc, child_proc):
+        child_proc.fds = parent_proc.fds.copy()
+        self.add_proc(child_proc)
+
+    # Rebuilds the links between the CPU shards and the task table
+    # after they were replaced, for example by a checkpoint.
+    def reindex_cpus(self):
+        self._running_tids = {}
+        for cpu_id, cpu in self.cpus.items():
+            if cpu.current_tid is None:
+                cpu.current_proc = None
+            else:
+                cpu.current_proc = self.get_or_create_proc(cpu.current_tid)
+                self._running_tids[cpu.current_tid] = cpu_id
+
+    # Notifications
+
+    def register_notification_cbs(self, period_data, cbs):
+        subscription = self._notification_bus.subscribe(period_data, cbs)
+        subscriptions = self._period_subscriptions.get(period_data)
+        if subscriptions is None:
+            subscriptions = []
+            self._period_subscriptions[period_data] = subscriptions
+        subscriptions.append(subscription)
+
+        return subscription
+
+    def send_notification(self, name, payload):
+        self._notification_bus.send(name, payload)
+
+    # Legacy interface, prefer send_notification() with a payload
+    # object from the notification module.
+    def send_notification_cb(self, name, **kwargs):
+        self._notification_bus.send(name, KwargsPayload(kwargs))
+
+    def clear_period_notification_cbs(self, period_data):
+        subscriptions = self._period_subscriptions.pop(period_data, [])
+        for subscription in subscriptions:
+            self._notification_bus.unsubscribe(subscription)
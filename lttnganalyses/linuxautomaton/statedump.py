@@ -22,10 +22,28 @@
 # SOFTWARE.
 
 import os
-from . import sp, sv
+from . import notification, sp, sv
+
+
+# Changes made by a run of statedump events, reported to the analyses
+# at once by a single statedump_bulk notification.
+class _StatedumpBulk():
+    def __init__(self, begin_ts):
+        self.begin_ts = begin_ts
+        # (thread, process) pairs
+        self.parent_procs = []
+        # FDs added to the table of each process, indexed by PID:
+        # (process, sv.FDTable) pairs
+        self.new_fds = {}
+        # (process, fd) pairs of the FDs whose filename was fixed
+        self.updated_fds = []
 
 
 class StatedumpStateProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset([
+        'statedump_bulk', 'lttng_statedump_block_device'])
+    _EVENT_PREFIX = 'lttng_statedump_'
+
     def __init__(self, state):
         cbs = {
             'lttng_statedump_process_state':
@@ -33,10 +51,71 @@ class StatedumpStateProvider(sp.StateProvider):
             'lttng_statedump_file_descriptor':
             self._process_lttng_statedump_file_descriptor,
             'lttng_statedump_block_device':
-            self._process_lttng_statedump_block_device
+            self._process_lttng_statedump_block_device,
+            'lttng_statedump_end': self._process_lttng_statedump_end,
         }
 
         super().__init__(state, cbs)
+        self._block_device_payload = notification.BlockDevicePayload()
+        self._bulk_payload = notification.StatedumpBulkPayload()
+        self._bulk = None
+
+    # The state is updated as the statedump events come, but the
+    # analyses are only notified once the run of statedump events
+    # ends: at lttng_statedump_end, or at the first event of another
+    # kind, which might rely on the statedump. This provider runs
+    # first so that it is notified before the other providers act on
+    # that event.
+    def process_event(self, ev):
+        if self._bulk is not None and \
+                not ev.name.startswith(self._EVENT_PREFIX):
+            self._send_bulk(ev.get('cpu_id'))
+
+        super().process_event(ev)
+
+    def end(self):
+        if self._bulk is not None:
+            self._send_bulk(None)
+
+    def get_checkpoint_data(self):
+        return self._bulk
+
+    def restore_checkpoint_data(self, data):
+        self._bulk = data
+
+    def _get_bulk(self, timestamp):
+        if self._bulk is None:
+            self._bulk = _StatedumpBulk(timestamp)
+
+        return self._bulk
+
+    def _send_bulk(self, cpu_id):
+        bulk = self._bulk
+        self._bulk = None
+        new_fds = []
+
+        for proc, fds in bulk.new_fds.values():
+            # skip the FDs closed since the statedump listed them
+            open_fds = sv.FDTable()
+            for fd, fd_obj in fds.items():
+                if proc.fds.get(fd) is fd_obj:
+                    open_fds[fd] = fd_obj
+
+            if open_fds:
+                new_fds.append((proc, open_fds))
+
+        payload = self._bulk_payload
+        payload.parent_procs = bulk.parent_procs
+        payload.new_fds = new_fds
+        payload.updated_fds = [(proc, fd) for proc, fd in bulk.updated_fds
+                               if fd in proc.fds]
+        payload.timestamp = bulk.begin_ts
+        payload.cpu_id = cpu_id
+        self._state.send_notification('statedump_bulk', payload)
+
+    def _process_lttng_statedump_end(self, event):
+        if self._bulk is not None:
+            self._send_bulk(event.get('cpu_id'))
 
     def _process_lttng_statedump_block_device(self, event):
         dev = event['dev']
@@ -46,21 +125,22 @@ class StatedumpStateProvider(sp.StateProvider):
             self._state.disks[dev] = sv.Disk(dev, diskname=diskname)
         elif self._state.disks[dev].diskname is None:
             self._state.disks[dev].diskname = diskname
-        self._state.send_notification_cb('lttng_statedump_block_device',
-                                         dev=dev, diskname=diskname)
+        payload = self._block_device_payload
+        payload.dev = dev
+        payload.diskname = diskname
+        self._state.send_notification('lttng_statedump_block_device',
+                                      payload)
 
     def _process_lttng_statedump_process_state(self, event):
         tid = event['tid']
         pid = event['pid']
-        name = event['name']
+        name = self._state.intern_pool.intern(event['name'])
         # prio is not in the payload for LTTng-modules < 2.8. Using
         # get() will set it to None if the key is not found
         prio = event.get('prio')
+        bulk = self._get_bulk(event.timestamp)
 
-        if tid not in self._state.tids:
-            self._state.tids[tid] = sv.Process(tid=tid)
-
-        proc = self._state.tids[tid]
+        proc = self._state.get_or_create_proc(tid)
         # Even if the process got created earlier, some info might be
         # missing, add it now.
         proc.pid = pid
@@ -77,42 +157,55 @@ class StatedumpStateProvider(sp.StateProvider):
                 # child? does that make sense?
 
                 # tid == pid for the parent process
-                self._state.tids[pid] = sv.Process(tid=pid, pid=pid, comm=name)
+                self._state.add_proc(sv.Process(tid=pid, pid=pid, comm=name))
 
             parent = self._state.tids[pid]
             # If the thread had opened FDs, they need to be assigned
             # to the parent.
             StatedumpStateProvider._assign_fds_to_parent(proc, parent)
-            self._state.send_notification_cb('create_parent_proc',
-                                             proc=proc,
-                                             parent_proc=parent)
+            thread_fds = bulk.new_fds.pop(tid, None)
+            if thread_fds is not None:
+                parent_fds = self._get_new_fds(bulk, parent)
+                for fd, fd_obj in thread_fds[1].items():
+                    if parent.fds.get(fd) is fd_obj:
+                        parent_fds[fd] = fd_obj
+
+            bulk.parent_procs.append((proc, parent))
+
+    @staticmethod
+    def _get_new_fds(bulk, proc):
+        entry = bulk.new_fds.get(proc.tid)
+        if entry is None:
+            entry = (proc, sv.FDTable())
+            bulk.new_fds[proc.tid] = entry
+
+        return entry[1]
 
     def _process_lttng_statedump_file_descriptor(self, event):
         pid = event['pid']
         fd = event['fd']
-        filename = event['filename']
+        filename = self._state.intern_pool.intern(event['filename'])
         cloexec = event['flags'] & os.O_CLOEXEC == os.O_CLOEXEC
 
         if pid not in self._state.tids:
-            self._state.tids[pid] = sv.Process(tid=pid, pid=pid)
+            self._state.add_proc(sv.Process(tid=pid, pid=pid))
 
         proc = self._state.tids[pid]
+        bulk = self._get_bulk(event.timestamp)
 
         if fd not in proc.fds:
-            proc.fds[fd] = sv.FD(fd, filename, sv.FDType.unknown, cloexec)
-            self._state.send_notification_cb('create_fd',
-                                             fd=fd,
-                                             parent_proc=proc,
-                                             timestamp=event.timestamp,
-                                             cpu_id=event['cpu_id'])
+            proc.fds.set_new(fd, sv.FD(fd, filename, sv.FDType.unknown,
+                                       cloexec))
+            self._get_new_fds(bulk, proc)[fd] = proc.fds[fd]
         else:
             # just fix the filename
-            proc.fds[fd].filename = filename
-            self._state.send_notification_cb('update_fd',
-                                             fd=fd,
-                                             parent_proc=proc,
-                                             timestamp=event.timestamp,
-                                             cpu_id=event['cpu_id'])
+            fd_obj = proc.fds.get_mutable(fd)
+            fd_obj.filename = filename
+            new_fds = self._get_new_fds(bulk, proc)
+            if fd in new_fds:
+                new_fds[fd] = fd_obj
+            else:
+                bulk.updated_fds.append((proc, fd))
 
     @staticmethod
     def _assign_fds_to_parent(proc, parent):
@@ -124,7 +217,8 @@ class StatedumpStateProvider(sp.StateProvider):
                 else:
                     # best effort to fix the filename
                     if not parent.fds[fd].filename:
-                        parent.fds[fd].filename = proc.fds[fd].filename
+                        parent.fds.get_mutable(fd).filename = \
+                            proc.fds[fd].filename
                 toremove.append(fd)
             for fd in toremove:
                 del proc.fds[fd]
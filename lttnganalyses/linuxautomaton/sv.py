@@ -21,6 +21,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import collections
 import os
 import socket
 from ..common import format_utils, trace_utils
@@ -33,7 +34,7 @@ class Process():
         self.comm = comm
         self.prio = prio
         # indexed by fd
-        self.fds = {}
+        self.fds = FDTable()
         self.current_syscall = None
         # the process scheduled before this one
         self.prev_tid = None
@@ -41,15 +42,29 @@ class Process():
         self.last_waker = None
 
 
+# CPU-local shard of the state, see state.State
 class CPU():
     def __init__(self, cpu_id):
         self.cpu_id = cpu_id
+        # TID and Process object of the running task, both None for
+        # the swapper
         self.current_tid = None
+        self.current_proc = None
         self.current_hard_irq = None
-        # softirqs use a dict because multiple ones can be raised before
-        # handling. They are indexed by vec, and each entry is a list,
-        # ordered chronologically
-        self.current_softirqs = {}
+        # softirqs use a queue per vec because multiple ones can be
+        # raised before handling. Each queue is ordered chronologically.
+        self.current_softirqs = [collections.deque()
+                                 for vec in range(SoftIRQ.NR_VECS)]
+
+    def get_softirq_queue(self, vec):
+        try:
+            return self.current_softirqs[vec]
+        except IndexError:
+            # vec added by a newer kernel
+            while len(self.current_softirqs) <= vec:
+                self.current_softirqs.append(collections.deque())
+
+            return self.current_softirqs[vec]
 
 
 class MemoryManagement():
@@ -80,7 +95,7 @@ class SyscallEvent():
 
     @classmethod
     def new_from_entry(cls, event):
-        name = trace_utils.get_syscall_name(event)
+        name = SyscallTable.get_info(event).name
         return cls(name, event.timestamp)
 
 
@@ -133,7 +148,99 @@ class FD():
                    io_rq.family)
 
 
+class FDTable():
+    # Copy-on-write table of FD objects, indexed by fd
+    #
+    # copy() is O(1): the copies share the same dict until one of them
+    # is modified, at which point it gets its own shallow copy. The FD
+    # objects themselves stay shared until they are modified through
+    # get_mutable(), so FDs must never be modified through []. An FD
+    # object created for this table is added with set_new(), any
+    # other one (possibly shared with other tables) with [].
+    __slots__ = ['_fds', '_refs', '_owned']
+
+    def __init__(self):
+        self._fds = {}
+        # number of tables sharing self._fds, in a list so that it is
+        # shared by all of them
+        self._refs = [1]
+        # fds whose FD object is only referenced by this table
+        self._owned = set()
+
+    def copy(self):
+        table = FDTable.__new__(FDTable)
+        table._fds = self._fds
+        table._refs = self._refs
+        table._refs[0] += 1
+        table._owned = set()
+        # the FD objects are now shared with the copy
+        self._owned = set()
+
+        return table
+
+    def _unshare(self):
+        if self._refs[0] == 1:
+            return
+
+        self._refs[0] -= 1
+        self._fds = self._fds.copy()
+        self._refs = [1]
+
+    def get_mutable(self, fd):
+        fd_obj = self._fds[fd]
+
+        if fd not in self._owned:
+            self._unshare()
+            fd_obj = FD.new_from_fd(fd_obj)
+            self._fds[fd] = fd_obj
+            self._owned.add(fd)
+
+        return fd_obj
+
+    def __contains__(self, fd):
+        return fd in self._fds
+
+    def __getitem__(self, fd):
+        return self._fds[fd]
+
+    def __setitem__(self, fd, fd_obj):
+        self._unshare()
+        self._fds[fd] = fd_obj
+        self._owned.discard(fd)
+
+    # Adds `fd_obj`, a new FD object only referenced by this table
+    def set_new(self, fd, fd_obj):
+        self._unshare()
+        self._fds[fd] = fd_obj
+        self._owned.add(fd)
+
+    def __delitem__(self, fd):
+        self._unshare()
+        del self._fds[fd]
+        self._owned.discard(fd)
+
+    def __iter__(self):
+        return iter(self._fds)
+
+    def __len__(self):
+        return len(self._fds)
+
+    def get(self, fd, default=None):
+        return self._fds.get(fd, default)
+
+    def keys(self):
+        return self._fds.keys()
+
+    def values(self):
+        return self._fds.values()
+
+    def items(self):
+        return self._fds.items()
+
+
 class IRQ():
+    __slots__ = ['id', 'cpu_id', 'begin_ts', 'end_ts']
+
     def __init__(self, id, cpu_id, begin_ts=None):
         self.id = id
         self.cpu_id = cpu_id
@@ -149,6 +256,8 @@ class IRQ():
 
 
 class HardIRQ(IRQ):
+    __slots__ = ['ret']
+
     def __init__(self, id, cpu_id, begin_ts):
         super().__init__(id, cpu_id, begin_ts)
         self.ret = None
@@ -162,10 +271,27 @@ class HardIRQ(IRQ):
 
 
 class SoftIRQ(IRQ):
+    __slots__ = ['raise_ts']
+    # Vectors known to the kernel, HI_SOFTIRQ to RCU_SOFTIRQ
+    NR_VECS = 10
+
     def __init__(self, id, cpu_id, raise_ts=None, begin_ts=None):
         super().__init__(id, cpu_id, begin_ts)
         self.raise_ts = raise_ts
 
+    # Reinitializes a recycled SoftIRQ object
+    def reset(self, id, cpu_id, raise_ts=None, begin_ts=None):
+        self.id = id
+        self.cpu_id = cpu_id
+        self.begin_ts = begin_ts
+        self.end_ts = None
+        self.raise_ts = raise_ts
+
+    def copy(self):
+        irq = SoftIRQ(self.id, self.cpu_id, self.raise_ts, self.begin_ts)
+        irq.end_ts = self.end_ts
+        return irq
+
     @classmethod
     def new_from_softirq_raise(cls, event):
         id = event['vec']
@@ -261,7 +387,7 @@ class OpenIORequest(SyscallIORequest):
     @classmethod
     def new_from_disk_open(cls, event, tid):
         begin_ts = event.timestamp
-        name = trace_utils.get_syscall_name(event)
+        name = SyscallTable.get_info(event).name
         filename = event['filename']
 
         req = cls(begin_ts, tid, name, filename, FDType.disk)
@@ -273,7 +399,7 @@ class OpenIORequest(SyscallIORequest):
     def new_from_accept(cls, event, tid):
         # Handle both accept and accept4
         begin_ts = event.timestamp
-        name = trace_utils.get_syscall_name(event)
+        name = SyscallTable.get_info(event).name
         req = cls(begin_ts, tid, name, 'socket', FDType.net)
 
         if 'family' in event:
@@ -299,7 +425,7 @@ class OpenIORequest(SyscallIORequest):
     @classmethod
     def new_from_old_fd(cls, event, tid, old_fd):
         begin_ts = event.timestamp
-        name = trace_utils.get_syscall_name(event)
+        name = SyscallTable.get_info(event).name
         if old_fd is None:
             filename = 'unknown'
             fd_type = FDType.unknown
@@ -367,8 +493,9 @@ class ReadWriteIORequest(SyscallIORequest):
         else:
             size = None
 
-        syscall_name = trace_utils.get_syscall_name(event)
-        if syscall_name in SyscallConsts.READ_SYSCALLS:
+        info = SyscallTable.get_info(event)
+        syscall_name = info.name
+        if info.syscall_class == SyscallClass.read:
             operation = IORequest.OP_READ
         else:
             operation = IORequest.OP_WRITE
@@ -395,7 +522,7 @@ class SyncIORequest(SyscallIORequest):
         # Also handle fdatasync
         begin_ts = event.timestamp
         size = None
-        syscall_name = trace_utils.get_syscall_name(event)
+        syscall_name = SyscallTable.get_info(event).name
 
         req = cls(begin_ts, size, tid, syscall_name)
         req.fd = event['fd']
@@ -479,3 +606,86 @@ class SyscallConsts():
     # All I/O related syscalls
     IO_SYSCALLS = OPEN_SYSCALLS + CLOSE_SYSCALLS + READ_SYSCALLS + \
         WRITE_SYSCALLS + SYNC_SYSCALLS + READ_WRITE_SYSCALLS
+
+
+class SyscallClass():
+    non_io = 0
+    open = 1
+    close = 2
+    read = 3
+    write = 4
+    sync = 5
+    read_write = 6
+
+
+class SyscallInfo():
+    __slots__ = ['name', 'syscall_class', 'size_key']
+
+    def __init__(self, name, syscall_class=SyscallClass.non_io,
+                 size_key=None):
+        self.name = name
+        self.syscall_class = syscall_class
+        # name of the entry event field holding the I/O size, only
+        # applicable to read and write syscalls
+        self.size_key = size_key
+
+    @property
+    def is_io(self):
+        return self.syscall_class != SyscallClass.non_io
+
+
+class SyscallTable():
+    # I/O syscall name to SyscallClass, the SyscallConsts lists do not
+    # overlap
+    _CLASSES = {
+        name: syscall_class
+        for syscall_class, names in [
+            (SyscallClass.open, SyscallConsts.OPEN_SYSCALLS),
+            (SyscallClass.close, SyscallConsts.CLOSE_SYSCALLS),
+            (SyscallClass.read, SyscallConsts.READ_SYSCALLS),
+            (SyscallClass.write, SyscallConsts.WRITE_SYSCALLS),
+            (SyscallClass.sync, SyscallConsts.SYNC_SYSCALLS),
+            (SyscallClass.read_write, SyscallConsts.READ_WRITE_SYSCALLS),
+        ]
+        for name in names
+    }
+
+    _SIZE_KEYS = {
+        'writev': 'vlen',
+        'pwritev': 'vlen',
+        'readv': 'vlen',
+        'preadv': 'vlen',
+        'recvfrom': 'size',
+        'sendto': 'len',
+        # only have size info on return
+        'recvmsg': None,
+        'sendmsg': None,
+    }
+
+    # Indexed by syscall entry event name (e.g. 'syscall_entry_read'
+    # or 'sys_read'), filled the first time each name is seen
+    _infos = {}
+
+    @classmethod
+    def _create_info(cls, name):
+        syscall_class = cls._CLASSES.get(name, SyscallClass.non_io)
+        size_key = None
+
+        if syscall_class in [SyscallClass.read, SyscallClass.write]:
+            size_key = cls._SIZE_KEYS.get(name, 'count')
+
+        return SyscallInfo(name, syscall_class, size_key)
+
+    @classmethod
+    def get_info(cls, event):
+        info = cls._infos.get(event.name)
+
+        if info is None:
+            info = cls._create_info(trace_utils.get_syscall_name(event))
+            cls._infos[event.name] = info
+
+        return info
+
+    @classmethod
+    def is_io_syscall(cls, name):
+        return name in cls._CLASSES
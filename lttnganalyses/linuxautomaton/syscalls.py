@@ -21,10 +21,15 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from . import sp, sv
+from . import notification, sp, sv
+from .sched import SchedStateProvider
 
 
 class SyscallsStateProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset(['syscall_exit'])
+    # the current process of each CPU
+    DEPENDENCIES = [SchedStateProvider]
+
     def __init__(self, state):
         cbs = {
             'syscall_entry': self._process_syscall_entry,
@@ -32,42 +37,38 @@ class SyscallsStateProvider(sp.StateProvider):
         }
 
         super().__init__(state, cbs)
+        self._syscall_exit_payload = notification.SyscallExitPayload()
+        # Whether to clear the current syscall on the exit of an I/O
+        # syscall: the IO state provider, when it runs, clears it
+        # itself once it processed the exit (see
+        # automaton.Automaton).
+        self.clear_io_syscalls = True
 
     def _process_syscall_entry(self, event):
-        cpu_id = event['cpu_id']
-
-        if cpu_id not in self._state.cpus:
+        proc = self._state.get_current_proc(event['cpu_id'])
+        if proc is None:
             return
 
-        cpu = self._state.cpus[cpu_id]
-        if cpu.current_tid is None:
-            return
-
-        proc = self._state.tids[cpu.current_tid]
         proc.current_syscall = sv.SyscallEvent.new_from_entry(event)
 
     def _process_syscall_exit(self, event):
         cpu_id = event['cpu_id']
-        if cpu_id not in self._state.cpus:
-            return
-
-        cpu = self._state.cpus[cpu_id]
-        if cpu.current_tid is None:
+        proc = self._state.get_current_proc(cpu_id)
+        if proc is None:
             return
 
-        proc = self._state.tids[cpu.current_tid]
         current_syscall = proc.current_syscall
         if current_syscall is None:
             return
 
         current_syscall.process_exit(event)
 
-        self._state.send_notification_cb('syscall_exit',
-                                         proc=proc,
-                                         event=event,
-                                         cpu_id=cpu_id)
+        payload = self._syscall_exit_payload
+        payload.proc = proc
+        payload.event = event
+        payload.cpu_id = cpu_id
+        self._state.send_notification('syscall_exit', payload)
 
-        # If it's an IO Syscall, the IO state provider will take care of
-        # clearing the current syscall, so only clear here if it's not
-        if current_syscall.name not in sv.SyscallConsts.IO_SYSCALLS:
-            self._state.tids[cpu.current_tid].current_syscall = None
+        if self.clear_io_syscalls or \
+                not sv.SyscallTable.is_io_syscall(current_syscall.name):
+            proc.current_syscall = None
@@ -0,0 +1,103 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import tempfile
+import unittest
+from lttnganalyses.linuxautomaton import checkpoint, sv
+from lttnganalyses.linuxautomaton.state import State
+
+
+class TestCheckpoint(unittest.TestCase):
+    def _get_state(self):
+        state = State()
+        proc = sv.Process(42, 42, 'bash', 20)
+        proc.fds[3] = sv.FD(3, '/etc/passwd', sv.FDType.disk)
+        proc.current_syscall = sv.SyscallEvent('read', 1000)
+        state.tids[42] = proc
+        # threads of the same process share their fds
+        state.tids[43] = sv.Process(43, 42, 'bash', 20)
+        state.tids[43].fds = proc.fds
+        cpu = sv.CPU(0)
+        cpu.current_tid = 42
+        cpu.get_softirq_queue(3).append(sv.SoftIRQ(3, 0, raise_ts=900))
+        state.cpus[0] = cpu
+        state.disks[8] = sv.Disk(8, 'sda')
+        state.mm.page_count = 12
+
+        return state
+
+    def test_roundtrip(self):
+        ckpt = checkpoint.Checkpoint.new_from_state(self._get_state(), 1500,
+                                                    100, 10000)
+        ckpt.providers['BlockStateProvider'] = []
+        ckpt.provider_names = ['SchedStateProvider', 'BlockStateProvider']
+        restored = checkpoint.Checkpoint.new_from_bytes(ckpt.to_bytes())
+        state = State()
+        restored.apply_to_state(state)
+        state.reindex_cpus()
+
+        self.assertEqual(restored.timestamp, 1500)
+        self.assertTrue(restored.matches_trace(100, 10000))
+        self.assertEqual(restored.providers, {'BlockStateProvider': []})
+        self.assertTrue(restored.has_providers(['BlockStateProvider']))
+        self.assertFalse(restored.has_providers(['BlockStateProvider',
+                                                 'IoStateProvider']))
+        self.assertEqual(state.tids[42].comm, 'bash')
+        self.assertEqual(state.tids[42].fds[3].filename, '/etc/passwd')
+        self.assertEqual(state.tids[42].current_syscall.name, 'read')
+        self.assertIs(state.tids[42].fds, state.tids[43].fds)
+        self.assertEqual(state.cpus[0].current_tid, 42)
+        self.assertIs(state.cpus[0].current_proc, state.tids[42])
+        self.assertEqual(state.get_running_cpu(42), 0)
+        self.assertEqual(state.cpus[0].current_softirqs[3][0].raise_ts, 900)
+        self.assertEqual(state.disks[8].diskname, 'sda')
+        self.assertEqual(state.mm.page_count, 12)
+
+    def test_bad_data(self):
+        ckpt = checkpoint.Checkpoint.new_from_state(State(), 0)
+        data = ckpt.to_bytes()
+
+        self.assertRaises(checkpoint.CheckpointError,
+                          checkpoint.Checkpoint.new_from_bytes, b'garbage')
+        self.assertRaises(checkpoint.CheckpointError,
+                          checkpoint.Checkpoint.new_from_bytes,
+                          data[:-4])
+
+    def test_store_find_nearest(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = checkpoint.CheckpointStore(path)
+            for ts in [1000, 2000, 3000]:
+                ckpt = checkpoint.Checkpoint.new_from_state(
+                    self._get_state(), ts, 0, 5000)
+                store.save(ckpt)
+            # checkpoint of another trace
+            store.save(checkpoint.Checkpoint.new_from_state(
+                self._get_state(), 2500, 0, 6000))
+
+            self.assertIsNone(store.find_nearest(999, 0, 5000))
+            self.assertEqual(store.find_nearest(2000, 0, 5000),
+                             os.path.join(path, '{:020d}.ckpt'.format(2000)))
+            self.assertEqual(store.find_nearest(2999, 0, 5000),
+                             os.path.join(path, '{:020d}.ckpt'.format(2000)))
+            self.assertEqual(store.find_nearest(2999, 0, 6000),
+                             os.path.join(path, '{:020d}.ckpt'.format(2500)))
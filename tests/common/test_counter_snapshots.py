@@ -0,0 +1,196 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2015 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+from lttnganalyses.linuxautomaton import notification, sv
+from lttnganalyses.linuxautomaton.state import State
+
+try:
+    from lttnganalyses.core import analysis, io, memtop, period
+except ImportError:
+    # babeltrace is not installed
+    analysis = None
+
+
+# Mock of babeltrace's Event, without fields
+class Event():
+    def __init__(self, timestamp):
+        self.name = 'event'
+        self.timestamp = timestamp
+        self.cycles = timestamp
+
+    def field_list_with_scope(self, scope):
+        return []
+
+    def field_with_scope(self, field_name, scope):
+        return
+
+
+@unittest.skipIf(analysis is None, 'babeltrace is not installed')
+class TestCounterSnapshots(unittest.TestCase):
+    # Runs `steps` with a new analysis of class `cls` and returns the
+    # period data object of each ended period, by period name. A step
+    # is ('begin', period name), ('end', period name) or a
+    # (notification name, payload) pair.
+    def _run(self, cls, counter_snapshots, steps):
+        conf = analysis.AnalysisConfig()
+        conf.counter_snapshots = counter_snapshots
+        state = State()
+        specific_analysis = cls(state, conf)
+        periods = {}
+        period_datas = {}
+
+        for ts, (name, arg) in enumerate(steps):
+            if name == 'begin':
+                periods[arg] = period.Period(None, None, Event(ts), None)
+                specific_analysis._on_period_begin(periods[arg])
+            elif name == 'end':
+                ended_period = periods.pop(arg)
+                period_datas[arg] = \
+                    specific_analysis._get_period_data(ended_period)
+                specific_analysis._on_period_end(ended_period)
+            else:
+                state.send_notification(name, arg)
+
+        return period_datas
+
+    # Overlapping periods: `b` begins after and ends after `a`, `c` is
+    # nested in `b`, and `d` has no notifications
+    @staticmethod
+    def _get_steps(notifications):
+        steps = [('begin', 'a')] + notifications[0:2] + \
+            [('begin', 'b')] + notifications[2:4] + \
+            [('begin', 'c')] + notifications[4:6] + \
+            [('end', 'a')] + notifications[6:8] + \
+            [('end', 'c'), ('begin', 'd'), ('end', 'd')] + \
+            notifications[8:10] + [('end', 'b')]
+
+        return steps
+
+    def _get_results(self, cls, get_result, notifications):
+        steps = self._get_steps(notifications)
+        results = []
+
+        for counter_snapshots in [False, True]:
+            period_datas = self._run(cls, counter_snapshots, steps)
+            results.append({name: get_result(period_data)
+                            for name, period_data in period_datas.items()})
+
+        return results
+
+    def test_memtop(self):
+        procs = [sv.Process(tid, tid, 'proc{}'.format(tid))
+                 for tid in [1, 2, 3]]
+        notifications = []
+
+        for i in range(10):
+            payload = notification.ProcCpuPayload()
+            payload.proc = procs[i % 3]
+            payload.cpu_id = 0
+            name = 'tid_page_alloc' if i % 4 else 'tid_page_free'
+            notifications.append((name, payload))
+
+        def get_result(period_data):
+            return {tid: (proc_stats.comm, proc_stats.allocated_pages,
+                          proc_stats.freed_pages)
+                    for tid, proc_stats in period_data.tids.items()}
+
+        results = self._get_results(memtop.Memtop, get_result,
+                                    notifications)
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0]['a'], {
+            1: ('proc1', 1, 1),
+            2: ('proc2', 1, 1),
+            3: ('proc3', 2, 0),
+        })
+        self.assertEqual(results[0]['d'], {})
+
+    def test_counter_log(self):
+        conf = analysis.AnalysisConfig()
+        conf.counter_snapshots = True
+        state = State()
+        memtop_analysis = memtop.Memtop(state, conf)
+        procs = [sv.Process(tid, tid, 'proc{}'.format(tid))
+                 for tid in [1, 2]]
+
+        def alloc(proc):
+            payload = notification.ProcCpuPayload()
+            payload.proc = proc
+            payload.cpu_id = 0
+            state.send_notification('tid_page_alloc', payload)
+
+        period_a = period.Period(None, None, Event(0), None)
+        memtop_analysis._on_period_begin(period_a)
+        alloc(procs[0])
+        alloc(procs[1])
+        period_b = period.Period(None, None, Event(1), None)
+        memtop_analysis._on_period_begin(period_b)
+
+        # only the counters updated since the latest period began are
+        # logged, once
+        alloc(procs[1])
+        alloc(procs[1])
+        self.assertEqual(memtop_analysis._counter_log[2:], [(2, (1, 0))])
+
+        period_data = memtop_analysis._get_period_data(period_b)
+        memtop_analysis._on_period_end(period_b)
+        self.assertEqual(list(period_data.tids), [2])
+        self.assertEqual(period_data.tids[2].allocated_pages, 2)
+
+        period_data = memtop_analysis._get_period_data(period_a)
+        memtop_analysis._on_period_end(period_a)
+        self.assertEqual(period_data.tids[1].allocated_pages, 1)
+        self.assertEqual(period_data.tids[2].allocated_pages, 3)
+        self.assertEqual(memtop_analysis._counter_log, [])
+
+    def test_io(self):
+        notifications = []
+
+        for i in range(10):
+            if i % 3:
+                payload = notification.NetDevXmitPayload()
+                payload.sent_bytes = i * 10
+                name = 'net_dev_xmit'
+            else:
+                payload = notification.NetifReceiveSkbPayload()
+                payload.recv_bytes = i * 100
+                name = 'netif_receive_skb'
+
+            payload.iface_name = 'eth{}'.format(i % 2)
+            payload.cpu_id = 0
+            notifications.append((name, payload))
+
+        def get_result(period_data):
+            return {name: (iface.recv_bytes, iface.recv_packets,
+                           iface.sent_bytes, iface.sent_packets)
+                    for name, iface in period_data.ifaces.items()}
+
+        results = self._get_results(io.IoAnalysis, get_result,
+                                    notifications)
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0]['c'], {
+            'eth0': (600, 1, 40, 1),
+            'eth1': (0, 0, 120, 2),
+        })
+        self.assertEqual(results[0]['d'], {})
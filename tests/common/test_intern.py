@@ -0,0 +1,52 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+from lttnganalyses.linuxautomaton.intern import InternPool
+
+
+class TestInternPool(unittest.TestCase):
+    def test_intern(self):
+        pool = InternPool()
+        # build equal strings at runtime so that they are distinct objects
+        first = ''.join(['ba', 'sh'])
+        second = ''.join(['b', 'ash'])
+        self.assertIsNot(first, second)
+
+        self.assertIs(pool.intern(first), first)
+        self.assertIs(pool.intern(second), first)
+        self.assertIsNone(pool.intern(None))
+        self.assertEqual(pool.size, 1)
+        self.assertEqual(pool.lookups, 0)
+
+    def test_accounting(self):
+        pool = InternPool()
+        pool.enable_accounting()
+        for comm in ['ba', 'sh', 'ba']:
+            pool.intern(''.join([comm, 'sh']))
+        pool.intern(''.join(['ba', 'sh']))
+
+        self.assertEqual(pool.size, 2)
+        self.assertEqual(pool.lookups, 4)
+        self.assertEqual(pool.hits, 2)
+        self.assertGreater(pool.saved_bytes, 0)
+        self.assertGreater(pool.pool_bytes, 0)
@@ -0,0 +1,85 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+from lttnganalyses.linuxautomaton.irq import IrqStateProvider
+from lttnganalyses.linuxautomaton.state import State
+from .utils import Event
+
+
+class TestSoftIrq(unittest.TestCase):
+    def setUp(self):
+        self._state = State()
+        self._provider = IrqStateProvider(self._state)
+        self._softirqs = []
+        self._state.register_notification_cbs(None, {
+            'softirq_exit': self._softirq_exit_cb,
+        })
+
+    def _softirq_exit_cb(self, period_data, payload):
+        irq = payload.softirq
+        self._softirqs.append((irq.id, irq.raise_ts, irq.begin_ts,
+                               irq.end_ts))
+
+    def _softirq(self, name, timestamp, vec):
+        self._provider.process_event(Event(name, timestamp, vec=vec))
+
+    def test_raise_entry_exit(self):
+        self._softirq('softirq_raise', 10, 3)
+        # level-triggered: only the first raise is kept
+        self._softirq('softirq_raise', 15, 3)
+        self._softirq('softirq_entry', 20, 3)
+        # raised again while running
+        self._softirq('softirq_raise', 25, 3)
+        self._softirq('softirq_exit', 30, 3)
+        self._softirq('softirq_entry', 40, 3)
+        self._softirq('softirq_exit', 50, 3)
+
+        self.assertEqual(self._softirqs, [(3, 10, 20, 30),
+                                          (3, 25, 40, 50)])
+        self.assertFalse(self._state.get_cpu(0).get_softirq_queue(3))
+
+    def test_unmatched(self):
+        self._softirq('softirq_exit', 10, 1)
+        self._softirq('softirq_entry', 20, 1)
+        self._softirq('softirq_exit', 30, 1)
+
+        self.assertEqual(self._softirqs, [(1, None, 20, 30)])
+
+    def test_recycled(self):
+        self._softirq('softirq_raise', 10, 3)
+        self._softirq('softirq_entry', 20, 3)
+        irq = self._state.get_cpu(0).get_softirq_queue(3)[0]
+        self._softirq('softirq_exit', 30, 3)
+        self._softirq('softirq_entry', 40, 2)
+
+        queue = self._state.get_cpu(0).get_softirq_queue(2)
+        self.assertIs(queue[0], irq)
+        self.assertEqual((irq.id, irq.raise_ts, irq.begin_ts, irq.end_ts),
+                         (2, None, 40, None))
+
+    def test_unknown_vec(self):
+        self._softirq('softirq_raise', 10, 12)
+        self._softirq('softirq_entry', 20, 12)
+        self._softirq('softirq_exit', 30, 12)
+
+        self.assertEqual(self._softirqs, [(12, 10, 20, 30)])
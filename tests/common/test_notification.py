@@ -0,0 +1,81 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+from lttnganalyses.linuxautomaton import notification
+
+
+class TestNotificationBus(unittest.TestCase):
+    def setUp(self):
+        self.bus = notification.NotificationBus()
+        self.calls = []
+
+    def _cb(self, period_data, payload):
+        self.calls.append((period_data, payload.as_dict()))
+
+    def test_dispatch_order(self):
+        for period_data in ['a', 'b', 'c']:
+            self.bus.subscribe(period_data, {'sched_switch': self._cb})
+        payload = notification.KwargsPayload({'cpu_id': 1})
+        self.bus.send('sched_switch', payload)
+        self.bus.send('softirq_exit', payload)
+
+        self.assertEqual(self.calls, [('a', {'cpu_id': 1}),
+                                      ('b', {'cpu_id': 1}),
+                                      ('c', {'cpu_id': 1})])
+
+    def test_unsubscribe(self):
+        cbs = {'sched_switch': self._cb, 'softirq_exit': self._cb}
+        subscriptions = [self.bus.subscribe(period_data, cbs)
+                         for period_data in range(4)]
+        # consecutive removals must not skip any subscriber
+        self.bus.unsubscribe(subscriptions[1])
+        self.bus.unsubscribe(subscriptions[2])
+        payload = notification.IrqHandlerExitPayload()
+        self.bus.send('sched_switch', payload)
+        self.bus.send('softirq_exit', payload)
+
+        self.assertEqual([c[0] for c in self.calls], [0, 3, 0, 3])
+        self.assertEqual(self.bus.subscriber_count('sched_switch'), 2)
+
+        self.bus.unsubscribe(subscriptions[0])
+        self.bus.unsubscribe(subscriptions[3])
+        # unsubscribing twice is harmless
+        self.bus.unsubscribe(subscriptions[3])
+
+        self.assertFalse(self.bus.has_subscribers('sched_switch'))
+        self.assertFalse(self.bus.has_subscribers('softirq_exit'))
+
+    def test_kwargs_cb(self):
+        def legacy_cb(period_data, **kwargs):
+            self.calls.append((period_data, kwargs))
+
+        payload = notification.ProcCpuPayload()
+        payload.proc = 'proc'
+        payload.cpu_id = 2
+        self.bus.subscribe('a', {
+            'tid_page_alloc': notification.kwargs_cb(legacy_cb)
+        })
+        self.bus.send('tid_page_alloc', payload)
+
+        self.assertEqual(self.calls,
+                         [('a', {'proc': 'proc', 'cpu_id': 2})])
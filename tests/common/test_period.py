@@ -0,0 +1,712 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Philippe Proulx <pproulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+
+try:
+    import babeltrace as bt
+    from lttnganalyses.core import event as core_event
+    from lttnganalyses.core import period
+except ImportError:
+    # babeltrace is not installed
+    bt = None
+    core_event = None
+    period = None
+
+
+# Mock of babeltrace's Event: `fields` are the payload fields and
+# `scoped_fields` maps other CTF scopes to their fields. A field read
+# without a scope is searched in the payload first.
+class Event():
+    def __init__(self, name, timestamp=0, scoped_fields=None, **fields):
+        self.name = name
+        self.timestamp = timestamp
+        self.cycles = timestamp
+        self._fields = {bt.CTFScope.EVENT_FIELDS: fields}
+
+        if scoped_fields is not None:
+            self._fields.update(scoped_fields)
+
+    def _get_first_field(self, field_name):
+        for scope_fields in self._fields.values():
+            if field_name in scope_fields:
+                return scope_fields[field_name]
+
+    def __contains__(self, field_name):
+        return self._get_first_field(field_name) is not None
+
+    def __getitem__(self, field_name):
+        field = self._get_first_field(field_name)
+
+        if field is None:
+            raise KeyError(field_name)
+
+        return field
+
+    def field_with_scope(self, field_name, scope):
+        return self._fields.get(scope, {}).get(field_name)
+
+    def field_list_with_scope(self, scope):
+        return list(self._fields.get(scope, {}))
+
+
+# Expression builders: `$evt.name`, `$begin.$evt.name`,
+# `$parent.$begin.$evt.name` and `$evt.$name`
+def _evt_field(name, dyn_scope=None):
+    expr = period.EventFieldName(name)
+
+    if dyn_scope is not None:
+        expr = period.DynamicScope(dyn_scope, expr)
+
+    return period.EventScope(expr)
+
+
+def _begin_field(name, dyn_scope=None):
+    return period.BeginScope(_evt_field(name, dyn_scope))
+
+
+def _parent_field(name):
+    return period.ParentScope(_begin_field(name))
+
+
+def _evt_name():
+    return period.EventScope(period.EventName())
+
+
+@unittest.skipIf(period is None, 'babeltrace is not installed')
+class TestExpressionCompiler(unittest.TestCase):
+    def _matches(self, expr, evt, begin_evt=None, parent_begin_evt=None):
+        compiler = period._ExpressionCompiler()
+        matches = compiler.compile_predicate(expr)
+
+        return matches(evt, begin_evt, parent_begin_evt)
+
+    def _comp_matches(self, expr_cls, value, rh_value):
+        expr = expr_cls(_evt_field('x'), period.Number(rh_value))
+
+        return self._matches(expr, Event('a', x=value))
+
+    def test_eq(self):
+        self.assertTrue(self._comp_matches(period.Eq, 2, 2))
+        self.assertFalse(self._comp_matches(period.Eq, 2, 3))
+
+    def test_lt(self):
+        self.assertTrue(self._comp_matches(period.Lt, 2, 3))
+        self.assertFalse(self._comp_matches(period.Lt, 2, 2))
+
+    def test_lt_eq(self):
+        self.assertTrue(self._comp_matches(period.LtEq, 2, 2))
+        self.assertFalse(self._comp_matches(period.LtEq, 3, 2))
+
+    def test_gt(self):
+        self.assertTrue(self._comp_matches(period.Gt, 3, 2))
+        self.assertFalse(self._comp_matches(period.Gt, 2, 2))
+
+    def test_gt_eq(self):
+        self.assertTrue(self._comp_matches(period.GtEq, 2, 2))
+        self.assertFalse(self._comp_matches(period.GtEq, 2, 3))
+
+    def test_glob_eq(self):
+        expr = period.GlobEq(_evt_name(), period.String('sched_*'))
+
+        self.assertTrue(self._matches(expr, Event('sched_switch')))
+        self.assertFalse(self._matches(expr, Event('irq_entry')))
+
+    def test_and(self):
+        expr = period.LogicalAnd(
+            period.Eq(_evt_name(), period.String('a')),
+            period.Eq(_evt_field('x'), period.Number(1)))
+
+        self.assertTrue(self._matches(expr, Event('a', x=1)))
+        self.assertFalse(self._matches(expr, Event('a', x=2)))
+        self.assertFalse(self._matches(expr, Event('b', x=1)))
+
+    def test_or(self):
+        expr = period.LogicalOr(
+            period.Eq(_evt_name(), period.String('a')),
+            period.Eq(_evt_field('x'), period.Number(1)))
+
+        self.assertTrue(self._matches(expr, Event('a', x=2)))
+        self.assertTrue(self._matches(expr, Event('b', x=1)))
+        self.assertFalse(self._matches(expr, Event('b', x=2)))
+
+    def test_not(self):
+        expr = period.LogicalNot(
+            period.Eq(_evt_field('x'), period.Number(1)))
+
+        self.assertTrue(self._matches(expr, Event('a', x=2)))
+        self.assertFalse(self._matches(expr, Event('a', x=1)))
+
+    def test_literal_int_float(self):
+        # the float literal is cast to the int field's type
+        self.assertTrue(self._comp_matches(period.Eq, 2, 2.5))
+        self.assertTrue(self._comp_matches(period.Lt, 2, 3.5))
+        self.assertFalse(self._comp_matches(period.Gt, 2, 2.5))
+
+        # a float field is not cast
+        self.assertFalse(self._comp_matches(period.Eq, 2.5, 2))
+
+    def test_literal_type_mismatch(self):
+        self.assertFalse(self._comp_matches(period.Eq, '2', 2))
+        self.assertFalse(self._comp_matches(period.LtEq, 2, '2'))
+
+        expr = period.Eq(_evt_field('x'), period.String('2'))
+        self.assertTrue(self._matches(expr, Event('a', x='2')))
+
+    def test_literal_missing_field(self):
+        expr = period.GtEq(_evt_field('x'), period.Number(0))
+
+        self.assertFalse(self._matches(expr, Event('a', y=1)))
+        self.assertTrue(self._matches(period.LogicalNot(expr),
+                                      Event('a', y=1)))
+
+    def test_fields(self):
+        expr = period.Eq(_evt_field('x'), _begin_field('y'))
+        begin_evt = Event('a', y=2)
+
+        self.assertTrue(self._matches(expr, Event('b', x=2), begin_evt))
+        self.assertFalse(self._matches(expr, Event('b', x=3), begin_evt))
+        self.assertFalse(self._matches(expr, Event('b'), begin_evt))
+        # the RHS is cast to the LHS's int type
+        self.assertTrue(self._matches(expr, Event('b', x=2),
+                                      Event('a', y=2.5)))
+
+    def test_parent_begin(self):
+        expr = period.Eq(_evt_field('x'), _parent_field('x'))
+        evt = Event('b', x=1)
+
+        self.assertTrue(self._matches(expr, evt, Event('a', x=2),
+                                      Event('p', x=1)))
+        self.assertFalse(self._matches(expr, evt, Event('a', x=1),
+                                       Event('p', x=2)))
+        # no parent period
+        self.assertFalse(self._matches(expr, evt, Event('a', x=1)))
+
+    def test_dynamic_scope(self):
+        sec = bt.CTFScope.STREAM_EVENT_CONTEXT
+        expr = period.Eq(_evt_field('x', period.DynScope.SEC),
+                         period.Number(1))
+
+        self.assertTrue(self._matches(
+            expr, Event('a', x=2, scoped_fields={sec: {'x': 1}})))
+        self.assertFalse(self._matches(expr, Event('a', x=1)))
+
+    def test_field_scopes(self):
+        sec = bt.CTFScope.STREAM_EVENT_CONTEXT
+        field_expr = _evt_field('x')
+        compiler = period._ExpressionCompiler({field_expr.child: sec})
+        get_value = compiler.compile_value(field_expr)
+        evt = Event('a', x=2, scoped_fields={sec: {'x': 1}})
+
+        # read from the resolved scope, not from the first one
+        self.assertEqual(get_value(evt, None, None), 1)
+
+
+@unittest.skipIf(period is None, 'babeltrace is not installed')
+class TestNameFilter(unittest.TestCase):
+    def _get_filter(self, expr, scope_types=None):
+        if scope_types is None:
+            scope_types = (period.EventScope,)
+
+        compiler = period._ExpressionCompiler()
+
+        return compiler.compile_name_filter(expr, scope_types)
+
+    def test_eq(self):
+        name_filter = self._get_filter(
+            period.Eq(_evt_name(), period.String('a')))
+
+        self.assertTrue(name_filter('a'))
+        self.assertFalse(name_filter('b'))
+
+        # the string may also be the LHS
+        name_filter = self._get_filter(
+            period.Eq(period.String('a'), _evt_name()))
+
+        self.assertTrue(name_filter('a'))
+        self.assertFalse(name_filter('b'))
+
+    def test_glob_eq(self):
+        name_filter = self._get_filter(
+            period.GlobEq(_evt_name(), period.String('sched_*')))
+
+        self.assertTrue(name_filter('sched_switch'))
+        self.assertFalse(name_filter('irq_entry'))
+
+    def test_field(self):
+        expr = period.Eq(_evt_field('x'), period.String('a'))
+
+        self.assertIsNone(self._get_filter(expr))
+
+    def test_and(self):
+        expr = period.LogicalAnd(
+            period.GlobEq(_evt_name(), period.String('a*')),
+            period.GlobEq(_evt_name(), period.String('*b')))
+        name_filter = self._get_filter(expr)
+
+        self.assertTrue(name_filter('a_b'))
+        self.assertFalse(name_filter('a_c'))
+        self.assertFalse(name_filter('c_b'))
+
+        # an unconstrained side does not widen the filter
+        expr = period.LogicalAnd(
+            period.Eq(_evt_field('x'), period.Number(1)),
+            period.Eq(_evt_name(), period.String('a')))
+        name_filter = self._get_filter(expr)
+
+        self.assertTrue(name_filter('a'))
+        self.assertFalse(name_filter('b'))
+
+    def test_or(self):
+        expr = period.LogicalOr(
+            period.Eq(_evt_name(), period.String('a')),
+            period.Eq(_evt_name(), period.String('b')))
+        name_filter = self._get_filter(expr)
+
+        self.assertTrue(name_filter('a'))
+        self.assertTrue(name_filter('b'))
+        self.assertFalse(name_filter('c'))
+
+        # an unconstrained side matches any name
+        expr = period.LogicalOr(
+            period.Eq(_evt_name(), period.String('a')),
+            period.Eq(_evt_field('x'), period.Number(1)))
+
+        self.assertIsNone(self._get_filter(expr))
+
+    def test_not(self):
+        expr = period.LogicalNot(
+            period.Eq(_evt_name(), period.String('a')))
+
+        self.assertIsNone(self._get_filter(expr))
+
+    def test_begin_scope(self):
+        expr = period.Eq(period.BeginScope(_evt_name()),
+                         period.String('a'))
+
+        # `$begin` is the current event in a begin expression only
+        name_filter = self._get_filter(
+            expr, (period.EventScope, period.BeginScope))
+
+        self.assertTrue(name_filter('a'))
+        self.assertFalse(name_filter('b'))
+        self.assertIsNone(self._get_filter(expr))
+
+
+@unittest.skipIf(period is None, 'babeltrace is not installed')
+class TestCandidatePeriodDefs(unittest.TestCase):
+    def setUp(self):
+        self._registry = period.PeriodDefinitionRegistry()
+
+    def _add_period_def(self, parent_name, name, begin_expr, end_expr):
+        self._registry.add_period_def(parent_name, name, begin_expr,
+                                      end_expr, {}, {})
+
+        return self._registry.get_period_def(name)
+
+    def _get_names(self, period_defs):
+        return [period_def.name for period_def in period_defs]
+
+    def test_names(self):
+        name_a = period.Eq(_evt_name(), period.String('a'))
+        name_b = period.Eq(_evt_name(), period.String('b'))
+        self._add_period_def(None, 'parent', name_a, name_b)
+        self._add_period_def('parent', 'child', name_a,
+                             period.GlobEq(_evt_name(), period.String('b*')))
+        self._add_period_def('child', 'grandchild', name_b, name_b)
+
+        # parents first when beginning, children first when ending
+        begin_defs, end_defs = self._registry.get_candidate_period_defs('a')
+        self.assertEqual(self._get_names(begin_defs), ['parent', 'child'])
+        self.assertEqual(self._get_names(end_defs), [])
+
+        begin_defs, end_defs = self._registry.get_candidate_period_defs('b')
+        self.assertEqual(self._get_names(begin_defs), ['grandchild'])
+        self.assertEqual(self._get_names(end_defs),
+                         ['grandchild', 'child', 'parent'])
+
+        begin_defs, end_defs = self._registry.get_candidate_period_defs('bc')
+        self.assertEqual(self._get_names(begin_defs), [])
+        self.assertEqual(self._get_names(end_defs), ['child'])
+
+        self.assertEqual(self._registry.get_candidate_period_defs('c'),
+                         ((), ()))
+
+    def test_unconstrained(self):
+        self._add_period_def(
+            None, 'period', period.Eq(_evt_field('x'), period.Number(1)),
+            period.LogicalNot(period.Eq(_evt_name(), period.String('a'))))
+
+        begin_defs, end_defs = self._registry.get_candidate_period_defs('a')
+        self.assertEqual(self._get_names(begin_defs), ['period'])
+        self.assertEqual(self._get_names(end_defs), ['period'])
+
+    def test_begin_scope(self):
+        begin_name = period.Eq(period.BeginScope(_evt_name()),
+                               period.String('a'))
+        period_def = self._add_period_def(None, 'period', begin_name,
+                                          begin_name)
+
+        self.assertTrue(period_def.can_begin_with('a'))
+        self.assertFalse(period_def.can_begin_with('b'))
+        # in an end expression, `$begin` is not the current event
+        self.assertTrue(period_def.can_end_with('b'))
+
+    def test_new_period_def(self):
+        name_a = period.Eq(_evt_name(), period.String('a'))
+        self._add_period_def(None, 'first', name_a, name_a)
+        self._registry.get_candidate_period_defs('a')
+        self._add_period_def(None, 'second', name_a, name_a)
+
+        # the candidates are resolved again
+        begin_defs, _ = self._registry.get_candidate_period_defs('a')
+        self.assertEqual(sorted(self._get_names(begin_defs)),
+                         ['first', 'second'])
+
+
+class _PeriodEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self._registry = period.PeriodDefinitionRegistry()
+        self._engine = None
+        self._ended_periods = []
+
+    def _add_period_def(self, parent_name, name, begin_expr, end_expr):
+        self._registry.add_period_def(parent_name, name, begin_expr,
+                                      end_expr, {}, {})
+
+        return self._registry.get_period_def(name)
+
+    def _period_end_cb(self, ended_period):
+        self._ended_periods.append(ended_period)
+
+    def _process_events(self, evts):
+        if self._engine is None:
+            self._engine = period.PeriodEngine(self._registry, {
+                period.PeriodEngineCallbackType.PERIOD_BEGIN: lambda p: None,
+                period.PeriodEngineCallbackType.PERIOD_END:
+                    self._period_end_cb,
+            })
+
+        for evt in evts:
+            self._engine.process_event(evt)
+
+    # Returns the (name, begin timestamp, end timestamp, completed)
+    # tuples of the ended periods, in ending order
+    def _get_ended(self):
+        ended = []
+
+        for ended_period in self._ended_periods:
+            end_ts = None
+
+            if ended_period.end_evt is not None:
+                end_ts = ended_period.end_evt.timestamp
+
+            ended.append((ended_period.definition.name,
+                          ended_period.begin_evt.timestamp, end_ts,
+                          ended_period.completed))
+
+        return ended
+
+
+@unittest.skipIf(period is None, 'babeltrace is not installed')
+class TestPeriodEngine(_PeriodEngineTestCase):
+    # period beginning with an `a` event and ending with the next `b`
+    # event of the same tid
+    def _add_tid_period_def(self):
+        end_expr = period.LogicalAnd(
+            period.Eq(_evt_name(), period.String('b')),
+            period.Eq(_begin_field('tid'), _evt_field('tid')))
+
+        return self._add_period_def(
+            None, 'tid', period.Eq(_evt_name(), period.String('a')),
+            end_expr)
+
+    def test_indexed_end(self):
+        period_def = self._add_tid_period_def()
+        self._process_events([
+            Event('a', 1, tid=1),
+            Event('a', 2, tid=2),
+            Event('b', 3, tid=2),
+            Event('b', 4, tid=3),
+            Event('b', 5, tid=1),
+        ])
+
+        self.assertEqual(self._get_ended(), [
+            ('tid', 2, 3, True),
+            ('tid', 1, 5, True),
+        ])
+        self.assertEqual(period_def.get_event_key(Event('b', tid=2)),
+                         ((int, 2),))
+        self.assertIsNone(period_def.get_event_key(Event('b')))
+        self.assertFalse(self._engine.root_periods)
+
+    def test_float_event_key(self):
+        period_def = self._add_tid_period_def()
+        self._process_events([
+            Event('a', 1, tid=1),
+            Event('a', 2, tid=2),
+        ])
+
+        for open_period in self._engine.root_periods:
+            self.assertIsNotNone(open_period.key)
+
+        # all the open periods are evaluated: the begin int is compared
+        # to the event float cast to an int
+        end_evt = Event('b', 3, tid=2.5)
+        self.assertIs(period_def.get_event_key(end_evt), period.ANY_KEY)
+        self._process_events([end_evt])
+
+        self.assertEqual(self._get_ended(), [('tid', 2, 3, True)])
+
+    def test_unindexed(self):
+        self._add_tid_period_def()
+        self._process_events([
+            # floats and missing values are not indexed
+            Event('a', 1, tid=1.0),
+            Event('a', 2),
+            Event('a', 3, tid=1),
+        ])
+
+        for open_period in self._engine.root_periods:
+            if open_period.begin_evt.timestamp == 3:
+                self.assertIsNotNone(open_period.key)
+            else:
+                self.assertIsNone(open_period.key)
+
+        # a float begin value is not cast to the event's int
+        self._process_events([Event('b', 4, tid=1)])
+        self.assertEqual(self._get_ended(), [('tid', 3, 4, True)])
+
+        self._process_events([Event('b', 5, tid=1.0)])
+        self._engine.remove_all_periods()
+
+        self.assertEqual(self._get_ended(), [
+            ('tid', 3, 4, True),
+            ('tid', 1, 5, True),
+            ('tid', 2, None, False),
+        ])
+
+    def test_no_key(self):
+        self._add_period_def(
+            None, 'period', period.Eq(_evt_name(), period.String('a')),
+            period.Eq(_evt_name(), period.String('b')))
+        self._process_events([
+            Event('a', 1),
+            Event('b', 2),
+            Event('b', 3),
+        ])
+
+        self.assertEqual(self._get_ended(), [('period', 1, 2, True)])
+
+    def test_child_same_begin_evt(self):
+        name_a = period.Eq(_evt_name(), period.String('a'))
+        self._add_period_def(None, 'parent', name_a,
+                             period.Eq(_evt_name(), period.String('c')))
+        self._add_period_def('parent', 'child', name_a,
+                             period.Eq(_evt_name(), period.String('b')))
+        self._process_events([
+            Event('a', 1),
+            Event('b', 2),
+            Event('c', 3),
+        ])
+
+        self.assertEqual(self._get_ended(), [
+            ('child', 1, 2, True),
+            ('parent', 1, 3, True),
+        ])
+        child, parent = self._ended_periods
+        self.assertIs(child.parent, parent)
+
+
+@unittest.skipIf(period is None, 'babeltrace is not installed')
+class TestBeginEvtFields(_PeriodEngineTestCase):
+    def test_parent_begin_fields(self):
+        parent_def = self._add_period_def(
+            None, 'parent', period.Eq(_evt_name(), period.String('a')),
+            period.Eq(_evt_name(), period.String('c')))
+        begin_expr = period.LogicalAnd(
+            period.Eq(_evt_name(), period.String('b')),
+            period.Eq(_evt_field('x'), _parent_field('x')))
+        self._add_period_def('parent', 'child', begin_expr,
+                             period.Eq(_evt_name(), period.String('c')))
+
+        # the parent's begin expression does not read `x`
+        self.assertEqual(parent_def.begin_evt_fields, {('x', None)})
+
+        self._process_events([
+            Event('a', 1, x=5, y=1),
+            Event('b', 2, x=4),
+            Event('b', 3, x=5),
+            Event('c', 4),
+        ])
+
+        self.assertEqual(self._get_ended(), [
+            ('child', 3, 4, True),
+            ('parent', 1, 4, True),
+        ])
+        parent_begin_evt = self._ended_periods[1].begin_evt
+        self.assertEqual(parent_begin_evt['x'], 5)
+        self.assertNotIn('y', parent_begin_evt)
+
+    def test_end_fields(self):
+        end_expr = period.LogicalAnd(
+            period.Eq(_evt_name(), period.String('b')),
+            period.Eq(_evt_field('x'), _begin_field('x')))
+        period_def = self._add_period_def(
+            None, 'period', period.Eq(_evt_name(), period.String('a')),
+            end_expr)
+
+        self.assertEqual(period_def.begin_evt_fields, {('x', None)})
+
+    def test_auto_scope_copy(self):
+        sec = bt.CTFScope.STREAM_EVENT_CONTEXT
+        evt = Event('a', x=1, y=2, scoped_fields={sec: {'x': 3}})
+        evt_copy = core_event.Event(evt, [('x', None)])
+
+        # copied from every scope it's found in
+        self.assertEqual(
+            evt_copy.field_with_scope('x', bt.CTFScope.EVENT_FIELDS), 1)
+        self.assertEqual(evt_copy.field_with_scope('x', sec), 3)
+        self.assertNotIn('y', evt_copy)
+
+    def test_scoped_copy(self):
+        sec = bt.CTFScope.STREAM_EVENT_CONTEXT
+        evt = Event('a', x=1, scoped_fields={sec: {'x': 3}})
+        evt_copy = core_event.Event(evt, [('x', sec)])
+
+        self.assertIsNone(
+            evt_copy.field_with_scope('x', bt.CTFScope.EVENT_FIELDS))
+        self.assertEqual(evt_copy['x'], 3)
+
+
+@unittest.skipIf(period is None, 'babeltrace is not installed')
+class TestRemovePeriods(_PeriodEngineTestCase):
+    def setUp(self):
+        super().setUp()
+        # three levels, each beginning with the next event
+        self._add_period_def(
+            None, 'parent', period.Eq(_evt_name(), period.String('a')),
+            period.Eq(_evt_name(), period.String('d')))
+        self._add_period_def(
+            'parent', 'child', period.Eq(_evt_name(), period.String('b')),
+            period.Eq(_evt_name(), period.String('e')))
+        self._add_period_def(
+            'child', 'grandchild',
+            period.Eq(_evt_name(), period.String('c')),
+            period.Eq(_evt_name(), period.String('e')))
+        self._process_events([
+            Event('a', 1),
+            Event('b', 2),
+            Event('c', 3),
+        ])
+
+    def test_parent_end(self):
+        self._process_events([Event('d', 4)])
+
+        # the descendants end first, without matching their end
+        # expression
+        self.assertEqual(self._get_ended(), [
+            ('grandchild', 3, 4, False),
+            ('child', 2, 4, False),
+            ('parent', 1, 4, True),
+        ])
+
+        for ended_period in self._ended_periods:
+            self.assertFalse(ended_period.children)
+
+        self.assertFalse(self._engine.root_periods)
+
+        # the removed periods are not open anymore
+        self._process_events([Event('e', 5)])
+        self.assertEqual(len(self._ended_periods), 3)
+
+    def test_remove_all(self):
+        self._engine.remove_all_periods()
+
+        self.assertEqual(self._get_ended(), [
+            ('grandchild', 3, None, False),
+            ('child', 2, None, False),
+            ('parent', 1, None, False),
+        ])
+        self.assertFalse(self._engine.root_periods)
+
+
+@unittest.skipIf(period is None, 'babeltrace is not installed')
+class TestResolveFieldScopes(_PeriodEngineTestCase):
+    # period beginning with an `a` event and ending with the next `b`
+    # event with the same `x` field
+    def _add_x_period_def(self):
+        end_expr = period.LogicalAnd(
+            period.Eq(_evt_name(), period.String('b')),
+            period.Eq(_evt_field('x'), _begin_field('x')))
+
+        return self._add_period_def(
+            None, 'x', period.Eq(_evt_name(), period.String('a')),
+            end_expr)
+
+    def test_same_scope(self):
+        ec = bt.CTFScope.EVENT_CONTEXT
+        period_def = self._add_x_period_def()
+        self._registry.resolve_field_scopes({
+            'a': [[('x', ec)], [('y', ec), ('x', ec)]],
+            'b': [[('x', ec)]],
+        })
+
+        # read from the only scope which has it
+        self.assertEqual(period_def.begin_evt_fields, {('x', ec)})
+        self._process_events([
+            Event('a', 1, x=2, scoped_fields={ec: {'x': 1}}),
+            Event('b', 2, x=1, scoped_fields={ec: {'x': 2}}),
+            Event('b', 3, x=2, scoped_fields={ec: {'x': 1}}),
+        ])
+
+        self.assertEqual(self._get_ended(), [('x', 1, 3, True)])
+
+    def test_multiple_handles(self):
+        ep = bt.CTFScope.EVENT_FIELDS
+        sec = bt.CTFScope.STREAM_EVENT_CONTEXT
+        period_def = self._add_x_period_def()
+
+        # `x` is in the payload of the first trace's `a` event and in
+        # the stream event context of the second trace's
+        self._registry.resolve_field_scopes({
+            'a': [[('x', ep)], [('x', sec)]],
+            'b': [[('x', ep)]],
+        })
+
+        self.assertEqual(period_def.begin_evt_fields, {('x', None)})
+        self._process_events([
+            Event('a', 1, scoped_fields={sec: {'x': 1}}),
+            Event('b', 2, x=1),
+        ])
+
+        self.assertEqual(self._get_ended(), [('x', 1, 2, True)])
+
+    def test_missing_field(self):
+        ep = bt.CTFScope.EVENT_FIELDS
+        self._add_x_period_def()
+
+        with self.assertRaises(period.InvalidPeriodDefinition):
+            self._registry.resolve_field_scopes({
+                'a': [[('y', ep)], [('z', ep)]],
+                'b': [[('x', ep)]],
+            })
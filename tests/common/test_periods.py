@@ -0,0 +1,315 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import statistics
+import unittest
+
+try:
+    from lttnganalyses.core import period, periods
+except ImportError:
+    # babeltrace is not installed
+    periods = None
+
+
+def _create_registry():
+    registry = period.PeriodDefinitionRegistry()
+
+    for parent_name, name in [(None, 'a'), ('a', 'b')]:
+        name_expr = period.Eq(period.EventScope(period.EventName()),
+                              period.String(name))
+        registry.add_period_def(parent_name, name, name_expr, name_expr,
+                                {}, {})
+
+    return registry
+
+
+class _PeriodEventsTestCase(unittest.TestCase):
+    def setUp(self):
+        self._index = 0
+        self._aggregator = None
+
+    def _create_aggregator(self, group_by=None, select=None,
+                           aggregate_by=None, **kwargs):
+        if group_by is None:
+            group_by = {}
+
+        if select is None:
+            select = []
+
+        self._aggregator = periods.PeriodAggregator(
+            _create_registry(), lambda period_event: True, group_by, select,
+            aggregate_by, **kwargs)
+
+    # Begins a period event like PeriodAnalysis does
+    def _begin(self, name, start_ts, parent=None):
+        period_event = periods.PeriodEvent(start_ts, name, parent,
+                                           self._index)
+        self._index += 1
+
+        if self._aggregator is not None:
+            self._aggregator.begin_period_event(period_event)
+
+        return period_event
+
+    # Ends a period event like PeriodAnalysis does
+    def _end(self, period_event, end_ts, completed=True,
+             begin_captures=None, end_captures=None):
+        if completed:
+            period_event.finish(end_ts, begin_captures, end_captures)
+
+        if self._aggregator is not None:
+            self._aggregator.end_period_event(period_event, completed)
+
+        if completed and period_event.parent is not None:
+            period_event.parent.add_child(period_event)
+
+
+@unittest.skipIf(periods is None, 'babeltrace is not installed')
+class TestPeriodAggregator(_PeriodEventsTestCase):
+    def _get_hierarchical_list(self):
+        return [(period_event.name, period_event.start_ts)
+                for period_event in self._aggregator.hierarchical_list]
+
+    def test_out_of_order_root_ends(self):
+        self._create_aggregator(keep_hierarchical_list=True)
+        first = self._begin('a', 10)
+        second = self._begin('a', 20)
+        child = self._begin('b', 30, second)
+        self._end(child, 40)
+        self._end(second, 50)
+
+        # waiting for the root period event which began before
+        self.assertEqual(self._aggregator.hierarchical_list, [])
+        self.assertEqual(len(self._aggregator.per_period_stats), 0)
+
+        self._end(first, 60)
+
+        self.assertEqual(self._get_hierarchical_list(),
+                         [('a', 10), ('a', 20), ('b', 30)])
+        stats = self._aggregator.per_period_stats
+        self.assertEqual(list(stats.keys()), ['a', 'b'])
+        self.assertEqual(stats['a'].nr_periods, 2)
+        self.assertEqual(stats['b'].nr_periods, 1)
+        child_stats = stats['a']._children['b']
+        self.assertEqual((child_stats.durations.count,
+                          child_stats.durations.total), (1, 10))
+
+    def test_incomplete_roots(self):
+        self._create_aggregator(keep_hierarchical_list=True)
+        first = self._begin('a', 10)
+        second = self._begin('a', 20)
+        third = self._begin('a', 30)
+        self._end(third, 40)
+        self._end(second, None, completed=False)
+
+        self.assertEqual(self._aggregator.hierarchical_list, [])
+
+        # an incomplete root period event is not aggregated, but does
+        # not block the ones which began after it
+        self._end(first, None, completed=False)
+
+        self.assertEqual(self._get_hierarchical_list(), [('a', 30)])
+        self.assertEqual(self._aggregator.per_period_stats['a'].nr_periods,
+                         1)
+
+    def test_per_parent(self):
+        self._create_aggregator(select=['b'], aggregate_by='a',
+                                hierarchy=False, by_parent=True)
+        first = self._begin('a', 10)
+        second = self._begin('a', 20)
+        third = self._begin('a', 30)
+        first_child = self._begin('b', 40, first)
+        second_child = self._begin('b', 41, second)
+        self._end(first_child, 45, begin_captures={'x': 1})
+        self._end(second_child, 46)
+        self._end(third, 50)
+        self._end(second, None, completed=False)
+        self._end(first, 60)
+
+        # incomplete parents are removed, the others are in the order
+        # they began
+        parent_aggregated_dict = self._aggregator.parent_aggregated_dict
+        self.assertEqual(list(parent_aggregated_dict.keys()),
+                         [first, third])
+        self.assertEqual(parent_aggregated_dict[third], {})
+
+        items = parent_aggregated_dict[first]['b']
+        self.assertEqual(len(items), 1)
+        self.assertIs(items[0].event, first_child)
+        self.assertIs(items[0].parent_event, first)
+        self.assertEqual(items[0].full_captures, [('b.x', 1)])
+        self.assertEqual(items[0].group_by_captures, ())
+
+
+@unittest.skipIf(periods is None, 'babeltrace is not installed')
+class TestPeriodStats(_PeriodEventsTestCase):
+    def test_update_stats(self):
+        period_stats = periods.PeriodStats('a')
+
+        for start_ts, end_ts in [(10, 40), (50, 60), (70, 90)]:
+            period_event = self._begin('a', start_ts)
+            self._end(period_event, end_ts)
+            period_stats.update_stats(period_event)
+
+        self.assertEqual((period_stats.count, period_stats.min_duration,
+                          period_stats.max_duration,
+                          period_stats.total_duration), (3, 10, 30, 60))
+        self.assertEqual(period_stats.durations.stdev, 10)
+        self.assertEqual(period_stats.histogram.get_freq_counts(10, 30, 2),
+                         [1, 2])
+
+
+@unittest.skipIf(periods is None, 'babeltrace is not installed')
+class TestAggregatedStats(unittest.TestCase):
+    def test_new_with_zeros(self):
+        aggregated_stats = periods.AggregatedStats()
+        for count, duration, pc in [(1, 10, 25), (3, 30, 50.5)]:
+            aggregated_stats.add_count(count)
+            aggregated_stats.add_duration(duration)
+            aggregated_stats.add_percentage(pc)
+        aggregated_stats.parent_count['a'] = 2
+
+        global_stats = aggregated_stats.new_with_zeros(2)
+
+        self.assertEqual((global_stats.durations.count,
+                          global_stats.durations.min,
+                          global_stats.durations.max,
+                          global_stats.durations.mean), (4, 0, 30, 10))
+        self.assertAlmostEqual(global_stats.counts.stdev,
+                               statistics.stdev([1, 3, 0, 0]))
+        self.assertAlmostEqual(global_stats.pcs.mean, 75.5 / 4)
+        self.assertEqual(global_stats.count_histogram.get_freq_counts(
+            0, 3, 3), [2, 1, 1])
+        ratio = periods.AggregatedStats.PC_RATIO
+        self.assertEqual(global_stats.pc_histogram.get_freq_counts(
+            0, 100, 4, ratio), [2, 1, 1, 0])
+        self.assertEqual(global_stats.parent_count, {'a': 2})
+
+        # unchanged
+        self.assertEqual(aggregated_stats.durations.count, 2)
+        self.assertEqual(aggregated_stats.duration_histogram.count, 2)
+
+
+@unittest.skipIf(periods is None, 'babeltrace is not installed')
+class TestPeriodStore(_PeriodEventsTestCase):
+    def _get_period_event_values(self, period_event):
+        return (period_event.index, period_event.name,
+                period_event.start_ts, period_event.end_ts,
+                period_event._begin_captures, period_event._end_captures)
+
+    def test_round_trip(self):
+        store = periods.PeriodStore()
+        parent = self._begin('a', 10)
+        first = self._begin('b', 20, parent)
+        second = self._begin('b', 30, parent)
+        unnamed = self._begin(None, 35)
+        self._end(second, 40, begin_captures={'x': 1, 'y': 'foo'},
+                  end_captures={'z': None})
+        self._end(first, 50, begin_captures={'x': 2, 'y': 'bar'})
+        self._end(parent, 60)
+        self._end(unnamed, 70, begin_captures={}, end_captures={})
+        period_events = [second, first, parent, unnamed]
+
+        for period_event in period_events:
+            store.append(period_event)
+
+        self.assertEqual(len(store), 4)
+
+        for row, period_event in enumerate(period_events):
+            self.assertEqual(
+                self._get_period_event_values(store.get_period_event(row)),
+                self._get_period_event_values(period_event))
+
+        # one name id per name
+        self.assertEqual(store._names, ['b', 'a', None])
+        self.assertEqual(list(store._name_ids), [0, 0, 1, 2])
+
+        # capture names are shared between the rows
+        self.assertIs(store._begin_capture_names[0],
+                      store._begin_capture_names[1])
+        self.assertIsNone(store._end_capture_names[1])
+        self.assertIsNone(store._begin_capture_names[2])
+
+    def test_period_events_order(self):
+        store = periods.PeriodStore()
+        period_events = [self._begin('a', ts) for ts in [10, 20, 30]]
+
+        # ending in another order than they began
+        for period_event in reversed(period_events):
+            self._end(period_event, 40)
+            store.append(period_event)
+
+        self.assertEqual([(period_event.index, period_event.start_ts)
+                          for period_event in store.period_events()],
+                         [(0, 10), (1, 20), (2, 30)])
+
+
+@unittest.skipIf(periods is None, 'babeltrace is not installed')
+class TestGroupKey(_PeriodEventsTestCase):
+    def test_project_captures(self):
+        self._create_aggregator(group_by={'a': ['y', 'x', 'y']})
+        period_event = self._begin('a', 10)
+        self._end(period_event, 20, begin_captures={'y': 2, 'z': 3},
+                  end_captures={'x': 1})
+
+        # begin captures first, then sorted by capture name
+        self.assertEqual(period_event.group_by_captures,
+                         (('a.y', 2), ('a.x', 1)))
+        self.assertEqual(
+            self._aggregator.get_group_key(period_event.group_by_captures),
+            'a.x = 1, a.y = 2')
+
+    def test_incomplete(self):
+        self._create_aggregator(group_by={'a': ['x']})
+        period_event = self._begin('a', 10)
+        self._end(period_event, None, completed=False)
+
+        self.assertEqual(period_event.group_by_captures, ())
+
+    def test_group_key(self):
+        self._create_aggregator(group_by={'a': ['x', 'y'], 'b': ['x']})
+        captures = (('b.x', 'foo'), ('a.y', 2), ('a.x', 1))
+        group_key = self._aggregator.get_group_key(captures)
+
+        self.assertEqual(group_key, 'a.x = 1, a.y = 2, b.x = foo')
+        # formatted once
+        self.assertIs(self._aggregator.get_group_key(captures), group_key)
+        self.assertEqual(self._aggregator.get_group_key(()), '')
+
+    def test_unhashable_group_key(self):
+        self._create_aggregator(group_by={'a': ['x', 'y']})
+        captures = (('a.y', [2, 3]), ('a.x', 1))
+
+        self.assertEqual(self._aggregator.get_group_key(captures),
+                         'a.x = 1, a.y = [2, 3]')
+        self.assertEqual(self._aggregator._group_keys, {})
+
+    def test_dedup_captures(self):
+        captures_list = [(('a.x', 1),), (('a.x', 2),), (('a.x', 1),)]
+
+        self.assertEqual(periods._dedup_captures(captures_list),
+                         [(('a.x', 1),), (('a.x', 2),)])
+
+        captures_list = [(('a.x', [1]),), (('a.x', 2),), (('a.x', [1]),)]
+
+        self.assertEqual(periods._dedup_captures(captures_list),
+                         [(('a.x', [1]),), (('a.x', 2),)])
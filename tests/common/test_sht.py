@@ -0,0 +1,87 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import tempfile
+import unittest
+from lttnganalyses.linuxautomaton import sht
+
+
+class TestStateHistory(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._dir.name, 'history')
+
+        builder = sht.HistoryBuilder()
+        builder.modify(('cpus', 0, 'current_tid'), 0, 100)
+        builder.modify(('cpus', 1, 'current_tid'), 42, 100)
+        builder.modify(('tids', 42, 'syscall'), 'read', 150)
+        builder.modify(('cpus', 0, 'current_tid'), 42, 200)
+        builder.modify(('cpus', 1, 'current_tid'), 43, 200)
+        # same value, the interval goes on
+        builder.modify(('cpus', 1, 'current_tid'), 43, 250)
+        builder.modify(('tids', 42, 'syscall'), None, 300)
+        builder.modify(('cpus', 0, 'current_tid'), 0, 400)
+        builder.save(self._path, 499, 10, 1000)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_query(self):
+        with sht.StateHistory(self._path) as history:
+            self.assertEqual(history.begin_ts, 100)
+            self.assertEqual(history.end_ts, 500)
+            self.assertTrue(history.matches_trace(10, 1000))
+            self.assertFalse(history.matches_trace(10, 2000))
+            self.assertIsNone(history.get_cpu_tid(0, 99))
+            self.assertEqual(history.get_cpu_tid(0, 100), 0)
+            self.assertEqual(history.get_cpu_tid(0, 199), 0)
+            self.assertEqual(history.get_cpu_tid(0, 200), 42)
+            self.assertEqual(history.get_cpu_tid(0, 499), 0)
+            self.assertIsNone(history.get_cpu_tid(0, 500))
+            self.assertEqual(history.get_cpu_tid(1, 300), 43)
+            self.assertIsNone(history.get_cpu_tid(2, 300))
+            self.assertEqual(history.query(('tids', 42, 'syscall'), 299),
+                             'read')
+            self.assertIsNone(history.query(('tids', 42, 'syscall'), 300))
+            self.assertEqual(history.query_full(160), {
+                ('cpus', 0, 'current_tid'): 0,
+                ('cpus', 1, 'current_tid'): 42,
+                ('tids', 42, 'syscall'): 'read',
+            })
+
+    def test_query_range(self):
+        with sht.StateHistory(self._path) as history:
+            intervals = list(history.query_range(
+                ('cpus', 0, 'current_tid'), 150, 400))
+            self.assertEqual(intervals, [(100, 200, 0), (200, 400, 42)])
+            self.assertEqual(history.get_cpu_usage(150, 300),
+                             {0: 50, 42: 150, 43: 100})
+            self.assertEqual(sorted(history.get_attributes(['tids'])),
+                             [('tids', 42, 'syscall')])
+
+    def test_bad_file(self):
+        with open(self._path, 'wb') as f:
+            f.write(b'garbage')
+
+        self.assertRaises(sht.HistoryError, sht.StateHistory, self._path)
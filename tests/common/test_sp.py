@@ -0,0 +1,108 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import unittest
+from lttnganalyses.linuxautomaton import sp
+from lttnganalyses.linuxautomaton.state import State
+from lttnganalyses.linuxautomaton.syscalls import SyscallsStateProvider
+from .utils import Event
+
+
+class SchedProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset(['sched_switch_per_tid'])
+
+
+class SyscallsProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset(['syscall_exit'])
+    DEPENDENCIES = [SchedProvider]
+
+
+class IoProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset(['create_fd', 'io_rq_exit'])
+    DEPENDENCIES = [SchedProvider, SyscallsProvider]
+
+
+class IrqProvider(sp.StateProvider):
+    NOTIFICATIONS = frozenset(['softirq_exit'])
+
+
+class TestNeededProviders(unittest.TestCase):
+    _PROVIDERS = [SchedProvider, IrqProvider, SyscallsProvider, IoProvider]
+
+    def _get_needed(self, notifications):
+        return sp.get_needed_provider_classes(self._PROVIDERS,
+                                              notifications)
+
+    def test_all(self):
+        self.assertEqual(self._get_needed(None), self._PROVIDERS)
+
+    def test_none(self):
+        self.assertEqual(self._get_needed([]), [])
+
+    def test_standalone(self):
+        self.assertEqual(self._get_needed(['softirq_exit']), [IrqProvider])
+
+    def test_dependencies(self):
+        # the original order is kept
+        self.assertEqual(self._get_needed(['io_rq_exit']),
+                         [SchedProvider, SyscallsProvider, IoProvider])
+        self.assertEqual(self._get_needed(['syscall_exit', 'softirq_exit']),
+                         [SchedProvider, IrqProvider, SyscallsProvider])
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, self._get_needed, ['unknown'])
+
+
+class TestSyscallsProviderAlone(unittest.TestCase):
+    def setUp(self):
+        # no IoStateProvider to clear the I/O syscalls
+        self._state = State()
+        self._provider = SyscallsStateProvider(self._state)
+        self._exits = []
+        self._state.register_notification_cbs(None, {
+            'syscall_exit': self._syscall_exit_cb,
+        })
+        self._state.switch_task(0, 42)
+
+    def _syscall_exit_cb(self, period_data, payload):
+        self._exits.append(payload.proc.current_syscall.name)
+
+    def _syscall(self, name, begin_ts, end_ts):
+        self._provider.process_event(
+            Event('syscall_entry_' + name, begin_ts))
+        self._provider.process_event(
+            Event('syscall_exit_' + name, end_ts, ret=0))
+
+    def test_io_syscall_cleared(self):
+        self._syscall('read', 100, 110)
+
+        self.assertEqual(self._exits, ['read'])
+        self.assertIsNone(self._state.tids[42].current_syscall)
+
+    def test_unmatched_exit(self):
+        self._syscall('write', 100, 110)
+        # entry lost
+        self._provider.process_event(
+            Event('syscall_exit_write', 120, ret=0))
+
+        self.assertEqual(self._exits, ['write'])
@@ -0,0 +1,78 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import unittest
+from lttnganalyses.linuxautomaton import sv
+from lttnganalyses.linuxautomaton.state import State
+
+
+class TestState(unittest.TestCase):
+    def test_switch_task(self):
+        state = State()
+        cpu = state.switch_task(0, 42)
+
+        self.assertIs(state.get_cpu(0), cpu)
+        self.assertIs(state.get_current_proc(0), state.tids[42])
+        self.assertEqual(state.get_running_cpu(42), 0)
+        self.assertIsNone(state.get_current_proc(1))
+
+        # the swapper is not a current process
+        state.switch_task(0, 0)
+        self.assertIsNone(cpu.current_tid)
+        self.assertIsNone(state.get_current_proc(0))
+        self.assertIsNone(state.get_running_cpu(42))
+
+    def test_migrated_task_switch(self):
+        state = State()
+        state.switch_task(0, 42)
+        # 42 runs on CPU 1 before CPU 0 switches out of it
+        state.switch_task(1, 42)
+        state.switch_task(0, 43)
+
+        self.assertEqual(state.get_running_cpu(42), 1)
+        self.assertEqual(state.get_running_cpu(43), 0)
+
+    def test_wakeup_task(self):
+        state = State()
+        state.switch_task(0, 42)
+
+        self.assertIsNone(state.wakeup_task(42, 1, 100))
+        proc = state.wakeup_task(43, 0, 100)
+        self.assertEqual(proc.last_wakeup, 100)
+        self.assertEqual(proc.last_waker, 42)
+        # only the first wakeup is recorded
+        state.wakeup_task(43, 1, 200)
+        self.assertEqual(proc.last_wakeup, 100)
+
+    def test_fork_task(self):
+        state = State()
+        state.switch_task(0, 43)
+        parent = state.get_or_create_proc(42)
+        parent.fds[3] = sv.FD(3, '/etc/passwd', sv.FDType.disk)
+        child = sv.Process(43, 43, 'bash')
+        state.fork_task(parent, child)
+
+        self.assertIs(state.tids[43], child)
+        # the CPU running the child sees the new process object
+        self.assertIs(state.get_current_proc(0), child)
+        self.assertEqual(child.fds[3].filename, '/etc/passwd')
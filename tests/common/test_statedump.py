@@ -0,0 +1,104 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import unittest
+from lttnganalyses.linuxautomaton.state import State
+from lttnganalyses.linuxautomaton.statedump import StatedumpStateProvider
+from .utils import Event
+
+
+class TestStatedumpBulk(unittest.TestCase):
+    def setUp(self):
+        self._state = State()
+        self._provider = StatedumpStateProvider(self._state)
+        self._payloads = []
+        self._state.register_notification_cbs(None, {
+            'statedump_bulk': self._statedump_bulk_cb,
+        })
+
+    def _statedump_bulk_cb(self, period_data, payload):
+        self._payloads.append(dict(payload.as_dict()))
+
+    def _process_state(self, timestamp, tid, pid, name):
+        self._provider.process_event(Event(
+            'lttng_statedump_process_state', timestamp, tid=tid, pid=pid,
+            name=name))
+
+    def _file_descriptor(self, timestamp, pid, fd, filename):
+        self._provider.process_event(Event(
+            'lttng_statedump_file_descriptor', timestamp, pid=pid, fd=fd,
+            filename=filename, flags=0))
+
+    def test_bulk(self):
+        self._process_state(100, 42, 42, 'app')
+        self._process_state(101, 43, 42, 'app')
+        self._file_descriptor(102, 42, 3, 'testfile')
+        self._file_descriptor(103, 42, 4, 'other')
+        self._file_descriptor(104, 42, 4, 'fixed')
+
+        # the state is up to date, the analyses are not notified yet
+        self.assertEqual(self._state.tids[42].fds[4].filename, 'fixed')
+        self.assertEqual(self._state.tids[43].pid, 42)
+        self.assertEqual(self._payloads, [])
+
+        self._provider.process_event(Event('lttng_statedump_end', 105))
+        self.assertEqual(len(self._payloads), 1)
+        payload = self._payloads[0]
+        parent = self._state.tids[42]
+
+        self.assertEqual(payload['timestamp'], 100)
+        self.assertEqual(payload['parent_procs'],
+                         [(self._state.tids[43], parent)])
+        self.assertEqual(len(payload['new_fds']), 1)
+        proc, fds = payload['new_fds'][0]
+        self.assertIs(proc, parent)
+        self.assertEqual(sorted(fds.keys()), [3, 4])
+        self.assertEqual(fds[4].filename, 'fixed')
+        self.assertEqual(payload['updated_fds'], [])
+
+    def test_closed_fd(self):
+        self._file_descriptor(100, 42, 3, 'testfile')
+        self._file_descriptor(101, 42, 4, 'other')
+        # closed before the end of the statedump
+        del self._state.tids[42].fds[3]
+
+        # any other event ends the run of statedump events
+        self._provider.process_event(Event('sched_switch', 103))
+        proc, fds = self._payloads[0]['new_fds'][0]
+        self.assertEqual(sorted(fds.keys()), [4])
+        self.assertEqual(self._payloads[0]['updated_fds'], [])
+
+    def test_no_cpu_id(self):
+        self._file_descriptor(100, 42, 3, 'testfile')
+        event = Event('lttng_ust_statedump:end', 101)
+        del event['cpu_id']
+        self._provider.process_event(event)
+        self.assertEqual(len(self._payloads), 1)
+        self.assertIsNone(self._payloads[0]['cpu_id'])
+
+    def test_end(self):
+        self._file_descriptor(100, 42, 3, 'testfile')
+        self._provider.end()
+        self.assertEqual(len(self._payloads), 1)
+        self._provider.end()
+        self.assertEqual(len(self._payloads), 1)
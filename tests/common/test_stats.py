@@ -0,0 +1,225 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import statistics
+import unittest
+from lttnganalyses.core import stats
+
+
+class TestSummary(unittest.TestCase):
+    def test_empty(self):
+        summary = stats.Summary()
+
+        self.assertEqual(summary.count, 0)
+        self.assertIsNone(summary.min)
+        self.assertIsNone(summary.max)
+        self.assertIsNone(summary.mean)
+        self.assertTrue(math.isnan(summary.stdev))
+
+    def test_single(self):
+        summary = stats.Summary()
+        summary.update(2000)
+
+        self.assertEqual((summary.count, summary.min, summary.max),
+                         (1, 2000, 2000))
+        self.assertEqual(summary.mean, 2000)
+        self.assertTrue(math.isnan(summary.stdev))
+
+    def test_values(self):
+        values = [1000, 3000, 2000, 2000, 7000, 1500]
+        summary = stats.Summary()
+        for value in values:
+            summary.update(value)
+
+        self.assertEqual(summary.count, len(values))
+        self.assertEqual(summary.min, 1000)
+        self.assertEqual(summary.max, 7000)
+        self.assertEqual(summary.total, sum(values))
+        self.assertAlmostEqual(summary.mean, statistics.mean(values))
+        self.assertAlmostEqual(summary.stdev, statistics.stdev(values))
+
+    def test_repeated_values(self):
+        values = [1000, 3000, 2000]
+        summary = stats.Summary()
+        for value in values:
+            summary.update(value)
+        summary.update(0, 4)
+        summary.update(0, 0)
+        values += [0] * 4
+
+        self.assertEqual((summary.count, summary.min, summary.max,
+                          summary.total), (7, 0, 3000, 6000))
+        self.assertAlmostEqual(summary.mean, statistics.mean(values))
+        self.assertAlmostEqual(summary.stdev, statistics.stdev(values))
+
+    def test_merge(self):
+        first = stats.Summary()
+        for value in [10, 20, 5000]:
+            first.update(value)
+        second = stats.Summary()
+        for value in [30, 7000000]:
+            second.update(value)
+        merged = stats.Summary.new_from_summaries(
+            [first, stats.Summary(), second])
+        values = [10, 20, 5000, 30, 7000000]
+
+        self.assertEqual((merged.count, merged.min, merged.max,
+                          merged.total), (5, 10, 7000000, sum(values)))
+        self.assertAlmostEqual(merged.mean, statistics.mean(values))
+        self.assertAlmostEqual(merged.stdev, statistics.stdev(values))
+        self.assertEqual(first.count, 3)
+
+    def test_reset(self):
+        summary = stats.Summary()
+        summary.update(10)
+        summary.update(20)
+        summary.reset()
+        summary.update(5)
+
+        self.assertEqual((summary.count, summary.min, summary.max,
+                          summary.total), (1, 5, 5, 5))
+
+
+class TestLogLinearHistogram(unittest.TestCase):
+    def _get_histogram(self, values):
+        histogram = stats.LogLinearHistogram()
+        for value in values:
+            histogram.record(value)
+
+        return histogram
+
+    def test_empty(self):
+        histogram = stats.LogLinearHistogram()
+
+        self.assertEqual(histogram.count, 0)
+        self.assertIsNone(histogram.min)
+        self.assertEqual(histogram.get_freq_counts(0, 10, 5), [0] * 5)
+
+    def test_freq_counts(self):
+        # same bins as the per-sample computation
+        values = [1000000, 2000000, 2000000, 3000000, 1500000, 2999999]
+        histogram = self._get_histogram(values)
+        counts = histogram.get_freq_counts(1000, 3000, 4, 1000)
+
+        self.assertEqual(histogram.count, len(values))
+        self.assertEqual((histogram.min, histogram.max), (1000000, 3000000))
+        self.assertEqual(counts, [1, 1, 2, 2])
+
+    def test_out_of_range(self):
+        histogram = self._get_histogram([5, 10, 20, 40])
+
+        self.assertEqual(histogram.get_freq_counts(10, 20, 2), [1, 1])
+
+    def test_exact_small_values(self):
+        nr_values = 2 ** stats.LogLinearHistogram.SUB_BUCKET_BITS
+        histogram = self._get_histogram(range(nr_values))
+
+        self.assertEqual(histogram.get_freq_counts(0, nr_values, nr_values),
+                         [1] * nr_values)
+
+    def test_merge(self):
+        first = self._get_histogram([10, 20, 5000])
+        second = self._get_histogram([30, 5000, 7000000])
+        merged = stats.LogLinearHistogram.new_from_histograms([first, second])
+        whole = self._get_histogram([10, 20, 5000, 30, 5000, 7000000])
+
+        self.assertEqual((merged.count, merged.min, merged.max),
+                         (6, 10, 7000000))
+        self.assertEqual(merged.get_freq_counts(0, 7000000, 7),
+                         whole.get_freq_counts(0, 7000000, 7))
+        self.assertEqual(first.count, 3)
+
+    def test_repeated_values(self):
+        histogram = self._get_histogram([10, 5000])
+        histogram.record(0, 3)
+        histogram.record(5000, 2)
+        whole = self._get_histogram([10, 5000, 0, 0, 0, 5000, 5000])
+
+        self.assertEqual((histogram.count, histogram.min, histogram.max),
+                         (7, 0, 5000))
+        self.assertEqual(histogram.get_freq_counts(0, 5000, 5),
+                         whole.get_freq_counts(0, 5000, 5))
+
+    def test_quantiles_empty(self):
+        histogram = stats.LogLinearHistogram()
+
+        self.assertEqual(histogram.get_quantiles([.5, .99]), [None, None])
+
+    def test_quantiles_exact_small_values(self):
+        histogram = self._get_histogram(range(1, 101))
+
+        self.assertEqual(histogram.get_quantiles([.5, .9, .99, 1]),
+                         [50, 90, 99, 100])
+        self.assertEqual(histogram.get_quantile(.001), 1)
+
+    def test_quantiles_relative_error(self):
+        values = [(i * 7919) % 1000003 + 1000 for i in range(5000)]
+        histogram = self._get_histogram(values)
+        values.sort()
+        max_error = 2 ** -(stats.LogLinearHistogram.SUB_BUCKET_BITS - 1)
+
+        for quantile in [.5, .9, .99, .999]:
+            expected = values[math.ceil(quantile * len(values)) - 1]
+            value = histogram.get_quantile(quantile)
+            self.assertLessEqual(abs(value - expected) / expected, max_error)
+
+
+class TestTopK(unittest.TestCase):
+    def _get_top(self, limit, items):
+        top = stats.TopK(limit, lambda item: item[0])
+        for item in items:
+            top.add(item)
+
+        return top
+
+    def test_empty(self):
+        top = self._get_top(3, [])
+
+        self.assertEqual(len(top), 0)
+        self.assertEqual(top.items, [])
+
+    def test_largest(self):
+        values = [(i * 37) % 101 for i in range(101)]
+        top = self._get_top(5, [(value,) for value in values])
+
+        self.assertEqual(len(top), 5)
+        self.assertEqual(top.items, [(100,), (99,), (98,), (97,), (96,)])
+
+    def test_ties_keep_insertion_order(self):
+        items = [(1, 'a'), (2, 'b'), (1, 'c'), (2, 'd'), (3, 'e'), (1, 'f')]
+        top = self._get_top(4, items)
+
+        self.assertEqual(top.items, sorted(items, key=lambda item: item[0],
+                                           reverse=True)[:4])
+
+    def test_zero_limit(self):
+        top = self._get_top(0, [(1,), (2,)])
+
+        self.assertEqual(top.items, [])
+
+    def test_reset(self):
+        top = self._get_top(2, [(1,), (2,), (3,)])
+        top.reset()
+        top.add((0,))
+
+        self.assertEqual(top.items, [(0,)])
@@ -0,0 +1,120 @@
+# The MIT License (MIT)
+#
+# Copyright (C) 2016 - Julien Desfossez <jdesfossez@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+from lttnganalyses.linuxautomaton import sv
+
+
+# Mock of babeltrace's Event, only the name is needed
+class Event():
+    def __init__(self, name):
+        self.name = name
+
+
+class TestSyscallTable(unittest.TestCase):
+    def _check(self, event_name, name, syscall_class, size_key):
+        info = sv.SyscallTable.get_info(Event(event_name))
+
+        self.assertEqual(info.name, name)
+        self.assertEqual(info.syscall_class, syscall_class)
+        self.assertEqual(info.size_key, size_key)
+
+    def test_classes(self):
+        self._check('syscall_entry_openat', 'openat', sv.SyscallClass.open,
+                    None)
+        self._check('syscall_entry_close', 'close', sv.SyscallClass.close,
+                    None)
+        self._check('syscall_entry_fdatasync', 'fdatasync',
+                    sv.SyscallClass.sync, None)
+        self._check('syscall_entry_splice', 'splice',
+                    sv.SyscallClass.read_write, None)
+        self._check('syscall_entry_futex', 'futex', sv.SyscallClass.non_io,
+                    None)
+
+    def test_size_keys(self):
+        self._check('syscall_entry_read', 'read', sv.SyscallClass.read,
+                    'count')
+        self._check('sys_writev', 'writev', sv.SyscallClass.write, 'vlen')
+        self._check('syscall_entry_recvfrom', 'recvfrom',
+                    sv.SyscallClass.read, 'size')
+        self._check('syscall_entry_sendto', 'sendto', sv.SyscallClass.write,
+                    'len')
+        self._check('syscall_entry_recvmsg', 'recvmsg', sv.SyscallClass.read,
+                    None)
+
+    def test_cached(self):
+        info = sv.SyscallTable.get_info(Event('syscall_entry_write'))
+
+        self.assertIs(sv.SyscallTable.get_info(Event('syscall_entry_write')),
+                      info)
+        self.assertTrue(info.is_io)
+
+    def test_not_a_syscall(self):
+        self.assertRaises(ValueError, sv.SyscallTable.get_info,
+                          Event('sched_switch'))
+
+
+class TestFDTable(unittest.TestCase):
+    def setUp(self):
+        self.parent = sv.FDTable()
+        self.parent.set_new(0, sv.FD(0, '/dev/pts/0'))
+        self.parent.set_new(3, sv.FD(3, '/etc/passwd', sv.FDType.disk))
+
+    def test_copy_shares(self):
+        child = self.parent.copy()
+
+        self.assertEqual(sorted(child), [0, 3])
+        self.assertIs(child[3], self.parent[3])
+
+    def test_copy_on_write(self):
+        child = self.parent.copy()
+        del child[0]
+        child.set_new(4, sv.FD(4, 'socket', sv.FDType.net))
+
+        self.assertEqual(sorted(child), [3, 4])
+        self.assertEqual(sorted(self.parent), [0, 3])
+
+    def test_get_mutable(self):
+        child = self.parent.copy()
+        child.get_mutable(3).filename = '/etc/shadow'
+
+        self.assertEqual(child[3].filename, '/etc/shadow')
+        self.assertEqual(self.parent[3].filename, '/etc/passwd')
+
+        # the parent's FD objects are shared as well
+        self.parent.get_mutable(0).filename = 'pipe'
+        self.assertEqual(child[0].filename, '/dev/pts/0')
+
+        # once owned, the FD object is modified in place
+        fd_obj = child.get_mutable(3)
+        self.assertIs(child.get_mutable(3), fd_obj)
+
+    def test_set_shared(self):
+        sibling = self.parent.copy()
+        other = sv.FDTable()
+        # the FD object is still visible through the sibling
+        other[3] = self.parent[3]
+        other.get_mutable(3).filename = '/etc/shadow'
+
+        self.assertEqual(other[3].filename, '/etc/shadow')
+        self.assertEqual(sibling[3].filename, '/etc/passwd')
+        self.assertEqual(self.parent[3].filename, '/etc/passwd')
@@ -117,3 +117,93 @@ class TestGetSyscallName(unittest.TestCase):
         event = self.Event('whatever')
 
         self.assertRaises(ValueError, trace_utils.get_syscall_name, event)
+
+
+class TestGetEventFields(unittest.TestCase):
+    # Mocks of babeltrace's TraceHandle and declarations, the scopes
+    # are plain integers
+    class FieldDeclaration():
+        def __init__(self, name, scope):
+            self.name = name
+            self.scope = scope
+
+    class EventDeclaration():
+        def __init__(self, name, fields):
+            self.name = name
+            self.fields = [TestGetEventFields.FieldDeclaration(*field)
+                           for field in fields]
+
+    class TraceHandle():
+        def __init__(self, events):
+            self.events = events
+
+    def test_fields(self):
+        handles = {
+            0: self.TraceHandle([
+                self.EventDeclaration('sched_switch', [
+                    ('prev_tid', 0), ('next_tid', 0), ('cpu_id', 4),
+                ]),
+                self.EventDeclaration('irq_handler_entry', [
+                    ('irq', 0), ('cpu_id', 4),
+                ]),
+            ]),
+        }
+        result = trace_utils.get_event_fields(handles)
+
+        self.assertEqual(result, {
+            'sched_switch': [[('prev_tid', 0), ('next_tid', 0),
+                              ('cpu_id', 4)]],
+            'irq_handler_entry': [[('irq', 0), ('cpu_id', 4)]],
+        })
+
+    def test_merge_handles(self):
+        handles = {
+            0: self.TraceHandle([
+                self.EventDeclaration('sched_switch', [
+                    ('prev_tid', 0), ('cpu_id', 4),
+                ]),
+            ]),
+            1: self.TraceHandle([
+                self.EventDeclaration('sched_switch', [
+                    ('prev_tid', 0), ('vtid', 1), ('cpu_id', 4),
+                ]),
+            ]),
+        }
+        result = trace_utils.get_event_fields(handles)
+
+        # one declaration per trace
+        self.assertEqual(result, {
+            'sched_switch': [
+                [('prev_tid', 0), ('cpu_id', 4)],
+                [('prev_tid', 0), ('vtid', 1), ('cpu_id', 4)],
+            ],
+        })
+
+    def test_same_declarations(self):
+        handles = {
+            0: self.TraceHandle([
+                self.EventDeclaration('sched_switch', [
+                    ('prev_tid', 0), ('cpu_id', 4),
+                ]),
+            ]),
+            1: self.TraceHandle([
+                self.EventDeclaration('sched_switch', [
+                    ('prev_tid', 0), ('cpu_id', 4),
+                ]),
+                self.EventDeclaration('irq_handler_entry', [
+                    ('irq', 0), ('cpu_id', 4),
+                ]),
+            ]),
+        }
+        result = trace_utils.get_event_fields(handles)
+
+        self.assertEqual(result, {
+            'sched_switch': [[('prev_tid', 0), ('cpu_id', 4)]],
+            'irq_handler_entry': [[('irq', 0), ('cpu_id', 4)]],
+        })
+
+    def test_no_events(self):
+        handles = {0: self.TraceHandle([])}
+        result = trace_utils.get_event_fields(handles)
+
+        self.assertEqual(result, {})
@@ -24,6 +24,14 @@ import os
 import time
 
 
+# Mock of babeltrace's Event
+class Event(dict):
+    def __init__(self, event_name, timestamp, **fields):
+        super().__init__(fields, cpu_id=0)
+        self.name = event_name
+        self.timestamp = timestamp
+
+
 class TimezoneUtils():
     def __init__(self):
         self.original_tz = None